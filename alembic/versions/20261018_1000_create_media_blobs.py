@@ -0,0 +1,52 @@
+"""Create media_blobs table for content-addressed upload deduplication.
+
+Revision ID: 20261018_1000_media_blobs
+Revises: 20260422_1200_nullable_vrs_legacy
+Create Date: 2026-10-18 10:00:00
+
+One row per (company, SHA-256) with the storage location, size, mime type,
+derived artefacts (thumbnails, previews) and a reference count.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "20261018_1000_media_blobs"
+down_revision: Union[str, None] = "20260422_1200_nullable_vrs_legacy"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "media_blobs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "company_id",
+            sa.Integer(),
+            sa.ForeignKey("companies.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("sha256", sa.String(64), nullable=False),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("storage_provider", sa.String(50), nullable=False, server_default="local"),
+        sa.Column("storage_path", sa.String(500), nullable=False),
+        sa.Column("public_url", sa.String(500), nullable=True),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("mime_type", sa.String(100), nullable=True),
+        sa.Column("derived", sa.JSON(), nullable=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("last_used_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index(
+        "ix_media_blobs_company_sha256", "media_blobs", ["company_id", "sha256"], unique=True
+    )
+    op.create_index("ix_media_blobs_storage_path", "media_blobs", ["storage_path"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_media_blobs_storage_path", table_name="media_blobs")
+    op.drop_index("ix_media_blobs_company_sha256", table_name="media_blobs")
+    op.drop_table("media_blobs")
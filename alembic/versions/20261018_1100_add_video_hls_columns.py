@@ -0,0 +1,33 @@
+"""Add HLS rendition columns to videos.
+
+Revision ID: 20261018_1100_video_hls
+Revises: 20261018_1000_media_blobs
+Create Date: 2026-10-18 11:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1100_video_hls"
+down_revision: Union[str, None] = "20261018_1000_media_blobs"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("videos") as batch_op:
+        batch_op.add_column(sa.Column("hls_path", sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column("hls_url", sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column("hls_status", sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column("poster_url", sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("videos") as batch_op:
+        batch_op.drop_column("poster_url")
+        batch_op.drop_column("hls_status")
+        batch_op.drop_column("hls_url")
+        batch_op.drop_column("hls_path")
@@ -0,0 +1,29 @@
+"""Add perceptual marker hash columns to ar_content.
+
+Revision ID: 20261018_1200_marker_hash
+Revises: 20261018_1100_video_hls
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1200_marker_hash"
+down_revision: Union[str, None] = "20261018_1100_video_hls"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("ar_content") as batch_op:
+        batch_op.add_column(sa.Column("marker_phash", sa.String(length=16), nullable=True))
+        batch_op.add_column(sa.Column("marker_dhash", sa.String(length=16), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("ar_content") as batch_op:
+        batch_op.drop_column("marker_dhash")
+        batch_op.drop_column("marker_phash")
@@ -0,0 +1,31 @@
+"""Add animated preview and sprite sheet columns to videos.
+
+Revision ID: 20261018_1300_video_scrub
+Revises: 20261018_1200_marker_hash
+Create Date: 2026-10-18 13:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1300_video_scrub"
+down_revision: Union[str, None] = "20261018_1200_marker_hash"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("videos") as batch_op:
+        batch_op.add_column(sa.Column("animated_preview_url", sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column("sprite_url", sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column("sprite_vtt_url", sa.String(length=500), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("videos") as batch_op:
+        batch_op.drop_column("sprite_vtt_url")
+        batch_op.drop_column("sprite_url")
+        batch_op.drop_column("animated_preview_url")
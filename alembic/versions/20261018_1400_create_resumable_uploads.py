@@ -0,0 +1,40 @@
+"""Create resumable_uploads table for chunked (tus-style) uploads.
+
+Revision ID: 20261018_1400_resumable_uploads
+Revises: 20261018_1300_video_scrub
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1400_resumable_uploads"
+down_revision: Union[str, None] = "20261018_1300_video_scrub"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "resumable_uploads",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("filename", sa.String(255), nullable=False),
+        sa.Column("content_type", sa.String(100), nullable=True),
+        sa.Column("length", sa.BigInteger(), nullable=False),
+        sa.Column("offset", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("storage_path", sa.String(500), nullable=False),
+        sa.Column("upload_metadata", sa.JSON(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_resumable_uploads_expires_at", "resumable_uploads", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_resumable_uploads_expires_at", table_name="resumable_uploads")
+    op.drop_table("resumable_uploads")
@@ -0,0 +1,35 @@
+"""Create storage_usage table for incremental usage accounting.
+
+Revision ID: 20261018_1500_storage_usage
+Revises: 20261018_1400_resumable_uploads
+Create Date: 2026-10-18 15:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1500_storage_usage"
+down_revision: Union[str, None] = "20261018_1400_resumable_uploads"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "storage_usage",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("project_id", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("total_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("file_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.UniqueConstraint("company_id", "project_id", "kind", name="uq_storage_usage_bucket"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("storage_usage")
@@ -0,0 +1,69 @@
+"""Create storage_migrations tables for provider-to-provider file moves.
+
+Revision ID: 20261018_1600_storage_migrations
+Revises: 20261018_1500_storage_usage
+Create Date: 2026-10-18 16:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1600_storage_migrations"
+down_revision: Union[str, None] = "20261018_1500_storage_usage"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "storage_migrations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("company_id", sa.Integer(), sa.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("source_provider", sa.String(50), nullable=False),
+        sa.Column("target_provider", sa.String(50), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False, server_default="planning"),
+        sa.Column("total_files", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("total_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("copied_files", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("copied_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("run_copied_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("failed_files", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("rewritten_rows", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_storage_migrations_company_id", "storage_migrations", ["company_id"])
+    op.create_table(
+        "storage_migration_items",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "migration_id",
+            sa.Integer(),
+            sa.ForeignKey("storage_migrations.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("source_path", sa.String(500), nullable=False),
+        sa.Column("target_path", sa.String(500), nullable=False),
+        sa.Column("size_bytes", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("md5", sa.String(32), nullable=True),
+        sa.Column("status", sa.String(20), nullable=False, server_default="pending"),
+        sa.Column("error", sa.Text(), nullable=True),
+    )
+    op.create_index(
+        "ix_storage_migration_items_migration_status",
+        "storage_migration_items",
+        ["migration_id", "status"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_storage_migration_items_migration_status", table_name="storage_migration_items")
+    op.drop_table("storage_migration_items")
+    op.drop_index("ix_storage_migrations_company_id", table_name="storage_migrations")
+    op.drop_table("storage_migrations")
@@ -0,0 +1,31 @@
+"""Create job_leases table for single-worker scheduled jobs.
+
+Revision ID: 20261018_1700_job_leases
+Revises: 20261018_1600_storage_migrations
+Create Date: 2026-10-18 17:00:00
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision: str = "20261018_1700_job_leases"
+down_revision: Union[str, None] = "20261018_1600_storage_migrations"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_leases",
+        sa.Column("name", sa.String(100), primary_key=True),
+        sa.Column("owner", sa.String(255), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.Column("acquired_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("job_leases")
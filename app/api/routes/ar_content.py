@@ -1,9 +1,10 @@
 """
 AR Content API routes with Company → Project → AR Content hierarchy.
 """
+import asyncio
 from uuid import uuid4, UUID
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, BackgroundTasks, Request
 import shutil
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,9 +13,17 @@ from sqlalchemy.orm import selectinload
 import structlog
 import re
 from datetime import datetime
-import time
 
 from app.services.thumbnail_service import thumbnail_service
+from app.services.enhanced_thumbnail_service import enhanced_thumbnail_service
+from app.services.enhanced_validation_service import UploadRejected, enhanced_validation_service
+from app.services.ar_content_pipeline import (
+    POOL_CPU,
+    POOL_IO,
+    POOL_UPLOAD,
+    StagePipeline,
+    get_pool_semaphore,
+)
 
 # marker_service — ленивый импорт (cv2/numpy), не грузить при старте приложения
 
@@ -29,6 +38,7 @@ from app.schemas.ar_content import (
     ARContentUpdate,
     ARContentList,
     ARContentCreateResponse,
+    ARContentFromUploads,
     ARContentWithLinks
 )
 from app.utils.ar_content import (
@@ -37,8 +47,20 @@ from app.utils.ar_content import (
     build_unique_link,
     generate_qr_code,
     save_uploaded_file,
+    save_uploaded_file_hashed,
 )
-from app.core.storage_providers import get_provider_for_company
+from app.core.storage_providers import RemoteStorageProvider, get_provider_for_company, split_remote_ref
+from app.services.media_blob_service import StoredMedia, blob_relative_dir, media_blob_service
+from app.services.video_ingest_service import VideoIngestResult, ingest_video
+from app.services.hls_service import hls_worker
+from app.services.video_preview_service import apply_scrub_preview
+from app.services.marker_derivative_service import create_marker_derivative, reusable_derivative
+from app.services.marker_similarity_service import marker_similarity_service
+from app.services.image_variant_service import image_variant_service
+from app.services import resumable_upload_service
+from app.services.resumable_upload_service import UploadError
+from app.services.storage_usage_service import bind_usage_scope, local_tree_files, storage_usage
+from app.utils.image_hash import hash_image_file
 
 import json
 
@@ -47,10 +69,11 @@ logger = structlog.get_logger()
 router = APIRouter(tags=["AR Content"])
 
 
-def _safe_delete_folder(path: Path) -> None:
+def _safe_delete_folder(path: Path, company_id: Optional[int] = None, project_id: Optional[int] = None) -> None:
     """Best-effort recursive delete of content folder.
 
-    Safety: only allow deleting within STORAGE_BASE_PATH.
+    Safety: only allow deleting within STORAGE_BASE_PATH.  Removed files are
+    subtracted from the storage usage of *company_id* / *project_id*.
     """
     base = Path(settings.STORAGE_BASE_PATH).resolve()
     target = path.resolve()
@@ -66,12 +89,108 @@ def _safe_delete_folder(path: Path) -> None:
         return
 
     try:
+        removed = local_tree_files(target)
         shutil.rmtree(target)
+        storage_usage.record_tree_deleted(removed, company_id=company_id, project_id=project_id)
         logger.info("ar_content_delete_storage_ok", storage_path=str(target))
     except Exception as e:
         logger.error("ar_content_delete_storage_failed", storage_path=str(target), error=str(e))
 
 
+async def _release_media_blobs(
+    db: AsyncSession,
+    ar_content: ARContent,
+    background_tasks: Optional[BackgroundTasks],
+    paths: Optional[list] = None,
+) -> None:
+    """Drop blob references held by AR content; purge unreferenced blobs after commit.
+
+    By default releases the photo and every video of the content.
+    """
+    if paths is None:
+        video_paths = (
+            await db.execute(select(Video.video_path).where(Video.ar_content_id == ar_content.id))
+        ).scalars().all()
+        paths = [ar_content.photo_path, *video_paths]
+
+    collected = []
+    for path in paths:
+        try:
+            blob = await media_blob_service.release(db, ar_content.company_id, path)
+        except Exception as exc:
+            logger.warning("media_blob_release_failed", path=path, error=str(exc))
+            continue
+        if blob is not None:
+            collected.append(blob)
+
+    if not collected or background_tasks is None:
+        return
+    company = await db.get(Company, ar_content.company_id) if ar_content.company_id else None
+    provider = await get_provider_for_company(company) if company else None
+    for blob in collected:
+        background_tasks.add_task(media_blob_service.purge, blob, provider)
+
+
+async def _local_marker_derivative(photo_path: Optional[str]):
+    """Build a marker derivative next to a locally stored photo (best-effort)."""
+    if not settings.MARKER_DERIVATIVE_ENABLED or not photo_path or split_remote_ref(photo_path):
+        return None
+    path = Path(photo_path)
+    if not path.exists():
+        return None
+    try:
+        return await create_marker_derivative(path, path.parent)
+    except Exception as exc:
+        logger.warning("marker_derivative_failed", photo_path=photo_path, error=str(exc))
+        return None
+
+
+async def _hash_marker(photo_path: Optional[str]) -> Optional[tuple[str, str]]:
+    """(pHash, dHash) of a locally stored photo, computed off the event loop."""
+    if not photo_path or split_remote_ref(str(photo_path)):
+        return None
+    path = Path(photo_path)
+    if not path.exists():
+        return None
+    return await asyncio.to_thread(hash_image_file, str(path))
+
+
+async def _index_marker_hash(db: AsyncSession, ar_content: ARContent, hashes: Optional[tuple[str, str]]) -> list:
+    """Store the marker hash, index it and report near-duplicates (best-effort)."""
+    ar_content.marker_phash, ar_content.marker_dhash = hashes or (None, None)
+    if not hashes:
+        marker_similarity_service.discard(ar_content.id)
+        return []
+    try:
+        duplicates = await marker_similarity_service.find_near_duplicates(
+            db, hashes[0], ar_content.company_id, exclude_id=ar_content.id
+        )
+    except Exception as exc:
+        logger.warning("marker_duplicate_lookup_failed", ar_content_id=ar_content.id, error=str(exc))
+        duplicates = []
+    marker_similarity_service.add(ar_content.id, ar_content.company_id, hashes[0])
+    if duplicates:
+        logger.info(
+            "marker_near_duplicates_found",
+            ar_content_id=ar_content.id,
+            duplicates=[item["ar_content_id"] for item in duplicates],
+        )
+    return duplicates
+
+
+def _apply_marker(ar_content: ARContent, derivative, fallback_path: Optional[str], fallback_url: Optional[str]) -> None:
+    """ARCore marker = tracking derivative of the photo, or the photo itself."""
+    if derivative is not None:
+        ar_content.marker_path = derivative.storage_path
+        ar_content.marker_url = derivative.url
+        ar_content.marker_metadata = {"derivative": derivative.as_metadata()}
+    else:
+        ar_content.marker_path = fallback_path
+        ar_content.marker_url = fallback_url
+        ar_content.marker_metadata = {}
+    ar_content.marker_status = "ready"
+
+
 async def validate_company_project(company_id: int, project_id: int, db: AsyncSession) -> tuple[Company, Project]:
     """Validate that company and project exist and project belongs to company."""
     company = await db.get(Company, company_id)
@@ -237,7 +356,8 @@ async def _create_ar_content(
     background_tasks: Optional["BackgroundTasks"] = None,
 ):
     """Внутренняя функция для создания AR-контента"""
-    t0 = time.perf_counter()
+    pipeline = StagePipeline(name="ar_content_create")
+    bind_usage_scope(company_id, project_id)
     logger.info("ar_content_create_start", company_id=company_id, project_id=project_id)
 
     # Validate company and project relationship
@@ -245,8 +365,7 @@ async def _create_ar_content(
 
     # Resolve storage provider for the company
     provider = await get_provider_for_company(company)
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
-    is_yd = isinstance(provider, YandexDiskStorageProvider)
+    is_remote = isinstance(provider, RemoteStorageProvider)
     
     # Validate duration years
     if duration_years < 1:
@@ -284,121 +403,271 @@ async def _create_ar_content(
     )
     storage_path.mkdir(parents=True, exist_ok=True)
 
-    # Relative path used for Yandex Disk uploads
+    # Relative path used for remote (Yandex Disk, S3) uploads
     from app.utils.slug_utils import generate_slug
     project_slug = generate_slug(project.name) or f"Project_{project_id}"
     from app.utils.ar_content import sanitize_filename
     order_folder = sanitize_filename(order_number, max_length=50)
-    yd_relative_prefix = f"{project_slug}/{order_folder}"
+    remote_relative_prefix = f"{project_slug}/{order_folder}"
     
-    # Save photo
     photo_filename = f"photo{Path(photo_file.filename).suffix}"
     photo_path = storage_path / photo_filename
-    if is_yd:
-        # Save locally first (needed for image analysis), then upload to YD
-        import tempfile as _tmpmod
-        _tmp_photo = Path(_tmpmod.mkdtemp()) / photo_filename
-        await save_uploaded_file(photo_file, _tmp_photo)
-        yd_photo_ref = await provider.save_file(str(_tmp_photo), f"{yd_relative_prefix}/{photo_filename}")
-        # Keep local copy for analysis
-        shutil.copy2(str(_tmp_photo), str(photo_path))
-    else:
-        await save_uploaded_file(photo_file, photo_path)
-        yd_photo_ref = None
-
-    logger.info("ar_content_create_photo_saved", elapsed_s=round(time.perf_counter() - t0, 2))
-    
-    # Save video
     video_filename = f"video{Path(video_file.filename).suffix}"
     video_path = storage_path / video_filename
-    if is_yd:
-        yd_video_ref = await save_uploaded_file(
-            video_file,
-            video_path,
+    storage_provider_name = provider.provider_name
+
+    # ── Stage graph ──────────────────────────────────────────────────
+    # Photo and video land on local disk first (hashed while streaming);
+    # after that uploads, QR, quality analysis and thumbnails only depend on
+    # what they read and run concurrently, bounded by the per-pool limits in
+    # ar_content_pipeline.  Duplicate uploads reuse the stored blob and its
+    # derived artefacts (see media_blob_service).
+    db_lock = asyncio.Lock()  # AsyncSession is not safe for concurrent use
+
+    async def _save_scanned(upload: UploadFile, destination: Path, file_type: str) -> tuple[str, int]:
+        # Size limit, signature/MIME, hash and entropy in the same pass that writes the file
+        try:
+            return await save_uploaded_file_hashed(
+                upload, destination, scanner=enhanced_validation_service.upload_scanner(file_type)
+            )
+        except UploadRejected as exc:
+            raise HTTPException(status_code=exc.status_code, detail=f"{file_type.capitalize()}: {exc}")
+
+    async def _save_photo() -> tuple[str, int]:
+        return await _save_scanned(photo_file, photo_path, "image")
+
+    async def _save_video() -> tuple[str, int]:
+        return await _save_scanned(video_file, video_path, "video")
+
+    async def _lookup_photo(saved: tuple[str, int]):
+        async with db_lock:
+            return await media_blob_service.lookup(db, company_id, saved[0], "photo")
+
+    async def _lookup_video(saved: tuple[str, int]):
+        async with db_lock:
+            return await media_blob_service.lookup(db, company_id, saved[0], "video")
+
+    async def _store_photo(saved: tuple[str, int], existing) -> StoredMedia:
+        # The photo stays on local disk for YD as well (needed for analysis).
+        stored = await media_blob_service.store(
+            staged_path=photo_path,
+            sha256=saved[0],
+            size_bytes=saved[1],
+            kind="photo",
+            original_filename=photo_file.filename,
             provider=provider,
-            relative_storage_path=f"{yd_relative_prefix}/{video_filename}",
+            existing=existing,
+            keep_local=True,
+        )
+        # Thumbnail cache keys on the content hash — already known from the upload
+        if stored.local_path is not None:
+            enhanced_thumbnail_service.remember_file_hash(stored.local_path, stored.sha256)
+        return stored
+
+    async def _ingest_video(saved: tuple[str, int], existing) -> Optional[VideoIngestResult]:
+        # One ffprobe pass + fast-start remux; skipped when the blob already has metadata.
+        if existing is not None and (existing.derived or {}).get("video_meta"):
+            return None
+        return await ingest_video(video_path)
+
+    async def _store_video(
+        saved: tuple[str, int], existing, ingested: Optional[VideoIngestResult]
+    ) -> StoredMedia:
+        # Yandex Disk keeps the only copy of the video; the staging file is dropped.
+        # The blob stays keyed by the hash of the uploaded bytes, so a re-upload
+        # of the same original maps to the already normalised file.
+        return await media_blob_service.store(
+            staged_path=video_path,
+            sha256=saved[0],
+            size_bytes=ingested.size_bytes if ingested and ingested.size_bytes else saved[1],
+            kind="video",
+            original_filename=video_file.filename,
+            provider=provider,
+            existing=existing,
         )
-    else:
-        await save_uploaded_file(video_file, video_path)
-        yd_video_ref = None
-
-    logger.info("ar_content_create_video_saved", elapsed_s=round(time.perf_counter() - t0, 2))
 
-    # Resolve URLs depending on provider
-    if is_yd:
-        photo_url_val = yd_photo_ref or provider.get_public_url(f"{yd_relative_prefix}/{photo_filename}")
-        video_url = yd_video_ref or provider.get_public_url(f"{yd_relative_prefix}/{video_filename}")
-    else:
-        photo_url_val = build_public_url(photo_path, provider=provider)
-        video_url = build_public_url(video_path, provider=provider)
-    
-    # Generate QR code
-    if is_yd:
-        qr_code_url = await generate_qr_code(
+    async def _generate_qr() -> str:
+        qr_target = Path(remote_relative_prefix) if is_remote else storage_path
+        return await generate_qr_code(
             unique_id,
-            Path(yd_relative_prefix),
+            qr_target,
             provider=provider,
             order_number=order_number,
         )
-    else:
-        qr_code_url = await generate_qr_code(
-            unique_id,
-            storage_path,
+
+    async def _analyze_photo(stored: StoredMedia) -> dict:
+        cached = stored.derived.get("analysis") or {}
+        if cached.get("auto_enhance") == auto_enhance and cached.get("photo_analysis"):
+            logger.info("media_blob_analysis_reused", sha256=stored.sha256)
+            return {"photo_analysis": cached["photo_analysis"], "marker_image": None, "reused": True}
+
+        # Analyze photo quality and build recommendations (always uses local file)
+        from app.services.marker_service import marker_service
+
+        local_photo = stored.local_path
+        image_quality = await asyncio.to_thread(marker_service.analyze_image_quality, str(local_photo))
+        analysis: dict = {
+            "metrics": image_quality,
+            "recommendations": marker_service.build_image_recommendations(image_quality),
+            "auto_enhanced": False,
+        }
+        marker_image = str(local_photo)
+        if auto_enhance:
+            if marker_service.should_auto_enhance(image_quality):
+                enhanced_path = await asyncio.to_thread(
+                    marker_service.enhance_image_for_marker,
+                    image_path=str(local_photo),
+                    output_path=str(local_photo.parent / "photo_enhanced.png"),
+                )
+                if enhanced_path:
+                    marker_image = enhanced_path
+                    enhanced_metrics = await asyncio.to_thread(
+                        marker_service.analyze_image_quality, enhanced_path
+                    )
+                    analysis.update({"auto_enhanced": True, "enhanced_metrics": enhanced_metrics})
+            else:
+                analysis["auto_enhance_skipped_reason"] = "quality_above_threshold"
+        return {"photo_analysis": analysis, "marker_image": marker_image, "reused": False}
+
+    async def _upload_enhanced(stored: StoredMedia, analyzed: dict) -> Optional[str]:
+        if not (is_remote and analyzed["photo_analysis"].get("auto_enhanced")) or analyzed["reused"]:
+            return None
+        return await provider.save_file(
+            analyzed["marker_image"],
+            f"{blob_relative_dir(stored.sha256)}/photo_enhanced.png",
+        )
+
+    async def _generate_thumbnail(stored: StoredMedia, analyzed: dict) -> Optional[str]:
+        enhanced = bool(analyzed["photo_analysis"].get("auto_enhanced"))
+        derived = stored.derived
+        if derived.get("thumbnail_url") and derived.get("thumbnail_enhanced", False) == enhanced:
+            return derived["thumbnail_url"]
+
+        # Use enhanced image path when auto-enhance was applied
+        marker_image = analyzed["marker_image"] or str(stored.local_path)
+        thumbnail_result = await thumbnail_service.generate_image_thumbnail(
+            image_path=marker_image,
+            company_id=company_id,
+            storage_path=Path(marker_image).parent,
+        )
+        if thumbnail_result.get("status") != "ready":
+            logger.warning("photo_thumbnail_generation_failed", error=thumbnail_result.get("error"))
+            return None
+        thumb_url = thumbnail_result.get("thumbnail_url")
+        # Remote storage: upload generated thumbnail next to the blob
+        if is_remote:
+            thumb_local = thumbnail_result.get("thumbnail_path")
+            if thumb_local and Path(thumb_local).exists():
+                async with get_pool_semaphore(POOL_UPLOAD):
+                    thumb_url = await provider.save_file(
+                        thumb_local,
+                        f"{blob_relative_dir(stored.sha256)}/thumbnail.png",
+                    )
+        return thumb_url
+
+    async def _build_marker_derivative(stored: StoredMedia, analyzed: dict):
+        if not settings.MARKER_DERIVATIVE_ENABLED:
+            return None
+        enhanced = bool(analyzed["photo_analysis"].get("auto_enhanced"))
+        source_path = Path(analyzed["marker_image"] or stored.local_path)
+        if enhanced and not analyzed["marker_image"]:
+            # Cached analysis: the enhanced image sits next to the photo if still on disk
+            candidate = stored.local_path.parent / "photo_enhanced.png"
+            enhanced = candidate.exists()
+            source_path = candidate if enhanced else stored.local_path
+        source = "enhanced" if enhanced else "original"
+        cached = reusable_derivative(stored.derived.get("marker"), source)
+        if cached is not None:
+            return cached
+        return await create_marker_derivative(
+            source_path,
+            stored.local_path.parent,
             provider=provider,
-            order_number=order_number,
+            remote_dir=blob_relative_dir(stored.sha256),
+            source=source,
+        )
+
+    async def _hash_photo(stored: StoredMedia) -> Optional[tuple[str, str]]:
+        cached = stored.derived.get("phash")
+        if cached:
+            return cached["phash"], cached["dhash"]
+        return await asyncio.to_thread(hash_image_file, str(stored.local_path))
+
+    pipeline.add("save_photo", _save_photo, pool=POOL_IO)
+    pipeline.add("save_video", _save_video, pool=POOL_IO)
+    pipeline.add("lookup_photo", _lookup_photo, deps=("save_photo",), pool=POOL_IO)
+    pipeline.add("lookup_video", _lookup_video, deps=("save_video",), pool=POOL_IO)
+    pipeline.add("store_photo", _store_photo, deps=("save_photo", "lookup_photo"), pool=POOL_UPLOAD)
+    # ingest_video bounds its ffmpeg work by the media pool itself
+    pipeline.add("ingest_video", _ingest_video, deps=("save_video", "lookup_video"), pool=POOL_IO)
+    pipeline.add(
+        "store_video", _store_video, deps=("save_video", "lookup_video", "ingest_video"), pool=POOL_UPLOAD
+    )
+    pipeline.add("qr_code", _generate_qr, pool=POOL_UPLOAD if is_remote else POOL_CPU)
+    pipeline.add("analyze_photo", _analyze_photo, deps=("store_photo",), pool=POOL_CPU)
+    pipeline.add(
+        "upload_enhanced", _upload_enhanced, deps=("store_photo", "analyze_photo"), pool=POOL_UPLOAD
+    )
+    pipeline.add(
+        "thumbnail",
+        _generate_thumbnail,
+        deps=("store_photo", "analyze_photo"),
+        pool=POOL_CPU,
+        optional=True,
+    )
+
+    pipeline.add(
+        "marker_derivative",
+        _build_marker_derivative,
+        deps=("store_photo", "analyze_photo"),
+        pool=POOL_CPU,
+        optional=True,
+    )
+    pipeline.add("marker_hash", _hash_photo, deps=("store_photo",), pool=POOL_CPU, optional=True)
+
+    try:
+        results = await pipeline.run()
+    except Exception:
+        logger.error(
+            "ar_content_create_pipeline_failed",
+            elapsed_s=round(pipeline.elapsed(), 2),
+            timings=pipeline.breakdown()["stages"],
         )
+        raise
+
+    stored_photo: StoredMedia = results["store_photo"]
+    stored_video: StoredMedia = results["store_video"]
+    ingested: Optional[VideoIngestResult] = results["ingest_video"]
+    video_meta = ingested.as_dict() if ingested else stored_video.derived.get("video_meta", {})
+    qr_code_url = results["qr_code"]
+    analyzed = results["analyze_photo"]
+    photo_analysis = analyzed["photo_analysis"]
+    thumb_url = results.get("thumbnail")
+    marker_derivative = results.get("marker_derivative")
+    marker_hashes = results.get("marker_hash")
+
+    photo_url_val = stored_photo.public_url
+    video_url = stored_video.public_url
+
     logger.info(
         "ar_content_create_storage_ready",
-        elapsed_s=round(time.perf_counter() - t0, 2),
+        elapsed_s=round(pipeline.elapsed(), 2),
         storage_path=str(storage_path),
-        photo_path=str(photo_path),
-        video_path=str(video_path),
+        photo_path=stored_photo.storage_path,
+        video_path=stored_video.storage_path,
         photo_url=photo_url_val,
         video_url=video_url,
         qr_code_url=qr_code_url,
+        thumbnail_url=thumb_url,
+        photo_reused=stored_photo.reused,
+        video_reused=stored_video.reused,
         storage_provider=company.storage_provider,
     )
 
-    # Analyze photo quality and build recommendations (always uses local file)
-    from app.services.marker_service import marker_service
-    image_quality = marker_service.analyze_image_quality(str(photo_path))
-    recommendations = marker_service.build_image_recommendations(image_quality)
-    photo_analysis: dict = {
-        "metrics": image_quality,
-        "recommendations": recommendations,
-        "auto_enhanced": False,
-    }
-
-    marker_image_path = str(photo_path)
-    if auto_enhance:
-        if marker_service.should_auto_enhance(image_quality):
-            enhanced_photo_path = storage_path / "photo_enhanced.png"
-            enhanced_path = marker_service.enhance_image_for_marker(
-                image_path=str(photo_path),
-                output_path=str(enhanced_photo_path),
-            )
-            if enhanced_path:
-                marker_image_path = enhanced_path
-                enhanced_metrics = marker_service.analyze_image_quality(enhanced_path)
-                photo_analysis.update(
-                    {
-                        "auto_enhanced": True,
-                        "enhanced_metrics": enhanced_metrics,
-                    }
-                )
-                # Upload enhanced version to YD
-                if is_yd:
-                    await provider.save_file(
-                        enhanced_path,
-                        f"{yd_relative_prefix}/photo_enhanced.png",
-                    )
-        else:
-            photo_analysis["auto_enhance_skipped_reason"] = "quality_above_threshold"
-
-    # Paths stored in DB: for YD — yadisk:// refs, for local — absolute paths
-    db_photo_path = yd_photo_ref if is_yd else str(photo_path)
-    db_video_path = yd_video_ref if is_yd else str(video_path)
-    db_qr_path = qr_code_url if is_yd else str(storage_path / "qr_code.png")
+    # Paths stored in DB: blob location (remote ref for YD/S3, local path otherwise)
+    db_photo_path = stored_photo.storage_path
+    db_video_path = stored_video.storage_path
+    db_qr_path = qr_code_url if is_remote else str(storage_path / "qr_code.png")
 
     # Create database record for AR content
     ar_content = ARContent(
@@ -416,67 +685,75 @@ async def _create_ar_content(
         video_url=video_url,
         qr_code_path=db_qr_path,
         qr_code_url=qr_code_url,
+        thumbnail_url=thumb_url,
         status="pending"
     )
-    
-    # Add to session before processing
-    db.add(ar_content)
-    await db.commit()
-    await db.refresh(ar_content)
-    
-    # Generate thumbnail (use enhanced image path when auto-enhance was applied)
-    try:
-        thumbnail_result = await thumbnail_service.generate_image_thumbnail(
-            image_path=marker_image_path,
+
+    async with pipeline.track("db_records"):
+        photo_derived: dict = {}
+        if not analyzed["reused"]:
+            photo_derived["analysis"] = {"auto_enhance": auto_enhance, "photo_analysis": photo_analysis}
+        if thumb_url and thumb_url != stored_photo.derived.get("thumbnail_url"):
+            photo_derived["thumbnail_url"] = thumb_url
+            photo_derived["thumbnail_enhanced"] = bool(photo_analysis.get("auto_enhanced"))
+        if marker_derivative is not None and marker_derivative.as_metadata() != stored_photo.derived.get("marker"):
+            photo_derived["marker"] = marker_derivative.as_metadata()
+        if marker_hashes and not stored_photo.derived.get("phash"):
+            photo_derived["phash"] = {"phash": marker_hashes[0], "dhash": marker_hashes[1]}
+        await media_blob_service.register(
+            db,
             company_id=company_id,
-            storage_path=storage_path
+            stored=stored_photo,
+            kind="photo",
+            storage_provider=storage_provider_name,
+            mime_type=photo_file.content_type,
+            derived=photo_derived,
         )
-        
-        if thumbnail_result.get("status") == "ready":
-            thumb_url = thumbnail_result.get("thumbnail_url")
-            # For YD: upload generated thumbnail
-            if is_yd:
-                thumb_local = thumbnail_result.get("thumbnail_path")
-                if thumb_local and Path(thumb_local).exists():
-                    thumb_url = await provider.save_file(
-                        thumb_local,
-                        f"{yd_relative_prefix}/thumbnail.png",
-                    )
-            ar_content.thumbnail_url = thumb_url
-            await db.commit()
-            await db.refresh(ar_content)
-            logger.info(
-                "photo_thumbnail_generation_saved",
-                ar_content_id=ar_content.id,
-                thumbnail_url=thumb_url,
-            )
-        else:
-            logger.warning("photo_thumbnail_generation_failed", error=thumbnail_result.get("error"))
-    except Exception as e:
-        logger.error("photo_thumbnail_generation_exception", error=str(e))
-    
-    # Create video record
-    video_record = Video(
-        ar_content_id=ar_content.id,
-        filename=video_filename,
-        video_path=db_video_path,
-        video_url=video_url,
-        preview_url=video_url,
-        is_active=True,
-        status="uploaded"
-    )
-    
-    db.add(video_record)
-    await db.commit()
-    await db.refresh(video_record)
-    
-    # Set the video as active for the AR content
-    ar_content.active_video_id = video_record.id
-    await db.commit()
-    await db.refresh(ar_content)
+        await media_blob_service.register(
+            db,
+            company_id=company_id,
+            stored=stored_video,
+            kind="video",
+            storage_provider=storage_provider_name,
+            mime_type=video_meta.get("mime_type") or video_file.content_type,
+            derived={"video_meta": video_meta} if ingested else None,
+        )
+
+        # Add to session before processing
+        db.add(ar_content)
+        await db.commit()
+        await db.refresh(ar_content)
+
+        # Create video record (a duplicate video reuses the preview of its blob)
+        video_derived = stored_video.derived
+        video_record = Video(
+            ar_content_id=ar_content.id,
+            filename=video_filename,
+            video_path=db_video_path,
+            video_url=video_url,
+            preview_url=video_derived.get("preview_url") or video_url,
+            thumbnail_path=video_derived.get("thumbnail_path"),
+            size_bytes=stored_video.size_bytes,
+            duration=int(round(video_meta["duration"])) if video_meta.get("duration") else None,
+            width=video_meta.get("width"),
+            height=video_meta.get("height"),
+            mime_type=video_meta.get("mime_type") or video_file.content_type,
+            is_active=True,
+            status="ready" if video_derived.get("preview_url") else "uploaded"
+        )
+        apply_scrub_preview(video_record, video_derived.get("scrub"))
+
+        db.add(video_record)
+        await db.commit()
+        await db.refresh(video_record)
+
+        # Set the video as active for the AR content
+        ar_content.active_video_id = video_record.id
+        await db.commit()
+        await db.refresh(ar_content)
 
     # Запускаем фоновую генерацию превью видео
-    if background_tasks is not None and video_record.video_path:
+    if background_tasks is not None and video_record.video_path and not video_derived.get("preview_url"):
         from app.api.routes.videos import _generate_video_thumbnail_task
         background_tasks.add_task(
             _generate_video_thumbnail_task,
@@ -488,13 +765,14 @@ async def _create_ar_content(
             video_id=video_record.id,
             video_path=video_record.video_path,
         )
+    # Optional HLS ladder (bounded worker, no-op unless VIDEO_HLS_ENABLED)
+    hls_worker.submit(video_record.id)
 
-    # ARCore: marker = photo image (no .mind generation)
+    # ARCore: marker = tracking derivative of the photo (no .mind generation)
+    near_duplicates: list = []
     try:
-        ar_content.marker_path = db_photo_path
-        ar_content.marker_url = photo_url_val
-        ar_content.marker_status = "ready"
-        ar_content.marker_metadata = {}
+        _apply_marker(ar_content, marker_derivative, db_photo_path, photo_url_val)
+        near_duplicates = await _index_marker_hash(db, ar_content, marker_hashes)
         ar_content.status = "ready"
         await db.commit()
         await db.refresh(ar_content)
@@ -536,8 +814,14 @@ async def _create_ar_content(
     except Exception as e:
         logger.error("marker_save_exception", error=str(e))
 
-    total_elapsed = round(time.perf_counter() - t0, 2)
-    logger.info("ar_content_create_done", ar_content_id=ar_content.id, total_elapsed_s=total_elapsed)
+    total_elapsed = pipeline.observe_total()
+    timings = pipeline.breakdown(total_elapsed)
+    logger.info(
+        "ar_content_create_done",
+        ar_content_id=ar_content.id,
+        total_elapsed_s=round(total_elapsed, 2),
+        timings=timings,
+    )
     
     return ARContentCreateResponse(
         id=ar_content.id,
@@ -547,6 +831,8 @@ async def _create_ar_content(
         photo_url=ar_content.photo_url,
         video_url=ar_content.video_url,
         photo_analysis=photo_analysis,
+        timings=timings,
+        near_duplicates=near_duplicates,
     )
 
 
@@ -604,13 +890,16 @@ async def regenerate_media(
         except Exception as e:
             logger.error("thumbnail_generation_exception", error=str(e), ar_content_id=ar_content.id, exc_info=True)
 
-        # ARCore: marker = photo image (no .mind generation)
+        # ARCore: marker = tracking derivative of the photo (no .mind generation)
         try:
             photo_path_obj = Path(ar_content.photo_path)
-            ar_content.marker_path = ar_content.photo_path
-            ar_content.marker_url = build_public_url(photo_path_obj)
-            ar_content.marker_status = "ready"
-            ar_content.marker_metadata = {}
+            _apply_marker(
+                ar_content,
+                await _local_marker_derivative(ar_content.photo_path),
+                ar_content.photo_path,
+                build_public_url(photo_path_obj),
+            )
+            await _index_marker_hash(db, ar_content, await _hash_marker(ar_content.photo_path))
             logger.info("marker_saved_from_photo", marker_url=ar_content.marker_url, ar_content_id=ar_content.id)
         except Exception as e:
             logger.error("marker_save_exception", error=str(e), ar_content_id=ar_content.id, exc_info=True)
@@ -810,6 +1099,46 @@ async def create_ar_content_hierarchical(
         )
 
 
+@router.post("/companies/{company_id}/projects/{project_id}/ar-content/from-uploads", response_model=ARContentCreateResponse, tags=["AR Content"])
+async def create_ar_content_from_uploads(
+    company_id: int,
+    project_id: int,
+    payload: ARContentFromUploads,
+    background_tasks: BackgroundTasks = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Create AR content from photo and video sent via resumable uploads.
+
+    The finished upload files are moved into the content folder (no copy);
+    the upload records are released once their files have been adopted.
+    """
+    try:
+        photo_file = await resumable_upload_service.claim_completed(db, payload.photo_upload_id, "photo")
+        video_file = await resumable_upload_service.claim_completed(db, payload.video_upload_id, "video")
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    try:
+        return await _create_ar_content(
+            company_id=company_id,
+            project_id=project_id,
+            customer_name=payload.customer_name,
+            customer_phone=payload.customer_phone,
+            customer_email=payload.customer_email,
+            duration_years=payload.duration_years,
+            photo_file=photo_file,
+            video_file=video_file,
+            auto_enhance=payload.auto_enhance,
+            db=db,
+            background_tasks=background_tasks,
+        )
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await resumable_upload_service.release(db, [photo_file, video_file])
+
+
 @router.post("/companies/{company_id}/projects/{project_id}/ar-content-legacy", response_model=ARContentCreateResponse, tags=["AR Content"])
 async def create_ar_content_legacy(
     company_id: int,
@@ -973,6 +1302,7 @@ async def update_ar_content_photo(
     company_id: int,
     project_id: int,
     content_id: int,
+    background_tasks: BackgroundTasks,
     photo: UploadFile = File(...),
     db: AsyncSession = Depends(get_db)
 ):
@@ -997,6 +1327,11 @@ async def update_ar_content_photo(
     photo_path = storage_path / photo_filename
     await save_uploaded_file(photo, photo_path)
 
+    # The previous photo may be a shared blob — drop this content's reference
+    await _release_media_blobs(db, ar_content, background_tasks, paths=[ar_content.photo_path])
+    # Variants of the old photo are unreachable under the new version
+    background_tasks.add_task(image_variant_service.discard, content_id)
+
     # Update database
     ar_content.photo_path = str(photo_path)
     ar_content.photo_url = build_public_url(photo_path)
@@ -1015,12 +1350,15 @@ async def update_ar_content_photo(
     except Exception as e:
         logger.error("photo_thumbnail_generation_exception", error=str(e))
 
-    # ARCore: marker = photo image (no .mind generation)
+    # ARCore: marker = tracking derivative of the photo (no .mind generation)
     try:
-        ar_content.marker_path = str(photo_path)
-        ar_content.marker_url = build_public_url(photo_path)
-        ar_content.marker_status = "ready"
-        ar_content.marker_metadata = {}
+        _apply_marker(
+            ar_content,
+            await _local_marker_derivative(str(photo_path)),
+            str(photo_path),
+            build_public_url(photo_path),
+        )
+        await _index_marker_hash(db, ar_content, await _hash_marker(str(photo_path)))
         ar_content.status = "ready"
     except Exception as e:
         logger.error("marker_save_exception", error=str(e))
@@ -1036,6 +1374,7 @@ async def update_ar_content_video(
     company_id: int,
     project_id: int,
     content_id: int,
+    background_tasks: BackgroundTasks,
     video: UploadFile = File(...),
     db: AsyncSession = Depends(get_db)
 ):
@@ -1059,13 +1398,20 @@ async def update_ar_content_video(
     video_filename = f"video{Path(video.filename).suffix}"
     video_path = storage_path / video_filename
     await save_uploaded_file(video, video_path)
+
+    # The previous video may be a shared blob — drop this content's reference
+    active_video = await db.get(Video, ar_content.active_video_id) if ar_content.active_video_id else None
+    if active_video is not None and active_video.video_path:
+        await _release_media_blobs(db, ar_content, background_tasks, paths=[active_video.video_path])
+        active_video.video_path = str(video_path)
+        active_video.video_url = build_public_url(video_path)
     
     # Update database
     ar_content.video_path = str(video_path)
     ar_content.video_url = build_public_url(video_path)
     # Update preview URL as well
-    if ar_content.active_video:
-        ar_content.active_video.preview_url = build_public_url(video_path)
+    if active_video is not None:
+        active_video.preview_url = build_public_url(video_path)
     
     await db.commit()
     await db.refresh(ar_content)
@@ -1096,6 +1442,9 @@ async def delete_ar_content(
     from app.utils.ar_content import get_ar_content_storage_path
     storage_path = await get_ar_content_storage_path(ar_content, db)
     
+    # Release deduplicated media (photo/videos); blob files are purged after commit
+    await _release_media_blobs(db, ar_content, background_tasks)
+
     # Clear the active_video_id reference to avoid circular dependency
     ar_content.active_video_id = None
     await db.commit()
@@ -1116,9 +1465,13 @@ async def delete_ar_content(
     # Delete from database (cascades to related videos)
     await db.delete(ar_content)
     await db.commit()
+    marker_similarity_service.discard(content_id)
+    background_tasks.add_task(image_variant_service.discard, content_id)
 
     # Best-effort delete storage folder after DB commit
-    background_tasks.add_task(_safe_delete_folder, storage_path)
+    background_tasks.add_task(
+        _safe_delete_folder, storage_path, ar_content.company_id, ar_content.project_id
+    )
 
     logger.info(
         "ar_content_deleted",
@@ -1198,6 +1551,9 @@ async def delete_ar_content_by_id(
     from app.utils.ar_content import get_ar_content_storage_path
     storage_path = await get_ar_content_storage_path(ar_content, db)
     
+    # Release deduplicated media (photo/videos); blob files are purged after commit
+    await _release_media_blobs(db, ar_content, background_tasks)
+
     # Clear the active_video_id reference to avoid circular dependency
     ar_content.active_video_id = None
     await db.commit()
@@ -1218,9 +1574,13 @@ async def delete_ar_content_by_id(
     # Delete from database (cascades to related videos)
     await db.delete(ar_content)
     await db.commit()
+    marker_similarity_service.discard(content_id)
+    background_tasks.add_task(image_variant_service.discard, content_id)
     
     # Best-effort delete storage folder after DB commit
-    background_tasks.add_task(_safe_delete_folder, storage_path)
+    background_tasks.add_task(
+        _safe_delete_folder, storage_path, ar_content.company_id, ar_content.project_id
+    )
     
     logger.info(
         "ar_content_deleted",
@@ -1269,6 +1629,22 @@ async def validate_marker(
         recommendations = ["ARCore uses the photo as the tracking image. Use a clear, well-lit image for best results."]
         if width and height and (width < 320 or height < 320):
             recommendations.append("Higher resolution (e.g. 640x480 or more) may improve tracking.")
+
+        # Near-duplicate markers (legacy rows are hashed lazily here)
+        warnings: list[str] = []
+        if not ar_content.marker_phash:
+            hashes = await asyncio.to_thread(hash_image_file, str(path))
+            if hashes:
+                ar_content.marker_phash, ar_content.marker_dhash = hashes
+                await db.commit()
+                marker_similarity_service.add(ar_content.id, ar_content.company_id, ar_content.marker_phash)
+        near_duplicates = await marker_similarity_service.find_near_duplicates(
+            db, ar_content.marker_phash, ar_content.company_id, exclude_id=ar_content.id
+        )
+        if near_duplicates:
+            orders = ", ".join(str(item["order_number"]) for item in near_duplicates)
+            warnings.append(f"Marker is visually near-identical to other AR content: {orders}")
+            recommendations.append("Use distinct photos for different AR content so ARCore does not confuse them.")
         logger.info("marker_validation_requested", ar_content_id=ar_content_id, width=width, height=height)
         return {
             "ar_content_id": ar_content_id,
@@ -1281,7 +1657,8 @@ async def validate_marker(
                 "height": height,
                 "image_size": image_size,
                 "quality_assessment": quality_assessment,
-                "warnings": [],
+                "warnings": warnings,
+                "near_duplicates": near_duplicates,
             },
             "metadata": ar_content.marker_metadata or {},
             "recommendations": recommendations,
@@ -1348,72 +1725,97 @@ async def get_ar_image(unique_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid unique_id format")
 
 
+_ANALYZE_ALLOWED_EXTENSIONS = {"jpeg", "jpg", "png", "webp"}
+_ANALYZE_MAX_BYTES = 10 * 1024 * 1024
+_ANALYZE_MAX_BATCH = 20
+
+
+def _analysis_payload(result: dict) -> dict:
+    """Response shape of a single photo analysis (kept stable for the admin form)."""
+    from app.services.marker_service import marker_service
+
+    metrics = result["metrics"]
+    recognition_probability = metrics.get("recognition_probability")
+    return {
+        "recognition_probability": recognition_probability,
+        "quality_level": marker_service.get_quality_level(recognition_probability),
+        "metrics": metrics,
+        "recommendations": marker_service.build_image_recommendations(metrics),
+        "resolution": {"width": result["width"], "height": result["height"]},
+    }
+
+
 @router.post("/ar-content/photo/analyze", tags=["AR Content"])
 async def analyze_photo_quality(
-    photo_file: UploadFile = File(...),
+    photo_file: Optional[UploadFile] = File(None),
+    photo_files: Optional[List[UploadFile]] = File(None),
 ) -> dict:
-    """Analyze uploaded photo for AR marker tracking quality.
+    """Analyze uploaded photo(s) for AR marker tracking quality.
 
-    Accepts a photo via multipart upload, saves it to a temporary file,
-    runs ``ARCoreMarkerService.analyze_image_quality`` and returns
-    metrics, quality level, and recommendations **without** persisting
-    anything to the database.
+    ``photo_file`` — a single photo, response as before (metrics, quality
+    level, recommendations, resolution).  ``photo_files`` — a batch of up to
+    20 photos scored in one process-pool call; returns ``{"results": [...]}``
+    in upload order, with a per-item ``error`` instead of failing the batch.
 
-    The temporary file is deleted after analysis.
+    Files go to a temporary directory that is removed after analysis;
+    nothing is persisted to the database.
     """
     import tempfile
-    import os
-
-    allowed_extensions = {"jpeg", "jpg", "png", "webp"}
-    filename = photo_file.filename or ""
-    ext = Path(filename).suffix.lower().lstrip(".")
-    if ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=422,
-            detail=f"Photo must be one of: {', '.join(sorted(allowed_extensions))}",
-        )
-
-    tmp_path: str | None = None
-    try:
-        suffix = f".{ext}" if ext else ".jpg"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            tmp_path = tmp.name
-            contents = await photo_file.read()
-            if len(contents) > 10 * 1024 * 1024:
-                raise HTTPException(status_code=422, detail="File size must not exceed 10 MB")
-            tmp.write(contents)
-
-        import cv2
-        from app.services.marker_service import marker_service
-
-        img = cv2.imread(tmp_path)
-        if img is None:
-            raise HTTPException(status_code=422, detail="Cannot decode image — upload a valid JPEG or PNG")
-
-        height, width = img.shape[:2]
-        metrics = marker_service.analyze_image_quality(tmp_path)
-        recommendations = marker_service.build_image_recommendations(metrics)
-        recognition_probability = metrics.get("recognition_probability")
-        quality_level = marker_service.get_quality_level(recognition_probability)
 
+    from app.core.process_pool import run_in_process
+    from app.utils.marker_analysis import analyze_paths
+
+    batch = photo_files is not None
+    uploads = list(photo_files or []) if batch else ([photo_file] if photo_file is not None else [])
+    if not uploads:
+        raise HTTPException(status_code=422, detail="Upload photo_file or photo_files")
+    if len(uploads) > _ANALYZE_MAX_BATCH:
+        raise HTTPException(status_code=422, detail=f"At most {_ANALYZE_MAX_BATCH} photos per batch")
+
+    with tempfile.TemporaryDirectory(prefix="photo_analyze_") as tmp_dir:
+        paths: list[Optional[str]] = []
+        errors: dict[int, str] = {}
+        for idx, upload in enumerate(uploads):
+            ext = Path(upload.filename or "").suffix.lower().lstrip(".")
+            if ext not in _ANALYZE_ALLOWED_EXTENSIONS:
+                error = f"Photo must be one of: {', '.join(sorted(_ANALYZE_ALLOWED_EXTENSIONS))}"
+            else:
+                contents = await upload.read()
+                error = "File size must not exceed 10 MB" if len(contents) > _ANALYZE_MAX_BYTES else None
+            if error:
+                if not batch:
+                    raise HTTPException(status_code=422, detail=error)
+                errors[idx] = error
+                paths.append(None)
+                continue
+            path = Path(tmp_dir) / f"{idx}.{ext}"
+            path.write_bytes(contents)
+            paths.append(str(path))
+
+        to_analyze = [p for p in paths if p is not None]
+        analyzed = iter(await run_in_process(analyze_paths, to_analyze) if to_analyze else [])
+
+    results = []
+    for idx, (upload, path) in enumerate(zip(uploads, paths)):
+        result = next(analyzed) if path is not None else {"error": errors[idx]}
+        if "error" in result:
+            if result["error"] == "decode_failed":
+                result = {"error": "Cannot decode image — upload a valid JPEG or PNG"}
+            if not batch:
+                raise HTTPException(status_code=422, detail=result["error"])
+            results.append({"filename": upload.filename, "error": result["error"]})
+            continue
+        payload = _analysis_payload(result)
         logger.info(
             "photo_quality_analyzed",
-            width=width,
-            height=height,
-            quality_level=quality_level,
-            recognition_probability=recognition_probability,
+            width=payload["resolution"]["width"],
+            height=payload["resolution"]["height"],
+            quality_level=payload["quality_level"],
+            recognition_probability=payload["recognition_probability"],
+            batch=batch,
         )
+        if not batch:
+            return payload
+        results.append({"filename": upload.filename, **payload})
 
-        return {
-            "recognition_probability": recognition_probability,
-            "quality_level": quality_level,
-            "metrics": metrics,
-            "recommendations": recommendations,
-            "resolution": {"width": width, "height": height},
-        }
-    finally:
-        if tmp_path:
-            try:
-                os.unlink(tmp_path)
-            except OSError:
-                pass
+    return {"results": results, "count": len(results)}
@@ -8,6 +8,7 @@ import structlog
 
 from app.core.config import get_settings
 from app.core.database import get_db
+from app.core.storage_providers import invalidate_company_provider
 from app.models.company import Company
 from app.models.project import Project
 from app.models.ar_content import ARContent
@@ -266,6 +267,7 @@ async def update_company(
     
     await db.commit()
     await db.refresh(company)
+    invalidate_company_provider(company_id)
     
     # Get counts for response
     projects_count_query = select(func.count()).select_from(Project).where(Project.company_id == company.id)
@@ -325,6 +327,7 @@ async def delete_company(
     # Delete company
     await db.delete(company)
     await db.commit()
+    invalidate_company_provider(company_id)
     
     logger.info("company_deleted", company_id=company_id, name=company.name)
     
@@ -430,6 +433,7 @@ async def exchange_yandex_auth_code(
     company.yandex_disk_token = encrypted
     company.storage_provider = "yandex_disk"
     await db.commit()
+    invalidate_company_provider(company_id)
     await db.refresh(company)
 
     logger.info("yandex_disk_connected", company_id=company_id)
@@ -456,6 +460,7 @@ async def delete_yandex_token(
     company.yandex_disk_token = None
     company.storage_provider = "local"
     await db.commit()
+    invalidate_company_provider(company_id)
     await db.refresh(company)
 
     logger.info("yandex_disk_disconnected", company_id=company_id)
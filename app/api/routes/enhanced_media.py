@@ -2,17 +2,22 @@
 Enhanced Media API routes with advanced validation, caching, and reliability.
 """
 import hashlib
+import json
 import time
 import uuid
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.process_pool import map_unordered, run_in_process
 from app.models.ar_content import ARContent
 from app.models.video import Video
 from app.services.enhanced_thumbnail_service import (
@@ -23,6 +28,7 @@ from app.services.enhanced_thumbnail_service import (
 )
 from app.services.enhanced_validation_service import (
     enhanced_validation_service,
+    validate_path_in_worker,
     ValidationLevel,
 )
 from app.services.enhanced_cache_service import enhanced_cache_service
@@ -42,6 +48,31 @@ router = APIRouter(prefix="/api/v2/media", tags=["Enhanced Media"])
 def _utcnow_iso() -> str:
     return datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
 
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _ndjson(items: AsyncIterator[Dict[str, Any]], request: Optional[Request]) -> AsyncIterator[bytes]:
+    """One JSON document per line; stop (cancelling pending work) if the client is gone."""
+    async for item in items:
+        if request is not None and await request.is_disconnected():
+            logger.info("media_batch_client_disconnected", path=request.url.path)
+            break
+        yield (json.dumps(item, default=str) + "\n").encode()
+
+
+def _file_tag(file_path: str) -> str:
+    """Cache tag grouping every result derived from *file_path*."""
+    return f"file:{file_path}"
+
+
+def _check_batch_size(file_paths: List[str]) -> None:
+    if len(file_paths) > settings.MEDIA_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files in batch: {len(file_paths)} (max {settings.MEDIA_BATCH_MAX_ITEMS})",
+        )
+
 # Pydantic models
 class ThumbnailRequest(BaseModel):
     file_path: str
@@ -147,7 +178,8 @@ async def generate_thumbnail(
                 cache_key,
                 response_data,
                 'thumbnails',
-                ttl=3600  # 1 hour
+                ttl=3600,  # 1 hour
+                tags=[_file_tag(request.file_path)]
             )
         
         return response_data
@@ -156,14 +188,20 @@ async def generate_thumbnail(
         logger.error("thumbnail_generation_failed", file_path=request.file_path, error=str(e))
         raise HTTPException(status_code=500, detail=f"Thumbnail generation failed: {str(e)}")
 
-@router.post("/thumbnails/batch", response_model=List[Dict[str, Any]])
+@router.post("/thumbnails/batch")
 async def generate_batch_thumbnails(
     request: BatchThumbnailRequest,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    http_request: Request = None,
 ):
-    """Generate multiple thumbnails concurrently."""
+    """Generate thumbnails for many files; streams one NDJSON line per file as it completes.
+
+    At most ``MEDIA_BATCH_CONCURRENCY`` files are processed at a time and the
+    encoding runs on the shared process pool.
+    """
     
     try:
+        _check_batch_size(request.file_paths)
         # Create configurations for all requested sizes and formats
         configs = []
         for size_str in request.sizes:
@@ -177,50 +215,50 @@ async def generate_batch_thumbnails(
                     quality=request.quality or 85,
                     optimize=True
                 ))
-        
-        # Generate thumbnails for all files
-        all_results = []
-        
-        for file_path in request.file_paths:
-            try:
-                results = await enhanced_thumbnail_service.generate_multiple_thumbnails(
-                    file_path=file_path,
-                    configs=configs,
-                    force_regenerate=request.force_regenerate
-                )
-                
-                file_results = {
-                    "file_path": file_path,
-                    "thumbnails": []
-                }
-                
-                for result in results:
-                    if result.status == "ready":
-                        file_results["thumbnails"].append({
-                            "size": result.config.size.size_name,
-                            "format": result.config.format.value,
-                            "url": result.thumbnail_url,
-                            "path": result.thumbnail_path,
-                            "size_bytes": result.file_size,
-                            "generation_time": result.generation_time
-                        })
-                
-                all_results.append(file_results)
-                
-            except Exception as e:
-                logger.error("batch_thumbnail_failed", file_path=file_path, error=str(e))
-                all_results.append({
-                    "file_path": file_path,
-                    "error": str(e),
-                    "thumbnails": []
-                })
-        
-        return all_results
-        
+    except HTTPException:
+        raise
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown thumbnail size or format: {e}")
     except Exception as e:
         logger.error("batch_thumbnail_generation_failed", error=str(e))
         raise HTTPException(status_code=500, detail=f"Batch thumbnail generation failed: {str(e)}")
 
+    async def _generate(file_path: str):
+        return await enhanced_thumbnail_service.generate_multiple_thumbnails(
+            file_path=file_path,
+            configs=configs,
+            force_regenerate=request.force_regenerate,
+            in_process=True,
+        )
+
+    async def _items() -> AsyncIterator[Dict[str, Any]]:
+        async for index, outcome in map_unordered(
+            _generate, request.file_paths, settings.MEDIA_BATCH_CONCURRENCY
+        ):
+            file_path = request.file_paths[index]
+            if isinstance(outcome, Exception):
+                logger.error("batch_thumbnail_failed", file_path=file_path, error=str(outcome))
+                yield {"index": index, "file_path": file_path, "error": str(outcome), "thumbnails": []}
+                continue
+            yield {
+                "index": index,
+                "file_path": file_path,
+                "thumbnails": [
+                    {
+                        "size": result.config.size.size_name,
+                        "format": result.config.format.value,
+                        "url": result.thumbnail_url,
+                        "path": result.thumbnail_path,
+                        "size_bytes": result.file_size,
+                        "generation_time": result.generation_time
+                    }
+                    for result in outcome
+                    if result.status == "ready"
+                ],
+            }
+
+    return StreamingResponse(_ndjson(_items(), http_request), media_type=NDJSON_MEDIA_TYPE)
+
 @router.post("/validation/validate", response_model=Dict[str, Any])
 @reliable(
     service_name="file_validation",
@@ -245,9 +283,10 @@ async def validate_file(request: ValidationRequest):
                 "message": "Validation result retrieved from cache"
             }
         
-        # Perform validation
-        result = await enhanced_validation_service.validate_file(
-            file_path=request.file_path,
+        # Perform validation: one read for hash/signature/entropy, decoding off the loop
+        result = await enhanced_validation_service.validate_upload(
+            None,
+            Path(request.file_path),
             file_type=request.file_type,
             validation_level=level_enum,
             original_filename=request.original_filename
@@ -271,7 +310,8 @@ async def validate_file(request: ValidationRequest):
             cache_key,
             response_data,
             'validation',
-            ttl=300  # 5 minutes
+            ttl=300,  # 5 minutes
+            tags=[_file_tag(request.file_path)]
         )
         
         return response_data
@@ -280,40 +320,36 @@ async def validate_file(request: ValidationRequest):
         logger.error("file_validation_failed", file_path=request.file_path, error=str(e))
         raise HTTPException(status_code=500, detail=f"File validation failed: {str(e)}")
 
-@router.post("/validation/batch", response_model=List[Dict[str, Any]])
-async def validate_batch_files(request: BatchValidationRequest):
-    """Validate multiple files concurrently."""
+@router.post("/validation/batch")
+async def validate_batch_files(request: BatchValidationRequest, http_request: Request = None):
+    """Validate many files; streams one NDJSON line per file as it completes.
+
+    Each file is validated in the shared process pool, at most
+    ``MEDIA_BATCH_CONCURRENCY`` at a time.
+    """
     
-    try:
-        level_enum = ValidationLevel[request.validation_level.upper()]
-        
-        # Perform batch validation
-        results = await enhanced_validation_service.batch_validate(
-            file_paths=request.file_paths,
-            validation_level=level_enum
-        )
-        
-        # Convert to response format
-        response_data = []
-        for i, result in enumerate(results):
-            response_data.append({
-                "file_path": request.file_paths[i],
-                "is_valid": result.is_valid,
-                "threat_level": result.threat_level.value,
-                "errors": result.errors,
-                "warnings": result.warnings,
-                "metadata": result.metadata,
-                "security_info": result.security_info,
-                "file_info": result.file_info,
-                "validation_time": result.validation_time,
-                "validation_level": result.validation_level.value
-            })
-        
-        return response_data
-        
-    except Exception as e:
-        logger.error("batch_validation_failed", error=str(e))
-        raise HTTPException(status_code=500, detail=f"Batch validation failed: {str(e)}")
+    _check_batch_size(request.file_paths)
+    level = ValidationLevel[request.validation_level.upper()]
+
+    async def _validate(file_path: str) -> Dict[str, Any]:
+        return await run_in_process(validate_path_in_worker, file_path, level.value, request.file_type)
+
+    async def _items() -> AsyncIterator[Dict[str, Any]]:
+        async for index, outcome in map_unordered(
+            _validate, request.file_paths, settings.MEDIA_BATCH_CONCURRENCY
+        ):
+            file_path = request.file_paths[index]
+            if isinstance(outcome, Exception):
+                logger.error("batch_validation_failed", file_path=file_path, error=str(outcome))
+                outcome = {
+                    "is_valid": False,
+                    "threat_level": "unknown",
+                    "errors": [f"Validation exception: {outcome}"],
+                    "validation_level": level.value,
+                }
+            yield {"index": index, "file_path": file_path, **outcome}
+
+    return StreamingResponse(_ndjson(_items(), http_request), media_type=NDJSON_MEDIA_TYPE)
 
 @router.get("/info/{file_path:path}", response_model=MediaInfoResponse)
 async def get_media_info(file_path: str):
@@ -324,8 +360,9 @@ async def get_media_info(file_path: str):
         thumbnail_info = await enhanced_thumbnail_service.get_thumbnail_info(file_path)
         
         # Get validation summary (basic level for performance)
-        validation_result = await enhanced_validation_service.validate_file(
-            file_path=file_path,
+        validation_result = await enhanced_validation_service.validate_upload(
+            None,
+            Path(file_path),
             validation_level=ValidationLevel.BASIC
         )
         
@@ -363,7 +400,8 @@ async def get_media_info(file_path: str):
 @router.post("/cache/clear")
 async def clear_cache(
     pattern: Optional[str] = Query(None, description="Cache pattern to clear"),
-    cache_type: Optional[str] = Query(None, description="Cache type to clear")
+    cache_type: Optional[str] = Query(None, description="Cache type to clear"),
+    tag: Optional[str] = Query(None, description="Cache tag to clear, e.g. content:42")
 ):
     """Clear cache entries."""
     
@@ -372,8 +410,18 @@ async def clear_cache(
             pattern = None
         if not isinstance(cache_type, str):
             cache_type = None
+        if not isinstance(tag, str):
+            tag = None
 
-        if pattern:
+        if tag:
+            deleted_count = await enhanced_cache_service.invalidate_tags(tag)
+            return {
+                "status": "success",
+                "message": "Cache tag cleared",
+                "deleted_count": deleted_count,
+                "tag": tag
+            }
+        elif pattern:
             deleted_count = await enhanced_cache_service.invalidate_pattern(pattern, cache_type or 'default')
             return {
                 "status": "success",
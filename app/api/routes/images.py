@@ -0,0 +1,79 @@
+"""Resized photo variants: ``GET /img/{content_id}/{w}x{h}[.webp|.avif|.jpg]?v=…``.
+
+Without an extension the format is negotiated from ``Accept`` (AVIF when the
+server can encode it, then WebP, then JPEG).  ``v`` must be the current
+version token of the photo (see ``image_variant_service.variant_version``);
+responses are therefore safe to cache as immutable.
+"""
+
+import hmac
+
+import structlog
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.core.storage_providers import RemoteStorageProvider, get_provider_for_company, split_remote_ref
+from app.models.ar_content import ARContent
+from app.models.company import Company
+from app.services.image_variant_service import (
+    VARIANT_FORMATS,
+    VariantNotFound,
+    image_variant_service,
+    negotiate_format,
+    parse_variant,
+    variant_version,
+)
+
+router = APIRouter()
+logger = structlog.get_logger()
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/img/{content_id}/{variant}")
+async def get_image_variant(
+    content_id: int,
+    variant: str,
+    request: Request,
+    v: str = Query(..., description="Photo version token"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Serve a resized variant of the AR content photo, rendering it on first use."""
+    spec = parse_variant(variant)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Unsupported image variant")
+
+    ar_content = await db.get(ARContent, content_id)
+    if not ar_content or not ar_content.photo_path:
+        raise HTTPException(status_code=404, detail="Image not found")
+    version = variant_version(content_id, ar_content.photo_path)
+    if not hmac.compare_digest(v, version):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    fmt = spec.fmt or negotiate_format(request.headers.get("accept"))
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{version}-{spec.name}.{fmt}"',
+    }
+    if spec.fmt is None:
+        headers["Vary"] = "Accept"
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    provider = None
+    if split_remote_ref(ar_content.photo_path) and ar_content.company_id:
+        company = await db.get(Company, ar_content.company_id)
+        provider = await get_provider_for_company(company) if company else None
+        if not isinstance(provider, RemoteStorageProvider):
+            provider = None
+
+    try:
+        data = await image_variant_service.get_variant(
+            content_id, ar_content.photo_path, spec, fmt, provider=provider
+        )
+    except VariantNotFound as exc:
+        logger.info("image_variant_unavailable", content_id=content_id, variant=variant, reason=str(exc))
+        raise HTTPException(status_code=404, detail=str(exc))
+
+    return Response(content=data, media_type=VARIANT_FORMATS[fmt][1], headers=headers)
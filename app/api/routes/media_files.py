@@ -0,0 +1,45 @@
+"""``/storage/{path}`` in accelerated serving mode (``ACCEL_REDIRECT_ENABLED``).
+
+The app only checks and resolves the path; the response is an
+``X-Accel-Redirect`` to the internal nginx location, which sends the file
+with sendfile and handles ``Range``.  Service folders (``.uploads``,
+``.cache``, …) are never exposed.  Without nginx the ``StaticFiles`` mount
+in ``app.main`` serves ``/storage`` instead.
+"""
+
+import mimetypes
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.core.config import settings
+from app.utils.range_response import file_response
+
+router = APIRouter()
+
+STORAGE_CACHE_CONTROL = "public, max-age=604800"
+
+
+def resolve_storage_file(file_path: str) -> Path:
+    """Absolute path of a public storage file; ``HTTPException(404)`` otherwise."""
+    parts = [part for part in file_path.replace("\\", "/").split("/") if part]
+    if not parts or any(part.startswith(".") for part in parts):
+        raise HTTPException(status_code=404, detail="Not Found")
+    base = Path(settings.STORAGE_BASE_PATH).resolve()
+    path = base.joinpath(*parts).resolve()
+    if not path.is_relative_to(base) or not path.is_file():
+        raise HTTPException(status_code=404, detail="Not Found")
+    return path
+
+
+@router.api_route("/storage/{file_path:path}", methods=["GET", "HEAD"])
+async def serve_storage_file(file_path: str, request: Request):
+    """Authorize a storage path and hand the transfer to nginx."""
+    path = resolve_storage_file(file_path)
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return file_response(
+        request,
+        str(path),
+        media_type,
+        headers={"Cache-Control": STORAGE_CACHE_CONTROL, "Access-Control-Allow-Origin": "*"},
+    )
@@ -10,6 +10,7 @@ from typing import Any
 from app.core.database import get_db
 from app.core.config import get_settings
 from app.models.storage import StorageConnection
+from app.services.yandex_disk_metadata_service import yd_metadata
 from app.utils.oauth_state import oauth_state_store
 from app.utils.token_encryption import token_encryption
 
@@ -248,7 +249,7 @@ async def list_yandex_folders(
         if not token:
             logger.error("Missing OAuth token in credentials", extra={"connection_id": connection_id})
             raise HTTPException(
-                status_code=401, 
+                status_code=401,
                 detail="OAuth token not found. Please re-authenticate."
             )
     except Exception as e:
@@ -259,81 +260,74 @@ async def list_yandex_folders(
         )
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            resp = await client.get(
-                "https://cloud-api.yandex.net/v1/disk/resources",
-                params={"path": path, "limit": 100},
-                headers={"Authorization": f"OAuth {token}"},
-            )
-            
+        try:
+            # Cached listing, revalidated by the folder's ``modified`` timestamp
+            listing = await yd_metadata.list_directory(token, path)
+        except httpx.HTTPStatusError as exc:
+            status_code = exc.response.status_code
             # Handle specific Yandex API errors
-            if resp.status_code == 401:
+            if status_code == 401:
                 raise HTTPException(
                     status_code=401,
                     detail="OAuth token expired or invalid. Please re-authenticate."
                 )
-            elif resp.status_code == 403:
+            elif status_code == 403:
                 raise HTTPException(
                     status_code=403,
                     detail="Access denied to this folder. Please check permissions."
                 )
-            elif resp.status_code == 404:
+            elif status_code == 404:
                 raise HTTPException(
                     status_code=404,
                     detail="Folder not found in Yandex Disk."
                 )
-            elif resp.status_code != 200:
-                logger.error(
-                    "Yandex API error",
-                    extra={
-                        "status_code": resp.status_code,
-                        "response_text": resp.text[:200],
-                        "path": path,
-                        "connection_id": connection_id
-                    }
-                )
-                raise HTTPException(
-                    status_code=500,
-                    detail="Failed to access Yandex Disk. Please try again."
-                )
-            
-            data = resp.json()
-            items = (data.get("_embedded") or {}).get("items", [])
-            
-            # Filter only directories and include timestamps
-            folders = [
-                {
-                    "name": i.get("name"),
-                    "path": i.get("path"),
-                    "type": i.get("type"),
-                    "created": i.get("created"),
-                    "modified": i.get("modified"),
-                    "last_modified": i.get("modified"),  # Alias for frontend compatibility
+            logger.error(
+                "Yandex API error",
+                extra={
+                    "status_code": status_code,
+                    "response_text": exc.response.text[:200],
+                    "path": path,
+                    "connection_id": connection_id
                 }
-                for i in items
-                if i.get("type") == "dir"
-            ]
-            
-            # Calculate parent path for navigation
-            if path == "/" or path == "":
+            )
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to access Yandex Disk. Please try again."
+            )
+
+        # Filter only directories and include timestamps
+        folders = [
+            {
+                "name": i.get("name"),
+                "path": i.get("path"),
+                "type": i.get("type"),
+                "created": i.get("created"),
+                "modified": i.get("modified"),
+                "last_modified": i.get("modified"),  # Alias for frontend compatibility
+            }
+            for i in listing.folders
+        ]
+        
+        # Calculate parent path for navigation
+        if path == "/" or path == "":
+            parent_path = "/"
+            has_parent = False
+        else:
+            path_parts = path.rstrip("/").split("/")
+            if len(path_parts) > 1:
+                parent_path = "/".join(path_parts[:-1]) or "/"
+                has_parent = True
+            else:
                 parent_path = "/"
                 has_parent = False
-            else:
-                path_parts = path.rstrip("/").split("/")
-                if len(path_parts) > 1:
-                    parent_path = "/".join(path_parts[:-1]) or "/"
-                    has_parent = True
-                else:
-                    parent_path = "/"
-                    has_parent = False
-            
-            return {
-                "current_path": path,
-                "folders": folders,
-                "parent_path": parent_path,
-                "has_parent": has_parent,
-            }
-            
+        
+        return {
+            "current_path": path,
+            "folders": folders,
+            "parent_path": parent_path,
+            "has_parent": has_parent,
+        }
+        
     except httpx.TimeoutException:
         raise HTTPException(
             status_code=504,
@@ -433,6 +427,9 @@ async def create_yandex_folder(
                     detail="Failed to create folder. Please try again."
                 )
             
+            # The picker must show the new folder without waiting for the TTL
+            yd_metadata.invalidate(token, folder_path.rstrip("/").rsplit("/", 1)[0] or "/")
+
             logger.info(
                 "Folder created successfully",
                 extra={
@@ -1,5 +1,7 @@
 from typing import Dict, Optional, Sequence
+from urllib.parse import quote
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 import structlog
@@ -14,6 +16,12 @@ from app.schemas.project_api import (
     ProjectLinks, PaginatedProjectsResponse
 )
 from app.api.routes.auth import get_current_active_user
+from app.services.qr_sheet_service import (
+   SHEET_FORMATS,
+   load_project_labels,
+   sheet_filename,
+   stream_qr_sheet,
+)
 
 router = APIRouter(tags=["projects"])
 
@@ -331,6 +339,38 @@ async def get_project_general(
    )
 
 
+@router.get("/projects/{project_id}/qr-sheet")
+async def get_project_qr_sheet(
+   project_id: int,
+   format: str = Query("pdf", pattern="^(pdf|zip)$"),
+   db: AsyncSession = Depends(get_db),
+   current_user: User = Depends(get_current_active_user)
+):
+   """Print-ready QR labels for all AR content of a project (A4 PDF or ZIP of PNGs).
+
+   Labels are rendered on the process pool and the file is streamed as it is produced.
+   """
+   project = await db.get(Project, project_id)
+   if not project:
+       raise HTTPException(status_code=404, detail="Project not found")
+
+   labels = await load_project_labels(db, project_id)
+   if not labels:
+       raise HTTPException(status_code=404, detail="Project has no AR content")
+
+   filename = sheet_filename(project.name, project_id, format)
+   ascii_name = filename.encode("ascii", "ignore").decode() or f"qr_project_{project_id}.{format}"
+   structlog.get_logger().info("qr_sheet_requested", project_id=project_id, format=format, labels=len(labels))
+   return StreamingResponse(
+       stream_qr_sheet(labels, format),
+       media_type=SHEET_FORMATS[format],
+       headers={
+           "Content-Disposition": f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}",
+           "Cache-Control": "no-store",
+       },
+   )
+
+
 @router.put("/projects/{project_id}", response_model=ProjectDetail)
 async def update_project_general(
    project_id: int,
@@ -1,19 +1,27 @@
 import structlog
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from fastapi.responses import StreamingResponse
+from dataclasses import asdict
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional
 from datetime import datetime, UTC
 
-import httpx
-
+from app.api.routes.auth import get_current_active_user
 from app.core.database import get_db
+from app.core.http_client import get_http_client
 from app.core.storage import get_storage_provider_instance
 from app.core.storage_providers import get_provider_for_company
 from app.models.storage import StorageConnection
 from app.models.company import Company
-from app.schemas.storage import StorageConnectionCreate, StorageUsageStats
+from app.models.user import User
+from app.schemas.storage import StorageConnectionCreate, StorageUsageStats, StorageUsageSummary
+from app.services.storage_gc_service import storage_gc
+from app.services.storage_migration_service import MigrationError, MigrationProgress, storage_migration_service
+from app.services.storage_usage_service import storage_usage
+from app.services.yandex_disk_file_cache_service import YandexFileNotFound, yd_file_cache
+from app.utils.range_response import file_response
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -110,6 +118,16 @@ async def get_storage_stats(connection_id: int, path: str = "", db: AsyncSession
     if not conn:
         raise HTTPException(status_code=404, detail="Connection not found")
     
+    if not path.strip("/"):
+        # Whole storage: answered from the usage accounting, no tree walk
+        summary = storage_usage.summary()
+        return StorageUsageStats(
+            total_files=summary["file_count"],
+            total_size_bytes=summary["total_bytes"],
+            total_size_mb=round(summary["total_bytes"] / (1024 * 1024), 2),
+            base_path=conn.base_path or "",
+        )
+
     # Use the storage provider to get stats
     storage_provider = get_storage_provider_instance()
     stats = await storage_provider.get_usage_stats(path)
@@ -117,6 +135,13 @@ async def get_storage_stats(connection_id: int, path: str = "", db: AsyncSession
     return StorageUsageStats(**stats)
 
 
+@router.get("/usage", response_model=StorageUsageSummary)
+async def get_storage_usage(company_id: Optional[int] = None, project_id: Optional[int] = None):
+    """Storage usage by kind (photo, video, thumbnail, qr, backup), optionally per company/project."""
+    summary = storage_usage.summary(company_id=company_id, project_id=project_id)
+    return StorageUsageSummary(company_id=company_id, project_id=project_id, **summary)
+
+
 @router.put("/companies/{company_id}/storage")
 async def set_company_storage(
     company_id: int, 
@@ -138,6 +163,87 @@ async def set_company_storage(
     return {"status": "updated"}
 
 
+@router.post("/companies/{company_id}/migrations", status_code=202)
+async def start_storage_migration(
+    company_id: int,
+    background_tasks: BackgroundTasks,
+    target_provider: str = Query(..., description="local, yandex_disk or s3"),
+    source_provider: Optional[str] = Query(None, description="Defaults to the company's current provider"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Copy the company's files to *target_provider* and switch it over.
+
+    The migration runs as a background task; poll
+    ``GET /migrations/{id}`` for progress and throughput.
+    """
+    try:
+        migration = await storage_migration_service.create(db, company_id, target_provider, source_provider)
+    except MigrationError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    background_tasks.add_task(storage_migration_service.run, migration.id)
+    return asdict(MigrationProgress.of(migration))
+
+
+@router.get("/companies/{company_id}/migrations")
+async def list_storage_migrations(
+    company_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Recent storage migrations of a company, newest first."""
+    migrations = await storage_migration_service.list_for_company(db, company_id)
+    return [asdict(MigrationProgress.of(migration)) for migration in migrations]
+
+
+@router.get("/migrations/{migration_id}")
+async def get_storage_migration(
+    migration_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Progress of a storage migration."""
+    migration = await storage_migration_service.get(db, migration_id)
+    if migration is None:
+        raise HTTPException(status_code=404, detail="Migration not found")
+    return asdict(MigrationProgress.of(migration))
+
+
+@router.post("/migrations/{migration_id}/resume", status_code=202)
+async def resume_storage_migration(
+    migration_id: int,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Continue a failed or interrupted migration (retries failed files)."""
+    try:
+        migration = await storage_migration_service.check_resumable(db, migration_id)
+    except MigrationError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+    background_tasks.add_task(storage_migration_service.run, migration.id)
+    return asdict(MigrationProgress.of(migration))
+
+
+@router.post("/gc")
+async def run_storage_gc(
+    dry_run: bool = Query(True, description="Only report what would be removed"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Collect unreferenced media, stale caches and staging files now."""
+    return asdict(await storage_gc.run(dry_run=dry_run, db=db))
+
+
+@router.get("/gc")
+async def get_storage_gc_report(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """Report of the last GC run in any worker (``null`` before the first)."""
+    return await storage_gc.last_report(db)
+
+
 @router.get("/connections")
 async def list_storage_connections(
     is_active: Optional[bool] = Query(None, description="Filter by active status"),
@@ -192,6 +298,8 @@ _YD_MIME_MAP = {
     "mp4": "video/mp4",
     "webm": "video/webm",
     "mov": "video/quicktime",
+    "m3u8": "application/vnd.apple.mpegurl",
+    "ts": "video/mp2t",
 }
 
 
@@ -206,6 +314,10 @@ async def proxy_yandex_disk_file(
 
     Supports HTTP Range requests so that ``<video>`` elements can seek
     and the browser does not need to download the entire file at once.
+    Objects up to ``YD_FILE_CACHE_MAX_OBJECT_BYTES`` are served from the
+    local read-through cache (``yandex_disk_file_cache_service``); larger
+    ones, or all of them when the cache is unavailable, are streamed from
+    Yandex Disk.
 
     The admin panel cannot reference ``yadisk://`` URLs directly — this
     endpoint fetches a temporary download link, then streams the content
@@ -227,14 +339,32 @@ async def proxy_yandex_disk_file(
     if not isinstance(provider, YandexDiskStorageProvider):
         raise HTTPException(status_code=400, detail="Provider mismatch")
 
-    download_url = await provider.get_download_url(path)
-    if not download_url:
-        raise HTTPException(status_code=404, detail="File not found on Yandex Disk")
-
     # Determine MIME type from extension
     ext = path.rsplit(".", 1)[-1].lower() if "." in path else ""
     content_type = _YD_MIME_MAP.get(ext, "application/octet-stream")
 
+    # Hot objects are answered from the local read-through copy
+    try:
+        cached = await yd_file_cache.get(provider, company_id, path)
+    except YandexFileNotFound:
+        raise HTTPException(status_code=404, detail="File not found on Yandex Disk")
+    if cached is not None:
+        local_path, entry = cached
+        try:
+            return file_response(
+                request,
+                str(local_path),
+                content_type,
+                headers={"Cache-Control": "private, max-age=1800"},
+                etag=entry.etag or None,
+            )
+        except FileNotFoundError:
+            pass  # removed by another worker since the lookup: proxy this one
+
+    download_url = await provider.get_download_url(path)
+    if not download_url:
+        raise HTTPException(status_code=404, detail="File not found on Yandex Disk")
+
     range_header = request.headers.get("range")
 
     # Build upstream request headers — pass Range through to YD
@@ -242,25 +372,23 @@ async def proxy_yandex_disk_file(
     if range_header:
         upstream_headers["Range"] = range_header
 
-    # Open a persistent client that stays alive while the response streams.
-    # The generator's ``finally`` block ensures proper cleanup.
-    client = httpx.AsyncClient(timeout=120.0)
+    # Shared pooled client; the generator's ``finally`` returns the
+    # connection to the pool once the response has streamed.
+    client = get_http_client()
 
     try:
         upstream = await client.send(
             client.build_request(
-                "GET", download_url, headers=upstream_headers,
+                "GET", download_url, headers=upstream_headers, timeout=120.0,
             ),
             stream=True,
             follow_redirects=True,
         )
-        upstream.raise_for_status()
-    except httpx.HTTPStatusError:
-        await client.aclose()
-        raise HTTPException(status_code=502, detail="Yandex Disk download failed")
     except Exception:
-        await client.aclose()
         raise HTTPException(status_code=502, detail="Yandex Disk connection error")
+    if upstream.is_error:
+        await upstream.aclose()
+        raise HTTPException(status_code=502, detail="Yandex Disk download failed")
 
     response_headers: dict = {
         "Cache-Control": "private, max-age=1800",
@@ -283,7 +411,6 @@ async def proxy_yandex_disk_file(
                 yield chunk
         finally:
             await upstream.aclose()
-            await client.aclose()
 
     logger.info("yd_proxy_stream", company_id=company_id, path=path)
     return StreamingResponse(
@@ -292,3 +419,28 @@ async def proxy_yandex_disk_file(
         media_type=content_type,
         headers=response_headers,
     )
+
+
+@router.get("/s3-file")
+async def redirect_s3_file(
+    path: str = Query(..., description="Object path relative to the company prefix"),
+    company_id: int = Query(..., description="Company ID that owns the file"),
+    db: AsyncSession = Depends(get_db),
+):
+    """Redirect the admin panel to a presigned S3 URL.
+
+    Unlike ``/yd-file`` nothing is proxied: the URL is signed locally and the
+    browser (including ``Range`` requests of ``<video>``) talks to the
+    object store directly.
+    """
+    company = await db.get(Company, company_id)
+    if not company:
+        raise HTTPException(status_code=404, detail="Company not found")
+
+    from app.core.s3_provider import S3StorageProvider
+
+    provider = await get_provider_for_company(company)
+    if not isinstance(provider, S3StorageProvider):
+        raise HTTPException(status_code=400, detail="Company does not use S3 storage")
+
+    return RedirectResponse(provider.presigned_url(path), status_code=307)
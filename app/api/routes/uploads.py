@@ -0,0 +1,100 @@
+"""Resumable uploads (tus 1.0 core + creation/termination/expiration).
+
+``POST /api/uploads`` → ``PATCH``/``HEAD /api/uploads/{id}`` until
+``Upload-Offset == Upload-Length``; then pass the id to
+``POST /api/companies/{c}/projects/{p}/ar-content/from-uploads`` or
+``POST /api/videos/ar-content/{id}/videos/from-uploads``.
+"""
+
+import structlog
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import get_db
+from app.services import resumable_upload_service as uploads
+from app.services.resumable_upload_service import UploadError
+
+router = APIRouter()
+logger = structlog.get_logger()
+
+_EXPIRES_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+
+
+def _tus_headers(upload=None) -> dict:
+    headers = {"Tus-Resumable": uploads.TUS_VERSION, "Cache-Control": "no-store"}
+    if upload is not None:
+        headers["Upload-Offset"] = str(upload.offset)
+        headers["Upload-Length"] = str(upload.length)
+        headers["Upload-Expires"] = upload.expires_at.strftime(_EXPIRES_FORMAT)
+    return headers
+
+
+def _http_error(exc: UploadError) -> HTTPException:
+    return HTTPException(status_code=exc.status_code, detail=str(exc), headers=_tus_headers())
+
+
+@router.options("")
+async def upload_options():
+    """tus discovery: supported version and extensions."""
+    from app.utils.video_utils import MAX_VIDEO_SIZE
+
+    headers = _tus_headers()
+    headers.update({
+        "Tus-Version": uploads.TUS_VERSION,
+        "Tus-Extension": uploads.TUS_EXTENSIONS,
+        "Tus-Max-Size": str(MAX_VIDEO_SIZE),
+    })
+    return Response(status_code=204, headers=headers)
+
+
+@router.post("", status_code=201)
+async def create_upload(request: Request, db: AsyncSession = Depends(get_db)):
+    """Create an upload from ``Upload-Length`` and ``Upload-Metadata``."""
+    try:
+        upload = await uploads.create_upload(
+            db, request.headers.get("upload-length"), request.headers.get("upload-metadata")
+        )
+    except UploadError as exc:
+        raise _http_error(exc)
+    headers = _tus_headers(upload)
+    headers["Location"] = f"{request.url.path.rstrip('/')}/{upload.id}"
+    return Response(status_code=201, headers=headers)
+
+
+@router.head("/{upload_id}")
+async def get_upload_offset(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Current offset — where the client resumes after a failure."""
+    try:
+        upload = await uploads.get_upload(db, upload_id)
+    except UploadError as exc:
+        return Response(status_code=exc.status_code, headers=_tus_headers())
+    return Response(status_code=200, headers=_tus_headers(upload))
+
+
+@router.patch("/{upload_id}")
+async def patch_upload(upload_id: str, request: Request, db: AsyncSession = Depends(get_db)):
+    """Append the request body at ``Upload-Offset``."""
+    if request.headers.get("content-type", "").split(";")[0].strip() != uploads.UPLOAD_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=415,
+            detail=f"Content-Type must be {uploads.UPLOAD_CONTENT_TYPE}",
+            headers=_tus_headers(),
+        )
+    try:
+        upload = await uploads.get_upload(db, upload_id)
+        await uploads.append_chunk(db, upload, request.headers.get("upload-offset"), request.stream())
+    except UploadError as exc:
+        raise _http_error(exc)
+    return Response(status_code=204, headers=_tus_headers(upload))
+
+
+@router.delete("/{upload_id}", status_code=204)
+async def terminate_upload(upload_id: str, db: AsyncSession = Depends(get_db)):
+    """Abandon an upload and free its disk space."""
+    try:
+        upload = await uploads.get_upload(db, upload_id)
+    except UploadError as exc:
+        raise _http_error(exc)
+    await uploads.delete_upload(db, upload)
+    logger.info("resumable_upload_terminated", upload_id=upload_id)
+    return Response(status_code=204, headers=_tus_headers())
@@ -4,7 +4,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, or_
 from datetime import datetime, timedelta, timezone
 
+from app.core.config import settings
 from app.core.database import get_db, AsyncSessionLocal
+from app.core.storage_providers import RemoteStorageProvider, split_remote_ref
 from app.models.video import Video
 from app.models.ar_content import ARContent
 from app.models.video_schedule import VideoSchedule as VideoScheduleModel
@@ -17,14 +19,21 @@ from app.schemas.video_schedule import (
 from app.services.video_scheduler import (
     compute_video_status, compute_days_remaining,
 )
-from app.utils.ar_content import build_ar_content_storage_path, build_public_url
+from app.utils.ar_content import build_ar_content_storage_path
 from app.utils.video_utils import (
     validate_video_file, 
-    get_video_metadata, 
     save_uploaded_video,
     generate_video_filename
 )
 from app.services.thumbnail_service import ThumbnailService
+from app.services.media_blob_service import blob_relative_dir, media_blob_service
+from app.services.video_ingest_service import ingest_video
+from app.services.hls_service import delete_renditions, hls_worker
+from app.services.video_preview_service import apply_scrub_preview, generate_scrub_assets, legacy_root
+from app.services import resumable_upload_service
+from app.services.resumable_upload_service import UploadError
+from app.services.storage_usage_service import bind_usage_scope
+from app.schemas.ar_content import VideosFromUploads
 from app.enums import VideoStatus
 
 
@@ -34,54 +43,50 @@ import structlog
 
 _log = structlog.get_logger()
 
-_YADISK_PREFIX = "yadisk://"
-
-
 def _utcnow_naive() -> datetime:
     """Return UTC now as naive datetime for DB/model consistency."""
     return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
-def _is_yadisk_path(path: str) -> bool:
-    """Проверяет, является ли путь ссылкой на Yandex Disk."""
-    return path.startswith(_YADISK_PREFIX)
+def _is_remote_path(path: str) -> bool:
+    """Проверяет, является ли путь ссылкой на удалённое хранилище (Yandex Disk, S3)."""
+    return split_remote_ref(path) is not None
 
 
-async def _download_yadisk_video(video_id: int, yadisk_path: str) -> Optional[str]:
-    """Скачивает видео с Yandex Disk во временный файл.
+async def _download_remote_video(video_id: int, remote_path: str) -> Optional[str]:
+    """Скачивает видео из удалённого хранилища компании во временный файл.
 
     Returns:
         Путь к временному файлу или None при ошибке.
     """
-    log = _log.bind(video_id=video_id, yadisk_path=yadisk_path)
+    log = _log.bind(video_id=video_id, remote_path=remote_path)
 
     from app.models.ar_content import ARContent
     from app.models.company import Company
     from app.core.storage_providers import get_provider_for_company
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
 
     async with AsyncSessionLocal() as session:
         video = await session.get(Video, video_id)
         if not video:
-            log.warning("yadisk_download_video_not_found")
+            log.warning("remote_download_video_not_found")
             return None
 
         ar_content = await session.get(ARContent, video.ar_content_id)
         if not ar_content:
-            log.warning("yadisk_download_ar_content_not_found")
+            log.warning("remote_download_ar_content_not_found")
             return None
 
         company = await session.get(Company, ar_content.company_id)
         if not company:
-            log.warning("yadisk_download_company_not_found")
+            log.warning("remote_download_company_not_found")
             return None
 
     provider = await get_provider_for_company(company)
-    if not isinstance(provider, YandexDiskStorageProvider):
-        log.warning("yadisk_download_wrong_provider")
+    if not isinstance(provider, RemoteStorageProvider) or not provider.owns_ref(remote_path):
+        log.warning("remote_download_wrong_provider")
         return None
 
-    relative_path = yadisk_path[len(_YADISK_PREFIX):]
+    relative_path = provider.relative_path(remote_path)
 
     suffix = os.path.splitext(relative_path)[1] or ".mp4"
     tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
@@ -90,19 +95,49 @@ async def _download_yadisk_video(video_id: int, yadisk_path: str) -> Optional[st
 
     success = await provider.get_file(relative_path, tmp_path)
     if not success:
-        log.error("yadisk_download_failed", relative_path=relative_path)
+        log.error("remote_download_failed", relative_path=relative_path)
         if os.path.exists(tmp_path):
             os.remove(tmp_path)
         return None
 
-    log.info("yadisk_download_success", tmp_path=tmp_path)
+    log.info("remote_download_success", tmp_path=tmp_path)
     return tmp_path
 
 
+async def _generate_scrub_preview(video_id: int, video_path: str, local_path: str) -> None:
+    """Animated WebP + sprite sheet for the admin, from the already-local video."""
+    from app.models.company import Company
+    from app.core.storage_providers import get_provider_for_company
+
+    async with AsyncSessionLocal() as session:
+        video = await session.get(Video, video_id)
+        ar_content = await session.get(ARContent, video.ar_content_id) if video else None
+        company = await session.get(Company, ar_content.company_id) if ar_content else None
+        if company is None:
+            return
+        blob = await media_blob_service.find_by_path(session, company.id, video_path)
+        root = f"{blob_relative_dir(blob.sha256)}/preview" if blob else legacy_root(video_id)
+
+    provider = await get_provider_for_company(company)
+    scrub = await generate_scrub_assets(local_path, root, provider, company.id)
+    if scrub is None:
+        return
+
+    async with AsyncSessionLocal() as session:
+        video = await session.get(Video, video_id)
+        if video is None:
+            return
+        apply_scrub_preview(video, scrub)
+        blob = await media_blob_service.find_by_path(session, company.id, video.video_path)
+        if blob is not None:
+            await media_blob_service.update_derived(session, blob, scrub=scrub)
+        await session.commit()
+
+
 async def _generate_video_thumbnail_task(video_id: int, video_path: str) -> None:
     """Фоновая задача: генерация мультиразмерных WebP-превью для видео.
 
-    Поддерживает как локальные пути, так и ``yadisk://`` ссылки.
+    Поддерживает как локальные пути, так и ссылки удалённых хранилищ (``yadisk://``, ``s3://``).
     """
     log = _log.bind(video_id=video_id, video_path=video_path)
     log.info("video_thumbnail_task_started")
@@ -110,11 +145,11 @@ async def _generate_video_thumbnail_task(video_id: int, video_path: str) -> None
     local_path = video_path
     tmp_downloaded: Optional[str] = None
 
-    # Если видео на Yandex Disk — скачиваем во временный файл
-    if _is_yadisk_path(video_path):
-        tmp_downloaded = await _download_yadisk_video(video_id, video_path)
+    # Если видео в удалённом хранилище — скачиваем во временный файл
+    if _is_remote_path(video_path):
+        tmp_downloaded = await _download_remote_video(video_id, video_path)
         if not tmp_downloaded:
-            log.error("video_thumbnail_task_yadisk_download_failed")
+            log.error("video_thumbnail_task_remote_download_failed")
             async with AsyncSessionLocal() as session:
                 v = await session.get(Video, video_id)
                 if v:
@@ -129,11 +164,13 @@ async def _generate_video_thumbnail_task(video_id: int, video_path: str) -> None
             local_path,
             thumbnail_name=f"video_{video_id}_thumb.webp",
         )
+        # Same local copy: a remote video is downloaded once for both previews
+        await _generate_scrub_preview(video_id, video_path, local_path)
     finally:
-        # Удаляем временный файл если скачивали с YD
+        # Удаляем временный файл если скачивали из удалённого хранилища
         if tmp_downloaded and os.path.exists(tmp_downloaded):
             os.remove(tmp_downloaded)
-            log.info("yadisk_temp_file_cleaned", tmp_path=tmp_downloaded)
+            log.info("remote_temp_file_cleaned", tmp_path=tmp_downloaded)
 
     if result.get("status") != "ready":
         log.warning(
@@ -155,6 +192,18 @@ async def _generate_video_thumbnail_task(video_id: int, video_path: str) -> None
         v.thumbnail_path = result.get("thumbnail_path")
         v.preview_url = result.get("thumbnail_url")
         v.status = VideoStatus.READY
+        # Let later duplicates of this video reuse the preview
+        ar_content = await session.get(ARContent, v.ar_content_id)
+        blob = await media_blob_service.find_by_path(
+            session, ar_content.company_id if ar_content else None, v.video_path,
+        )
+        if blob is not None:
+            await media_blob_service.update_derived(
+                session,
+                blob,
+                preview_url=v.preview_url,
+                thumbnail_path=v.thumbnail_path,
+            )
         await session.commit()
 
     log.info(
@@ -198,6 +247,28 @@ async def regenerate_video_thumbnail(
     return {"status": "processing", "video_id": video_id}
 
 
+@router.post("/{video_id}/regenerate-hls")
+async def regenerate_video_hls(
+    video_id: int,
+    db: AsyncSession = Depends(get_db),
+) -> dict:
+    """Поставить видео в очередь на (пере)сборку HLS-лестницы качеств."""
+    video = await db.get(Video, video_id)
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+    if not video.video_path:
+        raise HTTPException(status_code=400, detail="Video file path is missing")
+    if not settings.VIDEO_HLS_ENABLED:
+        raise HTTPException(status_code=400, detail="HLS transcoding is disabled")
+    if not hls_worker.submit(video.id):
+        raise HTTPException(status_code=503, detail="HLS queue is full, try again later")
+
+    video.hls_status = "queued"
+    await db.commit()
+    _log.info("video_hls_regeneration_requested", video_id=video_id)
+    return {"status": "queued", "video_id": video_id}
+
+
 def parse_subscription_preset(preset: str) -> datetime:
     """Parse subscription preset like '1y', '2y' to datetime."""
     if preset == '1y':
@@ -225,8 +296,9 @@ async def upload_videos(
     """Upload one or multiple videos for AR content.
 
     Supports both local and Yandex Disk storage providers.  For YD the
-    video is saved to a temp file, metadata extracted with ffprobe, then
-    uploaded to Yandex Disk.  A thumbnail generation background task is
+    video is saved to a temp file, probed once with ffprobe and remuxed to
+    fast-start MP4 when needed (see video_ingest_service), then uploaded to
+    Yandex Disk.  A thumbnail generation background task is
     always enqueued.
     """
     log = _log.bind(content_id=content_id)
@@ -253,27 +325,12 @@ async def upload_videos(
     ar_content = result_content.scalar_one_or_none()
     if not ar_content:
         raise HTTPException(status_code=404, detail="AR content not found")
+    bind_usage_scope(ar_content.company_id, ar_content.project_id)
 
     # Resolve storage provider for the company
     from app.core.storage_providers import get_provider_for_company
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
 
     provider = await get_provider_for_company(ar_content.company)
-    is_yd = isinstance(provider, YandexDiskStorageProvider)
-
-    # Build YD relative prefix (same structure used during AR content creation)
-    yd_relative_prefix: Optional[str] = None
-    if is_yd:
-        from app.utils.slug_utils import generate_slug
-        from app.utils.ar_content import sanitize_filename
-
-        project_slug = (
-            generate_slug(ar_content.project.name)
-            if ar_content.project
-            else f"Project_{ar_content.project_id}"
-        )
-        order_folder = sanitize_filename(ar_content.order_number, max_length=50)
-        yd_relative_prefix = f"{project_slug}/{order_folder}"
 
     # Check if this is the first video for this AR content
     existing_videos_count = await db.scalar(
@@ -321,41 +378,68 @@ async def upload_videos(
             local_video_path = videos_storage_path / filename
 
             # Always save locally first — ffprobe needs a local file
-            await save_uploaded_video(upload_file, local_video_path)
+            sha256 = await save_uploaded_video(upload_file, local_video_path)
+            size_bytes = local_video_path.stat().st_size
 
-            # Extract metadata from the local file
-            metadata = await get_video_metadata(str(local_video_path))
+            # Content-addressed storage: identical bytes reuse the stored blob
+            existing_blob = await media_blob_service.lookup(
+                db, ar_content.company_id, sha256, "video",
+            )
 
-            if is_yd:
-                # Upload to Yandex Disk
-                yd_dest = f"{yd_relative_prefix}/videos/{filename}"
-                yd_ref = await provider.save_file(
-                    str(local_video_path), yd_dest,
-                )
-                db_video_path = yd_ref or provider.get_public_url(yd_dest)
-                db_video_url = db_video_path
-                log.info(
-                    "video_uploaded_to_yd",
-                    video_id=video.id,
-                    yd_dest=yd_dest,
-                )
-            else:
-                db_video_path = str(local_video_path)
-                db_video_url = build_public_url(local_video_path)
+            # Single ffprobe pass + fast-start remux (skipped for known blobs)
+            metadata = dict((existing_blob.derived or {}).get("video_meta") or {}) if existing_blob else {}
+            ingested = None
+            if not metadata:
+                ingested = await ingest_video(local_video_path)
+                metadata = ingested.as_dict()
+                size_bytes = ingested.size_bytes or size_bytes
+
+            stored = await media_blob_service.store(
+                staged_path=local_video_path,
+                sha256=sha256,
+                size_bytes=size_bytes,
+                kind="video",
+                original_filename=upload_file.filename,
+                provider=provider,
+                existing=existing_blob,
+            )
+            await media_blob_service.register(
+                db,
+                company_id=ar_content.company_id,
+                stored=stored,
+                kind="video",
+                storage_provider=provider.provider_name,
+                mime_type=metadata.get("mime_type") or upload_file.content_type,
+                derived={"video_meta": metadata} if ingested else None,
+            )
+            db_video_path = stored.storage_path
+            db_video_url = stored.public_url
+            log.info(
+                "video_stored",
+                video_id=video.id,
+                storage_path=db_video_path,
+                reused=stored.reused,
+                provider=provider.provider_name,
+            )
 
-            # Update video record
+            # Update video record (a duplicate reuses the preview of its blob)
+            reused_preview = stored.derived.get("preview_url")
             video.video_path = db_video_path
             video.video_url = db_video_url
-            video.preview_url = db_video_url
+            video.preview_url = reused_preview or db_video_url
+            if reused_preview:
+                video.thumbnail_path = stored.derived.get("thumbnail_path")
+                video.status = VideoStatus.READY
+            apply_scrub_preview(video, stored.derived.get("scrub"))
             video.duration = (
-                int(metadata["duration"])
-                if metadata.get("duration") is not None
+                int(round(metadata["duration"]))
+                if metadata.get("duration")
                 else None
             )
             video.width = metadata.get("width")
             video.height = metadata.get("height")
-            video.size_bytes = metadata.get("size_bytes")
-            video.mime_type = metadata.get("mime_type")
+            video.size_bytes = stored.size_bytes
+            video.mime_type = metadata.get("mime_type") or upload_file.content_type
 
             # If this is the first video, mark it as active
             if is_first_video and len(created_videos) == 0:
@@ -367,12 +451,13 @@ async def upload_videos(
 
             # Enqueue preview generation task.
             # For YD videos the task will download from YD to a temp file.
-            if background_tasks is not None and video.video_path:
+            if background_tasks is not None and video.video_path and not reused_preview:
                 background_tasks.add_task(
                     _generate_video_thumbnail_task,
                     video.id,
                     video.video_path,
                 )
+            hls_worker.submit(video.id)
 
             created_videos.append({
                 "id": video.id,
@@ -417,6 +502,35 @@ async def upload_videos(
     }
 
 
+@router.post("/ar-content/{content_id}/videos/from-uploads")
+async def upload_videos_from_uploads(
+    content_id: str,
+    payload: VideosFromUploads,
+    background_tasks: BackgroundTasks = None,
+    db: AsyncSession = Depends(get_db),
+):
+    """Attach videos sent via resumable uploads (``/api/uploads``).
+
+    Same processing as :func:`upload_videos`; the upload files are moved
+    into the content's ``videos/`` folder instead of being copied.
+    """
+    try:
+        staged = [
+            await resumable_upload_service.claim_completed(db, upload_id, "video")
+            for upload_id in payload.upload_ids
+        ]
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    try:
+        return await upload_videos(content_id, videos=staged, background_tasks=background_tasks, db=db)
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await resumable_upload_service.release(db, staged)
+
+
 @router.get("/ar-content/{content_id}/videos", response_model=List[VideoStatusResponse])
 async def list_videos(
     content_id: str,
@@ -474,6 +588,9 @@ async def list_videos(
             "title": video.filename,
             "video_url": video.video_url,
             "preview_url": video.preview_url,
+            "animated_preview_url": video.animated_preview_url,
+            "sprite_url": video.sprite_url,
+            "sprite_vtt_url": video.sprite_vtt_url,
             "is_active": video.is_active,
             "rotation_type": video.rotation_type,
             "subscription_end": video.subscription_end,
@@ -1007,7 +1124,11 @@ async def update_video(video_id: str, payload: dict, db: AsyncSession = Depends(
 
 
 @router.delete("/videos/{video_id}")
-async def delete_video(video_id: str, db: AsyncSession = Depends(get_db)):
+async def delete_video(
+    video_id: str,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+):
     """Delete a video and all its schedules."""
     try:
         video_uuid = int(video_id)
@@ -1017,6 +1138,23 @@ async def delete_video(video_id: str, db: AsyncSession = Depends(get_db)):
     v = await db.get(Video, video_uuid)
     if not v:
         raise HTTPException(status_code=404, detail="Video not found")
+
+    # Drop the blob reference; the file goes away with the last reference
+    ar_content = await db.get(ARContent, v.ar_content_id)
+    company_id = ar_content.company_id if ar_content else None
+    collected = await media_blob_service.release(db, company_id, v.video_path)
+    hls_path = v.hls_path
+
     await db.delete(v)
     await db.commit()
+
+    if collected is not None or hls_path:
+        from app.core.storage_providers import get_provider_for_company
+        from app.models.company import Company
+
+        company = await db.get(Company, company_id) if company_id else None
+        provider = await get_provider_for_company(company) if company else None
+        if collected is not None:
+            background_tasks.add_task(media_blob_service.purge, collected, provider)
+        background_tasks.add_task(delete_renditions, video_uuid, hls_path, provider)
     return {"status": "deleted"}
@@ -20,9 +20,10 @@ from app.models.ar_content import ARContent
 from app.models.ar_view_session import ARViewSession
 from app.models.company import Company
 from app.schemas.viewer import VIEWER_MANIFEST_VERSION, ViewerManifestResponse, ViewerManifestVideo
+from app.services.image_variant_service import variant_url
 from app.services.video_scheduler import get_active_video, update_rotation_state
 from app.utils.ar_content import build_public_url
-from app.core.storage_providers import get_provider_for_company
+from app.core.storage_providers import RemoteStorageProvider, get_provider_for_company, split_remote_ref
 
 logger = structlog.get_logger()
 router = APIRouter()
@@ -159,6 +160,11 @@ def _is_yadisk_ref(path_or_url: Optional[str]) -> bool:
     return bool(path_or_url and str(path_or_url).startswith("yadisk://"))
 
 
+def _is_remote_ref(path_or_url: Optional[str]) -> bool:
+    """Check if a stored path references a remote provider (``yadisk://``, ``s3://``)."""
+    return bool(path_or_url and split_remote_ref(str(path_or_url)))
+
+
 def _yadisk_relative(ref: str) -> str:
     """Extract relative path from ``yadisk://slug/project/001/file``."""
     return ref.replace("yadisk://", "", 1)
@@ -183,10 +189,10 @@ def _yadisk_proxy_url(yadisk_ref: str, company_id: int) -> str:
 
 
 def _photo_url_from_ar_content(ar_content: ARContent) -> Optional[str]:
-    """Get photo URL (relative or yadisk://) from ARContent."""
+    """Get photo URL (relative or remote ref) from ARContent."""
     url = ar_content.photo_url
-    # For yadisk:// references, just return as-is (will be resolved later)
-    if _is_yadisk_ref(url) or _is_yadisk_ref(ar_content.photo_path):
+    # For remote references, just return as-is (will be resolved later)
+    if _is_remote_ref(url) or _is_remote_ref(ar_content.photo_path):
         return url
     if ar_content.photo_path:
         try:
@@ -201,8 +207,8 @@ def _photo_url_from_ar_content(ar_content: ARContent) -> Optional[str]:
 def _marker_preview_url_from_ar_content(ar_content: ARContent) -> Optional[str]:
     """Get lightweight marker preview URL used on landing page."""
     preview = ar_content.thumbnail_url
-    # For yadisk:// references, return as-is (resolved later).
-    if _is_yadisk_ref(preview):
+    # For remote references, return as-is (resolved later).
+    if _is_remote_ref(preview):
         return preview
 
     if not preview and ar_content.photo_path:
@@ -276,13 +282,20 @@ async def get_viewer_landing_data(
             resolved_preview = _yadisk_proxy_url(resolved_preview, company.id)
         if _is_yadisk_ref(resolved_video):
             resolved_video = _yadisk_proxy_url(resolved_video, company.id)
-    if _is_yadisk_ref(resolved_photo) or _is_yadisk_ref(resolved_video):
+    elif company:
+        # S3 presigned URLs are signed locally: no extra round-trip
+        resolved_photo, resolved_preview, resolved_video = await asyncio.gather(
+            _resolve_remote_url(resolved_photo, company),
+            _resolve_remote_url(resolved_preview, company),
+            _resolve_remote_url(resolved_video, company),
+        )
+    if _is_remote_ref(resolved_photo) or _is_remote_ref(resolved_video):
         logger.warning(
-            "viewer_yadisk_unresolved",
+            "viewer_remote_unresolved",
             unique_id=unique_id,
             has_company=company is not None,
-            photo_still_yadisk=_is_yadisk_ref(resolved_photo),
-            video_still_yadisk=_is_yadisk_ref(resolved_video or ""),
+            photo_still_remote=_is_remote_ref(resolved_photo),
+            video_still_remote=_is_remote_ref(resolved_video or ""),
         )
     photo_url_abs = _absolute_url(resolved_photo)
     preview_url_abs = _absolute_url(resolved_preview)
@@ -294,35 +307,40 @@ async def get_viewer_landing_data(
         preview_url=preview_url_abs,
         video_url=video_url_abs,
     )
+    preview_srcset = None
+    if ar_content.photo_path:
+        preview_srcset = ", ".join(
+            f"{_absolute_url(variant_url(ar_content.id, ar_content.photo_path, width))} {width}w"
+            for width in settings.IMAGE_VARIANT_SRCSET_WIDTHS
+        )
     return {
         "photo_url": photo_url_abs,
         "preview_url": preview_url_abs,
+        "preview_srcset": preview_srcset,
         "video_url": video_url_abs,
         "order_number": ar_content.order_number or "AR",
     }
 
 
-async def _resolve_yd_url(url_or_path: Optional[str], company: Company) -> Optional[str]:
-    """Resolve a ``yadisk://`` reference to a temporary Yandex Disk download URL.
+async def _resolve_remote_url(url_or_path: Optional[str], company: Company) -> Optional[str]:
+    """Resolve a remote reference to a temporary direct download URL.
 
-    Returns the original value unchanged if it is not a YD reference or if
-    the company doesn't have a valid token.
+    ``yadisk://`` refs cost a Yandex Disk API call, ``s3://`` refs are
+    presigned locally.  Returns the original value unchanged if it is not a
+    remote reference of the company's provider or if resolution failed.
     """
     if not url_or_path:
         return url_or_path
-    if not _is_yadisk_ref(url_or_path):
+    if not _is_remote_ref(url_or_path):
         return url_or_path
     try:
         provider = await get_provider_for_company(company)
-        from app.core.yandex_disk_provider import YandexDiskStorageProvider
-
-        if isinstance(provider, YandexDiskStorageProvider):
-            relative = _yadisk_relative(url_or_path)
-            download_url = await provider.get_download_url(relative)
+        if isinstance(provider, RemoteStorageProvider) and provider.owns_ref(url_or_path):
+            download_url = await provider.get_download_url(provider.relative_path(url_or_path))
             if download_url:
                 return download_url
     except Exception as exc:
-        logger.error("yd_resolve_url_failed", path=url_or_path, error=str(exc))
+        logger.error("remote_resolve_url_failed", path=url_or_path, error=str(exc))
     return url_or_path
 
 
@@ -642,44 +660,68 @@ async def _build_manifest(
     if source == "rotation" and getattr(video, "rotation_type", None) in ("sequential", "cyclic"):
         await update_rotation_state(ar_content, db)
 
-    # ── Resolve Yandex Disk yadisk:// references (in parallel) ──────
+    # ── Resolve remote (yadisk:// / s3://) references (in parallel) ──
     # IMPORTANT: use local variables instead of mutating ORM fields.
     # Mutating video.video_url would persist the temporary download URL
     # back to the database on the next session commit, overwriting the
-    # stable yadisk:// reference and causing expired-URL errors later.
+    # stable remote reference and causing expired-URL errors later.
     #
-    # All YD resolves run concurrently via asyncio.gather() to cut
+    # All remote resolves run concurrently via asyncio.gather() to cut
     # manifest latency from ~1.5s (3 sequential HTTP calls) to ~0.5s.
     resolved_photo = photo_url_rel
+    # Tracking-optimised marker derivative (falls back to the original photo)
+    marker_derivative = (getattr(ar_content, "marker_metadata", None) or {}).get("derivative") or {}
+    resolved_marker = ar_content.marker_url if marker_derivative and ar_content.marker_url else photo_url_rel
     resolved_video = video.video_url
     resolved_preview = video.preview_url
+    resolved_poster = getattr(video, "poster_url", None)
+    # HLS segments are addressed relative to the master, so YD playlists are
+    # always served through the same-host proxy (never a direct YD link).
+    hls_ready = getattr(video, "hls_status", None) == "ready" and bool(getattr(video, "hls_url", None))
+    resolved_hls = video.hls_url if hls_ready else None
+    if company and _is_yadisk_ref(resolved_hls):
+        resolved_hls = _yadisk_proxy_url(resolved_hls, company.id)
+    elif _is_remote_ref(resolved_hls):
+        resolved_hls = None  # no same-host proxy for other providers: plain MP4
 
     if company:
-        yd_tasks: list[tuple[str, str]] = []  # (field_name, yadisk_ref)
-        if _is_yadisk_ref(resolved_photo):
-            yd_tasks.append(("photo", resolved_photo))
-        if _is_yadisk_ref(resolved_video):
-            yd_tasks.append(("video", resolved_video))
-        if _is_yadisk_ref(resolved_preview):
-            yd_tasks.append(("preview", resolved_preview))
-
-        if yd_tasks:
+        remote_tasks: list[tuple[str, str]] = []  # (field_name, remote_ref)
+        if _is_remote_ref(resolved_photo):
+            remote_tasks.append(("photo", resolved_photo))
+        if resolved_marker != photo_url_rel and _is_remote_ref(resolved_marker):
+            remote_tasks.append(("marker", resolved_marker))
+        if _is_remote_ref(resolved_video):
+            remote_tasks.append(("video", resolved_video))
+        if _is_remote_ref(resolved_preview):
+            remote_tasks.append(("preview", resolved_preview))
+        if _is_remote_ref(resolved_poster):
+            remote_tasks.append(("poster", resolved_poster))
+
+        if remote_tasks:
             results = await asyncio.gather(
-                *(_resolve_yd_url(ref, company) for _, ref in yd_tasks),
+                *(_resolve_remote_url(ref, company) for _, ref in remote_tasks),
             )
-            for (field_name, _original), result in zip(yd_tasks, results):
+            for (field_name, _original), result in zip(remote_tasks, results):
                 if field_name == "photo":
                     resolved_photo = result
+                elif field_name == "marker":
+                    resolved_marker = result
                 elif field_name == "video":
                     resolved_video = result
                 elif field_name == "preview":
                     resolved_preview = result
+                elif field_name == "poster":
+                    resolved_poster = result
 
     # ── Build absolute URLs ──────────────────────────────────────────
-    marker_image_url = _absolute_url(resolved_photo)
+    if resolved_marker == photo_url_rel:
+        resolved_marker = resolved_photo
+    marker_image_url = _absolute_url(resolved_marker)
     photo_url_abs = _absolute_url(resolved_photo)
     video_url_abs = _absolute_url(resolved_video or "")
     thumbnail_url_abs = _absolute_url(resolved_preview) if resolved_preview else None
+    hls_url_abs = _absolute_url(resolved_hls) if resolved_hls else None
+    poster_url_abs = _absolute_url(resolved_poster) if resolved_poster else None
 
     # ── Extract ALL ORM data into plain values BEFORE _record_view ──
     # _record_view may rollback on failure which expires every ORM object
@@ -704,6 +746,8 @@ async def _build_manifest(
         id=video_id,
         title=video_title,
         video_url=video_url_abs,
+        hls_url=hls_url_abs,
+        poster_url=poster_url_abs,
         thumbnail_url=thumbnail_url_abs,
         duration=video_duration,
         width=video_width,
@@ -719,6 +763,8 @@ async def _build_manifest(
         unique_id=unique_id,
         order_number=ar_order_number,
         marker_image_url=marker_image_url,
+        marker_image_size_bytes=marker_derivative.get("size_bytes"),
+        marker_image_sha256=marker_derivative.get("sha256"),
         photo_url=photo_url_abs,
         video=video_payload,
         expires_at=expires_at_str,
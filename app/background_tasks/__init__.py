@@ -43,15 +43,11 @@ async def run_background_task(
         background_tasks.add_task(run_in_threadpool, func, *args, **kwargs)
 
 
-# Import task modules here
-from . import email_tasks  # noqa: E402
-from . import storage_tasks  # noqa: E402
-from . import processing_tasks  # noqa: E402
-
+# Task modules are imported on demand (``from app.background_tasks import
+# storage_tasks``): email_tasks needs an email service this tree does not
+# ship, and processing_tasks pulls in OpenCV, so importing them eagerly made
+# the whole package unusable (the scheduler imports storage_tasks).
 __all__ = [
     'run_background_task',
     'run_in_threadpool',
-    'email_tasks',
-    'storage_tasks',
-    'processing_tasks',
 ]
@@ -2,17 +2,23 @@
 Storage-related background tasks.
 """
 
-import logging
+import asyncio
 import shutil
+import tempfile
 from pathlib import Path
 from typing import BinaryIO, Optional, Union
 
+import structlog
 from fastapi import BackgroundTasks, UploadFile
 
 from app.core.config import settings
 from . import run_background_task
 
-logger = logging.getLogger(__name__)
+logger = structlog.get_logger()
+
+# Temporary files/folders the app creates in the system temp directory
+# (storage migration downloads, HLS and preview encodes, photo analysis)
+APP_TEMP_PATTERNS = ("migrate_*", "hls_*", "scrub_*", "photo_analyze_*")
 
 
 async def save_upload_file(
@@ -148,6 +154,19 @@ async def cleanup_temp_files(
     )
 
 
+async def cleanup_app_temp_files() -> None:
+    """Remove the app's leftovers from the system temp directory.
+
+    Scheduled every hour: a crashed worker or a killed ffmpeg leaves its
+    temp files behind.  Anything older than ``TEMP_FILE_MAX_AGE_HOURS`` is
+    removed.
+    """
+    directory = tempfile.gettempdir()
+    max_age_seconds = settings.TEMP_FILE_MAX_AGE_HOURS * 3600
+    for pattern in APP_TEMP_PATTERNS:
+        await asyncio.to_thread(_cleanup_temp_files, directory, pattern, max_age_seconds)
+
+
 def _cleanup_temp_files(directory: str, pattern: str, max_age_seconds: int) -> None:
     """
     Clean up temporary files (runs in a background thread).
@@ -158,8 +177,7 @@ def _cleanup_temp_files(directory: str, pattern: str, max_age_seconds: int) -> N
         max_age_seconds: Maximum age of files to keep (in seconds)
     """
     import time
-    from pathlib import Path
-    
+
     now = time.time()
     deleted = 0
     
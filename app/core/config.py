@@ -96,6 +96,11 @@ class Settings(BaseSettings):
     # Local Storage
     LOCAL_STORAGE_PATH: str = "./storage"
     LOCAL_STORAGE_PUBLIC_URL: str = "http://localhost:8000/storage"
+    # Ускоренная отдача файлов через nginx (X-Accel-Redirect): приложение проверяет
+    # путь, а байты отдаёт nginx из internal location (sendfile, Range).
+    # Без nginx оставить False — файлы отдаёт само приложение
+    ACCEL_REDIRECT_ENABLED: bool = False
+    ACCEL_REDIRECT_STORAGE_LOCATION: str = "/_accel/storage"
     
     # File storage configuration
     ALLOWED_FILE_EXTENSIONS_PHOTO: list[str] = ["jpeg", "jpg", "png"]
@@ -122,7 +127,80 @@ class Settings(BaseSettings):
     
     # Background tasks configuration
     MAX_BACKGROUND_WORKERS: int = 4
-    
+    # Общий пул процессов для CPU-задач (анализ маркеров, рендеринг)
+    PROCESS_POOL_WORKERS: int = 2
+    # QR-листы для печати: сколько пачек этикеток рендерится в пуле одновременно
+    QR_SHEET_LOOKAHEAD: int = 4
+    # Пакетные /api/v2/media/*/batch: параллельных файлов на запрос и лимит размера пакета
+    MEDIA_BATCH_CONCURRENCY: int = 4
+    MEDIA_BATCH_MAX_ITEMS: int = 500
+    # Ресайз фото на лету (/img/{id}/{w}x{h}.{fmt}): предел стороны, качество,
+    # бюджет LRU в памяти и ширины для srcset в шаблонах
+    IMAGE_VARIANT_MAX_DIMENSION: int = 2048
+    IMAGE_VARIANT_QUALITY: int = 80
+    IMAGE_VARIANT_MEMORY_BYTES: int = 64 * 1024 * 1024
+    IMAGE_VARIANT_SRCSET_WIDTHS: list[int] = [160, 320, 640, 1280]
+
+    # Возобновляемая загрузка (tus): сколько часов живёт незавершённая загрузка
+    # и как часто фоновая задача удаляет просроченные
+    RESUMABLE_UPLOAD_EXPIRY_HOURS: int = 24
+    RESUMABLE_UPLOAD_CLEANUP_MINUTES: int = 30
+
+    # Учёт занятого места: как часто накопленные дельты пишутся в storage_usage
+    # и как часто полная сверка пересчитывает таблицу по файлам
+    STORAGE_USAGE_FLUSH_SECONDS: int = 30
+    STORAGE_USAGE_RECONCILE_HOURS: int = 6
+
+    # Сборка мусора в хранилище: период запуска, возраст, младше которого файлы
+    # не трогаются, режим «только отчёт» и сколько дней локальные файлы лежат
+    # в .trash перед удалением (0 — удалять сразу)
+    STORAGE_GC_INTERVAL_HOURS: int = 24
+    STORAGE_GC_GRACE_HOURS: int = 48
+    STORAGE_GC_DRY_RUN: bool = True
+    STORAGE_GC_QUARANTINE_DAYS: int = 7
+    # Временные файлы приложения в системном каталоге: возраст для удаления
+    TEMP_FILE_MAX_AGE_HOURS: int = 24
+
+    # AR content creation pipeline: process-wide limits per stage pool
+    # (io — запись на локальный диск, upload — загрузка в облако, cpu — анализ/превью,
+    # media — процессы ffmpeg/ffprobe)
+    AR_PIPELINE_IO_CONCURRENCY: int = 8
+    AR_PIPELINE_UPLOAD_CONCURRENCY: int = 4
+    AR_PIPELINE_CPU_CONCURRENCY: int = 2
+    AR_PIPELINE_MEDIA_CONCURRENCY: int = 2
+
+    # Video ingest: переупаковка MP4 с moov в начале файла (-movflags +faststart, без перекодирования)
+    VIDEO_FASTSTART_ENABLED: bool = True
+
+    # Marker derivative: облегчённое изображение для трекинга ARCore (оригинал не трогаем)
+    MARKER_DERIVATIVE_ENABLED: bool = True
+    MARKER_DERIVATIVE_LONG_EDGE: int = 1024
+    MARKER_DERIVATIVE_MODE: str = "grayscale"  # grayscale | jpeg
+    MARKER_DERIVATIVE_JPEG_QUALITY: int = 85
+
+    # Near-duplicate markers: pHash + индекс по Хэммингу (в памяти каждого воркера)
+    MARKER_DUPLICATE_MAX_DISTANCE: int = 10  # бит из 64
+    MARKER_HASH_INDEX_REFRESH_SECONDS: int = 30
+
+    # HLS: лестница качеств для AR-видео (опционально, требует ffmpeg)
+    VIDEO_HLS_ENABLED: bool = False
+    VIDEO_HLS_RENDITIONS: str = "360,540,720"  # высоты кадра, через запятую
+    VIDEO_HLS_SEGMENT_SECONDS: int = 4
+    VIDEO_HLS_WORKERS: int = 1  # параллельных перекодирований на процесс
+    VIDEO_HLS_QUEUE_SIZE: int = 100
+    VIDEO_HLS_FFMPEG_THREADS: int = 2
+
+    # Превью для админки вместо загрузки всего видео: анимированный WebP
+    # и спрайт из равномерно выбранных кадров с VTT-индексом (требует ffmpeg)
+    VIDEO_SCRUB_PREVIEW_ENABLED: bool = True
+    VIDEO_PREVIEW_SECONDS: float = 3.0
+    VIDEO_PREVIEW_FPS: int = 8
+    VIDEO_PREVIEW_WIDTH: int = 320
+    VIDEO_PREVIEW_QUALITY: int = 50
+    VIDEO_SPRITE_FRAMES: int = 20
+    VIDEO_SPRITE_COLUMNS: int = 5
+    VIDEO_SPRITE_TILE_WIDTH: int = 160
+
     # Monitoring
     SENTRY_DSN: str = ""
     PROMETHEUS_MULTIPROC_DIR: str = "/tmp/prometheus_multiproc"
@@ -147,6 +225,66 @@ class Settings(BaseSettings):
     # Yandex OAuth (for Yandex Disk storage)
     YANDEX_OAUTH_CLIENT_ID: str = ""
     YANDEX_OAUTH_CLIENT_SECRET: str = ""
+    # Общий HTTP-клиент для Yandex Disk: пул keep-alive соединений (HTTP/2, если установлен h2)
+    HTTP_CLIENT_HTTP2: bool = True
+    HTTP_CLIENT_MAX_CONNECTIONS: int = 100
+    HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    # Кэш существующих папок на Яндекс Диске: загрузки в известную папку идут без mkdir
+    YD_DIRECTORY_CACHE_TTL_SECONDS: int = 600
+    YD_DIRECTORY_CACHE_MAX_ENTRIES: int = 10000
+    # Метаданные Яндекс Диска (листинги папок для выбора папки и подсчёта размера):
+    # TTL кэша, затем перепроверка по полю modified; параллельность обхода дерева
+    YD_METADATA_CACHE_TTL_SECONDS: int = 300
+    YD_METADATA_CACHE_MAX_ENTRIES: int = 20000
+    YD_METADATA_CONCURRENCY: int = 8
+    YD_METADATA_PAGE_SIZE: int = 500
+    # Локальный дисковый LRU-кэш файлов Яндекс Диска для /api/storage/yd-file
+    # (.cache/yd): лимит по байтам, файлы крупнее лимита объекта проксируются;
+    # после YD_FILE_CACHE_REVALIDATE_SECONDS копия сверяется по md5/modified
+    YD_FILE_CACHE_ENABLED: bool = True
+    YD_FILE_CACHE_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    YD_FILE_CACHE_MAX_OBJECT_BYTES: int = 512 * 1024 * 1024
+    YD_FILE_CACHE_REVALIDATE_SECONDS: int = 300
+
+    # Многоуровневый кэш (enhanced_cache_service): объём L1 в памяти процесса
+    # (типы с CacheConfig.max_size получают свою долю) и число шардов L1
+    CACHE_L1_MAX_BYTES: int = 100 * 1024 * 1024
+    CACHE_L1_SHARDS: int = 4
+    # L3 на диске: индекс в SQLite, LRU-вытеснение до лимита по байтам;
+    # записи без собственного TTL живут CACHE_L3_DEFAULT_TTL_SECONDS; пустой
+    # CACHE_L3_DIR — каталог vertex_cache во временной папке
+    CACHE_L3_DIR: str = ""
+    CACHE_L3_MAX_BYTES: int = 1024 * 1024 * 1024
+    CACHE_L3_DEFAULT_TTL_SECONDS: int = 86400
+    # Ключи кэша в общем Redis живут под CACHE_KEY_PREFIX; инвалидации (ключи,
+    # теги, шаблоны) рассылаются всем воркерам через pub/sub-канал, чтобы их L1
+    # не отдавал устаревшие записи
+    CACHE_KEY_PREFIX: str = "vertex:cache"
+    CACHE_INVALIDATION_BUS_ENABLED: bool = True
+    CACHE_INVALIDATION_CHANNEL: str = "vertex:cache:invalidate"
+
+    # S3-совместимое хранилище (MinIO, Yandex Object Storage, AWS) для компаний
+    # с storage_provider = "s3": общий бакет, у каждой компании префикс = slug.
+    # Ссылки на скачивание подписываются локально (SigV4), без запроса к S3.
+    # S3_PUBLIC_ENDPOINT_URL — адрес для браузеров/приложения, если отличается
+    # от внутреннего (например, http://minio:9000 внутри docker)
+    S3_ENDPOINT_URL: str = ""
+    S3_PUBLIC_ENDPOINT_URL: str = ""
+    S3_REGION: str = "us-east-1"
+    S3_BUCKET: str = "vertex-ar-media"
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_PRESIGN_EXPIRES_SECONDS: int = 3600
+    # Multipart: файлы от порога грузятся частями параллельно
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 * 1024
+    S3_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MULTIPART_CONCURRENCY: int = 4
+
+    # Перенос файлов компании между провайдерами хранилища: параллельные
+    # передачи и размер пакета (файлов на шаг / строк на обновление ссылок в БД)
+    STORAGE_MIGRATION_CONCURRENCY: int = 4
+    STORAGE_MIGRATION_BATCH_SIZE: int = 200
 
     # Backup
     BACKUP_S3_ENDPOINT: str = ""
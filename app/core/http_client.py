@@ -0,0 +1,96 @@
+"""Shared outbound HTTP client (Yandex Disk API and upload/download hosts).
+
+Opening an ``httpx.AsyncClient`` per call pays for DNS, TCP and TLS on every
+Disk API request.  The app keeps one connection-pooled client with
+keep-alive instead, created lazily and closed in the lifespan.  HTTP/2 is
+negotiated when the optional ``h2`` package is installed
+(``httpx[http2]``); otherwise the pool speaks HTTP/1.1.
+
+Per-request timeouts are passed at the call site (``timeout=``); the
+client-level default is the Disk API one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+import httpx
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+DEFAULT_TIMEOUT = 60.0
+
+# One pooled client per event loop (``None``: created outside a running loop)
+_clients: dict[Optional[asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _create_client() -> httpx.AsyncClient:
+    http2 = settings.HTTP_CLIENT_HTTP2 and http2_available()
+    if settings.HTTP_CLIENT_HTTP2 and not http2:
+        logger.info("http_client_http2_unavailable", reason="h2 not installed")
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_CLIENT_KEEPALIVE_EXPIRY,
+    )
+    logger.info("http_client_started", http2=http2, max_connections=limits.max_connections)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=DEFAULT_TIMEOUT)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return this event loop's client, creating it on first use.
+
+    Pooled connections belong to the event loop that opened them, so a
+    caller on another loop (scripts, tests) gets its own client; every one
+    of them is closed by :func:`close_http_client`.
+    """
+    try:
+        loop: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        for stale in [other for other in _clients if other is not None and other.is_closed()]:
+            _abandon(_clients.pop(stale))
+        client = _clients[loop] = _create_client()
+    return client
+
+
+def _abandon(client: httpx.AsyncClient) -> None:
+    """Drop a client whose event loop is gone; it can no longer be awaited."""
+    if not client.is_closed:
+        logger.warning("http_client_abandoned", reason="event loop closed")
+
+
+async def close_http_client() -> None:
+    """Close the clients of every event loop (application shutdown)."""
+    clients = list(_clients.items())
+    _clients.clear()
+    current = asyncio.get_running_loop()
+    for loop, client in clients:
+        if client.is_closed:
+            continue
+        try:
+            if loop is None or loop is current:
+                await client.aclose()
+            elif loop.is_running():
+                # Loop of another thread: close the pool where its sockets live
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop))
+            else:
+                _abandon(client)
+                continue
+        except Exception as exc:
+            logger.warning("http_client_close_failed", error=str(exc))
+            continue
+        logger.info("http_client_closed")
@@ -0,0 +1,99 @@
+"""Shared process pool for CPU-bound work (image analysis, rendering).
+
+Threads do not help pure-Python/NumPy-heavy code much because of the GIL,
+and spawning a pool per request is slower than the work itself, so the app
+keeps one lazily created ``ProcessPoolExecutor`` sized by
+``PROCESS_POOL_WORKERS`` and shuts it down in the lifespan.
+
+Functions submitted here must be module-level (picklable) and must not touch
+the database or the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, TypeVar
+
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = max(1, int(settings.PROCESS_POOL_WORKERS))
+                # "spawn" keeps children free of the parent's event loop,
+                # DB connections and threads.
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info("process_pool_started", workers=workers)
+    return _pool
+
+
+async def run_in_process(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run ``func(*args, **kwargs)`` in the shared process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+
+async def map_unordered(
+    func: Callable[[T], Awaitable[Any]],
+    items: Iterable[T],
+    limit: int,
+) -> AsyncIterator[tuple[int, Any]]:
+    """Run ``func(item)`` for *items* with at most *limit* in flight.
+
+    Yields ``(index, result)`` as each call completes (an exception is yielded
+    as the result, not raised).  Closing the iterator early — e.g. when an
+    HTTP client disconnects from a streaming response — cancels everything
+    still running and submits nothing more.
+    """
+    source = iter(enumerate(items))
+    running: dict[asyncio.Future, int] = {}
+
+    def _fill() -> None:
+        while len(running) < max(1, limit):
+            nxt = next(source, None)
+            if nxt is None:
+                return
+            index, item = nxt
+            running[asyncio.ensure_future(func(item))] = index
+
+    try:
+        _fill()
+        while running:
+            done, _pending = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                yield index, (future.exception() or future.result())
+            _fill()
+    finally:
+        for future in running:
+            future.cancel()
+
+
+def shutdown_process_pool() -> None:
+    """Stop the pool (lifespan shutdown); pending work is cancelled."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+            logger.info("process_pool_stopped")
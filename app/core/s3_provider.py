@@ -0,0 +1,430 @@
+"""
+S3-compatible storage provider for V-Portal platform.
+
+Works with AWS S3, MinIO and other S3 APIs (path-style addressing, so a
+local MinIO at ``http://localhost:9000`` needs no DNS setup).  Requests are
+signed with AWS Signature V4 and sent through the shared pooled client
+(``app.core.http_client``); no SDK is required.
+
+* Objects live at ``{bucket}/{base_prefix}/{relative path}``; stored paths
+  are ``s3://{relative path}`` references.
+* Files from ``S3_MULTIPART_THRESHOLD`` up are uploaded as multipart
+  uploads with ``S3_MULTIPART_CONCURRENCY`` parts in flight.
+* Download URLs are presigned locally — resolving a manifest or landing
+  page costs no request to the storage.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import aiofiles
+import httpx
+import structlog
+from prometheus_client import Counter
+
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.storage_providers import RemoteStorageProvider
+
+logger = structlog.get_logger()
+
+_UPLOAD_TIMEOUT = 600.0  # 10 min for large video uploads
+_MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for every part but the last
+_DELETE_CONCURRENCY = 8
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+S3_UPLOADS = Counter(
+    "s3_uploads_total",
+    "Objects uploaded to S3-compatible storage",
+    ["mode"],
+)
+
+
+def _uri_quote(value: str, safe: str = "-_.~") -> str:
+    return quote(value, safe=safe)
+
+
+def _hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+class SigV4Signer:
+    """AWS Signature Version 4 for S3 (header auth and presigned URLs)."""
+
+    def __init__(self, access_key: str, secret_key: str, region: str, service: str = "s3") -> None:
+        self.access_key = access_key
+        self._secret_key = secret_key
+        self.region = region
+        self.service = service
+
+    @staticmethod
+    def canonical_query(params: Optional[Dict[str, str]]) -> str:
+        """Query string in canonical form (also what is sent on the wire)."""
+        return "&".join(
+            f"{_uri_quote(key)}={_uri_quote(value)}"
+            for key, value in sorted((str(k), str(v)) for k, v in (params or {}).items())
+        )
+
+    def _scope(self, date: str) -> str:
+        return f"{date}/{self.region}/{self.service}/aws4_request"
+
+    def _signature(self, amz_date: str, canonical_request: str) -> str:
+        date = amz_date[:8]
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256",
+            amz_date,
+            self._scope(date),
+            hashlib.sha256(canonical_request.encode()).hexdigest(),
+        ])
+        key = _hmac_sha256(f"AWS4{self._secret_key}".encode(), date)
+        for part in (self.region, self.service, "aws4_request"):
+            key = _hmac_sha256(key, part)
+        return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    def sign(
+        self,
+        method: str,
+        url: str,
+        query: str,
+        headers: Dict[str, str],
+        payload_hash: str,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, str]:
+        """Headers for a request to *url* (path already URI-encoded)."""
+        parts = urlsplit(url)
+        amz_date = (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+        signed = {
+            **headers,
+            "host": parts.netloc,
+            "x-amz-date": amz_date,
+            "x-amz-content-sha256": payload_hash,
+        }
+        canonical = {key.lower(): " ".join(str(value).split()) for key, value in signed.items()}
+        signed_headers = ";".join(sorted(canonical))
+        canonical_request = "\n".join([
+            method,
+            parts.path or "/",
+            query,
+            "".join(f"{key}:{canonical[key]}\n" for key in sorted(canonical)),
+            signed_headers,
+            payload_hash,
+        ])
+        signature = self._signature(amz_date, canonical_request)
+        signed.pop("host")  # set by httpx from the URL
+        signed["Authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{self._scope(amz_date[:8])}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return signed
+
+    def presign(self, method: str, url: str, expires: int, now: Optional[datetime] = None) -> str:
+        """Query-string authenticated URL, computed without any request."""
+        parts = urlsplit(url)
+        amz_date = (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+        query = self.canonical_query({
+            "X-Amz-Algorithm": "AWS4-HMAC-SHA256",
+            "X-Amz-Credential": f"{self.access_key}/{self._scope(amz_date[:8])}",
+            "X-Amz-Date": amz_date,
+            "X-Amz-Expires": str(expires),
+            "X-Amz-SignedHeaders": "host",
+        })
+        canonical_request = "\n".join([
+            method, parts.path or "/", query, f"host:{parts.netloc}\n", "host", UNSIGNED_PAYLOAD,
+        ])
+        return f"{url}?{query}&X-Amz-Signature={self._signature(amz_date, canonical_request)}"
+
+
+def _xml_texts(content: bytes, tag: str) -> list[str]:
+    root = ElementTree.fromstring(content)
+    return [element.text or "" for element in root.iterfind(f".//{{*}}{tag}")]
+
+
+def _read_range(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as fh:
+        return os.pread(fh.fileno(), length, offset)
+
+
+class S3StorageProvider(RemoteStorageProvider):
+    """Storage provider backed by an S3-compatible object store."""
+
+    provider_name = "s3"
+    ref_scheme = "s3://"
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        base_prefix: str = "",
+        company_id: Optional[int] = None,
+        public_endpoint_url: Optional[str] = None,
+    ) -> None:
+        """
+        Initialise provider.
+
+        Args:
+            endpoint_url: S3 API endpoint (``https://s3.example.com``).
+            bucket: Bucket name (path-style addressing).
+            access_key: Access key id.
+            secret_key: Secret access key.
+            region: Signing region (MinIO accepts the default).
+            base_prefix: Key prefix of this company inside the bucket.
+            company_id: Owning company, for storage usage accounting.
+            public_endpoint_url: Endpoint used in presigned URLs when clients
+                reach the storage under another address.
+        """
+        self._endpoint = endpoint_url.rstrip("/")
+        self._public_endpoint = (public_endpoint_url or endpoint_url).rstrip("/")
+        self._bucket = bucket
+        self._base_prefix = base_prefix.strip("/")
+        self.company_id = company_id
+        self._signer = SigV4Signer(access_key, secret_key, region)
+
+    # ------------------------------------------------------------------
+    # Internal helpers
+    # ------------------------------------------------------------------
+
+    def _key(self, relative_path: str) -> str:
+        relative_path = relative_path.replace("\\", "/").lstrip("/")
+        return f"{self._base_prefix}/{relative_path}" if self._base_prefix else relative_path
+
+    def _url(self, key: str = "", public: bool = False) -> str:
+        endpoint = self._public_endpoint if public else self._endpoint
+        if not key:
+            return f"{endpoint}/{self._bucket}"
+        return f"{endpoint}/{self._bucket}/{_uri_quote(key, safe='/-_.~')}"
+
+    def _signed(self, method: str, key: str, query: str, content: bytes, headers: Optional[dict] = None):
+        url = self._url(key)
+        payload_hash = hashlib.sha256(content).hexdigest()
+        signed = self._signer.sign(method, url, query, headers or {}, payload_hash)
+        return (f"{url}?{query}" if query else url), signed
+
+    async def _request(
+        self,
+        method: str,
+        key: str = "",
+        params: Optional[Dict[str, str]] = None,
+        content: bytes = b"",
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        url, signed = self._signed(method, key, self._signer.canonical_query(params), content, headers)
+        kwargs: Dict[str, Any] = {"content": content, "headers": signed}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return await get_http_client().request(method, url, **kwargs)
+
+    def _record_saved(self, relative_path: str, size: int) -> None:
+        from app.services.storage_usage_service import storage_usage
+
+        storage_usage.record_saved(relative_path, size, company_id=self.company_id)
+
+    async def _put_object(self, key: str, content: bytes) -> None:
+        resp = await self._request(
+            "PUT", key, content=content,
+            headers={"Content-Type": "application/octet-stream"}, timeout=_UPLOAD_TIMEOUT,
+        )
+        resp.raise_for_status()
+        S3_UPLOADS.labels(mode="single").inc()
+
+    async def _multipart_upload(self, source_path: str, key: str, size: int) -> None:
+        """Upload *source_path* in parts, ``S3_MULTIPART_CONCURRENCY`` at a time."""
+        resp = await self._request("POST", key, {"uploads": ""})
+        resp.raise_for_status()
+        upload_id = _xml_texts(resp.content, "UploadId")[0]
+        part_size = max(settings.S3_MULTIPART_PART_SIZE, _MIN_PART_SIZE)
+        semaphore = asyncio.Semaphore(settings.S3_MULTIPART_CONCURRENCY)
+
+        async def _upload_part(number: int, offset: int) -> tuple[int, str]:
+            async with semaphore:
+                data = await asyncio.to_thread(_read_range, source_path, offset, min(part_size, size - offset))
+                part = await self._request(
+                    "PUT", key, {"partNumber": str(number), "uploadId": upload_id},
+                    content=data, timeout=_UPLOAD_TIMEOUT,
+                )
+                part.raise_for_status()
+                return number, part.headers["etag"]
+
+        tasks = [
+            asyncio.ensure_future(_upload_part(number, offset))
+            for number, offset in enumerate(range(0, size, part_size), start=1)
+        ]
+        try:
+            etags = await asyncio.gather(*tasks)
+            body = "<CompleteMultipartUpload>{}</CompleteMultipartUpload>".format("".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{escape(etag)}</ETag></Part>"
+                for number, etag in sorted(etags)
+            ))
+            done = await self._request("POST", key, {"uploadId": upload_id}, content=body.encode())
+            done.raise_for_status()
+            if b"<Error>" in done.content:  # S3 may report a failed completion with 200
+                raise RuntimeError(f"multipart completion failed: {done.text[:200]}")
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            try:
+                await self._request("DELETE", key, {"uploadId": upload_id})
+            except Exception as exc:
+                logger.warning("s3_multipart_abort_failed", key=key, error=str(exc))
+            raise
+        S3_UPLOADS.labels(mode="multipart").inc()
+        logger.info("s3_multipart_uploaded", key=key, parts=len(tasks), size=size)
+
+    # ------------------------------------------------------------------
+    # StorageProvider interface
+    # ------------------------------------------------------------------
+
+    async def save_file(self, source_path: str, destination_path: str) -> str:
+        """Upload a local file (multipart above the threshold)."""
+        key = self._key(destination_path)
+        size = os.path.getsize(source_path)
+        if size >= settings.S3_MULTIPART_THRESHOLD:
+            await self._multipart_upload(source_path, key, size)
+        else:
+            await self._put_object(key, await asyncio.to_thread(Path(source_path).read_bytes))
+        self._record_saved(destination_path, size)
+        logger.info("s3_file_uploaded", key=key, size=size)
+        return self.ref(destination_path)
+
+    async def save_file_bytes(self, content: bytes, destination_path: str) -> str:
+        """Upload raw bytes (QR code, thumbnail, etc.)."""
+        await self._put_object(self._key(destination_path), content)
+        self._record_saved(destination_path, len(content))
+        return self.ref(destination_path)
+
+    async def get_file(self, storage_path: str, local_path: str) -> bool:
+        """Download an object to a local path."""
+        key = self._key(storage_path)
+        url, signed = self._signed("GET", key, "", b"")
+        try:
+            async with get_http_client().stream("GET", url, headers=signed, timeout=_UPLOAD_TIMEOUT) as resp:
+                resp.raise_for_status()
+                async with aiofiles.open(local_path, "wb") as fh:
+                    async for chunk in resp.aiter_bytes(256 * 1024):
+                        await fh.write(chunk)
+            return True
+        except Exception as exc:
+            logger.error("s3_file_download_failed", key=key, error=str(exc))
+            return False
+
+    async def delete_file(self, storage_path: str) -> bool:
+        """Delete an object, or every object below a "folder" prefix."""
+        from app.services.storage_usage_service import storage_usage
+
+        key = self._key(storage_path)
+        try:
+            head = await self._request("HEAD", key)
+            if head.status_code == 200:
+                resp = await self._request("DELETE", key)
+                resp.raise_for_status()
+                storage_usage.record_deleted(
+                    storage_path, int(head.headers.get("content-length", 0)), company_id=self.company_id
+                )
+                return True
+
+            removed = [item async for item in self.iter_files(storage_path)]
+            if not removed:
+                return False
+            semaphore = asyncio.Semaphore(_DELETE_CONCURRENCY)
+
+            async def _delete(relative: str) -> None:
+                async with semaphore:
+                    (await self._request("DELETE", self._key(relative))).raise_for_status()
+
+            await asyncio.gather(*(_delete(relative) for relative, _size in removed))
+            storage_usage.record_tree_deleted(removed, company_id=self.company_id)
+            logger.info("s3_prefix_deleted", prefix=key, objects=len(removed))
+            return True
+        except Exception as exc:
+            logger.error("s3_file_delete_failed", key=key, error=str(exc))
+            return False
+
+    async def file_exists(self, storage_path: str) -> bool:
+        try:
+            return (await self._request("HEAD", self._key(storage_path))).status_code == 200
+        except Exception:
+            return False
+
+    async def get_file_info(self, storage_path: str) -> Optional[Dict[str, Any]]:
+        """``size``/``md5`` (ETag)/``modified`` of an object; ``None`` if missing."""
+        resp = await self._request("HEAD", self._key(storage_path))
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return {
+            "type": "file",
+            "size": int(resp.headers.get("content-length", 0)),
+            "md5": resp.headers.get("etag", "").strip('"'),
+            "modified": resp.headers.get("last-modified"),
+        }
+
+    def get_public_url(self, storage_path: str) -> str:
+        """Return internal ``s3://`` reference (presigned at serve-time)."""
+        return self.ref(storage_path)
+
+    def presigned_url(self, storage_path: str, expires: Optional[int] = None) -> str:
+        """Presigned GET URL, computed locally."""
+        return self._signer.presign(
+            "GET",
+            self._url(self._key(storage_path), public=True),
+            expires or settings.S3_PRESIGN_EXPIRES_SECONDS,
+        )
+
+    async def get_download_url(self, storage_path: str) -> Optional[str]:
+        return self.presigned_url(storage_path)
+
+    async def iter_files(self, relative_path: str = "", max_depth: int = 10) -> AsyncIterator[tuple[str, int]]:
+        """Yield ``(relative path, size)`` for every object below a prefix.
+
+        Paths are relative to ``base_prefix``, like the ``s3://`` references.
+        """
+        root = f"{self._base_prefix}/" if self._base_prefix else ""
+        prefix = self._key(relative_path).rstrip("/") + "/" if relative_path.strip("/") else root
+        params = {"list-type": "2", "prefix": prefix, "max-keys": "1000"}
+        while True:
+            resp = await self._request("GET", "", params)
+            resp.raise_for_status()
+            tree = ElementTree.fromstring(resp.content)
+            for item in tree.iterfind("{*}Contents"):
+                key = item.findtext("{*}Key") or ""
+                if key.endswith("/") or key[len(prefix):].count("/") > max_depth:
+                    continue
+                yield key[len(root):], int(item.findtext("{*}Size") or 0)
+            token = tree.findtext("{*}NextContinuationToken")
+            if (tree.findtext("{*}IsTruncated") or "").lower() != "true" or not token:
+                break
+            params = {**params, "continuation-token": token}
+
+    async def get_usage_stats(self, path: str = "") -> Dict[str, Any]:
+        """Size of the company's objects (S3 has no quota)."""
+        try:
+            total = 0
+            count = 0
+            async for _relative, size in self.iter_files(path):
+                total += size
+                count += 1
+            return {
+                "total_files": count,
+                "total_size_bytes": total,
+                "total_size_mb": round(total / (1024 * 1024), 2),
+                "used_bytes": total,
+                "path": self._key(path),
+                "provider": "s3",
+                "exists": True,
+            }
+        except Exception as exc:
+            logger.error("s3_usage_stats_failed", error=str(exc))
+            return {"total_files": 0, "total_size_bytes": 0, "used_bytes": 0, "provider": "s3", "exists": False}
@@ -4,20 +4,34 @@ The scheduler is started during application startup and reads its
 configuration from the ``backup`` section of system settings.  When
 backup settings are changed via the admin panel the schedule is
 re-applied at runtime without restarting the application.
+
+It also runs fixed-interval housekeeping (expired resumable uploads,
+storage usage flush and reconciliation, storage GC, temp file sweep).
 """
 
 from __future__ import annotations
 
+from datetime import datetime, timedelta
+
 import structlog
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
+from app.core.config import settings
 from app.core.database import AsyncSessionLocal
 from app.services.settings_service import SettingsService
 
 logger = structlog.get_logger()
 
 _JOB_ID = "db_backup"
+_UPLOAD_CLEANUP_JOB_ID = "resumable_upload_cleanup"
+_USAGE_FLUSH_JOB_ID = "storage_usage_flush"
+_USAGE_RECONCILE_JOB_ID = "storage_usage_reconcile"
+_STORAGE_GC_JOB_ID = "storage_gc"
+_TEMP_CLEANUP_JOB_ID = "temp_file_cleanup"
+# A job lease ends this long before the next run, so whichever worker fires first takes it again
+_LEASE_MARGIN_SECONDS = 300
 
 scheduler = AsyncIOScheduler()
 
@@ -66,6 +80,10 @@ async def init_scheduler() -> None:
         else:
             logger.info("backup_scheduler_skipped", reason="disabled_or_no_company")
 
+        _add_upload_cleanup_job()
+        _add_storage_usage_jobs()
+        _add_storage_gc_jobs()
+
         scheduler.start()
         logger.info("scheduler_started")
     except Exception as exc:
@@ -106,3 +124,82 @@ def _add_or_replace_job(cron_expression: str) -> None:
             name="Database Backup",
             replace_existing=True,
         )
+
+
+def _add_upload_cleanup_job() -> None:
+    """Expire abandoned resumable uploads every ``RESUMABLE_UPLOAD_CLEANUP_MINUTES``."""
+    from app.services.resumable_upload_service import expire_stale_uploads
+
+    scheduler.add_job(
+        expire_stale_uploads,
+        trigger=IntervalTrigger(minutes=settings.RESUMABLE_UPLOAD_CLEANUP_MINUTES),
+        id=_UPLOAD_CLEANUP_JOB_ID,
+        name="Resumable upload cleanup",
+        replace_existing=True,
+    )
+
+
+def _lease_seconds(hours: int) -> float:
+    """Lease time of a job running every *hours* (see ``job_lease_service``)."""
+    return max(hours * 3600 - _LEASE_MARGIN_SECONDS, _LEASE_MARGIN_SECONDS)
+
+
+def _add_storage_usage_jobs() -> None:
+    """Flush usage deltas often; rebuild the table from a full scan rarely.
+
+    Every worker flushes its own deltas; the reconciliation runs in the one
+    worker that takes its lease.  The first reconciliation runs shortly
+    after startup when the table is still empty (fresh install or right
+    after the migration).
+    """
+    from app.services.job_lease_service import leased
+    from app.services.storage_usage_service import storage_usage
+
+    scheduler.add_job(
+        storage_usage.flush,
+        trigger=IntervalTrigger(seconds=settings.STORAGE_USAGE_FLUSH_SECONDS),
+        id=_USAGE_FLUSH_JOB_ID,
+        name="Storage usage flush",
+        replace_existing=True,
+    )
+    reconcile_options = {}
+    if not storage_usage.summary()["file_count"]:
+        reconcile_options["next_run_time"] = datetime.now() + timedelta(minutes=1)
+    scheduler.add_job(
+        leased(_USAGE_RECONCILE_JOB_ID, _lease_seconds(settings.STORAGE_USAGE_RECONCILE_HOURS))(
+            storage_usage.reconcile
+        ),
+        trigger=IntervalTrigger(hours=settings.STORAGE_USAGE_RECONCILE_HOURS),
+        id=_USAGE_RECONCILE_JOB_ID,
+        name="Storage usage reconciliation",
+        replace_existing=True,
+        max_instances=1,
+        **reconcile_options,
+    )
+
+
+def _add_storage_gc_jobs() -> None:
+    """Collect unreferenced storage daily and sweep app temp files hourly.
+
+    Like the usage reconciliation, the collection runs in the one worker
+    holding its lease.
+    """
+    from app.background_tasks.storage_tasks import cleanup_app_temp_files
+    from app.services.job_lease_service import leased
+    from app.services.storage_gc_service import storage_gc
+
+    scheduler.add_job(
+        leased(_STORAGE_GC_JOB_ID, _lease_seconds(settings.STORAGE_GC_INTERVAL_HOURS))(storage_gc.run),
+        trigger=IntervalTrigger(hours=settings.STORAGE_GC_INTERVAL_HOURS),
+        id=_STORAGE_GC_JOB_ID,
+        name="Storage garbage collection",
+        replace_existing=True,
+        max_instances=1,
+    )
+    scheduler.add_job(
+        cleanup_app_temp_files,
+        trigger=IntervalTrigger(hours=1),
+        id=_TEMP_CLEANUP_JOB_ID,
+        name="Temp file cleanup",
+        replace_existing=True,
+    )
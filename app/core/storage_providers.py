@@ -6,19 +6,30 @@ currently supporting local file system storage with the ability to
 extend to other providers in the future.
 """
 
+import asyncio
 import shutil
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Any, AsyncIterator, Dict, Optional
 import structlog
+from prometheus_client import Counter
 
 from app.core.config import settings
 
 logger = structlog.get_logger()
 
+COMPANY_PROVIDER_CACHE = Counter(
+    "storage_company_provider_cache_total",
+    "Per-company storage provider lookups by cache outcome",
+    ["result"],
+)
+
 
 class StorageProvider(ABC):
     """Abstract base class for storage providers."""
+
+    # Value stored in ``Company.storage_provider`` / ``MediaBlob.storage_provider``
+    provider_name = "local"
     
     @abstractmethod
     async def save_file(self, source_path: str, destination_path: str) -> str:
@@ -101,6 +112,59 @@ class StorageProvider(ABC):
         pass
 
 
+class RemoteStorageProvider(StorageProvider):
+    """Provider whose files live off this host (Yandex Disk, S3).
+
+    Stored paths are ``{ref_scheme}{relative path}`` references, resolved to
+    a download URL at serve time.  Uploads always go through a local staging
+    file first (see ``media_blob_service``).
+    """
+
+    ref_scheme = ""
+
+    def ref(self, relative_path: str) -> str:
+        """Stable reference stored in the DB for *relative_path*."""
+        return f"{self.ref_scheme}{relative_path.replace(chr(92), '/').lstrip('/')}"
+
+    def owns_ref(self, value: Optional[str]) -> bool:
+        return bool(value) and str(value).startswith(self.ref_scheme)
+
+    def relative_path(self, ref: str) -> str:
+        """Relative path of a reference produced by :meth:`ref`."""
+        return ref[len(self.ref_scheme):] if ref.startswith(self.ref_scheme) else ref
+
+    @abstractmethod
+    async def save_file_bytes(self, content: bytes, destination_path: str) -> str:
+        """Store *content* at *destination_path*; returns the reference."""
+
+    @abstractmethod
+    async def get_download_url(self, storage_path: str) -> Optional[str]:
+        """Temporary URL a browser or the AR app can download the file from."""
+
+    @abstractmethod
+    def iter_files(self, relative_path: str = "", max_depth: int = 10) -> AsyncIterator[tuple[str, int]]:
+        """Yield ``(relative path, size)`` for every file below a folder."""
+
+    @abstractmethod
+    async def get_file_info(self, storage_path: str) -> Optional[Dict[str, Any]]:
+        """``size``/``md5``/``modified`` of a file; ``None`` if it does not exist."""
+
+
+# Reference prefix → ``storage_provider`` value of remote providers
+REMOTE_REF_SCHEMES = {"yadisk://": "yandex_disk", "s3://": "s3"}
+
+
+def split_remote_ref(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """``(provider_name, relative path)`` of a remote reference, else ``None``."""
+    if not value:
+        return None
+    value = str(value)
+    for scheme, name in REMOTE_REF_SCHEMES.items():
+        if value.startswith(scheme):
+            return name, value[len(scheme):]
+    return None
+
+
 class LocalStorageProvider(StorageProvider):
     """Local file system storage provider."""
     
@@ -138,9 +202,11 @@ class LocalStorageProvider(StorageProvider):
         
         # Create destination directory if needed
         destination.parent.mkdir(parents=True, exist_ok=True)
+        previous_size = destination.stat().st_size if destination.is_file() else None
         
         # Copy file
         shutil.copy2(source, destination)
+        _usage().record_saved(destination_path, destination.stat().st_size, previous_size)
         
         logger.info("file_saved_to_local_storage", 
                    source_path=str(source),
@@ -176,10 +242,14 @@ class LocalStorageProvider(StorageProvider):
             return False
         
         try:
+            from app.services.storage_usage_service import local_tree_files
+
+            removed = local_tree_files(file_path)
             if file_path.is_file():
                 file_path.unlink()
             elif file_path.is_dir():
                 shutil.rmtree(file_path)
+            _usage().record_tree_deleted(removed)
             
             logger.info("file_deleted_from_local_storage", storage_path=storage_path)
             return True
@@ -205,7 +275,11 @@ class LocalStorageProvider(StorageProvider):
         return f"/storage/{storage_path}"
     
     async def get_usage_stats(self, path: str = "") -> Dict[str, Any]:
-        """Get storage usage statistics for local storage."""
+        """Get storage usage statistics for local storage.
+
+        The whole storage is answered from the ``storage_usage`` accounting;
+        only a sub-path is measured on disk (in a worker thread).
+        """
         target_path = self._get_full_path(path)
         
         if not target_path.exists():
@@ -217,17 +291,16 @@ class LocalStorageProvider(StorageProvider):
                 "exists": False
             }
         
-        total_size = 0
-        file_count = 0
-        
-        if target_path.is_file():
-            total_size = target_path.stat().st_size
-            file_count = 1
+        if path.strip("/"):
+            from app.services.storage_usage_service import local_tree_files
+
+            files = await asyncio.to_thread(local_tree_files, target_path)
+            total_size = sum(size for _, size in files)
+            file_count = len(files)
         else:
-            for item in target_path.rglob("*"):
-                if item.is_file():
-                    total_size += item.stat().st_size
-                    file_count += 1
+            summary = _usage().summary()
+            total_size = summary["total_bytes"]
+            file_count = summary["file_count"]
         
         return {
             "total_files": file_count,
@@ -238,6 +311,13 @@ class LocalStorageProvider(StorageProvider):
         }
 
 
+def _usage():
+    """The process-wide usage tracker (imported lazily: services import this module)."""
+    from app.services.storage_usage_service import storage_usage
+
+    return storage_usage
+
+
 # Global storage provider instance
 _storage_provider: Optional[StorageProvider] = None
 
@@ -262,6 +342,31 @@ def reset_storage_provider() -> None:
     """Reset the global storage provider instance (for testing)."""
     global _storage_provider
     _storage_provider = None
+    _company_providers.clear()
+
+
+# company_id → (fingerprint, provider).  Building a Yandex Disk provider
+# Fernet-decrypts the token, and the viewer/proxy/uploads resolve it on
+# every request; the fingerprint makes a changed token or storage setting
+# (including one saved by another worker) miss the cache.
+_company_providers: Dict[int, tuple[tuple, StorageProvider]] = {}
+
+
+def _company_fingerprint(company) -> tuple:
+    return (
+        getattr(company, "storage_provider", "local"),
+        getattr(company, "yandex_disk_token", None),
+        getattr(company, "slug", None),
+        getattr(company, "name", None),
+    )
+
+
+def invalidate_company_provider(company_id: Optional[int] = None) -> None:
+    """Forget the cached provider of *company_id* (all companies if ``None``)."""
+    if company_id is None:
+        _company_providers.clear()
+    else:
+        _company_providers.pop(company_id, None)
 
 
 async def get_provider_for_company(company) -> StorageProvider:
@@ -269,8 +374,11 @@ async def get_provider_for_company(company) -> StorageProvider:
     Resolve the correct storage provider for a given company.
 
     For companies with ``storage_provider == 'yandex_disk'`` and a valid token,
-    returns a :class:`YandexDiskStorageProvider`.  Otherwise falls back to
-    the default local provider.
+    returns a :class:`YandexDiskStorageProvider`, cached per company until
+    the token or storage settings change.  ``storage_provider == 's3'``
+    returns an :class:`S3StorageProvider` on the configured bucket (key
+    prefix = company slug) when ``S3_ENDPOINT_URL`` is set.  Otherwise falls
+    back to the default local provider.
 
     Args:
         company: A :class:`Company` SQLAlchemy model instance.
@@ -282,6 +390,14 @@ async def get_provider_for_company(company) -> StorageProvider:
         getattr(company, "storage_provider", "local") == "yandex_disk"
         and getattr(company, "yandex_disk_token", None)
     ):
+        company_id = getattr(company, "id", None)
+        fingerprint = _company_fingerprint(company)
+        cached = _company_providers.get(company_id) if company_id is not None else None
+        if cached is not None and cached[0] == fingerprint:
+            COMPANY_PROVIDER_CACHE.labels(result="hit").inc()
+            return cached[1]
+        COMPANY_PROVIDER_CACHE.labels(result="miss").inc()
+
         from app.utils.token_encryption import token_encryption
         from app.core.yandex_disk_provider import YandexDiskStorageProvider
 
@@ -290,10 +406,41 @@ async def get_provider_for_company(company) -> StorageProvider:
         if oauth_token:
             # Use company slug as the root folder on Yandex Disk
             folder_name = getattr(company, "slug", None) or getattr(company, "name", "VertexAR")
-            return YandexDiskStorageProvider(oauth_token=oauth_token, base_prefix=folder_name)
+            provider = YandexDiskStorageProvider(
+                oauth_token=oauth_token, base_prefix=folder_name, company_id=company_id
+            )
+            if company_id is not None:
+                _company_providers[company_id] = (fingerprint, provider)
+            return provider
         logger.warning(
             "yd_token_missing_after_decrypt",
             company_id=company.id,
         )
 
+    if getattr(company, "storage_provider", "local") == "s3" and settings.S3_ENDPOINT_URL:
+        company_id = getattr(company, "id", None)
+        fingerprint = _company_fingerprint(company)
+        cached = _company_providers.get(company_id) if company_id is not None else None
+        if cached is not None and cached[0] == fingerprint:
+            COMPANY_PROVIDER_CACHE.labels(result="hit").inc()
+            return cached[1]
+        COMPANY_PROVIDER_CACHE.labels(result="miss").inc()
+
+        from app.core.s3_provider import S3StorageProvider
+
+        provider = S3StorageProvider(
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            bucket=settings.S3_BUCKET,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+            base_prefix=getattr(company, "slug", None) or f"company_{company_id}",
+            company_id=company_id,
+            public_endpoint_url=settings.S3_PUBLIC_ENDPOINT_URL or None,
+        )
+        if company_id is not None:
+            _company_providers[company_id] = (fingerprint, provider)
+        return provider
+
+    _company_providers.pop(getattr(company, "id", None), None)
     return get_storage_provider()
\ No newline at end of file
@@ -4,38 +4,107 @@ Yandex Disk storage provider for V-Portal platform.
 Implements the StorageProvider interface using the Yandex Disk REST API
 (https://yandex.ru/dev/disk-api/doc/ru/).
 Files are stored under ``app:/{base_prefix}/…`` in the application folder.
+All requests go through the shared pooled client (``app.core.http_client``).
 """
 
 from __future__ import annotations
 
+import asyncio
+import os
+import time
+from collections import OrderedDict
 from pathlib import PurePosixPath
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
-import httpx
+import aiofiles
 import structlog
+from prometheus_client import Counter
 
-from app.core.storage_providers import StorageProvider
+from app.core.config import settings
+from app.core.http_client import get_http_client
+from app.core.storage_providers import RemoteStorageProvider
 
 logger = structlog.get_logger()
 
 _DISK_API = "https://cloud-api.yandex.net/v1/disk"
-_DEFAULT_TIMEOUT = 60.0
 _UPLOAD_TIMEOUT = 600.0  # 10 min for large video uploads
+_CHUNK_SIZE = 256 * 1024
 
+YD_MKDIR_REQUESTS = Counter(
+    "yd_mkdir_requests_total",
+    "Directory creation requests sent to Yandex Disk",
+)
 
-class YandexDiskStorageProvider(StorageProvider):
+
+async def _file_chunks(path: str) -> AsyncIterator[bytes]:
+    async with aiofiles.open(path, "rb") as fh:
+        while chunk := await fh.read(_CHUNK_SIZE):
+            yield chunk
+
+
+class KnownDirectories:
+    """Process-wide TTL set of remote folders known to exist.
+
+    Keys are ``(oauth_token, disk_path)``: two companies may share folder
+    names but never a Disk.  Entries expire after
+    ``YD_DIRECTORY_CACHE_TTL_SECONDS`` (a folder deleted in the Disk UI is
+    then noticed by the next upload's 409 anyway) and the oldest are dropped
+    beyond ``YD_DIRECTORY_CACHE_MAX_ENTRIES``.
+    """
+
+    def __init__(self) -> None:
+        self._entries: OrderedDict[tuple[str, str], float] = OrderedDict()
+
+    def __contains__(self, key: tuple[str, str]) -> bool:
+        expires = self._entries.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False
+        return True
+
+    def add(self, key: tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = time.monotonic() + settings.YD_DIRECTORY_CACHE_TTL_SECONDS
+        while len(self._entries) > settings.YD_DIRECTORY_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+
+    def discard_tree(self, token: str, disk_path: str) -> None:
+        """Forget *disk_path* and everything below it (folder deleted)."""
+        prefix = disk_path.rstrip("/") + "/"
+        for key in [k for k in self._entries if k[0] == token and (k[1] == disk_path or k[1].startswith(prefix))]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+known_directories = KnownDirectories()
+_mkdir_inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+
+class YandexDiskStorageProvider(RemoteStorageProvider):
     """Storage provider backed by Yandex Disk REST API."""
 
-    def __init__(self, oauth_token: str, base_prefix: str = "VertexAR") -> None:
+    provider_name = "yandex_disk"
+    ref_scheme = "yadisk://"
+
+    def __init__(self, oauth_token: str, base_prefix: str = "VertexAR", company_id: Optional[int] = None) -> None:
         """
         Initialise provider.
 
         Args:
             oauth_token: Yandex OAuth bearer token.
             base_prefix: Root folder name inside the app folder on Disk.
+            company_id: Owning company, for storage usage accounting.
         """
         self._token = oauth_token
         self._base_prefix = base_prefix
+        self.company_id = company_id
         self._headers = {"Authorization": f"OAuth {self._token}"}
 
     # ------------------------------------------------------------------
@@ -47,27 +116,92 @@ class YandexDiskStorageProvider(StorageProvider):
         relative_path = relative_path.replace("\\", "/").lstrip("/")
         return f"app:/{self._base_prefix}/{relative_path}"
 
+    def _record_saved(self, relative_path: str, size: int) -> None:
+        from app.services.storage_usage_service import storage_usage
+
+        storage_usage.record_saved(relative_path, size, company_id=self.company_id)
+        self._invalidate_listing(self._disk_path(relative_path))
+        self._invalidate_cached_file(relative_path)
+
+    def _invalidate_listing(self, disk_path: str) -> None:
+        """The cached listing of the parent folder no longer matches the Disk."""
+        from app.services.yandex_disk_metadata_service import yd_metadata
+
+        yd_metadata.invalidate(self._token, str(PurePosixPath(disk_path).parent))
+
+    def _invalidate_cached_file(self, relative_path: str) -> None:
+        """Drop the local read-through copy served by ``/api/storage/yd-file``."""
+        if self.company_id is None:
+            return
+        from app.services.yandex_disk_file_cache_service import yd_file_cache
+
+        yd_file_cache.invalidate(self.company_id, relative_path)
+
     async def _ensure_directory(self, disk_path: str) -> None:
-        """Recursively create directories on Disk (mkdir -p equivalent)."""
+        """Recursively create directories on Disk (mkdir -p equivalent).
+
+        Levels already in :data:`known_directories` are skipped; concurrent
+        uploads into the same new folder share one creation.
+        """
+        key = (self._token, disk_path)
+        if key in known_directories:
+            return
+        future = _mkdir_inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._create_directories(disk_path))
+            _mkdir_inflight[key] = future
+            future.add_done_callback(lambda _f: _mkdir_inflight.pop(key, None))
+        await asyncio.shield(future)
+
+    async def _create_directories(self, disk_path: str) -> None:
         parts = PurePosixPath(disk_path).parts
         # ``parts`` for ``app:/VertexAR/slug/001`` → ('app:', 'VertexAR', 'slug', '001')
         # Начинаем с i=2, т.к. "app:" — корень YD, его нельзя создать через mkdir
+        client = get_http_client()
         for i in range(2, len(parts) + 1):
             folder = "/".join(parts[:i])
-            async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-                resp = await client.put(
-                    f"{_DISK_API}/resources",
-                    params={"path": folder},
-                    headers=self._headers,
+            if (self._token, folder) in known_directories:
+                continue
+            YD_MKDIR_REQUESTS.inc()
+            resp = await client.put(
+                f"{_DISK_API}/resources",
+                params={"path": folder},
+                headers=self._headers,
+            )
+            # 201 — created, 409 — already exists
+            if resp.status_code in (201, 409):
+                known_directories.add((self._token, folder))
+            else:
+                logger.warning(
+                    "yd_mkdir_unexpected_status",
+                    path=folder,
+                    status=resp.status_code,
+                    body=resp.text[:300],
                 )
-                # 201 — created, 409 — already exists
-                if resp.status_code not in (201, 409):
-                    logger.warning(
-                        "yd_mkdir_unexpected_status",
-                        path=folder,
-                        status=resp.status_code,
-                        body=resp.text[:300],
-                    )
+
+    async def _upload_href(self, disk_path: str) -> str:
+        """Upload URL for *disk_path*, creating the parent folder only if missing.
+
+        Uploads are tried first: the Disk answers 409 (``DiskPathDoesntExistsError``)
+        or 404 when the parent does not exist, and only then are the folders
+        created and the request repeated once.
+        """
+        client = get_http_client()
+        params = {"path": disk_path, "overwrite": "true"}
+        resp = await client.get(f"{_DISK_API}/resources/upload", params=params, headers=self._headers)
+        parent = str(PurePosixPath(disk_path).parent)
+        if resp.status_code in (404, 409):
+            # Some cached level is stale (deleted in the Disk UI?): the mkdir
+            # endpoint also answers 409 when an ancestor is missing, so
+            # recreate the whole chain rather than trusting the cache
+            parts = PurePosixPath(parent).parts
+            for i in range(2, len(parts) + 1):
+                known_directories.discard((self._token, "/".join(parts[:i])))
+            await self._ensure_directory(parent)
+            resp = await client.get(f"{_DISK_API}/resources/upload", params=params, headers=self._headers)
+        resp.raise_for_status()
+        known_directories.add((self._token, parent))
+        return resp.json()["href"]
 
     # ------------------------------------------------------------------
     # StorageProvider interface
@@ -76,79 +210,63 @@ class YandexDiskStorageProvider(StorageProvider):
     async def save_file(self, source_path: str, destination_path: str) -> str:
         """Upload a local file to Yandex Disk."""
         disk_path = self._disk_path(destination_path)
-        parent = str(PurePosixPath(disk_path).parent)
-        await self._ensure_directory(parent)
-
-        async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-            # Step 1: get upload URL
-            resp = await client.get(
-                f"{_DISK_API}/resources/upload",
-                params={"path": disk_path, "overwrite": "true"},
-                headers=self._headers,
-            )
-            resp.raise_for_status()
-            upload_url = resp.json()["href"]
-
-            # Step 2: PUT the file
-            with open(source_path, "rb") as fh:
-                data = fh.read()
-            upload_resp = await client.put(
-                upload_url,
-                content=data,
-                headers={"Content-Type": "application/octet-stream"},
-                timeout=_UPLOAD_TIMEOUT,
-            )
-            upload_resp.raise_for_status()
+        client = get_http_client()
+        # Step 1: get upload URL
+        upload_url = await self._upload_href(disk_path)
+
+        # Step 2: PUT the file, streamed from disk
+        size = os.path.getsize(source_path)
+        upload_resp = await client.put(
+            upload_url,
+            content=_file_chunks(source_path),
+            headers={"Content-Type": "application/octet-stream", "Content-Length": str(size)},
+            timeout=_UPLOAD_TIMEOUT,
+        )
+        upload_resp.raise_for_status()
+        self._record_saved(destination_path, size)
 
         logger.info("yd_file_uploaded", disk_path=disk_path)
         # Return an internal reference; resolved at serve-time.
-        return f"yadisk://{destination_path.replace(chr(92), '/').lstrip('/')}"
+        return self.ref(destination_path)
 
     async def save_file_bytes(self, content: bytes, destination_path: str) -> str:
         """Upload raw bytes (QR code, thumbnail, etc.) to Yandex Disk."""
         disk_path = self._disk_path(destination_path)
-        parent = str(PurePosixPath(disk_path).parent)
-        await self._ensure_directory(parent)
-
-        async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-            resp = await client.get(
-                f"{_DISK_API}/resources/upload",
-                params={"path": disk_path, "overwrite": "true"},
-                headers=self._headers,
-            )
-            resp.raise_for_status()
-            upload_url = resp.json()["href"]
-
-            upload_resp = await client.put(
-                upload_url,
-                content=content,
-                headers={"Content-Type": "application/octet-stream"},
-                timeout=_UPLOAD_TIMEOUT,
-            )
-            upload_resp.raise_for_status()
+        client = get_http_client()
+        upload_url = await self._upload_href(disk_path)
+
+        upload_resp = await client.put(
+            upload_url,
+            content=content,
+            headers={"Content-Type": "application/octet-stream"},
+            timeout=_UPLOAD_TIMEOUT,
+        )
+        upload_resp.raise_for_status()
+        self._record_saved(destination_path, len(content))
 
         logger.info("yd_bytes_uploaded", disk_path=disk_path)
-        return f"yadisk://{destination_path.replace(chr(92), '/').lstrip('/')}"
+        return self.ref(destination_path)
 
     async def get_file(self, storage_path: str, local_path: str) -> bool:
         """Download a file from Yandex Disk to a local path."""
         disk_path = self._disk_path(storage_path)
         try:
-            async with httpx.AsyncClient(timeout=_UPLOAD_TIMEOUT) as client:
-                resp = await client.get(
-                    f"{_DISK_API}/resources/download",
-                    params={"path": disk_path},
-                    headers=self._headers,
-                )
-                resp.raise_for_status()
-                download_url = resp.json()["href"]
+            client = get_http_client()
+            resp = await client.get(
+                f"{_DISK_API}/resources/download",
+                params={"path": disk_path},
+                headers=self._headers,
+            )
+            resp.raise_for_status()
+            download_url = resp.json()["href"]
 
-                dl_resp = await client.get(download_url, follow_redirects=True)
+            async with client.stream(
+                "GET", download_url, follow_redirects=True, timeout=_UPLOAD_TIMEOUT
+            ) as dl_resp:
                 dl_resp.raise_for_status()
-
-                import aiofiles
                 async with aiofiles.open(local_path, "wb") as fh:
-                    await fh.write(dl_resp.content)
+                    async for chunk in dl_resp.aiter_bytes(_CHUNK_SIZE):
+                        await fh.write(chunk)
 
             logger.info("yd_file_downloaded", disk_path=disk_path, local_path=local_path)
             return True
@@ -160,19 +278,34 @@ class YandexDiskStorageProvider(StorageProvider):
         """Delete a file or folder from Yandex Disk."""
         disk_path = self._disk_path(storage_path)
         try:
-            async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-                resp = await client.delete(
-                    f"{_DISK_API}/resources",
-                    params={"path": disk_path, "permanently": "true"},
-                    headers=self._headers,
-                )
-                if resp.status_code in (202, 204):
-                    logger.info("yd_file_deleted", disk_path=disk_path)
-                    return True
-                if resp.status_code == 404:
-                    return False
-                resp.raise_for_status()
+            client = get_http_client()
+            # Size of a single file for usage accounting; folder deletes are
+            # settled by the reconciliation scan
+            meta = await client.get(
+                f"{_DISK_API}/resources",
+                params={"path": disk_path, "fields": "type,size"},
+                headers=self._headers,
+            )
+            file_size = meta.json().get("size") if meta.status_code == 200 else None
+            resp = await client.delete(
+                f"{_DISK_API}/resources",
+                params={"path": disk_path, "permanently": "true"},
+                headers=self._headers,
+            )
+            if resp.status_code in (202, 204):
+                known_directories.discard_tree(self._token, disk_path)
+                self._invalidate_listing(disk_path)
+                self._invalidate_cached_file(storage_path)
+                if file_size is not None:
+                    from app.services.storage_usage_service import storage_usage
+
+                    storage_usage.record_deleted(storage_path, int(file_size), company_id=self.company_id)
+                logger.info("yd_file_deleted", disk_path=disk_path)
                 return True
+            if resp.status_code == 404:
+                return False
+            resp.raise_for_status()
+            return True
         except Exception as exc:
             logger.error("yd_file_delete_failed", disk_path=disk_path, error=str(exc))
             return False
@@ -181,16 +314,33 @@ class YandexDiskStorageProvider(StorageProvider):
         """Check whether a resource exists on Yandex Disk."""
         disk_path = self._disk_path(storage_path)
         try:
-            async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-                resp = await client.get(
-                    f"{_DISK_API}/resources",
-                    params={"path": disk_path},
-                    headers=self._headers,
-                )
-                return resp.status_code == 200
+            client = get_http_client()
+            resp = await client.get(
+                f"{_DISK_API}/resources",
+                params={"path": disk_path},
+                headers=self._headers,
+            )
+            return resp.status_code == 200
         except Exception:
             return False
 
+    async def get_file_info(self, storage_path: str) -> Optional[Dict[str, Any]]:
+        """``size``/``md5``/``modified`` of a file; ``None`` if it does not exist.
+
+        Other API errors raise ``httpx.HTTPStatusError``.
+        """
+        client = get_http_client()
+        resp = await client.get(
+            f"{_DISK_API}/resources",
+            params={"path": self._disk_path(storage_path), "fields": "type,size,md5,modified"},
+            headers=self._headers,
+        )
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        info = resp.json()
+        return info if info.get("type", "file") == "file" else None
+
     def get_public_url(self, storage_path: str) -> str:
         """Return internal ``yadisk://`` reference (resolved at serve-time)."""
         storage_path = storage_path.replace("\\", "/").lstrip("/")
@@ -204,23 +354,38 @@ class YandexDiskStorageProvider(StorageProvider):
         """
         disk_path = self._disk_path(storage_path)
         try:
-            async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-                resp = await client.get(
-                    f"{_DISK_API}/resources/download",
-                    params={"path": disk_path},
-                    headers=self._headers,
-                )
-                resp.raise_for_status()
-                return resp.json()["href"]
+            client = get_http_client()
+            resp = await client.get(
+                f"{_DISK_API}/resources/download",
+                params={"path": disk_path},
+                headers=self._headers,
+            )
+            resp.raise_for_status()
+            return resp.json()["href"]
         except Exception as exc:
             logger.error("yd_download_url_failed", disk_path=disk_path, error=str(exc))
             return None
 
+    async def iter_files(self, relative_path: str = "", max_depth: int = 10) -> AsyncIterator[tuple[str, int]]:
+        """Yield ``(relative path, size)`` for every file below a folder.
+
+        Listings come from the shared metadata cache and sub-folders are
+        listed concurrently (see ``app.services.yandex_disk_metadata_service``).
+        Paths are relative to ``base_prefix``, like the ``yadisk://``
+        references.
+        """
+        from app.services.yandex_disk_metadata_service import yd_metadata
+
+        root = f"app:/{self._base_prefix}"
+        disk_path = self._disk_path(relative_path) if relative_path else root
+        for path, item in await yd_metadata.walk_files(self._token, disk_path, max_depth=max_depth):
+            yield path[len(root):].lstrip("/"), int(item.get("size", 0) or 0)
+
     async def get_folder_size(self, relative_path: str = "") -> Dict[str, Any]:
         """Calculate total size and file count for a folder on Yandex Disk.
 
-        Recursively traverses the folder tree via the Disk REST API and
-        sums up file sizes.
+        Walks the folder tree through the metadata cache (see
+        :meth:`iter_files`); the storage page reads ``storage_usage`` instead.
 
         Args:
             relative_path: Path relative to base_prefix (empty = root folder).
@@ -228,77 +393,38 @@ class YandexDiskStorageProvider(StorageProvider):
         Returns:
             ``{"total_bytes": int, "file_count": int}``
         """
-        disk_path = self._disk_path(relative_path) if relative_path else f"app:/{self._base_prefix}"
-
-        async def _sum_dir(dir_path: str, client: httpx.AsyncClient, depth: int = 0) -> tuple[int, int]:
-            """Return (total_bytes, file_count) for *dir_path*."""
-            if depth > 10:
-                return 0, 0
-            total = 0
-            count = 0
-            offset = 0
-            limit = 100
-            while True:
-                try:
-                    resp = await client.get(
-                        f"{_DISK_API}/resources",
-                        params={
-                            "path": dir_path,
-                            "limit": limit,
-                            "offset": offset,
-                            "fields": "_embedded.items.type,_embedded.items.size,_embedded.items.path,_embedded.total",
-                        },
-                        headers=self._headers,
-                    )
-                    if resp.status_code != 200:
-                        break
-                    embedded = resp.json().get("_embedded", {})
-                    items = embedded.get("items", [])
-                    for item in items:
-                        if item.get("type") == "file":
-                            total += item.get("size", 0)
-                            count += 1
-                        elif item.get("type") == "dir":
-                            sub_total, sub_count = await _sum_dir(item["path"], client, depth + 1)
-                            total += sub_total
-                            count += sub_count
-                    items_total = embedded.get("total", 0)
-                    offset += limit
-                    if offset >= items_total:
-                        break
-                except Exception:
-                    break
-            return total, count
-
+        total_bytes = 0
+        file_count = 0
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                total_bytes, file_count = await _sum_dir(disk_path, client)
+            async for _path, size in self.iter_files(relative_path):
+                total_bytes += size
+                file_count += 1
             return {"total_bytes": total_bytes, "file_count": file_count}
         except Exception as exc:
-            logger.error("yd_folder_size_failed", path=disk_path, error=str(exc))
+            logger.error("yd_folder_size_failed", path=relative_path, error=str(exc))
             return {"total_bytes": 0, "file_count": 0, "error": str(exc)}
 
     async def get_usage_stats(self, path: str = "") -> Dict[str, Any]:
         """Return Yandex Disk quota information."""
         try:
-            async with httpx.AsyncClient(timeout=_DEFAULT_TIMEOUT) as client:
-                resp = await client.get(
-                    _DISK_API,
-                    headers=self._headers,
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                total = data.get("total_space", 0)
-                used = data.get("used_space", 0)
-                return {
-                    "total_bytes": total,
-                    "used_bytes": used,
-                    "free_bytes": total - used,
-                    "total_mb": round(total / (1024 * 1024), 2),
-                    "used_mb": round(used / (1024 * 1024), 2),
-                    "provider": "yandex_disk",
-                    "exists": True,
-                }
+            client = get_http_client()
+            resp = await client.get(
+                _DISK_API,
+                headers=self._headers,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            total = data.get("total_space", 0)
+            used = data.get("used_space", 0)
+            return {
+                "total_bytes": total,
+                "used_bytes": used,
+                "free_bytes": total - used,
+                "total_mb": round(total / (1024 * 1024), 2),
+                "used_mb": round(used / (1024 * 1024), 2),
+                "provider": "yandex_disk",
+                "exists": True,
+            }
         except Exception as exc:
             logger.error("yd_usage_stats_failed", error=str(exc))
             return {
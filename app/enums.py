@@ -38,3 +38,4 @@ class StorageProviderType(str, Enum):
     """Storage provider type for companies."""
     LOCAL = "local"
     YANDEX_DISK = "yandex_disk"
+    S3 = "s3"
@@ -21,21 +21,24 @@ def datetime_format(env, value, fmt="%d.%m.%Y %H:%M"):
 
 
 def storage_url(url: str, company_id=None) -> str:
-    """Convert ``yadisk://…`` references to admin-proxy URLs.
+    """Convert remote storage references to admin URLs.
 
     Regular (local) URLs are returned as-is.  ``yadisk://relative/path``
     is rewritten to ``/api/storage/yd-file?path=relative/path&company_id=…``
-    so the browser can fetch the file via the streaming proxy.
+    so the browser can fetch the file via the streaming proxy;
+    ``s3://relative/path`` goes to ``/api/storage/s3-file``, which redirects
+    to a presigned URL.
     """
     if not url:
         return url or ""
     url = str(url)
-    if url.startswith("yadisk://"):
-        relative = url[len("yadisk://"):]
-        qs = f"path={quote(relative, safe='/')}"
-        if company_id is not None:
-            qs += f"&company_id={company_id}"
-        return f"/api/storage/yd-file?{qs}"
+    for scheme, endpoint in (("yadisk://", "yd-file"), ("s3://", "s3-file")):
+        if url.startswith(scheme):
+            relative = url[len(scheme):]
+            qs = f"path={quote(relative, safe='/')}"
+            if company_id is not None:
+                qs += f"&company_id={company_id}"
+            return f"/api/storage/{endpoint}?{qs}"
     return url
 
 
@@ -28,6 +28,7 @@ from app.html.utils import require_active_user, serialize_datetime, serialize_ne
 from app.html.filters import storage_url
 from app.core.config import settings
 from app.services.settings_service import SettingsService
+from app.services.image_variant_service import variant_srcset, variant_url
 import structlog
 from datetime import datetime
 from pathlib import Path
@@ -36,27 +37,41 @@ logger = structlog.get_logger()
 
 router = APIRouter()
 
-# URL fields that may contain yadisk:// references
+# URL fields that may contain remote (yadisk:// / s3://) references
 _URL_FIELDS = (
     "photo_url", "video_url", "thumbnail_url",
     "qr_code_url", "marker_url", "preview_url",
+    "animated_preview_url", "sprite_url", "sprite_vtt_url",
 )
 
 
 def _resolve_yadisk_urls(data: dict, company_id=None) -> dict:
-    """Replace ``yadisk://`` references with admin-proxy URLs in-place.
+    """Replace remote storage references with admin URLs in-place.
 
     Converts fields like ``photo_url``, ``video_url``, etc. from the internal
     ``yadisk://relative/path`` format to ``/api/storage/yd-file?path=…&company_id=…``
-    so that browsers can fetch the resources via the streaming proxy endpoint.
+    (and ``s3://…`` to the presigning ``/api/storage/s3-file`` redirect)
+    so that browsers can fetch the resources.  See ``storage_url``.
     """
     for field in _URL_FIELDS:
         value = data.get(field)
-        if value and str(value).startswith("yadisk://"):
+        if value:
             data[field] = storage_url(value, company_id)
     return data
 
 
+def _image_variant_urls(content_id, photo_path) -> dict:
+    """Resized-variant URLs (``/img/…``) for responsive ``<img srcset>``."""
+    if not content_id or not photo_path:
+        return {}
+    content_id = int(content_id)
+    return {
+        "image_src": variant_url(content_id, photo_path, 320),
+        "image_srcset": variant_srcset(content_id, photo_path),
+        "image_large_url": variant_url(content_id, photo_path, 1280, 1280),
+    }
+
+
 def _js_safe_text(value) -> str:
     """Return text safe to embed into JS-driven form data."""
     if not value:
@@ -203,6 +218,9 @@ async def _load_video_details(ar_content_id: int, db: AsyncSession) -> tuple[lis
                 "title": getattr(video, 'filename', ''),
                 "video_url": getattr(video, 'video_url', ''),
                 "preview_url": getattr(video, 'preview_url', None) or getattr(video, 'video_url', ''),
+                "animated_preview_url": getattr(video, 'animated_preview_url', None),
+                "sprite_url": getattr(video, 'sprite_url', None),
+                "sprite_vtt_url": getattr(video, 'sprite_vtt_url', None),
                 "is_active": getattr(video, 'is_active', False),
                 "rotation_type": getattr(video, 'rotation_type', None),
                 "subscription_end": serialize_datetime(getattr(video, 'subscription_end', None)),
@@ -430,6 +448,7 @@ async def ar_content_list(
 
             # Resolve yadisk:// URLs to admin-proxy URLs
             _resolve_yadisk_urls(item_dict, company_id=item_dict.get('company_id'))
+            item_dict.update(_image_variant_urls(ar_content_model.id, ar_content_model.photo_path))
 
             ar_content_list.append(item_dict)
         
@@ -947,6 +966,9 @@ async def ar_content_detail(
             "created_at": serialize_datetime(ar_content.get("created_at")),
             "updated_at": serialize_datetime(ar_content.get("updated_at")),
         }
+        _row = await db.get(ARContent, int(ar_content_id))
+        if _row is not None:
+            ar_content_js.update(_image_variant_urls(_row.id, _row.photo_path))
         
     except Exception as exc:
         if not settings.DEBUG:
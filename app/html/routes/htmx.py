@@ -7,11 +7,10 @@ import base64
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-import qrcode
 
 from app.core.config import settings
 from app.core.redis import redis_client
-from app.utils.ar_content import compose_printable_qr
+from app.utils.ar_content import render_qr_label
 from app.html.deps import get_html_db, CurrentActiveUser
 from app.api.routes.ar_content import (
     get_ar_content_by_id,
@@ -82,19 +81,7 @@ async def get_ar_content_qr_code(
     if cached:
         img_b64 = cached
     else:
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_M,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(public_url)
-        qr.make(fit=True)
-        qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-        qr_img = compose_printable_qr(
-            qr_img,
-            order_number=content_data.get("order_number"),
-        )
+        qr_img = render_qr_label(public_url, order_number=content_data.get("order_number"))
         buf = io.BytesIO()
         qr_img.save(buf, format="PNG")
         buf.seek(0)
@@ -5,7 +5,6 @@ import structlog
 import time
 import traceback
 from pathlib import Path
-from typing import Tuple
 
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
@@ -20,6 +19,7 @@ from app.html.templating import templates
 from app.html.utils import require_active_user
 from app.models.company import Company
 from app.models.project import Project
+from app.services.storage_usage_service import storage_usage
 
 router = APIRouter()
 logger = structlog.get_logger()
@@ -27,16 +27,12 @@ logger = structlog.get_logger()
 _STORAGE_INFO_CACHE_TTL = 60.0
 _STORAGE_INFO_BUILD_TIMEOUT = 4.0
 _STORAGE_INFO_PROVIDER_TIMEOUT = 2.5
-_STORAGE_INFO_LOCAL_SIZE_TIMEOUT = 1.5
 _STORAGE_INFO_PROVIDER_CONCURRENCY = 3
-_YD_FOLDER_CACHE_TTL = 900.0
-_YD_FOLDER_CACHE_TIMEOUT = 12.0
 _STORAGE_INFO_CACHE: dict[str, object] = {
     "value": None,
     "timestamp": 0.0,
     "refresh_task": None,
 }
-_YD_FOLDER_CACHE: dict[int, dict[str, object]] = {}
 
 
 def format_bytes(bytes_value: int) -> str:
@@ -57,46 +53,6 @@ def format_bytes(bytes_value: int) -> str:
         return "0 B"
 
 
-def calculate_directory_size(directory: Path, max_depth: int = 10) -> Tuple[int, int]:
-    """Calculate total size and file count for a directory."""
-    total_size = 0
-    file_count = 0
-
-    if not directory.exists() or not directory.is_dir():
-        return 0, 0
-
-    try:
-        def _calculate_recursive(path: Path, depth: int = 0) -> Tuple[int, int]:
-            if depth > max_depth:
-                return 0, 0
-
-            size = 0
-            count = 0
-
-            try:
-                for item in path.iterdir():
-                    try:
-                        if item.is_file():
-                            size += item.stat().st_size
-                            count += 1
-                        elif item.is_dir():
-                            sub_size, sub_count = _calculate_recursive(item, depth + 1)
-                            size += sub_size
-                            count += sub_count
-                    except (OSError, PermissionError):
-                        continue
-            except (OSError, PermissionError):
-                pass
-
-            return size, count
-
-        total_size, file_count = _calculate_recursive(directory)
-    except (OSError, PermissionError) as e:
-        logger.warning("error_calculating_directory_size", directory=str(directory), error=str(e))
-
-    return total_size, file_count
-
-
 def _default_storage_info() -> dict:
     """Fallback storage payload for error paths."""
     return {
@@ -111,77 +67,6 @@ def _default_storage_info() -> dict:
     }
 
 
-def _get_yd_folder_cache_entry(company_id: int) -> dict[str, object]:
-    """Return the in-memory cache entry for a Yandex Disk company folder."""
-    return _YD_FOLDER_CACHE.setdefault(
-        company_id,
-        {
-            "value": None,
-            "timestamp": 0.0,
-            "refresh_task": None,
-        },
-    )
-
-
-def _yd_folder_cache_is_fresh(entry: dict[str, object], now: float | None = None) -> bool:
-    """Return whether a Yandex folder cache entry is still fresh."""
-    now = time.monotonic() if now is None else now
-    cached_value = entry.get("value")
-    cached_at = entry.get("timestamp", 0.0)
-    return cached_value is not None and (now - float(cached_at)) < _YD_FOLDER_CACHE_TTL
-
-
-async def _refresh_yandex_folder_cache(company_id: int, provider) -> None:
-    """Refresh a cached Yandex Disk folder size snapshot for a company."""
-    entry = _get_yd_folder_cache_entry(company_id)
-    try:
-        folder_info = await asyncio.wait_for(
-            provider.get_folder_size(),
-            timeout=_YD_FOLDER_CACHE_TIMEOUT,
-        )
-        entry["value"] = {
-            "total_bytes": int(folder_info.get("total_bytes", 0) or 0),
-            "file_count": int(folder_info.get("file_count", 0) or 0),
-        }
-        entry["timestamp"] = time.monotonic()
-        logger.info("yd_company_folder_cache_refresh", company_id=company_id)
-    except Exception as exc:
-        logger.warning("yd_company_folder_cache_refresh_failed", company_id=company_id, error=str(exc))
-    finally:
-        entry["refresh_task"] = None
-
-
-def _schedule_yandex_folder_cache_refresh(company_id: int, provider) -> None:
-    """Schedule a background refresh for a Yandex Disk folder size snapshot."""
-    entry = _get_yd_folder_cache_entry(company_id)
-    existing_task = entry.get("refresh_task")
-    if existing_task and not existing_task.done():
-        return
-    try:
-        entry["refresh_task"] = asyncio.create_task(_refresh_yandex_folder_cache(company_id, provider))
-        logger.info("yd_company_folder_cache_refresh_scheduled", company_id=company_id)
-    except RuntimeError:
-        logger.warning("yd_company_folder_cache_schedule_failed", company_id=company_id)
-
-
-async def _get_yandex_folder_snapshot(company_id: int, provider) -> dict[str, int] | None:
-    """Return cached Yandex folder size data and refresh it in the background when stale."""
-    entry = _get_yd_folder_cache_entry(company_id)
-    now = time.monotonic()
-    if _yd_folder_cache_is_fresh(entry, now):
-        logger.info("yd_company_folder_cache_hit", company_id=company_id)
-        return copy.deepcopy(entry["value"])
-
-    _schedule_yandex_folder_cache_refresh(company_id, provider)
-
-    if entry.get("value") is not None:
-        logger.info("yd_company_folder_cache_stale_hit", company_id=company_id)
-        return copy.deepcopy(entry["value"])
-
-    logger.info("yd_company_folder_cache_miss", company_id=company_id)
-    return None
-
-
 async def _build_storage_info(db: AsyncSession) -> dict:
     """Collect real storage information from database and providers."""
     logger.info("get_storage_info_started")
@@ -226,8 +111,11 @@ async def _build_storage_info(db: AsyncSession) -> dict:
                 error_type=type(e).__name__,
             )
 
-        storage_size = 0
-        storage_files = 0
+        # Usage comes from the incremental accounting, never from a tree walk
+        usage_total = storage_usage.summary()
+        usage_by_company = storage_usage.by_company()
+        storage_size = usage_total["total_bytes"]
+        storage_files = usage_total["file_count"]
 
         try:
             stmt = select(Company).order_by(Company.name)
@@ -260,6 +148,12 @@ async def _build_storage_info(db: AsyncSession) -> dict:
                 storage_used_bytes = 0
                 files_count = 0
 
+                usage = usage_by_company.get(company.id)
+                if usage is not None:
+                    storage_used_bytes = usage["total_bytes"]
+                    files_count = usage["file_count"]
+                    storage_used = format_bytes(storage_used_bytes)
+
                 if storage_type == "yandex_disk":
                     try:
                         async with provider_semaphore:
@@ -268,12 +162,6 @@ async def _build_storage_info(db: AsyncSession) -> dict:
                                 timeout=_STORAGE_INFO_PROVIDER_TIMEOUT,
                             )
                             if isinstance(provider, YandexDiskStorageProvider):
-                                folder_info = await _get_yandex_folder_snapshot(company.id, provider)
-                                if folder_info is not None:
-                                    storage_used_bytes = folder_info.get("total_bytes", 0)
-                                    files_count = folder_info.get("file_count", 0)
-                                    storage_used = format_bytes(storage_used_bytes)
-
                                 if quota_state["value"] is None:
                                     async with quota_lock:
                                         if quota_state["value"] is None:
@@ -282,18 +170,7 @@ async def _build_storage_info(db: AsyncSession) -> dict:
                                                 timeout=_STORAGE_INFO_PROVIDER_TIMEOUT,
                                             )
                     except Exception as exc:
-                        logger.warning("yd_company_usage_failed", company_id=company.id, error=str(exc))
-                else:
-                    try:
-                        company_dir = Path(settings.STORAGE_BASE_PATH) / (getattr(company, "slug", None) or "")
-                        if company_dir.exists() and company_dir.is_dir():
-                            storage_used_bytes, files_count = await asyncio.wait_for(
-                                asyncio.to_thread(calculate_directory_size, company_dir),
-                                timeout=_STORAGE_INFO_LOCAL_SIZE_TIMEOUT,
-                            )
-                            storage_used = format_bytes(storage_used_bytes)
-                    except Exception as exc:
-                        logger.warning("local_company_usage_failed", company_id=company.id, error=str(exc))
+                        logger.warning("yd_company_quota_failed", company_id=company.id, error=str(exc))
 
                 return {
                     "id": company.id,
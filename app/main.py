@@ -161,6 +161,19 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     except Exception as se:
         logger.error("defaults_seeding_failed", error=str(se))
 
+    # Shared pooled HTTP client for Yandex Disk (closed on shutdown)
+    from app.core.http_client import get_http_client
+
+    get_http_client()
+
+    # Storage usage accounting: load the last totals before serving stats
+    try:
+        from app.services.storage_usage_service import storage_usage
+
+        await storage_usage.flush()
+    except Exception as exc:
+        logger.warning("storage_usage_load_failed", error=str(exc))
+
     # Start backup scheduler
     try:
         from app.core.scheduler import init_scheduler
@@ -172,6 +185,30 @@ async def lifespan(app: FastAPI) -> AsyncGenerator:
     yield
 
     # Shutdown
+    try:
+        from app.services.hls_service import hls_worker
+
+        await hls_worker.stop()
+    except Exception:
+        pass
+    try:
+        from app.core.process_pool import shutdown_process_pool
+
+        shutdown_process_pool()
+    except Exception:
+        pass
+    try:
+        from app.services.storage_usage_service import storage_usage
+
+        await storage_usage.flush()
+    except Exception:
+        pass
+    try:
+        from app.core.http_client import close_http_client
+
+        await close_http_client()
+    except Exception:
+        pass
     try:
         from app.core.scheduler import scheduler as _sched
 
@@ -297,6 +334,9 @@ from app.api.routes import (  # noqa: E402
     health,
     alerts_ws,
     backups,
+    images,
+    uploads,
+    media_files,
 )
 
 # Health must be registered before ar_content (which has greedy /{content_id} under /api)
@@ -315,6 +355,8 @@ app.include_router(alerts_ws.router, prefix="/api/ws", tags=["WebSocket"])
 app.include_router(backups.router, prefix="/api/backups", tags=["Backups"])
 app.include_router(companies.router, prefix="/api", tags=["Companies"])
 app.include_router(projects.router, prefix="/api", tags=["Projects"])
+app.include_router(images.router, tags=["Images"])
+app.include_router(uploads.router, prefix="/api/uploads", tags=["Uploads"])
 # ar_content last: has greedy GET /{content_id} that matches any /api/... path
 app.include_router(ar_content.router, prefix="/api", tags=["AR Content"])
 
@@ -385,6 +427,7 @@ async def ar_viewer_landing(request: Request, unique_id: str):
                 "unique_id": unique_id,
                 "photo_url": data["photo_url"],
                 "preview_url": data.get("preview_url") or data["photo_url"],
+                "preview_srcset": data.get("preview_srcset"),
                 "video_url": data.get("video_url"),
                 "order_number": data.get("order_number", "AR"),
                 "app_url": deep_link,
@@ -449,11 +492,15 @@ os.makedirs("static", exist_ok=True)
 storage_base = Path(settings.STORAGE_BASE_PATH).resolve()
 storage_dir = str(storage_base.resolve())
 
-# Mount StaticFiles for storage
-app.mount("/storage", StaticFiles(directory=storage_dir), name="storage")
+# Storage: in accelerated mode the app checks the path and nginx sends the
+# file (X-Accel-Redirect); otherwise StaticFiles serves it from the worker
+if settings.ACCEL_REDIRECT_ENABLED:
+    app.include_router(media_files.router, tags=["Storage"])
+else:
+    app.mount("/storage", StaticFiles(directory=storage_dir), name="storage")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-logger.info("storage_mounted", storage_dir=storage_dir)
+logger.info("storage_mounted", storage_dir=storage_dir, accel_redirect=settings.ACCEL_REDIRECT_ENABLED)
 
 
 # Favicon: один ответ для /favicon.ico и /admin/favicon.ico (браузер запрашивает по пути страницы)
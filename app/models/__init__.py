@@ -17,6 +17,11 @@ from .email_queue import EmailQueue
 from .audit_log import AuditLog
 from .settings import SystemSettings
 from .backup import BackupHistory
+from .media_blob import MediaBlob
+from .resumable_upload import ResumableUpload
+from .storage_usage import StorageUsage
+from .storage_migration import StorageMigration, StorageMigrationItem
+from .job_lease import JobLease
 
 __all__ = [
     "CompanyStatus", "ProjectStatus", "ArContentStatus", "VideoStatus",
@@ -36,4 +41,9 @@ __all__ = [
     "AuditLog",
     "SystemSettings",
     "BackupHistory",
+    "MediaBlob",
+    "ResumableUpload",
+    "StorageUsage",
+    "StorageMigration", "StorageMigrationItem",
+    "JobLease",
 ]
\ No newline at end of file
@@ -86,6 +86,8 @@ class ARContent(Base):
     marker_url = Column(String(500), nullable=True)
     marker_status = Column(String(50), default="pending", nullable=True)  # Status of marker generation
     marker_metadata = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)  # Additional marker metadata
+    marker_phash = Column(String(16), nullable=True)  # 64-bit perceptual hash (hex) for near-duplicate detection
+    marker_dhash = Column(String(16), nullable=True)
     
     # Timestamps
     created_at = Column(DateTime, default=_utcnow, nullable=False)
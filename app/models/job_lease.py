@@ -0,0 +1,23 @@
+"""Lease rows that let one worker at a time run a scheduled job."""
+
+from sqlalchemy import Column, DateTime, String
+
+from app.core.database import Base
+
+
+class JobLease(Base):
+    """Worker holding the lease on job ``name`` until ``expires_at``.
+
+    Every gunicorn worker runs the same scheduler; jobs that scan storage
+    or rewrite shared tables take the lease first (see
+    ``app.services.job_lease_service``) and skip the run when another
+    worker holds it.  An expired lease can be taken over, so a crashed
+    worker does not block the job for longer than the lease time.
+    """
+
+    __tablename__ = "job_leases"
+
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
@@ -0,0 +1,44 @@
+"""Content-addressed media blob model (deduplicated photos and videos)."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.database import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class MediaBlob(Base):
+    """A stored file identified by its SHA-256 within one company's storage.
+
+    ``ar_content.photo_path`` / ``videos.video_path`` point at ``storage_path``;
+    ``ref_count`` counts those references and the blob (with its derived
+    files) is garbage-collected when it drops to zero.
+    """
+
+    __tablename__ = "media_blobs"
+
+    __table_args__ = (
+        Index("ix_media_blobs_company_sha256", "company_id", "sha256", unique=True),
+        Index("ix_media_blobs_storage_path", "storage_path"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    kind = Column(String(20), nullable=False)  # photo | video
+    storage_provider = Column(String(50), nullable=False, default="local")
+    # Local absolute path or ``yadisk://`` reference
+    storage_path = Column(String(500), nullable=False)
+    public_url = Column(String(500), nullable=True)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    mime_type = Column(String(100), nullable=True)
+    # Derived artefacts reused by duplicates: thumbnail_url, preview_url, files, ...
+    derived = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    last_used_at = Column(DateTime, nullable=False, default=_utcnow)
@@ -0,0 +1,41 @@
+"""Resumable (tus-style) upload model: a large file arriving in chunks."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import JSON, BigInteger, Column, DateTime, Index, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.core.database import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ResumableUpload(Base):
+    """Upload in progress under ``{STORAGE_BASE_PATH}/.uploads/``.
+
+    ``offset`` is the number of bytes safely written to ``storage_path``;
+    once it reaches ``length`` the file can be handed to AR content or video
+    creation, which moves it into place and deletes the row.  Rows past
+    ``expires_at`` are removed together with their file by the cleanup job.
+    """
+
+    __tablename__ = "resumable_uploads"
+
+    __table_args__ = (
+        Index("ix_resumable_uploads_expires_at", "expires_at"),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex, part of the upload URL
+    kind = Column(String(20), nullable=False)  # photo | video
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=True)
+    length = Column(BigInteger, nullable=False)
+    offset = Column(BigInteger, nullable=False, default=0)
+    storage_path = Column(String(500), nullable=False)
+    # Remaining tus ``Upload-Metadata`` pairs (decoded)
+    upload_metadata = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow)
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,66 @@
+"""Storage migration models: moving a company's files to another provider."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, Index, Integer, String, Text
+
+from app.core.database import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class StorageMigration(Base):
+    """One copy of a company's files from ``source_provider`` to ``target_provider``.
+
+    ``status`` walks ``planning → copying → rewriting → completed``; a run
+    interrupted in any phase (or ``failed``) is resumed from its items, so
+    files already copied and verified are never transferred again.  The
+    counters are cumulative over all runs.
+    """
+
+    __tablename__ = "storage_migrations"
+
+    __table_args__ = (
+        Index("ix_storage_migrations_company_id", "company_id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
+    source_provider = Column(String(50), nullable=False)
+    target_provider = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="planning")
+    total_files = Column(Integer, nullable=False, default=0)
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    copied_files = Column(Integer, nullable=False, default=0)
+    copied_bytes = Column(BigInteger, nullable=False, default=0)
+    # Bytes copied by the current run (throughput = run_copied_bytes / run time)
+    run_copied_bytes = Column(BigInteger, nullable=False, default=0)
+    failed_files = Column(Integer, nullable=False, default=0)
+    rewritten_rows = Column(Integer, nullable=False, default=0)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=_utcnow)
+    started_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+
+class StorageMigrationItem(Base):
+    """A single file of a migration and its transfer state."""
+
+    __tablename__ = "storage_migration_items"
+
+    __table_args__ = (
+        Index("ix_storage_migration_items_migration_status", "migration_id", "status"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    migration_id = Column(Integer, ForeignKey("storage_migrations.id", ondelete="CASCADE"), nullable=False)
+    # Path relative to the source / target provider root
+    source_path = Column(String(500), nullable=False)
+    target_path = Column(String(500), nullable=False)
+    size_bytes = Column(BigInteger, nullable=False, default=0)
+    md5 = Column(String(32), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending | copied | failed
+    error = Column(Text, nullable=True)
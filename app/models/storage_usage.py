@@ -0,0 +1,37 @@
+"""Aggregated storage usage per company, project and file kind."""
+
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, UniqueConstraint
+
+from app.core.database import Base
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class StorageUsage(Base):
+    """Bytes and file count of one ``(company, project, kind)`` bucket.
+
+    Maintained incrementally from provider saves/deletes by
+    ``app.services.storage_usage_service`` and rebuilt periodically by its
+    reconciliation scan.  ``company_id``/``project_id`` are ``0`` for files
+    that cannot be attributed (shared folders, unknown paths); there is no
+    foreign key so rows of deleted companies simply vanish on the next
+    reconciliation.
+    """
+
+    __tablename__ = "storage_usage"
+
+    __table_args__ = (
+        UniqueConstraint("company_id", "project_id", "kind", name="uq_storage_usage_bucket"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    company_id = Column(Integer, nullable=False, default=0)
+    project_id = Column(Integer, nullable=False, default=0)
+    kind = Column(String(20), nullable=False)  # photo | video | thumbnail | qr | backup | other
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    file_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=_utcnow)
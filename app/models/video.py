@@ -30,6 +30,17 @@ class Video(Base):
     thumbnail_path = Column(String(500), nullable=True)
     preview_url = Column(String(500), nullable=True)
 
+    # Adaptive streaming (HLS ladder + poster frame), filled by hls_service
+    hls_path = Column(String(500), nullable=True)
+    hls_url = Column(String(500), nullable=True)
+    hls_status = Column(String(50), nullable=True)
+    poster_url = Column(String(500), nullable=True)
+
+    # Admin scrubbing previews (animated WebP + sprite sheet / VTT), filled by video_preview_service
+    animated_preview_url = Column(String(500), nullable=True)
+    sprite_url = Column(String(500), nullable=True)
+    sprite_vtt_url = Column(String(500), nullable=True)
+
     # Video metadata
     duration = Column(Integer)
     width = Column(Integer)
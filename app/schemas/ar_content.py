@@ -107,6 +107,26 @@ class ARContentCreateResponse(BaseModel):
     photo_url: str
     video_url: str
     photo_analysis: Optional[Dict[str, Any]] = None
+    timings: Optional[Dict[str, Any]] = None
+    near_duplicates: Optional[List[Dict[str, Any]]] = None
+
+
+class ARContentFromUploads(BaseModel):
+    """Create AR content from finished resumable uploads (``/api/uploads``)."""
+
+    photo_upload_id: str
+    video_upload_id: str
+    customer_name: Optional[str] = None
+    customer_phone: Optional[str] = None
+    customer_email: Optional[str] = None
+    duration_years: int = Field(default=30)
+    auto_enhance: bool = False
+
+
+class VideosFromUploads(BaseModel):
+    """Attach finished resumable video uploads to existing AR content."""
+
+    upload_ids: List[str] = Field(..., min_length=1)
 
 
 class ARContentWithLinks(BaseModel):
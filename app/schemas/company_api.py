@@ -15,7 +15,7 @@ class CompanyCreate(BaseModel):
     status: Optional[CompanyStatus] = Field(default=CompanyStatus.ACTIVE, description="Company status")
     storage_provider: StorageProviderType = Field(
         default=StorageProviderType.LOCAL,
-        description="Storage backend: local or yandex_disk",
+        description="Storage backend: local, yandex_disk or s3",
     )
 
     @field_validator("contact_email", mode="before")
@@ -44,7 +44,7 @@ class CompanyUpdate(BaseModel):
     status: Optional[CompanyStatus] = Field(None, description="Company status")
     storage_provider: Optional[StorageProviderType] = Field(
         None,
-        description="Storage backend: local or yandex_disk",
+        description="Storage backend: local, yandex_disk or s3",
     )
 
     @field_validator("contact_email", mode="before")
@@ -71,6 +71,20 @@ class StorageUsageStats(BaseModel):
     base_path: str
 
 
+class StorageKindUsage(BaseModel):
+    total_bytes: int
+    file_count: int
+
+
+class StorageUsageSummary(BaseModel):
+    company_id: Optional[int] = None
+    project_id: Optional[int] = None
+    total_bytes: int
+    file_count: int
+    by_kind: Dict[str, StorageKindUsage]
+    updated_at: Optional[str] = None
+
+
 # ============ Storage Health Status ============
 
 class StorageHealthStatus(BaseModel):
@@ -13,6 +13,9 @@ class ViewerManifestVideo(BaseModel):
     id: int
     title: str
     video_url: str
+    # HLS master playlist (adaptive bitrate); video_url stays the original upload
+    hls_url: Optional[str] = None
+    poster_url: Optional[str] = None
     thumbnail_url: Optional[str] = None
     duration: Optional[int] = None
     width: Optional[int] = None
@@ -35,6 +38,9 @@ class ViewerManifestResponse(BaseModel):
     unique_id: str
     order_number: str
     marker_image_url: str
+    # Size/hash of the tracking derivative so the app can cache and verify it
+    marker_image_size_bytes: Optional[int] = None
+    marker_image_sha256: Optional[str] = None
     photo_url: str
     video: ViewerManifestVideo
     expires_at: str
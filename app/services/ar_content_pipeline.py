@@ -0,0 +1,238 @@
+"""Stage-graph runner for the AR content creation flow.
+
+``_create_ar_content`` used to save the photo, save the video, upload both to
+Yandex Disk, render the QR code, analyse/enhance the photo and build
+thumbnails strictly one after another.  Once the uploads are on local disk
+most of these steps are independent, so the flow is described as a small
+dependency graph and every stage starts as soon as its dependencies finish.
+
+Each stage belongs to a *pool* (``io``, ``upload``, ``cpu``).  Pools are
+process-wide semaphores, so the limits hold across concurrent requests and
+one slow Yandex Disk upload cannot starve the CPU-bound stages.
+
+Every stage is timed; the breakdown is returned to the caller (and ends up in
+``ARContentCreateResponse.timings``) and exported as Prometheus histograms.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+# Prometheus metrics
+AR_CONTENT_STAGE_DURATION = Histogram(
+    "ar_content_create_stage_duration_seconds",
+    "Time spent in each AR content creation stage",
+    ["stage"],
+)
+
+AR_CONTENT_STAGE_WAIT = Histogram(
+    "ar_content_create_stage_wait_seconds",
+    "Time a stage waited for a free slot in its pool",
+    ["stage"],
+)
+
+AR_CONTENT_STAGE_FAILURES = Counter(
+    "ar_content_create_stage_failures_total",
+    "Failed AR content creation stages",
+    ["stage"],
+)
+
+AR_CONTENT_CREATE_DURATION = Histogram(
+    "ar_content_create_duration_seconds",
+    "Total wall-clock time of AR content creation",
+)
+
+POOL_IO = "io"
+POOL_UPLOAD = "upload"
+POOL_CPU = "cpu"
+# ffmpeg/ffprobe jobs (probe, remux, transcode) — shared with background workers
+POOL_MEDIA = "media"
+
+
+def _pool_limits() -> dict[str, int]:
+    return {
+        POOL_IO: settings.AR_PIPELINE_IO_CONCURRENCY,
+        POOL_UPLOAD: settings.AR_PIPELINE_UPLOAD_CONCURRENCY,
+        POOL_CPU: settings.AR_PIPELINE_CPU_CONCURRENCY,
+        POOL_MEDIA: settings.AR_PIPELINE_MEDIA_CONCURRENCY,
+    }
+
+
+# Semaphores are bound to the event loop they are first used on, so keep one
+# set per loop (tests spin up a fresh loop per test case).
+_loop_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_pool_semaphore(pool: str) -> asyncio.Semaphore:
+    """Return the process-wide semaphore that limits stages of *pool*."""
+    loop = asyncio.get_running_loop()
+    semaphores = _loop_semaphores.setdefault(loop, {})
+    sem = semaphores.get(pool)
+    if sem is None:
+        limit = _pool_limits().get(pool, 1)
+        sem = asyncio.Semaphore(max(1, int(limit)))
+        semaphores[pool] = sem
+    return sem
+
+
+@dataclass
+class Stage:
+    """A single node of the creation graph."""
+
+    name: str
+    func: Callable[..., Awaitable[Any]]
+    deps: tuple[str, ...] = ()
+    pool: str = POOL_IO
+    optional: bool = False
+
+
+@dataclass
+class StageTiming:
+    """Timing of one stage relative to the pipeline start (seconds)."""
+
+    started_s: float
+    duration_s: float
+    wait_s: float = 0.0
+    status: str = "ok"
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "started_s": round(self.started_s, 4),
+            "duration_s": round(self.duration_s, 4),
+            "wait_s": round(self.wait_s, 4),
+            "status": self.status,
+        }
+
+
+@dataclass
+class StagePipeline:
+    """Run async stages as a dependency graph with per-pool concurrency limits.
+
+    Stage callables receive the results of their dependencies as positional
+    arguments, in the order the dependencies were declared.  A failing
+    required stage cancels everything still running and re-raises; a failing
+    ``optional`` stage is logged and yields ``None`` to its dependents.
+    """
+
+    name: str = "ar_content_create"
+    stages: dict[str, Stage] = field(default_factory=dict)
+    results: dict[str, Any] = field(default_factory=dict)
+    timings: dict[str, StageTiming] = field(default_factory=dict)
+    _t0: float = field(default_factory=time.perf_counter)
+
+    def add(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        deps: tuple[str, ...] = (),
+        pool: str = POOL_IO,
+        optional: bool = False,
+    ) -> None:
+        """Register a stage. Dependencies must be registered first (keeps the graph acyclic)."""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(missing)}")
+        self.stages[name] = Stage(name=name, func=func, deps=tuple(deps), pool=pool, optional=optional)
+
+    def _record(self, name: str, started: float, ended: float, wait: float, status: str) -> None:
+        self.timings[name] = StageTiming(
+            started_s=started - self._t0,
+            duration_s=ended - started,
+            wait_s=wait,
+            status=status,
+        )
+        AR_CONTENT_STAGE_DURATION.labels(stage=name).observe(ended - started)
+        AR_CONTENT_STAGE_WAIT.labels(stage=name).observe(wait)
+        if status != "ok":
+            AR_CONTENT_STAGE_FAILURES.labels(stage=name).inc()
+
+    async def _run_stage(self, stage: Stage, tasks: dict[str, "asyncio.Task[Any]"]) -> Any:
+        dep_values = [await tasks[dep] for dep in stage.deps]
+        queued = time.perf_counter()
+        async with get_pool_semaphore(stage.pool):
+            started = time.perf_counter()
+            try:
+                result = await stage.func(*dep_values)
+            except asyncio.CancelledError:
+                self._record(stage.name, started, time.perf_counter(), started - queued, "cancelled")
+                raise
+            except Exception as exc:
+                self._record(stage.name, started, time.perf_counter(), started - queued, "failed")
+                if not stage.optional:
+                    raise
+                logger.warning(
+                    "pipeline_optional_stage_failed",
+                    pipeline=self.name,
+                    stage=stage.name,
+                    error=str(exc),
+                )
+                self.results[stage.name] = None
+                return None
+            self._record(stage.name, started, time.perf_counter(), started - queued, "ok")
+        self.results[stage.name] = result
+        return result
+
+    async def run(self) -> dict[str, Any]:
+        """Execute all registered stages and return ``{stage_name: result}``."""
+        tasks: dict[str, asyncio.Task[Any]] = {}
+        # Stages are registered in topological order, so dependency tasks
+        # always exist before a dependent awaits them.
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.create_task(self._run_stage(stage, tasks))
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return self.results
+
+    @asynccontextmanager
+    async def track(self, name: str) -> AsyncIterator[None]:
+        """Time a sequential step (e.g. DB writes) into the same breakdown."""
+        started = time.perf_counter()
+        status = "failed"
+        try:
+            yield
+            status = "ok"
+        finally:
+            self._record(name, started, time.perf_counter(), 0.0, status)
+
+    def elapsed(self) -> float:
+        """Seconds since the pipeline was created."""
+        return time.perf_counter() - self._t0
+
+    def breakdown(self, total_s: Optional[float] = None) -> dict[str, Any]:
+        """Structured timing breakdown suitable for API responses and logs."""
+        total = self.elapsed() if total_s is None else total_s
+        stages = {name: timing.as_dict() for name, timing in self.timings.items()}
+        busy = sum(t.duration_s for t in self.timings.values())
+        return {
+            "total_s": round(total, 4),
+            # >1 means stages overlapped; 1.0 is the old strictly sequential flow.
+            "parallelism": round(busy / total, 2) if total > 0 else 0.0,
+            "stages": stages,
+        }
+
+    def observe_total(self) -> float:
+        """Export total duration and return it."""
+        total = self.elapsed()
+        AR_CONTENT_CREATE_DURATION.observe(total)
+        return total
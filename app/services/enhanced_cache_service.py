@@ -2,12 +2,21 @@
 Enhanced Cache Service with multi-tier caching, CDN integration, and performance optimization.
 """
 import asyncio
+import fnmatch
+import heapq
+import itertools
 import json
+import os
 import pickle
+import sqlite3
+import sys
+import threading
 import time
+import uuid
 import hashlib
 import gzip
-from typing import Any, Optional, Dict, List, Callable
+from collections import OrderedDict
+from typing import Any, Optional, Dict, Iterable, List, Callable, Set, Tuple
 from dataclasses import dataclass, asdict
 from enum import Enum
 from pathlib import Path
@@ -15,6 +24,7 @@ import tempfile
 import structlog
 from prometheus_client import Counter, Histogram, Gauge
 
+from app.core.config import settings
 from app.core.redis import redis_client
 
 logger = structlog.get_logger()
@@ -49,6 +59,7 @@ class CacheEntry:
     ttl: Optional[int] = None
     size_bytes: int = 0
     cache_level: Optional[CacheLevel] = None
+    tags: Tuple[str, ...] = ()
 
 # Prometheus metrics
 CACHE_OPERATIONS = Counter(
@@ -75,199 +86,616 @@ CACHE_LATENCY = Histogram(
     ['level', 'operation']
 )
 
+_SHARED_SEGMENT = "*"
+_SIZE_SAMPLE = 32
+_SIZE_DEPTH = 4
+_SCALAR_TYPES = frozenset({str, bytes, bytearray, int, float, bool, type(None)})
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate in-memory footprint of *value* in bytes.
+
+    ``sys.getsizeof`` of the object plus its contents; containers are
+    sampled (first ``_SIZE_SAMPLE`` items, extrapolated) down to
+    ``_SIZE_DEPTH`` levels.  O(1) for strings and bytes and bounded for
+    large containers, unlike pickling the value; callers that know the
+    size can pass it to :meth:`MemoryCache.set` instead.
+    """
+    size = sys.getsizeof(value, 64)
+    if type(value) in _SCALAR_TYPES or _depth >= _SIZE_DEPTH:
+        return size
+    if isinstance(value, dict):
+        items = itertools.chain.from_iterable(value.items())
+        count = 2 * len(value)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = value
+        count = len(value)
+    elif hasattr(value, "__dict__") and not isinstance(value, type):
+        return size + estimate_size(vars(value), _depth + 1)
+    else:
+        return size
+    sampled = seen = 0
+    for item in items:
+        if type(item) in _SCALAR_TYPES:
+            sampled += sys.getsizeof(item, 64)
+        else:
+            sampled += estimate_size(item, _depth + 1)
+        seen += 1
+        if seen == _SIZE_SAMPLE:
+            break
+    return size + (sampled * count // seen if seen else 0)
+
+
+class _Segment:
+    """LRU of one cache type within a shard (oldest first)."""
+
+    __slots__ = ("entries", "size", "budget")
+
+    def __init__(self, budget: int) -> None:
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.size = 0
+        self.budget = budget
+
+
+class _Shard:
+    __slots__ = ("segments", "index", "expiry", "tags", "lock")
+
+    def __init__(self, budgets: Dict[str, int]) -> None:
+        self.segments = {name: _Segment(budget) for name, budget in budgets.items()}
+        self.index: Dict[str, _Segment] = {}          # key → segment holding it
+        self.expiry: List[tuple] = []                 # min-heap of (expires_at, key)
+        self.tags: Dict[str, Set[str]] = {}           # tag → keys carrying it
+        self.lock = threading.Lock()
+
+    def untag(self, entry: CacheEntry) -> None:
+        for tag in entry.tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(entry.key)
+                if not keys:
+                    del self.tags[tag]
+
+
 class MemoryCache:
-    """In-memory L1 cache with LRU eviction."""
-    
-    def __init__(self, max_size: int = 100 * 1024 * 1024):  # 100MB
+    """In-memory L1 cache: O(1) LRU per cache type, TTL heap, optional shards.
+
+    Each shard holds one ``OrderedDict`` per budgeted cache type plus a
+    shared one for the rest, so hits (``move_to_end``) and evictions
+    (``popitem(last=False)``) are O(1).  ``budgets`` maps a cache type to
+    its byte budget (``CacheConfig.max_size``); unbudgeted types share what
+    is left of ``max_size``.  Budgets are split evenly across shards.
+    Expired entries are dropped on lookup and, in expiry order, from a
+    min-heap on every write and :meth:`purge_expired`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 100 * 1024 * 1024,  # 100MB
+        budgets: Optional[Dict[str, int]] = None,
+        shards: int = 1,
+    ):
         self.max_size = max_size
-        self.current_size = 0
-        self.cache: Dict[str, CacheEntry] = {}
-        self.access_order: List[str] = []
-        self.lock = asyncio.Lock()
-    
-    async def get(self, key: str) -> Optional[CacheEntry]:
-        async with self.lock:
-            entry = self.cache.get(key)
-            if entry:
-                entry.accessed_at = time.time()
-                entry.access_count += 1
-                # Move to end (most recently used)
-                self.access_order.remove(key)
-                self.access_order.append(key)
-                return entry
+        self.budgets = self._split_budgets(max_size, budgets or {})
+        self._shards = [
+            _Shard({name: budget // shards for name, budget in self.budgets.items()})
+            for _ in range(max(shards, 1))
+        ]
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _split_budgets(max_size: int, budgets: Dict[str, int]) -> Dict[str, int]:
+        """Per-type budgets scaled to fit ``max_size``; the rest is shared."""
+        reserved = sum(budgets.values())
+        scale = min(1.0, max_size / reserved) if reserved else 1.0
+        split = {name: int(budget * scale) for name, budget in budgets.items()}
+        split[_SHARED_SEGMENT] = max_size - sum(split.values())
+        return split
+
+    def _shard(self, key: str) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    @property
+    def current_size(self) -> int:
+        return sum(segment.size for shard in self._shards for segment in shard.segments.values())
+
+    def __len__(self) -> int:
+        return sum(len(shard.index) for shard in self._shards)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._shard(key).index
+
+    @staticmethod
+    def _drop(shard: _Shard, key: str) -> Optional[CacheEntry]:
+        segment = shard.index.pop(key, None)
+        if segment is None:
             return None
-    
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
-        async with self.lock:
-            # Calculate size
-            size = len(pickle.dumps(value))
-            
-            # Check if we need to evict
-            while (self.current_size + size > self.max_size and 
-                   self.access_order):
-                oldest_key = self.access_order.pop(0)
-                oldest_entry = self.cache.pop(oldest_key)
-                self.current_size -= oldest_entry.size_bytes
-            
-            # Add new entry
+        entry = segment.entries.pop(key)
+        segment.size -= entry.size_bytes
+        if entry.tags:
+            shard.untag(entry)
+        return entry
+
+    def _purge(self, shard: _Shard, now: float) -> None:
+        heap = shard.expiry
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            segment = shard.index.get(key)
+            # Stale heap item: the key was rewritten or deleted since
+            if segment is not None and _expires_at(segment.entries[key]) == expires_at:
+                self._drop(shard, key)
+                self.expirations += 1
+        if len(heap) > 2 * len(shard.index) + 64:
+            shard.expiry = [item for item in heap if item[1] in shard.index]
+            heapq.heapify(shard.expiry)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        shard = self._shard(key)
+        with shard.lock:
+            segment = shard.index.get(key)
+            if segment is None:
+                return None
+            entry = segment.entries[key]
+            now = time.time()
+            expires_at = _expires_at(entry)
+            if expires_at is not None and expires_at <= now:
+                self._drop(shard, key)
+                self.expirations += 1
+                return None
+            segment.entries.move_to_end(key)
+            entry.accessed_at = now
+            entry.access_count += 1
+            return entry
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        cache_type: Optional[str] = None,
+        size: Optional[int] = None,
+        tags: Iterable[str] = (),
+    ) -> bool:
+        """Store *value*; ``size`` overrides :func:`estimate_size`.
+
+        ``tags`` let :meth:`invalidate_tags` drop the entry later.  Returns
+        ``False`` when the value alone exceeds its type's budget.
+        """
+        tags = tuple(tags)
+        size = estimate_size(value) if size is None else size
+        shard = self._shard(key)
+        with shard.lock:
+            segment = shard.segments.get(cache_type or _SHARED_SEGMENT, shard.segments[_SHARED_SEGMENT])
+            now = time.time()
+            if shard.expiry and shard.expiry[0][0] <= now:
+                self._purge(shard, now)
+            self._drop(shard, key)
+            if size > segment.budget:
+                return False
+            while segment.size + size > segment.budget and segment.entries:
+                evicted_key, evicted = segment.entries.popitem(last=False)
+                del shard.index[evicted_key]
+                segment.size -= evicted.size_bytes
+                if evicted.tags:
+                    shard.untag(evicted)
+                self.evictions += 1
+
             entry = CacheEntry(
                 key=key,
                 value=value,
-                created_at=time.time(),
-                accessed_at=time.time(),
+                created_at=now,
+                accessed_at=now,
                 access_count=1,
                 ttl=ttl,
                 size_bytes=size,
-                cache_level=CacheLevel.L1_MEMORY
+                cache_level=CacheLevel.L1_MEMORY,
+                tags=tags,
             )
-            
-            self.cache[key] = entry
-            self.access_order.append(key)
-            self.current_size += size
-            
+            segment.entries[key] = entry
+            segment.size += size
+            shard.index[key] = segment
+            for tag in tags:
+                shard.tags.setdefault(tag, set()).add(key)
+            if ttl:
+                heapq.heappush(shard.expiry, (now + ttl, key))
             return True
-    
+
     async def delete(self, key: str) -> bool:
-        async with self.lock:
-            entry = self.cache.pop(key, None)
-            if entry:
-                self.current_size -= entry.size_bytes
-                if key in self.access_order:
-                    self.access_order.remove(key)
-                return True
-            return False
-    
+        shard = self._shard(key)
+        with shard.lock:
+            return self._drop(shard, key) is not None
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of *tags*; returns how many."""
+        tags = list(tags)
+        dropped = 0
+        for shard in self._shards:
+            with shard.lock:
+                keys = set().union(*(shard.tags.get(tag, ()) for tag in tags))
+                for key in keys:
+                    dropped += self._drop(shard, key) is not None
+        return dropped
+
+    async def invalidate_pattern(self, pattern: str) -> int:
+        """Drop every key matching the glob *pattern* (Redis-style)."""
+        dropped = 0
+        for shard in self._shards:
+            with shard.lock:
+                for key in [key for key in shard.index if fnmatch.fnmatchcase(key, pattern)]:
+                    dropped += self._drop(shard, key) is not None
+        return dropped
+
+    async def purge_expired(self) -> int:
+        """Drop every expired entry now; returns how many were dropped."""
+        before = self.expirations
+        now = time.time()
+        for shard in self._shards:
+            with shard.lock:
+                self._purge(shard, now)
+        return self.expirations - before
+
     async def clear(self) -> None:
-        async with self.lock:
-            self.cache.clear()
-            self.access_order.clear()
-            self.current_size = 0
-    
+        for shard in self._shards:
+            with shard.lock:
+                for segment in shard.segments.values():
+                    segment.entries.clear()
+                    segment.size = 0
+                shard.index.clear()
+                shard.expiry.clear()
+                shard.tags.clear()
+
     def stats(self) -> Dict[str, Any]:
+        current_size = self.current_size
+        segments = {}
+        for name, budget in self.budgets.items():
+            parts = [shard.segments[name] for shard in self._shards]
+            segments[name] = {
+                'entries': sum(len(part.entries) for part in parts),
+                'size_bytes': sum(part.size for part in parts),
+                'budget': budget,
+            }
         return {
-            'entries': len(self.cache),
-            'size_bytes': self.current_size,
+            'entries': len(self),
+            'size_bytes': current_size,
             'max_size': self.max_size,
-            'utilization': self.current_size / self.max_size if self.max_size > 0 else 0
+            'utilization': current_size / self.max_size if self.max_size > 0 else 0,
+            'shards': len(self._shards),
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'segments': segments,
         }
 
+
+def _expires_at(entry: CacheEntry) -> Optional[float]:
+    return entry.created_at + entry.ttl if entry.ttl else None
+
+
+_DISK_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_accessed_at ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS ix_entries_expires_at ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key));
+CREATE INDEX IF NOT EXISTS ix_tags_key ON tags (key);
+CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 1), entries INTEGER, size INTEGER);
+INSERT OR IGNORE INTO totals VALUES (1, 0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, size = size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, size = size - OLD.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete_tags AFTER DELETE ON entries BEGIN
+    DELETE FROM tags WHERE key = OLD.key;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET size = size - OLD.size + NEW.size;
+END;
+"""
+_EVICT_BATCH = 64
+_SCAN_BATCH = 500
+
+
 class DiskCache:
-    """Disk-based L3 cache with compression."""
-    
-    def __init__(self, cache_dir: Optional[str] = None):
+    """Disk-based L3 cache with compression, indexed in SQLite.
+
+    Entries are pickled ``CacheEntry`` files under two-character shard
+    directories; ``index.sqlite3`` keeps key, path, size, expiry and last
+    access so lookups, TTL checks and LRU eviction down to ``max_bytes``
+    never walk the directory.  Triggers keep running totals, so
+    :meth:`stats` is O(1).  All file and index I/O runs in a thread.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
         if cache_dir is None:
-            cache_dir = str(Path(tempfile.gettempdir()) / "vertex_cache")
+            cache_dir = settings.CACHE_L3_DIR or str(Path(tempfile.gettempdir()) / "vertex_cache")
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
-        self.lock = asyncio.Lock()
-    
+        self.max_bytes = settings.CACHE_L3_MAX_BYTES if max_bytes is None else max_bytes
+        self.index_path = self.cache_dir / "index.sqlite3"
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
     def _get_path(self, key: str) -> Path:
         # Use hash of key for filename to avoid filesystem issues
         key_hash = hashlib.sha256(key.encode()).hexdigest()
-        return self.cache_dir / f"{key_hash}.cache"
-    
-    async def get(self, key: str) -> Optional[CacheEntry]:
-        async with self.lock:
-            path = self._get_path(key)
-            if not path.exists():
-                return None
-            
+        return self.cache_dir / key_hash[:2] / f"{key_hash}.cache"
+
+    def _index(self) -> sqlite3.Connection:
+        """Open (or recreate, if corrupted) the index; call under ``_lock``.
+
+        A new index adopts the entry files already in the directory, so
+        they stay within ``max_bytes`` instead of becoming untracked.
+        """
+        if self._db is None:
+            fresh = not self.index_path.exists()
             try:
-                # Check if expired
-                stat = path.stat()
-                if time.time() - stat.st_mtime > 86400:  # 24 hours default
-                    path.unlink()
-                    return None
-                
-                # Read and deserialize
-                with open(path, 'rb') as f:
-                    data = f.read()
-                
-                # Decompress if needed
-                if data.startswith(b'\x1f\x8b'):  # Gzip magic number
-                    data = gzip.decompress(data)
-                
-                entry = pickle.loads(data)
-                entry.accessed_at = time.time()
-                entry.access_count += 1
-                entry.cache_level = CacheLevel.L3_DISK
-                
-                return entry
-                
-            except Exception as e:
-                logger.warning("disk_cache_read_failed", key=key, error=str(e))
-                # Remove corrupted file
-                try:
-                    path.unlink()
-                except OSError:
-                    pass
-                return None
-    
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None, compress: bool = True) -> bool:
-        async with self.lock:
-            path = self._get_path(key)
-            
+                db = self._open_index()
+            except sqlite3.DatabaseError as e:
+                logger.warning("disk_cache_index_reset", path=str(self.index_path), error=str(e))
+                self.index_path.unlink(missing_ok=True)
+                db = self._open_index()
+                fresh = True
+            if fresh:
+                self._reindex(db)
+            self._db = db
+        return self._db
+
+    def _open_index(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.index_path, timeout=10, isolation_level=None, check_same_thread=False)
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_DISK_INDEX_SCHEMA)
+        except sqlite3.DatabaseError:
+            db.close()
+            raise
+        return db
+
+    def _reindex(self, db: sqlite3.Connection) -> None:
+        """Index entry files left without index rows; drop the unreadable and expired.
+
+        Flat files from the pre-index layout are moved into their shard.
+        """
+        now = time.time()
+        adopted = removed = 0
+        for path in itertools.chain(self.cache_dir.glob("*/*.cache"), self.cache_dir.glob("*.cache")):
             try:
-                entry = CacheEntry(
-                    key=key,
-                    value=value,
-                    created_at=time.time(),
-                    accessed_at=time.time(),
-                    access_count=1,
-                    ttl=ttl,
-                    cache_level=CacheLevel.L3_DISK
+                entry = self._read(path)
+                expires_at = entry.created_at + (entry.ttl or settings.CACHE_L3_DEFAULT_TTL_SECONDS)
+                target = self._get_path(entry.key)
+                if expires_at <= now or (path != target and target.exists()):
+                    raise ValueError("expired or superseded")
+                if path != target:
+                    target.parent.mkdir(exist_ok=True)
+                    os.replace(path, target)
+                size = target.stat().st_size
+            except Exception:
+                self._unlink(str(path))
+                removed += 1
+                continue
+            inserted = db.execute(
+                "INSERT OR IGNORE INTO entries (key, path, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (entry.key, str(target), size, expires_at, entry.accessed_at),
+            ).rowcount
+            if inserted:
+                db.executemany(
+                    "INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)",
+                    [(tag, entry.key) for tag in entry.tags],
                 )
-                
-                data = pickle.dumps(entry)
-                
-                # Compress if requested and beneficial
-                if compress and len(data) > 1024:  # Only compress files > 1KB
-                    compressed = gzip.compress(data)
-                    if len(compressed) < len(data):
-                        data = compressed
-                        entry.size_bytes = len(compressed)
-                    else:
-                        entry.size_bytes = len(data)
-                else:
-                    entry.size_bytes = len(data)
-                
-                with open(path, 'wb') as f:
-                    f.write(data)
-                
-                return True
-                
-            except Exception as e:
-                logger.warning("disk_cache_write_failed", key=key, error=str(e))
-                return False
-    
-    async def delete(self, key: str) -> bool:
-        async with self.lock:
-            path = self._get_path(key)
-            try:
-                path.unlink()
-                return True
-            except FileNotFoundError:
-                return False
-    
-    async def clear(self) -> None:
-        async with self.lock:
-            for path in self.cache_dir.glob("*.cache"):
+                adopted += 1
+        for stale in self._evict(db, now):
+            self._unlink(stale)
+        if adopted or removed:
+            logger.info("disk_cache_reindexed", path=str(self.cache_dir), adopted=adopted, removed=removed)
+
+    @staticmethod
+    def _read(path: Path) -> CacheEntry:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # Decompress if needed
+        if data.startswith(b'\x1f\x8b'):  # Gzip magic number
+            data = gzip.decompress(data)
+
+        return pickle.loads(data)
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def _drop(self, db: sqlite3.Connection, key: str) -> Optional[str]:
+        row = db.execute("DELETE FROM entries WHERE key = ? RETURNING path", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _get_sync(self, key: str) -> Optional[CacheEntry]:
+        now = time.time()
+        with self._lock:
+            db = self._index()
+            row = db.execute("SELECT path, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            path, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._drop(db, key)
+                self._unlink(path)
+                return None
+            db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+
+        try:
+            entry = self._read(path)
+        except Exception as e:
+            logger.warning("disk_cache_read_failed", key=key, error=str(e))
+            # Forget the missing or corrupted file
+            with self._lock:
+                self._drop(self._index(), key)
+            self._unlink(path)
+            return None
+
+        entry.accessed_at = now
+        entry.access_count += 1
+        entry.cache_level = CacheLevel.L3_DISK
+        return entry
+
+    def _set_sync(self, key: str, value: Any, ttl: Optional[int], compress: bool, tags: Tuple[str, ...]) -> bool:
+        now = time.time()
+        ttl = ttl or settings.CACHE_L3_DEFAULT_TTL_SECONDS
+        entry = CacheEntry(
+            key=key,
+            value=value,
+            created_at=now,
+            accessed_at=now,
+            access_count=1,
+            ttl=ttl,
+            cache_level=CacheLevel.L3_DISK,
+            tags=tags,
+        )
+        data = pickle.dumps(entry)
+
+        # Compress if requested and beneficial
+        if compress and len(data) > 1024:  # Only compress files > 1KB
+            compressed = gzip.compress(data)
+            if len(compressed) < len(data):
+                data = compressed
+        if len(data) > self.max_bytes:
+            return False
+
+        path = self._get_path(key)
+        path.parent.mkdir(exist_ok=True)
+        partial = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+
+        with self._lock:
+            db = self._index()
+            db.execute(
+                "INSERT INTO entries (key, path, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET path = excluded.path, size = excluded.size, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, str(path), len(data), now + ttl, now),
+            )
+            db.execute("DELETE FROM tags WHERE key = ?", (key,))
+            db.executemany("INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+            evicted = self._evict(db, now)
+        for stale in evicted:
+            self._unlink(stale)
+        return True
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> List[str]:
+        """Drop expired entries, then least recently used ones, down to ``max_bytes``."""
+        paths = [
+            row[0] for row in
+            db.execute("DELETE FROM entries WHERE expires_at <= ? RETURNING path", (now,)).fetchall()
+        ]
+        excess = db.execute("SELECT size FROM totals").fetchone()[0] - self.max_bytes
+        while excess > 0:
+            rows = db.execute(
+                "SELECT key, path, size FROM entries ORDER BY accessed_at LIMIT ?", (_EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            for key, path, size in rows:
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                paths.append(path)
+                excess -= size
+                if excess <= 0:
+                    break
+        if paths:
+            CACHE_OPERATIONS.labels(
+                level=CacheLevel.L3_DISK.value,
+                operation='evict',
+                status='success'
+            ).inc(len(paths))
+        return paths
+
+    def _invalidate_sync(self, where: str, params: tuple) -> int:
+        with self._lock:
+            rows = self._index().execute(f"DELETE FROM entries WHERE {where} RETURNING path", params).fetchall()
+        for (path,) in rows:
+            self._unlink(path)
+        return len(rows)
+
+    def _delete_sync(self, key: str) -> bool:
+        with self._lock:
+            path = self._drop(self._index(), key)
+        if path is None:
+            return False
+        self._unlink(path)
+        return True
+
+    def _clear_sync(self) -> None:
+        with self._lock:
+            db = self._index()
+            db.execute("DELETE FROM entries")
+            # Shard directories, plus flat files left by the pre-index layout
+            for path in itertools.chain(self.cache_dir.glob("*/*.cache*"), self.cache_dir.glob("*.cache")):
                 try:
                     path.unlink()
                 except Exception as e:
                     logger.warning("disk_cache_clear_failed", path=str(path), error=str(e))
-    
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        try:
+            return await asyncio.to_thread(self._get_sync, key)
+        except sqlite3.Error as e:
+            logger.warning("disk_cache_index_failed", key=key, error=str(e))
+            return None
+
+    async def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        compress: bool = True,
+        tags: Iterable[str] = (),
+    ) -> bool:
+        try:
+            return await asyncio.to_thread(self._set_sync, key, value, ttl, compress, tuple(tags))
+        except Exception as e:
+            logger.warning("disk_cache_write_failed", key=key, error=str(e))
+            return False
+
+    async def delete(self, key: str) -> bool:
+        return await asyncio.to_thread(self._delete_sync, key)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Drop every entry carrying any of *tags*; returns how many."""
+        tags = list(tags)
+        if not tags:
+            return 0
+        marks = ", ".join("?" * len(tags))
+        return await asyncio.to_thread(
+            self._invalidate_sync, f"key IN (SELECT key FROM tags WHERE tag IN ({marks}))", tuple(tags)
+        )
+
+    async def invalidate_pattern(self, pattern: str) -> int:
+        """Drop every key matching the glob *pattern* (Redis-style)."""
+        return await asyncio.to_thread(self._invalidate_sync, "key GLOB ?", (pattern,))
+
+    async def purge_expired(self) -> int:
+        """Drop every expired entry now; returns how many were dropped."""
+        return await asyncio.to_thread(self._invalidate_sync, "expires_at <= ?", (time.time(),))
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear_sync)
+
     def stats(self) -> Dict[str, Any]:
-        total_files = 0
-        total_size = 0
-        
-        for path in self.cache_dir.glob("*.cache"):
-            total_files += 1
-            total_size += path.stat().st_size
-        
+        with self._lock:
+            entries, size = self._index().execute("SELECT entries, size FROM totals").fetchone()
         return {
-            'files': total_files,
-            'size_bytes': total_size,
+            'files': entries,
+            'size_bytes': size,
+            'max_size': self.max_bytes,
+            'utilization': size / self.max_bytes if self.max_bytes > 0 else 0,
             'directory': str(self.cache_dir)
         }
 
@@ -275,13 +703,6 @@ class EnhancedCacheService:
     """Multi-tier cache service with intelligent caching strategies."""
     
     def __init__(self):
-        # Initialize cache levels
-        self.l1_cache = MemoryCache(
-            max_size=100 * 1024 * 1024  # 100MB
-        )
-        self.l2_cache = redis_client
-        self.l3_cache = DiskCache()
-        
         # Default configurations
         self.default_configs = {
             'thumbnails': CacheConfig(CacheLevel.L1_MEMORY, ttl=3600, max_size=50*1024*1024),
@@ -291,6 +712,23 @@ class EnhancedCacheService:
             'user_sessions': CacheConfig(CacheLevel.L2_REDIS, ttl=1800),
             'static_assets': CacheConfig(CacheLevel.L3_DISK, ttl=86400*7, compression=True)
         }
+
+        # Initialize cache levels; L1 types with max_size get their own byte budget
+        self.l1_cache = MemoryCache(
+            max_size=settings.CACHE_L1_MAX_BYTES,
+            budgets={
+                name: config.max_size
+                for name, config in self.default_configs.items()
+                if config.level == CacheLevel.L1_MEMORY and config.max_size
+            },
+            shards=settings.CACHE_L1_SHARDS,
+        )
+        self.l2_cache = redis_client
+        self.l3_cache = DiskCache()
+
+        # Invalidation bus: this worker's id, so it skips its own broadcasts
+        self.instance_id = uuid.uuid4().hex
+        self._bus_task: Optional[asyncio.Task] = None
         
         # Performance tracking
         self.stats = {
@@ -319,6 +757,7 @@ class EnhancedCacheService:
         start_time = time.time()
         
         try:
+            self._ensure_bus()
             config = self._get_config(cache_type)
             
             # Try L1 (memory) first
@@ -340,13 +779,13 @@ class EnhancedCacheService:
             # Try L2 (Redis)
             if config.level in [CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
                 try:
-                    cached_data = await self.l2_cache.get(key)
+                    cached_data = await self.l2_cache.get(self._redis_key(key))
                     if cached_data:
                         value = json.loads(cached_data) if config.serialization == 'json' else pickle.loads(cached_data)
                         
                         # Promote to L1 if strategy is write-through
                         if strategy == CacheStrategy.WRITE_THROUGH:
-                            await self.l1_cache.set(key, value, config.ttl)
+                            await self.l1_cache.set(key, value, config.ttl, cache_type=cache_type)
                         
                         self.stats['hits'][CacheLevel.L2_REDIS.value] += 1
                         CACHE_OPERATIONS.labels(
@@ -368,8 +807,8 @@ class EnhancedCacheService:
                     
                     # Promote to higher levels
                     if strategy == CacheStrategy.WRITE_THROUGH:
-                        await self.l1_cache.set(key, value, config.ttl)
-                        await self._set_l2(key, value, config)
+                        await self.l1_cache.set(key, value, config.ttl, cache_type=cache_type, tags=entry.tags)
+                        await self._set_l2(key, value, config, tags=entry.tags)
                     
                     self.stats['hits'][CacheLevel.L3_DISK.value] += 1
                     CACHE_OPERATIONS.labels(
@@ -406,15 +845,22 @@ class EnhancedCacheService:
         value: Any,
         cache_type: str = 'default',
         ttl: Optional[int] = None,
-        strategy: CacheStrategy = CacheStrategy.WRITE_THROUGH
+        strategy: CacheStrategy = CacheStrategy.WRITE_THROUGH,
+        tags: Iterable[str] = ()
     ) -> bool:
-        """Set value in cache with strategy-based storage."""
+        """Set value in cache with strategy-based storage.
+
+        ``tags`` (e.g. ``content:42``, ``company:7``) group entries for
+        :meth:`invalidate_tags`.
+        """
         
         start_time = time.time()
         
         try:
+            self._ensure_bus()
             config = self._get_config(cache_type)
             effective_ttl = ttl or config.ttl
+            tags = tuple(tags)
             
             success = True
             
@@ -422,29 +868,32 @@ class EnhancedCacheService:
             if strategy == CacheStrategy.WRITE_THROUGH:
                 # Store in all applicable levels
                 if config.level in [CacheLevel.L1_MEMORY]:
-                    await self.l1_cache.set(key, value, effective_ttl)
+                    await self.l1_cache.set(key, value, effective_ttl, cache_type=cache_type, tags=tags)
                 
                 if config.level in [CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                    await self._set_l2(key, value, config, effective_ttl)
+                    await self._set_l2(key, value, config, effective_ttl, tags)
                 
                 if config.level in [CacheLevel.L3_DISK, CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                    await self.l3_cache.set(key, value, effective_ttl, config.compression)
+                    await self.l3_cache.set(key, value, effective_ttl, config.compression, tags)
                     
             elif strategy == CacheStrategy.LAZY:
                 # Store only in the configured level
                 if config.level == CacheLevel.L1_MEMORY:
-                    await self.l1_cache.set(key, value, effective_ttl)
+                    await self.l1_cache.set(key, value, effective_ttl, cache_type=cache_type, tags=tags)
                 elif config.level == CacheLevel.L2_REDIS:
-                    await self._set_l2(key, value, config, effective_ttl)
+                    await self._set_l2(key, value, config, effective_ttl, tags)
                 elif config.level == CacheLevel.L3_DISK:
-                    await self.l3_cache.set(key, value, effective_ttl, config.compression)
+                    await self.l3_cache.set(key, value, effective_ttl, config.compression, tags)
                     
             elif strategy == CacheStrategy.WRITE_BACK:
                 # Store in L1, async to others
-                await self.l1_cache.set(key, value, effective_ttl)
+                await self.l1_cache.set(key, value, effective_ttl, cache_type=cache_type, tags=tags)
                 
                 # Async background write to other levels
-                asyncio.create_task(self._background_write(key, value, config))
+                asyncio.create_task(self._background_write(key, value, config, tags))
+
+            # Other workers drop their L1 copy, so an overwrite is seen everywhere
+            await self._publish(keys=[key])
             
             # Update metrics
             for level in [CacheLevel.L1_MEMORY, CacheLevel.L2_REDIS, CacheLevel.L3_DISK]:
@@ -479,12 +928,13 @@ class EnhancedCacheService:
                 tasks.append(self.l1_cache.delete(key))
             
             if config.level in [CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                tasks.append(self.l2_cache.delete(key))
+                tasks.append(self.l2_cache.delete(self._redis_key(key)))
             
             if config.level in [CacheLevel.L3_DISK, CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
                 tasks.append(self.l3_cache.delete(key))
             
             results = await asyncio.gather(*tasks, return_exceptions=True)
+            await self._publish(keys=[key])
             return any(r is True for r in results)
             
         except Exception as e:
@@ -515,26 +965,59 @@ class EnhancedCacheService:
         return value
     
     async def invalidate_pattern(self, pattern: str, cache_type: str = 'default') -> int:
-        """Invalidate keys matching pattern."""
+        """Invalidate keys matching a glob pattern in every tier and worker.
+
+        Redis is walked with ``SCAN`` under the cache namespace, never
+        ``KEYS``.  ``cache_type`` is accepted for compatibility; patterns
+        apply to all types.
+        """
         
         try:
-            config = self._get_config(cache_type)
-            deleted_count = 0
-            
-            # For Redis, we can use KEYS pattern
-            if config.level in [CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                keys = await self.l2_cache.keys(pattern)
-                if keys:
-                    deleted_count += await self.l2_cache.delete(*keys)
-            
-            # For memory and disk, we need to iterate
-            # This is a simplified implementation
+            self._get_config(cache_type)
+            deleted_count = await self.l1_cache.invalidate_pattern(pattern)
+            deleted_count += await self._scan_delete(self._redis_key(pattern))
+            deleted_count += await self.l3_cache.invalidate_pattern(pattern)
+            await self._publish(patterns=[pattern])
+
             logger.info("cache_pattern_invalidated", pattern=pattern, deleted=deleted_count)
             return deleted_count
             
         except Exception as e:
             logger.error("cache_invalidate_pattern_error", pattern=pattern, error=str(e))
             return 0
+
+    async def invalidate_tags(self, *tags: str) -> int:
+        """Drop every entry tagged with any of *tags* from all tiers and workers.
+
+        Returns the number of entries removed across tiers on this worker.
+        """
+        if not tags:
+            return 0
+        try:
+            keys: Set[str] = set()
+            try:
+                for tag in tags:
+                    keys.update(await self.l2_cache.smembers(self._tag_key(tag)))
+                if keys:
+                    await self.l2_cache.delete(*(self._redis_key(key) for key in keys))
+                await self.l2_cache.delete(*(self._tag_key(tag) for tag in tags))
+            except Exception as e:
+                logger.warning("l2_tag_invalidation_error", tags=tags, error=str(e))
+
+            deleted_count = len(keys)
+            deleted_count += await self.l1_cache.invalidate_tags(tags)
+            for key in keys:
+                deleted_count += await self.l1_cache.delete(key)
+            deleted_count += await self.l3_cache.invalidate_tags(tags)
+            # L2-backed keys go along, so workers drop copies promoted without tags
+            await self._publish(tags=list(tags), keys=sorted(keys))
+
+            logger.info("cache_tags_invalidated", tags=tags, deleted=deleted_count)
+            return deleted_count
+
+        except Exception as e:
+            logger.error("cache_invalidate_tags_error", tags=tags, error=str(e))
+            return 0
     
     async def warm_cache(self, keys: List[str], factory: Callable[[str], Any], cache_type: str = 'default'):
         """Warm cache with precomputed values."""
@@ -557,7 +1040,14 @@ class EnhancedCacheService:
             return False
         return time.time() - entry.created_at > entry.ttl
     
-    async def _set_l2(self, key: str, value: Any, config: CacheConfig, ttl: Optional[int] = None):
+    async def _set_l2(
+        self,
+        key: str,
+        value: Any,
+        config: CacheConfig,
+        ttl: Optional[int] = None,
+        tags: Iterable[str] = ()
+    ):
         """Set value in L2 (Redis) cache."""
         try:
             effective_ttl = ttl or config.ttl
@@ -568,27 +1058,119 @@ class EnhancedCacheService:
                 data = pickle.dumps(value)
             
             if effective_ttl:
-                await self.l2_cache.setex(key, effective_ttl, data)
+                await self.l2_cache.setex(self._redis_key(key), effective_ttl, data)
             else:
-                await self.l2_cache.set(key, data)
+                await self.l2_cache.set(self._redis_key(key), data)
+
+            # Tag sets outlive their longest-lived member, then expire on their own
+            tag_ttl = max([effective_ttl or 0] + [c.ttl for c in self.default_configs.values()])
+            for tag in tags:
+                await self.l2_cache.sadd(self._tag_key(tag), key)
+                await self.l2_cache.expire(self._tag_key(tag), tag_ttl)
                 
         except Exception as e:
             logger.warning("l2_cache_set_error", key=key, error=str(e))
     
-    async def _background_write(self, key: str, value: Any, config: CacheConfig):
+    async def _background_write(self, key: str, value: Any, config: CacheConfig, tags: Iterable[str] = ()):
         """Background write for write-back strategy."""
         try:
             await asyncio.sleep(0.1)  # Small delay
             
             if config.level in [CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                await self._set_l2(key, value, config)
+                await self._set_l2(key, value, config, tags=tags)
             
             if config.level in [CacheLevel.L3_DISK, CacheLevel.L2_REDIS, CacheLevel.L1_MEMORY]:
-                await self.l3_cache.set(key, value, config.ttl, config.compression)
+                await self.l3_cache.set(key, value, config.ttl, config.compression, tags)
                 
         except Exception as e:
             logger.warning("background_write_failed", key=key, error=str(e))
     
+    @staticmethod
+    def _redis_key(key: str) -> str:
+        return f"{settings.CACHE_KEY_PREFIX}:{key}"
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"{settings.CACHE_KEY_PREFIX}:tag:{tag}"
+
+    async def _scan_delete(self, match: str) -> int:
+        """Delete Redis keys matching *match* in ``SCAN`` batches."""
+        deleted = 0
+        batch: List[str] = []
+        async for key in self.l2_cache.scan_iter(match=match, count=_SCAN_BATCH):
+            batch.append(key)
+            if len(batch) >= _SCAN_BATCH:
+                deleted += await self.l2_cache.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await self.l2_cache.delete(*batch)
+        return deleted
+
+    def _ensure_bus(self) -> None:
+        """Subscribe this worker to the invalidation bus on first cache use."""
+        if self._bus_task is None and settings.CACHE_INVALIDATION_BUS_ENABLED:
+            self._bus_task = asyncio.create_task(self._listen())
+
+    async def _publish(self, **message: Any) -> None:
+        """Broadcast an invalidation so other workers drop their local copies."""
+        if not settings.CACHE_INVALIDATION_BUS_ENABLED:
+            return
+        try:
+            await self.l2_cache.publish(
+                settings.CACHE_INVALIDATION_CHANNEL,
+                json.dumps({'origin': self.instance_id, **message}),
+            )
+        except Exception as e:
+            logger.warning("cache_invalidation_publish_failed", error=str(e))
+
+    async def _listen(self) -> None:
+        """Apply invalidations broadcast by other workers; resubscribes on errors."""
+        delay = 1
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.l2_cache.pubsub()
+                await pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+                delay = 1
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        await self.apply_invalidation(json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("cache_invalidation_bus_error", error=str(e), retry_in=delay)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    async def apply_invalidation(self, message: Dict[str, Any]) -> None:
+        """Drop L1 copies named by a bus message from another worker.
+
+        Redis and the disk tier are shared, and the sender has already
+        updated them, so only this worker's memory is touched here.
+        """
+        if message.get('origin') == self.instance_id:
+            return
+        if message.get('clear'):
+            await self.l1_cache.clear()
+            return
+        for key in message.get('keys', ()):
+            await self.l1_cache.delete(key)
+        if message.get('tags'):
+            await self.l1_cache.invalidate_tags(message['tags'])
+        for pattern in message.get('patterns', ()):
+            await self.l1_cache.invalidate_pattern(pattern)
+        CACHE_OPERATIONS.labels(
+            level=CacheLevel.L1_MEMORY.value,
+            operation='invalidate',
+            status='remote'
+        ).inc()
+
     def _calculate_hit_rate(self, level: CacheLevel) -> float:
         """Calculate hit rate for cache level."""
         hits = self.stats['hits'][level.value]
@@ -602,6 +1184,16 @@ class EnhancedCacheService:
             try:
                 await asyncio.sleep(300)  # Run every 5 minutes
                 
+                expired = await self.l1_cache.purge_expired()
+                if expired:
+                    CACHE_OPERATIONS.labels(
+                        level=CacheLevel.L1_MEMORY.value,
+                        operation='expire',
+                        status='success'
+                    ).inc(expired)
+
+                await self.l3_cache.purge_expired()
+
                 # Update cache size metrics
                 l1_stats = self.l1_cache.stats()
                 CACHE_SIZE.labels(level=CacheLevel.L1_MEMORY.value).set(l1_stats['size_bytes'])
@@ -629,18 +1221,17 @@ class EnhancedCacheService:
         }
     
     async def clear_all(self):
-        """Clear all cache levels."""
+        """Clear all cache levels (only our namespace in the shared Redis)."""
         await self.l1_cache.clear()
         
         # Clear Redis keys with our prefix
         try:
-            keys = await self.l2_cache.keys("*")
-            if keys:
-                await self.l2_cache.delete(*keys)
+            await self._scan_delete(f"{settings.CACHE_KEY_PREFIX}:*")
         except Exception as e:
             logger.warning("redis_clear_error", error=str(e))
         
         await self.l3_cache.clear()
+        await self._publish(clear=True)
         
         # Reset stats
         for level in CacheLevel:
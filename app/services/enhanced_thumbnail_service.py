@@ -4,7 +4,9 @@ Enhanced Thumbnail Service with multiple sizes, caching, and progressive loading
 import asyncio
 import hashlib
 import json
+import os
 import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, Dict, List, Tuple, Any
 from enum import Enum
@@ -16,6 +18,7 @@ from PIL import Image, ImageOps
 from prometheus_client import Counter, Histogram, Gauge
 
 from app.core.config import settings
+from app.core.process_pool import run_in_process
 from app.core.redis import redis_client
 
 logger = structlog.get_logger()
@@ -91,6 +94,46 @@ THUMBNAIL_FILE_SIZE = Histogram(
     ['size', 'format']
 )
 
+def render_thumbnail(
+    file_path: str,
+    width: int,
+    height: int,
+    format_value: str,
+    quality: int,
+    optimize: bool,
+) -> bytes:
+    """Encode a thumbnail of *file_path* (plain args so it can run in a worker process)."""
+    fmt = ThumbnailFormat(format_value)
+    with Image.open(file_path) as img:
+        # Convert to RGB if needed (for JPEG)
+        if fmt == ThumbnailFormat.JPEG and img.mode in ('RGBA', 'LA', 'P'):
+            # Create white background for transparent images
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            img = background
+        elif img.mode in ('RGBA', 'LA', 'P') and fmt != ThumbnailFormat.PNG:
+            img = img.convert('RGB')
+
+        # Use smart resize for better quality
+        img = ImageOps.contain(img, (width, height), Image.Resampling.LANCZOS)
+
+        # Save to bytes buffer
+        buffer = BytesIO()
+
+        save_kwargs = {
+            'format': fmt.value.upper(),
+            'optimize': optimize
+        }
+
+        if fmt in [ThumbnailFormat.JPEG, ThumbnailFormat.WEBP]:
+            save_kwargs['quality'] = quality
+
+        img.save(buffer, **save_kwargs)
+        return buffer.getvalue()
+
+
 class EnhancedThumbnailService:
     """Enhanced thumbnail service with caching and progressive loading."""
     
@@ -102,15 +145,51 @@ class EnhancedThumbnailService:
         ]
         self.cache_ttl = 86400 * 30  # 30 days
         self.max_file_size = 50 * 1024 * 1024  # 50MB for source files
-        
+        # path -> (size, mtime_ns, sha256) of files hashed while uploading
+        self._known_hashes: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._known_hashes_limit = 4096
+
+    def remember_file_hash(self, file_path, sha256: str) -> None:
+        """Record a hash computed elsewhere (e.g. during upload streaming).
+
+        Keyed by path and validated by size + mtime, so a file replaced in
+        place is hashed again.
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return
+        key = str(file_path)
+        self._known_hashes[key] = (stat.st_size, stat.st_mtime_ns, sha256)
+        self._known_hashes.move_to_end(key)
+        while len(self._known_hashes) > self._known_hashes_limit:
+            self._known_hashes.popitem(last=False)
+
+    def _remembered_hash(self, file_path: str) -> Optional[str]:
+        known = self._known_hashes.get(str(file_path))
+        if known is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if (stat.st_size, stat.st_mtime_ns) != known[:2]:
+            self._known_hashes.pop(str(file_path), None)
+            return None
+        return known[2]
+
     async def get_file_hash(self, file_path: str) -> str:
         """Generate SHA-256 hash of file for cache key."""
+        remembered = self._remembered_hash(file_path)
+        if remembered is not None:
+            return remembered
+
         hash_sha256 = hashlib.sha256()
         
         try:
             with open(file_path, "rb") as f:
                 # Read file in chunks to handle large files
-                for chunk in iter(lambda: f.read(4096), b""):
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
                     hash_sha256.update(chunk)
             return hash_sha256.hexdigest()
         except Exception as e:
@@ -210,7 +289,8 @@ class EnhancedThumbnailService:
         config: Optional[ThumbnailConfig] = None,
         provider=None,
         company_id: Optional[int] = None,
-        force_regenerate: bool = False
+        force_regenerate: bool = False,
+        in_process: bool = False,
     ) -> ThumbnailResult:
         """
         Generate thumbnail with caching and progressive loading support.
@@ -221,6 +301,7 @@ class EnhancedThumbnailService:
             provider: Storage provider for cloud storage
             company_id: Company ID for storage path
             force_regenerate: Skip cache and regenerate
+            in_process: Encode on the shared process pool (batch jobs)
             
         Returns:
             ThumbnailResult with generation details
@@ -266,7 +347,7 @@ class EnhancedThumbnailService:
             
             # Generate thumbnail in memory
             thumbnail_data = await self._generate_thumbnail_in_memory(
-                file_path, config, validation.metadata
+                file_path, config, validation.metadata, in_process=in_process
             )
             
             # Generate filename
@@ -352,41 +433,21 @@ class EnhancedThumbnailService:
         self,
         file_path: str,
         config: ThumbnailConfig,
-        source_metadata: Dict[str, Any]
+        source_metadata: Dict[str, Any],
+        in_process: bool = False,
     ) -> bytes:
-        """Generate thumbnail in memory using PIL."""
-        
-        with Image.open(file_path) as img:
-            # Convert to RGB if needed (for JPEG)
-            if config.format == ThumbnailFormat.JPEG and img.mode in ('RGBA', 'LA', 'P'):
-                # Create white background for transparent images
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode in ('RGBA', 'LA', 'P') and config.format != ThumbnailFormat.PNG:
-                img = img.convert('RGB')
-            
-            # Calculate thumbnail size maintaining aspect ratio
-            target_width, target_height = config.size.width, config.size.height
-            
-            # Use smart resize for better quality
-            img = ImageOps.contain(img, (target_width, target_height), Image.Resampling.LANCZOS)
-            
-            # Save to bytes buffer
-            buffer = BytesIO()
-            
-            save_kwargs = {
-                'format': config.format.value.upper(),
-                'optimize': config.optimize
-            }
-            
-            if config.format in [ThumbnailFormat.JPEG, ThumbnailFormat.WEBP]:
-                save_kwargs['quality'] = config.quality
-            
-            img.save(buffer, **save_kwargs)
-            return buffer.getvalue()
+        """Generate thumbnail in memory using PIL (off the event loop)."""
+        args = (
+            str(file_path),
+            config.size.width,
+            config.size.height,
+            config.format.value,
+            config.quality,
+            config.optimize,
+        )
+        if in_process:
+            return await run_in_process(render_thumbnail, *args)
+        return await asyncio.to_thread(render_thumbnail, *args)
     
     async def _save_to_cloud_storage(
         self,
@@ -423,7 +484,8 @@ class EnhancedThumbnailService:
         configs: Optional[List[ThumbnailConfig]] = None,
         provider=None,
         company_id: Optional[int] = None,
-        force_regenerate: bool = False
+        force_regenerate: bool = False,
+        in_process: bool = False,
     ) -> List[ThumbnailResult]:
         """Generate multiple thumbnails with different configurations."""
         
@@ -431,13 +493,15 @@ class EnhancedThumbnailService:
             configs = self.default_configs
         
         # Generate all thumbnails concurrently
+        extra = {"in_process": True} if in_process else {}
         tasks = [
             self.generate_thumbnail(
                 file_path=file_path,
                 config=config,
                 provider=provider,
                 company_id=company_id,
-                force_regenerate=force_regenerate
+                force_regenerate=force_regenerate,
+                **extra,
             )
             for config in configs
         ]
@@ -506,14 +570,19 @@ class EnhancedThumbnailService:
                 logger.info("cache_cleared_for_file", file_path=file_path, keys_deleted=keys_deleted)
                 return keys_deleted
             else:
-                # Clear all thumbnail cache
-                pattern = "thumb:*"
-                keys = await redis_client.keys(pattern)
-                if keys:
-                    deleted = await redis_client.delete(*keys)
+                # Clear all thumbnail cache (SCAN in batches, KEYS would block Redis)
+                deleted = 0
+                batch = []
+                async for key in redis_client.scan_iter(match="thumb:*", count=500):
+                    batch.append(key)
+                    if len(batch) >= 500:
+                        deleted += await redis_client.delete(*batch)
+                        batch = []
+                if batch:
+                    deleted += await redis_client.delete(*batch)
+                if deleted:
                     logger.info("all_cache_cleared", keys_deleted=deleted)
-                    return deleted
-                return 0
+                return deleted
                 
         except Exception as e:
             logger.error("cache_clear_failed", file_path=file_path, error=str(e))
@@ -0,0 +1,442 @@
+"""HLS adaptive-bitrate renditions for AR overlay videos.
+
+The manifest's ``video_url`` points at the original upload (up to 100 MB);
+on mobile data the viewer waits for a progressive download.  When
+``VIDEO_HLS_ENABLED`` is set, every uploaded video is queued here and
+transcoded by a bounded worker into a small ladder (``360p/540p/720p`` by
+default, never upscaled) with keyframes forced on segment boundaries, so all
+renditions switch cleanly, plus a ``poster.jpg`` frame.
+
+Renditions are stored next to the video blob (``blobs/ab/<sha>/hls/``) —
+duplicates of the same video reuse them and they are purged together with
+the blob.  Videos without a blob (legacy uploads) use ``hls/video_<id>/``.
+Yandex Disk companies get them uploaded to their Disk; every other company
+(local and S3) gets them on local storage, served from ``/storage/``.
+
+Yandex Disk download links are per-file and expire, so playlists for YD are
+rewritten to point every segment at the ``/api/storage/yd-file`` proxy.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+from urllib.parse import quote
+
+import structlog
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+from app.services.ar_content_pipeline import POOL_UPLOAD, get_pool_semaphore
+from app.services.media_blob_service import blob_relative_dir, media_blob_service
+from app.services.video_ingest_service import probe_video
+
+logger = structlog.get_logger()
+
+_YADISK_PREFIX = "yadisk://"
+HLS_MASTER = "master.m3u8"
+HLS_POSTER = "poster.jpg"
+
+HLS_JOBS = Counter(
+    "video_hls_jobs_total",
+    "HLS transcoding jobs by outcome",
+    ["result"],
+)
+
+HLS_DURATION = Histogram(
+    "video_hls_transcode_duration_seconds",
+    "Wall-clock time of an HLS transcode (ffmpeg only)",
+    buckets=(5, 15, 30, 60, 120, 300, 600, 1200),
+)
+
+HLS_QUEUE_DEPTH = Gauge(
+    "video_hls_queue_depth",
+    "Videos waiting for an HLS worker",
+)
+
+# Video bitrate per rendition height (kbit/s); audio is 96k AAC everywhere.
+_BITRATES_KBPS = {240: 400, 360: 800, 480: 1200, 540: 1600, 720: 2800, 1080: 5000}
+
+
+@dataclass(frozen=True)
+class Rendition:
+    height: int
+    video_kbps: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.height}p"
+
+
+def configured_heights() -> list[int]:
+    heights = []
+    for part in settings.VIDEO_HLS_RENDITIONS.split(","):
+        part = part.strip().lower().rstrip("p")
+        if part.isdigit():
+            heights.append(int(part))
+    return sorted(set(heights))
+
+
+def select_renditions(source_height: Optional[int], heights: Optional[list[int]] = None) -> list[Rendition]:
+    """Ladder for a source: never upscale, but always keep the lowest rung."""
+    heights = heights if heights is not None else configured_heights()
+    if not heights:
+        return []
+    usable = [h for h in heights if not source_height or h <= source_height] or heights[:1]
+    return [
+        Rendition(height=h, video_kbps=_BITRATES_KBPS.get(h, max(300, int(h * 3.9))))
+        for h in usable
+    ]
+
+
+def build_hls_command(
+    source: Path,
+    output_dir: Path,
+    renditions: list[Rendition],
+    *,
+    has_audio: bool,
+    fps: Optional[float],
+    segment_seconds: int,
+    threads: int,
+) -> list[str]:
+    """ffmpeg arguments for a single-pass multi-rendition HLS encode."""
+    count = len(renditions)
+    gop = max(1, round((fps or 30.0) * segment_seconds))
+    split = "".join(f"[s{i}]" for i in range(count))
+    filters = [f"[0:v]split={count}{split}"]
+    filters += [f"[s{i}]scale=-2:{r.height}[v{i}]" for i, r in enumerate(renditions)]
+
+    cmd = [
+        "ffmpeg", "-v", "error", "-y",
+        "-i", str(source),
+        "-filter_complex", ";".join(filters),
+    ]
+    stream_map = []
+    for i, r in enumerate(renditions):
+        cmd += ["-map", f"[v{i}]"]
+        if has_audio:
+            cmd += ["-map", "0:a:0"]
+        cmd += [
+            f"-b:v:{i}", f"{r.video_kbps}k",
+            f"-maxrate:v:{i}", f"{int(r.video_kbps * 1.07)}k",
+            f"-bufsize:v:{i}", f"{r.video_kbps * 2}k",
+        ]
+        stream_map.append(f"v:{i},a:{i},name:{r.name}" if has_audio else f"v:{i},name:{r.name}")
+
+    cmd += [
+        "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main", "-pix_fmt", "yuv420p",
+        # Aligned keyframes: fixed GOP, no scene-cut keyframes, forced on segment boundaries
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+        "-threads", str(max(1, threads)),
+    ]
+    if has_audio:
+        cmd += ["-c:a", "aac", "-b:a", "96k", "-ac", "2"]
+    cmd += [
+        "-f", "hls",
+        "-hls_time", str(segment_seconds),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", str(output_dir / "%v" / "seg_%03d.ts"),
+        "-master_pl_name", HLS_MASTER,
+        "-var_stream_map", " ".join(stream_map),
+        str(output_dir / "%v" / "index.m3u8"),
+    ]
+    return cmd
+
+
+async def _run_ffmpeg(cmd: list[str]) -> None:
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[:500]}")
+
+
+async def transcode(source: Path, output_dir: Path) -> list[Rendition]:
+    """Encode the HLS ladder and poster frame of *source* into *output_dir*."""
+    meta = await probe_video(source)
+    if meta is None or not meta.height:
+        raise RuntimeError("Unable to probe source video")
+    renditions = select_renditions(meta.height)
+    if not renditions:
+        raise RuntimeError("No HLS renditions configured")
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for r in renditions:
+        (output_dir / r.name).mkdir(exist_ok=True)
+
+    await _run_ffmpeg(
+        build_hls_command(
+            source,
+            output_dir,
+            renditions,
+            has_audio=meta.audio_codec is not None,
+            fps=meta.fps,
+            segment_seconds=settings.VIDEO_HLS_SEGMENT_SECONDS,
+            threads=settings.VIDEO_HLS_FFMPEG_THREADS,
+        )
+    )
+    poster_at = min(1.0, (meta.duration or 0) / 2)
+    await _run_ffmpeg([
+        "ffmpeg", "-v", "error", "-y",
+        "-ss", f"{poster_at:.3f}",
+        "-i", str(source),
+        "-frames:v", "1",
+        "-vf", f"scale=-2:{renditions[-1].height}",
+        "-q:v", "3",
+        str(output_dir / HLS_POSTER),
+    ])
+    if not (output_dir / HLS_MASTER).exists():
+        raise RuntimeError("ffmpeg did not produce a master playlist")
+    return renditions
+
+
+def yd_proxy_url(relative: str, company_id: int) -> str:
+    """Same-host proxy URL for a Yandex Disk file (see ``/api/storage/yd-file``)."""
+    return f"/api/storage/yd-file?path={quote(relative, safe='/')}&company_id={company_id}"
+
+
+def rewrite_playlist(text: str, url_for: Callable[[str], str]) -> str:
+    """Replace every URI line of an m3u8 playlist with ``url_for(uri)``."""
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        lines.append(url_for(stripped) if stripped and not stripped.startswith("#") else line)
+    return "\n".join(lines) + "\n"
+
+
+def _rewrite_for_proxy(output_dir: Path, root: str, company_id: int) -> None:
+    for playlist in output_dir.rglob("*.m3u8"):
+        base = playlist.parent.relative_to(output_dir).as_posix()
+        prefix = f"{root}/{base}" if base != "." else root
+        playlist.write_text(
+            rewrite_playlist(
+                playlist.read_text(),
+                lambda uri, prefix=prefix: yd_proxy_url(f"{prefix}/{uri}", company_id),
+            )
+        )
+
+
+async def publish(output_dir: Path, root: str, provider, company_id: int) -> dict[str, str]:
+    """Store the encoded ladder under *root* (on Yandex Disk or local storage)."""
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.utils.ar_content import build_public_url
+
+    if isinstance(provider, YandexDiskStorageProvider):
+        _rewrite_for_proxy(output_dir, root, company_id)
+        semaphore = get_pool_semaphore(POOL_UPLOAD)
+
+        async def _upload(path: Path) -> None:
+            async with semaphore:
+                await provider.save_file(str(path), f"{root}/{path.relative_to(output_dir).as_posix()}")
+
+        # Segments first, playlists last: a visible master is always complete.
+        files = [p for p in output_dir.rglob("*") if p.is_file()]
+        segments = [p for p in files if p.suffix != ".m3u8"]
+        playlists = [p for p in files if p.suffix == ".m3u8" and p.name != HLS_MASTER]
+        await asyncio.gather(*(_upload(p) for p in segments))
+        await asyncio.gather(*(_upload(p) for p in playlists))
+        await _upload(output_dir / HLS_MASTER)
+        return {
+            "hls_path": f"{_YADISK_PREFIX}{root}/{HLS_MASTER}",
+            "hls_url": f"{_YADISK_PREFIX}{root}/{HLS_MASTER}",
+            "poster_url": f"{_YADISK_PREFIX}{root}/{HLS_POSTER}",
+        }
+
+    target = Path(settings.STORAGE_BASE_PATH) / root
+    if target.exists():
+        shutil.rmtree(target, ignore_errors=True)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(output_dir), str(target))
+    # Local files get local URLs, whatever the company's provider (S3 would give s3:// refs)
+    return {
+        "hls_path": str(target / HLS_MASTER),
+        "hls_url": build_public_url(target / HLS_MASTER),
+        "poster_url": build_public_url(target / HLS_POSTER),
+    }
+
+
+def legacy_root(video_id: int) -> str:
+    return f"hls/video_{video_id}"
+
+
+async def delete_renditions(video_id: int, hls_path: Optional[str], provider=None) -> None:
+    """Remove per-video renditions; blob renditions go away with the blob."""
+    if not hls_path or f"/{legacy_root(video_id)}/" not in f"/{hls_path.replace(_YADISK_PREFIX, '')}":
+        return
+    try:
+        if hls_path.startswith(_YADISK_PREFIX):
+            if provider is not None:
+                await provider.delete_file(legacy_root(video_id))
+        else:
+            shutil.rmtree(Path(settings.STORAGE_BASE_PATH) / legacy_root(video_id), ignore_errors=True)
+    except Exception as exc:
+        logger.warning("video_hls_delete_failed", video_id=video_id, error=str(exc))
+
+
+async def _set_status(video_id: int, **values) -> None:
+    from app.core.database import AsyncSessionLocal
+    from app.models.video import Video
+
+    async with AsyncSessionLocal() as session:
+        video = await session.get(Video, video_id)
+        if video is not None:
+            for key, value in values.items():
+                setattr(video, key, value)
+            await session.commit()
+
+
+async def process_video_hls(video_id: int) -> Optional[dict[str, str]]:
+    """Build (or reuse) the HLS ladder of one video and record it on the row."""
+    from app.core.database import AsyncSessionLocal
+    from app.core.storage_providers import get_provider_for_company, split_remote_ref
+    from app.models.ar_content import ARContent
+    from app.models.company import Company
+    from app.models.video import Video
+
+    log = logger.bind(video_id=video_id)
+    async with AsyncSessionLocal() as session:
+        video = await session.get(Video, video_id)
+        if video is None or not video.video_path:
+            log.warning("video_hls_video_missing")
+            return None
+        ar_content = await session.get(ARContent, video.ar_content_id)
+        company = await session.get(Company, ar_content.company_id) if ar_content else None
+        if company is None:
+            log.warning("video_hls_company_missing")
+            return None
+        blob = await media_blob_service.find_by_path(session, company.id, video.video_path)
+        cached = dict((blob.derived or {}).get("hls") or {}) if blob else {}
+        video_path = video.video_path
+        if cached:
+            video.hls_path = cached.get("hls_path")
+            video.hls_url = cached.get("hls_url")
+            video.poster_url = cached.get("poster_url")
+            video.hls_status = "ready"
+            await session.commit()
+            HLS_JOBS.labels(result="reused").inc()
+            log.info("video_hls_reused", sha256=blob.sha256)
+            return cached
+        video.hls_status = "processing"
+        await session.commit()
+        root = f"{blob_relative_dir(blob.sha256)}/hls" if blob else legacy_root(video_id)
+
+    provider = await get_provider_for_company(company)
+    loop = asyncio.get_running_loop()
+    try:
+        with tempfile.TemporaryDirectory(prefix="hls_") as tmp:
+            tmp_dir = Path(tmp)
+            source = Path(video_path)
+            remote = split_remote_ref(video_path)
+            if remote:
+                source = tmp_dir / f"source{Path(video_path).suffix or '.mp4'}"
+                if not await provider.get_file(remote[1], str(source)):
+                    raise RuntimeError(f"Failed to download source video from {remote[0]}")
+            started = loop.time()
+            renditions = await transcode(source, tmp_dir / "hls")
+            HLS_DURATION.observe(loop.time() - started)
+            result = await publish(tmp_dir / "hls", root, provider, company.id)
+    except Exception as exc:
+        HLS_JOBS.labels(result="failed").inc()
+        log.error("video_hls_failed", error=str(exc))
+        await _set_status(video_id, hls_status="failed")
+        return None
+
+    async with AsyncSessionLocal() as session:
+        video = await session.get(Video, video_id)
+        if video is None:
+            return result
+        video.hls_path = result["hls_path"]
+        video.hls_url = result["hls_url"]
+        video.poster_url = result["poster_url"]
+        video.hls_status = "ready"
+        blob = await media_blob_service.find_by_path(session, company.id, video.video_path)
+        if blob is not None:
+            await media_blob_service.update_derived(session, blob, hls=result)
+        await session.commit()
+
+    HLS_JOBS.labels(result="ready").inc()
+    log.info("video_hls_ready", renditions=[r.name for r in renditions], hls_url=result["hls_url"])
+    return result
+
+
+class HlsWorker:
+    """Bounded in-process queue: at most ``VIDEO_HLS_WORKERS`` transcodes at once.
+
+    ffmpeg runs as a subprocess with a capped thread count, so the event loop
+    only awaits it; the queue limit keeps a burst of uploads from piling up
+    unbounded work.  Jobs are best-effort: a restart drops the queue and
+    ``POST /videos/{id}/regenerate-hls`` re-queues a video.
+    """
+
+    def __init__(self) -> None:
+        self._queue: Optional[asyncio.Queue[int]] = None
+        self._workers: list[asyncio.Task] = []
+        self._pending: set[int] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self) -> asyncio.Queue[int]:
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._loop = loop
+            self._pending.clear()
+            self._queue = asyncio.Queue(maxsize=max(1, settings.VIDEO_HLS_QUEUE_SIZE))
+            self._workers = [
+                loop.create_task(self._run(), name=f"hls-worker-{idx}")
+                for idx in range(max(1, settings.VIDEO_HLS_WORKERS))
+            ]
+        return self._queue
+
+    def submit(self, video_id: int) -> bool:
+        """Queue *video_id* for transcoding; ``False`` if disabled or the queue is full."""
+        if not settings.VIDEO_HLS_ENABLED:
+            return False
+        queue = self._ensure_started()
+        if video_id in self._pending:
+            return True
+        try:
+            queue.put_nowait(video_id)
+        except asyncio.QueueFull:
+            HLS_JOBS.labels(result="dropped").inc()
+            logger.warning("video_hls_queue_full", video_id=video_id)
+            return False
+        self._pending.add(video_id)
+        HLS_QUEUE_DEPTH.set(queue.qsize())
+        return True
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            video_id = await queue.get()
+            HLS_QUEUE_DEPTH.set(queue.qsize())
+            try:
+                await process_video_hls(video_id)
+            except Exception as exc:
+                logger.error("video_hls_worker_error", video_id=video_id, error=str(exc))
+            finally:
+                self._pending.discard(video_id)
+                queue.task_done()
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pending.clear()
+
+
+hls_worker = HlsWorker()
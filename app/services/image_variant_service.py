@@ -0,0 +1,308 @@
+"""On-demand resized variants of AR content photos (``/img/{id}/{w}x{h}.{fmt}``).
+
+Admin lists and detail pages used to fall back to the full-size photo
+whenever the pre-generated thumbnail was missing.  Variants are produced on
+first request and then served from two tiers:
+
+* a byte-bounded in-process LRU (``IMAGE_VARIANT_MEMORY_BYTES``);
+* the disk cache ``{STORAGE_BASE_PATH}/.cache/img/{content_id}/{version}/``.
+
+Encoding runs on the shared process pool; concurrent requests for the same
+variant share one render (single-flight).  ``version`` is an HMAC of the
+photo path and, for local photos, its mtime and size, so a replaced photo
+gets new URLs even when it is written to the same path (responses can be
+cached as immutable) and variant URLs cannot be enumerated by id alone.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import io
+import os
+import re
+import shutil
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import structlog
+from PIL import Image, ImageOps
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+from app.core.process_pool import run_in_process
+from app.core.storage_providers import split_remote_ref
+
+logger = structlog.get_logger()
+
+IMAGE_VARIANT_REQUESTS = Counter(
+    "image_variant_requests_total",
+    "Resized image variant requests by the tier that served them",
+    ["source"],
+)
+
+IMAGE_VARIANT_MEMORY_BYTES = Gauge(
+    "image_variant_memory_bytes",
+    "Bytes held in the in-process image variant LRU",
+)
+
+# extension → (Pillow format, MIME type); order is the negotiation preference
+VARIANT_FORMATS = {
+    "avif": ("AVIF", "image/avif"),
+    "webp": ("WEBP", "image/webp"),
+    "jpg": ("JPEG", "image/jpeg"),
+}
+_SIZE_STEP = 16
+_VARIANT_RE = re.compile(r"^(\d{1,5})x(\d{1,5})(?:\.([a-z]+))?$")
+
+
+class VariantNotFound(Exception):
+    """The variant cannot be produced (no photo, unreadable source)."""
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    width: int  # 0 = unconstrained
+    height: int  # 0 = unconstrained
+    fmt: Optional[str]  # None = negotiate from Accept
+
+    @property
+    def name(self) -> str:
+        return f"{self.width}x{self.height}"
+
+
+@lru_cache(maxsize=1)
+def supported_formats() -> tuple[str, ...]:
+    """Variant formats the installed Pillow can encode, in preference order."""
+    Image.init()
+    return tuple(ext for ext, (pil_format, _mime) in VARIANT_FORMATS.items() if pil_format in Image.SAVE)
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Best format the client accepts; JPEG is the universal fallback."""
+    accept = (accept or "").lower()
+    for ext in supported_formats():
+        if ext != "jpg" and VARIANT_FORMATS[ext][1] in accept:
+            return ext
+    return "jpg"
+
+
+def _snap(value: int) -> int:
+    """Round up to ``_SIZE_STEP`` so near-identical sizes share one cached file."""
+    return 0 if value <= 0 else -(-value // _SIZE_STEP) * _SIZE_STEP
+
+
+def parse_variant(value: str) -> Optional[VariantSpec]:
+    """Parse ``"{w}x{h}[.{fmt}]"``; ``None`` if malformed, out of range or unknown format."""
+    match = _VARIANT_RE.match(value.lower())
+    if not match:
+        return None
+    width, height = int(match.group(1)), int(match.group(2))
+    fmt = match.group(3)
+    if fmt == "jpeg":
+        fmt = "jpg"
+    limit = settings.IMAGE_VARIANT_MAX_DIMENSION
+    if (width == 0 and height == 0) or width > limit or height > limit:
+        return None
+    if fmt is not None and fmt not in supported_formats():
+        return None
+    return VariantSpec(min(_snap(width), limit), min(_snap(height), limit), fmt)
+
+
+def _photo_signature(photo_path: Optional[str]) -> str:
+    """``mtime_ns:size`` of a local photo; empty for remote or missing ones."""
+    if not photo_path or split_remote_ref(photo_path):
+        return ""
+    path = Path(photo_path)
+    if not path.is_absolute():
+        path = Path(settings.STORAGE_BASE_PATH) / path
+    try:
+        stat = path.stat()
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def variant_version(content_id: int, photo_path: Optional[str]) -> str:
+    """URL version token: changes with the photo (even replaced in place) and is not guessable."""
+    message = f"{content_id}:{photo_path or ''}:{_photo_signature(photo_path)}".encode()
+    return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()[:16]
+
+
+def _variant_url(content_id: int, version: str, width: int, height: int = 0, fmt: Optional[str] = None) -> str:
+    suffix = f".{fmt}" if fmt else ""
+    return f"/img/{content_id}/{width}x{height}{suffix}?v={version}"
+
+
+def variant_url(content_id: int, photo_path: Optional[str], width: int, height: int = 0, fmt: Optional[str] = None) -> str:
+    return _variant_url(content_id, variant_version(content_id, photo_path), width, height, fmt)
+
+
+def variant_srcset(content_id: int, photo_path: Optional[str], widths: Optional[list[int]] = None) -> str:
+    """``srcset`` value with width descriptors (format negotiated per request)."""
+    widths = widths or settings.IMAGE_VARIANT_SRCSET_WIDTHS
+    version = variant_version(content_id, photo_path)
+    return ", ".join(f"{_variant_url(content_id, version, width)} {width}w" for width in widths)
+
+
+def render_variant(source_path: str, width: int, height: int, fmt: str, quality: int) -> bytes:
+    """Encode one variant (process-pool entry point).  Never upscales."""
+    pil_format = VARIANT_FORMATS[fmt][0]
+    box = (width or 1 << 16, height or 1 << 16)
+    with Image.open(source_path) as original:
+        original.draft("RGB", box)  # JPEG: decode at reduced scale
+        image = ImageOps.exif_transpose(original)
+        if pil_format == "JPEG":
+            if image.mode in ("RGBA", "LA", "P"):
+                rgba = image.convert("RGBA")
+                background = Image.new("RGB", rgba.size, (255, 255, 255))
+                background.paste(rgba, mask=rgba.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() or image.mode == "P" else "RGB")
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        options = {"quality": quality}
+        if pil_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        elif pil_format == "WEBP":
+            options["method"] = 4
+        image.save(buffer, format=pil_format, **options)
+    return buffer.getvalue()
+
+
+class ImageVariantService:
+    """Two-tier (memory LRU + disk) cache of resized photo variants."""
+
+    def __init__(self, cache_dir: Optional[Path] = None) -> None:
+        self._cache_dir = cache_dir
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir or Path(settings.STORAGE_BASE_PATH) / ".cache" / "img"
+
+    # -- memory tier --------------------------------------------------------
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+        return data
+
+    def _memory_put(self, key: str, data: bytes) -> None:
+        budget = settings.IMAGE_VARIANT_MEMORY_BYTES
+        if len(data) > budget // 4:
+            return  # one huge variant must not flush the whole tier
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > budget and self._memory:
+            _key, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+        IMAGE_VARIANT_MEMORY_BYTES.set(self._memory_bytes)
+
+    async def discard(self, content_id: int) -> None:
+        """Drop every cached variant of *content_id* (content deleted or photo replaced)."""
+        prefix = f"{content_id}/"
+        for key in [key for key in self._memory if key.startswith(prefix)]:
+            self._memory_bytes -= len(self._memory.pop(key))
+        IMAGE_VARIANT_MEMORY_BYTES.set(self._memory_bytes)
+        await asyncio.to_thread(shutil.rmtree, self.cache_dir / str(content_id), True)
+
+    # -- variants -----------------------------------------------------------
+
+    async def get_variant(
+        self,
+        content_id: int,
+        photo_path: str,
+        spec: VariantSpec,
+        fmt: str,
+        provider=None,
+    ) -> bytes:
+        """Bytes of the variant, rendering it on first request."""
+        version = variant_version(content_id, photo_path)
+        key = f"{content_id}/{version}/{spec.name}.{fmt}"
+        data = self._memory_get(key)
+        if data is not None:
+            IMAGE_VARIANT_REQUESTS.labels(source="memory").inc()
+            return data
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, photo_path, spec, fmt, provider))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        # shield: a client disconnect must not abort a render others wait on
+        return await asyncio.shield(future)
+
+    async def _load(self, key: str, photo_path: str, spec: VariantSpec, fmt: str, provider) -> bytes:
+        target = self.cache_dir / key
+        data = await asyncio.to_thread(_read_if_exists, target)
+        if data is not None:
+            IMAGE_VARIANT_REQUESTS.labels(source="disk").inc()
+        else:
+            source = await self._source_path(key.rsplit("/", 1)[0], photo_path, provider)
+            try:
+                data = await run_in_process(
+                    render_variant, str(source), spec.width, spec.height, fmt, settings.IMAGE_VARIANT_QUALITY
+                )
+            except Exception as exc:
+                logger.warning("image_variant_render_failed", key=key, error=str(exc))
+                raise VariantNotFound("Photo cannot be decoded") from exc
+            await asyncio.to_thread(_write_atomic, target, data)
+            IMAGE_VARIANT_REQUESTS.labels(source="render").inc()
+        self._memory_put(key, data)
+        return data
+
+    async def _source_path(self, version_dir: str, photo_path: str, provider) -> Path:
+        """Local path of the original; remote (YD, S3) photos are fetched once per version."""
+        remote = split_remote_ref(photo_path)
+        if remote is None:
+            path = Path(photo_path)
+            if not path.is_absolute():
+                path = Path(settings.STORAGE_BASE_PATH) / path
+            if not path.is_file():
+                raise VariantNotFound("Photo file is missing")
+            return path
+
+        local = self.cache_dir / version_dir / ("source" + Path(photo_path).suffix.lower())
+        if local.is_file():
+            return local
+        if provider is None:
+            raise VariantNotFound("No storage provider for remote photo")
+        local.parent.mkdir(parents=True, exist_ok=True)
+        partial = local.with_name(local.name + ".part")
+        if not await provider.get_file(remote[1], str(partial)):
+            partial.unlink(missing_ok=True)
+            raise VariantNotFound("Photo download failed")
+        os.replace(partial, local)
+        return local
+
+
+def _read_if_exists(path: Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    temp.write_bytes(data)
+    os.replace(temp, path)
+
+
+image_variant_service = ImageVariantService()
@@ -0,0 +1,102 @@
+"""Database leases for scheduled jobs that must run in one worker at a time.
+
+Each gunicorn worker starts its own APScheduler, so interval jobs fire in
+every worker at nearly the same moment.  A job that scans all storage or
+rewrites a shared table takes the lease named after it first:
+
+* the lease row is updated only when it has expired or already belongs to
+  this worker (one atomic ``UPDATE``), or inserted when it does not exist
+  yet — a concurrent insert loses on the primary key;
+* a lease is held for about one job interval, so the workers whose trigger
+  fires a few seconds after the winner's skip that cycle, and a crashed
+  worker is replaced after at most one interval.
+"""
+
+from __future__ import annotations
+
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Any, Awaitable, Callable, Optional
+
+import structlog
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.job_lease import JobLease
+
+logger = structlog.get_logger()
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def worker_id() -> str:
+    """This process (workers are forked, so it is computed on each call)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease(db: AsyncSession, name: str, ttl_seconds: float) -> bool:
+    """Take or renew lease *name* for *ttl_seconds*; ``False`` if another worker holds it."""
+    owner = worker_id()
+    now = _utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    result = await db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, or_(JobLease.expires_at <= now, JobLease.owner == owner))
+        .values(owner=owner, expires_at=expires_at, acquired_at=now)
+    )
+    if result.rowcount:
+        await db.commit()
+        return True
+    if await db.get(JobLease, name) is not None:
+        await db.rollback()
+        return False
+    db.add(JobLease(name=name, owner=owner, expires_at=expires_at, acquired_at=now))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return True
+
+
+async def release_lease(db: AsyncSession, name: str) -> None:
+    """Let another worker take lease *name* right away (if this worker holds it)."""
+    await db.execute(
+        update(JobLease)
+        .where(JobLease.name == name, JobLease.owner == worker_id())
+        .values(expires_at=_utcnow())
+    )
+    await db.commit()
+
+
+def leased(name: str, ttl_seconds: float) -> Callable[[Callable[..., Awaitable[Any]]], Callable[..., Awaitable[Any]]]:
+    """Decorate a scheduled job so it only runs in the worker holding lease *name*.
+
+    The lease is kept after a successful run (other workers skip this
+    cycle) and released when the job fails, so another worker can retry.
+    """
+
+    def decorator(job: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @wraps(job)
+        async def run(*args: Any, **kwargs: Any) -> Optional[Any]:
+            from app.core.database import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as db:
+                if not await acquire_lease(db, name, ttl_seconds):
+                    logger.info("scheduled_job_skipped", job=name, reason="lease_held")
+                    return None
+            try:
+                return await job(*args, **kwargs)
+            except Exception:
+                async with AsyncSessionLocal() as db:
+                    await release_lease(db, name)
+                raise
+
+        return run
+
+    return decorator
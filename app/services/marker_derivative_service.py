@@ -0,0 +1,174 @@
+"""Tracking-optimised marker image derived from the customer photo.
+
+ARCore only needs a few hundred pixels per side to build an augmented-image
+database, but the manifest used to hand out the original multi-megabyte
+PNG/JPEG, which the app downloads before tracking starts.  The derivative is:
+
+* EXIF-orientation-normalised (rotated pixels, not a flag the app may ignore);
+* downscaled to ``MARKER_DERIVATIVE_LONG_EDGE`` (never upscaled);
+* grayscale or colour JPEG (``MARKER_DERIVATIVE_MODE``) with all metadata
+  stripped.
+
+It is stored next to the original (``blobs/ab/<sha>/marker.jpg``) so the
+original keeps serving admin previews, and its size and SHA-256 go into
+``marker_metadata["derivative"]`` and the viewer manifest.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import structlog
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+MARKER_FILENAME = "marker.jpg"
+_MODES = {"grayscale", "jpeg"}
+
+
+@dataclass
+class MarkerDerivative:
+    """A stored marker derivative."""
+
+    storage_path: str
+    url: str
+    width: int
+    height: int
+    size_bytes: int
+    sha256: str
+    mode: str
+    long_edge: int
+    source: str = "original"
+    quality: Optional[int] = None
+
+    def as_metadata(self) -> dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_metadata(cls, data: dict[str, Any]) -> "MarkerDerivative":
+        return cls(**{k: data[k] for k in cls.__dataclass_fields__ if k in data})
+
+
+def derivative_params() -> dict[str, Any]:
+    """Settings that define a derivative; cached derivatives must match them."""
+    mode = settings.MARKER_DERIVATIVE_MODE.lower()
+    return {
+        "mode": mode if mode in _MODES else "jpeg",
+        "long_edge": max(64, int(settings.MARKER_DERIVATIVE_LONG_EDGE)),
+        "quality": min(95, max(50, int(settings.MARKER_DERIVATIVE_JPEG_QUALITY))),
+    }
+
+
+def render_marker_derivative(
+    source_path: Path,
+    output_path: Path,
+    *,
+    long_edge: int,
+    mode: str,
+    quality: int,
+) -> tuple[int, int, int, str]:
+    """Encode the derivative; returns ``(width, height, size_bytes, sha256)``."""
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            # Flatten transparency on white, as viewers show it — ARCore has no alpha
+            rgba = image.convert("RGBA")
+            background = Image.new("RGB", rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        if mode == "grayscale":
+            image = image.convert("L")
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if max(image.size) > long_edge:
+            image.thumbnail((long_edge, long_edge), Image.Resampling.LANCZOS)
+
+        buffer = io.BytesIO()
+        # No exif/icc_profile passed → metadata stripped
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=False)
+        width, height = image.size
+
+    data = buffer.getvalue()
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(data)
+    return width, height, len(data), hashlib.sha256(data).hexdigest()
+
+
+async def create_marker_derivative(
+    source_path: Path | str,
+    local_dir: Path,
+    *,
+    provider=None,
+    remote_dir: Optional[str] = None,
+    source: str = "original",
+) -> MarkerDerivative:
+    """Render the derivative into *local_dir* and store it via *provider*.
+
+    For remote providers (Yandex Disk, S3) the file is uploaded to
+    ``{remote_dir}/marker.jpg`` and the reference is returned; otherwise the
+    local file is served directly.
+    """
+    from app.core.storage_providers import RemoteStorageProvider
+    from app.utils.ar_content import build_public_url
+
+    params = derivative_params()
+    output_path = Path(local_dir) / MARKER_FILENAME
+    width, height, size_bytes, sha256 = await asyncio.to_thread(
+        render_marker_derivative,
+        Path(source_path),
+        output_path,
+        long_edge=params["long_edge"],
+        mode=params["mode"],
+        quality=params["quality"],
+    )
+
+    if isinstance(provider, RemoteStorageProvider) and remote_dir:
+        ref = await provider.save_file(str(output_path), f"{remote_dir}/{MARKER_FILENAME}")
+        storage_path = url = ref
+    else:
+        storage_path = str(output_path)
+        url = build_public_url(output_path, provider=provider)
+
+    logger.info(
+        "marker_derivative_created",
+        source=str(source_path),
+        width=width,
+        height=height,
+        size_bytes=size_bytes,
+        mode=params["mode"],
+    )
+    return MarkerDerivative(
+        storage_path=storage_path,
+        url=url,
+        width=width,
+        height=height,
+        size_bytes=size_bytes,
+        sha256=sha256,
+        mode=params["mode"],
+        long_edge=params["long_edge"],
+        source=source,
+        quality=params["quality"],
+    )
+
+
+def reusable_derivative(cached: Optional[dict[str, Any]], source: str) -> Optional[MarkerDerivative]:
+    """Cached derivative of a blob, if it was built with the current settings."""
+    if not cached or not cached.get("url"):
+        return None
+    params = derivative_params()
+    if (
+        cached.get("mode") != params["mode"]
+        or cached.get("long_edge") != params["long_edge"]
+        or cached.get("quality") != params["quality"]
+        or cached.get("source") != source
+    ):
+        return None
+    return MarkerDerivative.from_metadata(cached)
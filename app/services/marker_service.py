@@ -2,8 +2,8 @@ from pathlib import Path
 from typing import Optional
 import structlog
 import cv2
-import numpy as np
 
+from app.utils.marker_analysis import analyze_gray, legacy_probability, read_working_gray
 
 
 logger = structlog.get_logger()
@@ -15,12 +15,16 @@ class ARCoreMarkerService:
     Uses the photo image as the tracking target (raster JPEG/PNG). No .mind format.
     """
 
-    _EDGE_DENSITY_TARGET = 0.2
-    _CONTRAST_NORM = 50.0
-    _SHARPNESS_NORM = 500.0
     _MIN_CONTRAST = 35.0
-    _MIN_SHARPNESS = 60.0
+    # Laplacian variance at the 640px working size (marker_analysis), not at
+    # full resolution. On 2-3k px photos: sharp 520-1980, Gaussian blur σ=2px
+    # 256-579, σ=4px 47-112; 250 flags blur from about σ=2.5px.
+    _MIN_SHARPNESS = 250.0
     _MIN_RECOGNITION_PROBABILITY = 0.6
+    _MIN_KEYPOINTS = 80
+    _MIN_KEYPOINT_COVERAGE = 0.35
+    _MAX_REPETITION = 0.35
+    _MAX_SYMMETRY = 0.8
 
     async def generate_marker(
         self,
@@ -70,6 +74,18 @@ class ARCoreMarkerService:
             recommendations.append("Нормализуйте яркость — избегайте сильных пересветов и теней")
         if edge_density is not None and edge_density < 0.01:
             recommendations.append("Добавьте мелкие детали и текстуры по всей площади изображения")
+        keypoint_count = image_quality.get("keypoint_count")
+        if keypoint_count is not None and keypoint_count < self._MIN_KEYPOINTS:
+            recommendations.append("Мало характерных точек — выберите изображение с большим количеством деталей")
+        coverage = image_quality.get("keypoint_coverage")
+        if coverage is not None and keypoint_count and coverage < self._MIN_KEYPOINT_COVERAGE:
+            recommendations.append("Детали сосредоточены в одной области — нужны детали по всей площади")
+        repetition = image_quality.get("repetition_ratio")
+        if repetition is not None and repetition > self._MAX_REPETITION:
+            recommendations.append("Избегайте повторяющихся узоров — они мешают однозначному распознаванию")
+        symmetry = image_quality.get("symmetry")
+        if symmetry is not None and symmetry > self._MAX_SYMMETRY:
+            recommendations.append("Изображение слишком симметрично — добавьте асимметричные элементы")
         if recognition_probability is not None and recognition_probability < self._MIN_RECOGNITION_PROBABILITY:
             recommendations.append("Используйте изображение с более выраженными деталями и контрастом")
 
@@ -139,34 +155,17 @@ class ARCoreMarkerService:
         return str(output_path_obj)
 
     def _analyze_image_quality(self, image_path: str) -> dict:
-        """Compute basic image quality metrics for recognition estimation."""
+        """Compute trackability metrics on a downscaled working copy.
+
+        See ``app.utils.marker_analysis`` for the feature-based metrics
+        (ORB keypoint coverage, repetition, symmetry); the photometric keys
+        and ``recognition_probability`` keep their meaning and 0..1 range.
+        """
         try:
-            image = cv2.imread(str(image_path))
-            if image is None:
+            gray, _size = read_working_gray(image_path)
+            if gray is None:
                 return {}
-
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            brightness = float(np.mean(gray))
-            contrast = float(np.std(gray))
-            sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = float(np.sum(edges > 0) / edges.size)
-
-            recognition_probability = self._estimate_recognition_probability(
-                contrast=contrast,
-                brightness=brightness,
-                sharpness=sharpness,
-                edge_density=edge_density,
-            )
-
-            return {
-                "brightness": brightness,
-                "contrast": contrast,
-                "sharpness": sharpness,
-                "edge_density": edge_density,
-                "recognition_probability": recognition_probability,
-            }
+            return analyze_gray(gray)
         except Exception as exc:
             logger.warning("image_quality_analysis_failed", error=str(exc))
             return {}
@@ -178,20 +177,8 @@ class ARCoreMarkerService:
         sharpness: float,
         edge_density: float
     ) -> float:
-        """Estimate recognition probability from image metrics."""
-        contrast_score = min(1.0, contrast / self._CONTRAST_NORM)
-        sharpness_score = min(1.0, sharpness / self._SHARPNESS_NORM)
-        edge_score = min(1.0, edge_density / self._EDGE_DENSITY_TARGET)
-        brightness_score = 1.0 - min(1.0, abs(brightness - 128.0) / 128.0)
-
-        weighted_score = (
-            0.35 * edge_score +
-            0.25 * contrast_score +
-            0.25 * sharpness_score +
-            0.15 * brightness_score
-        )
-
-        return round(min(max(weighted_score, 0.0), 1.0), 4)
+        """Photometric-only recognition estimate (no keypoint information)."""
+        return legacy_probability(contrast, brightness, sharpness, edge_density)
 
     # Removed save_marker - use generate_marker with storage_path instead
 
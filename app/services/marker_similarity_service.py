@@ -0,0 +1,259 @@
+"""Near-duplicate detection for AR markers via a multi-index hash table.
+
+Visually near-identical marker photos confuse ARCore image tracking, so every
+marker gets a 64-bit perceptual hash (``ar_content.marker_phash``) and all
+hashes are kept in memory in a multi-index hashing (MIH) structure:
+
+* the 64-bit hash is split into ``4 × 16-bit`` chunks, one dict per chunk;
+* by the pigeonhole principle any hash within Hamming distance ``r`` of the
+  query matches at least one chunk within ``r // 4`` bits, so a query probes
+  the ``Σ C(16, k), k ≤ r//4`` neighbours of each chunk (137 probes per chunk
+  for ``r ≤ 11``) and only verifies the few candidates found — no O(n) scan.
+
+The index is loaded from the database on first use and then kept current
+incrementally: local writes call ``add``/``discard``, and rows created by
+other workers are picked up by an ``id > last_seen`` query at most every
+``MARKER_HASH_INDEX_REFRESH_SECONDS``.  Candidates are re-read from the DB
+before being reported: rows deleted elsewhere never surface, and rows
+re-hashed elsewhere (photo replaced) are re-indexed and reported with the
+distance of their current hash.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from itertools import combinations
+from typing import Any, Iterable, Optional
+
+import structlog
+from prometheus_client import Gauge, Histogram
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.ar_content import ARContent
+from app.utils.image_hash import HASH_BITS, from_hex, hamming
+
+logger = structlog.get_logger()
+
+MARKER_HASH_LOOKUP = Histogram(
+    "marker_hash_lookup_seconds",
+    "Near-duplicate marker lookup latency (index probe + verification)",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+MARKER_HASH_INDEX_SIZE = Gauge(
+    "marker_hash_index_size",
+    "Marker hashes held in the in-memory near-duplicate index",
+)
+
+_CHUNKS = 4
+_CHUNK_BITS = HASH_BITS // _CHUNKS
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+_flip_masks_cache: dict[int, list[int]] = {}
+
+
+def _flip_masks(radius: int) -> list[int]:
+    """All 16-bit masks with at most *radius* bits set (XOR probes)."""
+    masks = _flip_masks_cache.get(radius)
+    if masks is None:
+        masks = [0]
+        for k in range(1, radius + 1):
+            for bits in combinations(range(_CHUNK_BITS), k):
+                mask = 0
+                for bit in bits:
+                    mask |= 1 << bit
+                masks.append(mask)
+        _flip_masks_cache[radius] = masks
+    return masks
+
+
+def _chunks(value: int) -> list[int]:
+    return [(value >> (i * _CHUNK_BITS)) & _CHUNK_MASK for i in range(_CHUNKS)]
+
+
+class MultiIndexHashIndex:
+    """In-memory MIH index of 64-bit hashes keyed by an integer id."""
+
+    def __init__(self) -> None:
+        self._tables: list[dict[int, set[int]]] = [{} for _ in range(_CHUNKS)]
+        self._hashes: dict[int, int] = {}
+        self._groups: dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def get(self, key: int) -> Optional[int]:
+        return self._hashes.get(key)
+
+    def add(self, key: int, value: int, group: Any = None) -> None:
+        if key in self._hashes:
+            self.discard(key)
+        self._hashes[key] = value
+        self._groups[key] = group
+        for table, chunk in zip(self._tables, _chunks(value)):
+            table.setdefault(chunk, set()).add(key)
+
+    def discard(self, key: int) -> None:
+        value = self._hashes.pop(key, None)
+        self._groups.pop(key, None)
+        if value is None:
+            return
+        for table, chunk in zip(self._tables, _chunks(value)):
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[chunk]
+
+    def search(self, value: int, max_distance: int, group: Any = None) -> list[tuple[int, int]]:
+        """``[(key, distance)]`` within *max_distance*, closest first.
+
+        With *group* set only keys added with the same group are returned.
+        """
+        radius = max_distance // _CHUNKS
+        masks = _flip_masks(radius)
+        candidates: set[int] = set()
+        for table, chunk in zip(self._tables, _chunks(value)):
+            for mask in masks:
+                bucket = table.get(chunk ^ mask)
+                if bucket:
+                    candidates |= bucket
+        matches = []
+        for key in candidates:
+            if group is not None and self._groups.get(key) != group:
+                continue
+            distance = hamming(value, self._hashes[key])
+            if distance <= max_distance:
+                matches.append((key, distance))
+        matches.sort(key=lambda item: (item[1], item[0]))
+        return matches
+
+
+class MarkerSimilarityService:
+    """Process-wide near-duplicate index over ``ar_content.marker_phash``."""
+
+    def __init__(self) -> None:
+        self._index = MultiIndexHashIndex()
+        self._loaded = False
+        self._last_seen_id = 0
+        self._last_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def size(self) -> int:
+        return len(self._index)
+
+    def add(self, ar_content_id: int, company_id: Optional[int], phash_hex: Optional[str]) -> None:
+        value = from_hex(phash_hex)
+        if value is None:
+            return
+        # _last_seen_id is deliberately left alone: lower ids committed by
+        # other workers must still be picked up by the next refresh.
+        self._index.add(ar_content_id, value, company_id)
+        MARKER_HASH_INDEX_SIZE.set(len(self._index))
+
+    def discard(self, ar_content_id: int) -> None:
+        self._index.discard(ar_content_id)
+        MARKER_HASH_INDEX_SIZE.set(len(self._index))
+
+    def _load_rows(self, rows: Iterable[tuple[int, Optional[int], Optional[str]]]) -> int:
+        count = 0
+        for ar_content_id, company_id, phash_hex in rows:
+            value = from_hex(phash_hex)
+            if value is not None:
+                self._index.add(ar_content_id, value, company_id)
+                count += 1
+            self._last_seen_id = max(self._last_seen_id, ar_content_id)
+        return count
+
+    async def ensure_fresh(self, db: AsyncSession) -> None:
+        """Load the index on first use, then pull rows added by other workers."""
+        now = time.monotonic()
+        if self._loaded and now - self._last_refresh < settings.MARKER_HASH_INDEX_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            if self._loaded and time.monotonic() - self._last_refresh < settings.MARKER_HASH_INDEX_REFRESH_SECONDS:
+                return
+            stmt = select(ARContent.id, ARContent.company_id, ARContent.marker_phash).where(
+                ARContent.marker_phash.isnot(None)
+            )
+            if self._loaded:
+                stmt = stmt.where(ARContent.id > self._last_seen_id)
+            stmt = stmt.order_by(ARContent.id)
+            result = await db.stream(stmt.execution_options(yield_per=5000))
+            added = 0
+            async for partition in result.partitions():
+                added += self._load_rows(partition)
+            first_load = not self._loaded
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+            MARKER_HASH_INDEX_SIZE.set(len(self._index))
+            if first_load or added:
+                logger.info("marker_hash_index_refreshed", added=added, size=len(self._index), full=first_load)
+
+    async def find_near_duplicates(
+        self,
+        db: AsyncSession,
+        phash_hex: Optional[str],
+        company_id: Optional[int],
+        exclude_id: Optional[int] = None,
+        max_distance: Optional[int] = None,
+        limit: int = 10,
+    ) -> list[dict[str, Any]]:
+        """Markers of the same company within *max_distance* bits of *phash_hex*."""
+        value = from_hex(phash_hex)
+        if value is None:
+            return []
+        max_distance = settings.MARKER_DUPLICATE_MAX_DISTANCE if max_distance is None else max_distance
+        await self.ensure_fresh(db)
+
+        started = time.perf_counter()
+        keys = [
+            key
+            for key, _distance in self._index.search(value, max_distance, group=company_id)
+            if key != exclude_id
+        ]
+        MARKER_HASH_LOOKUP.observe(time.perf_counter() - started)
+        if not keys:
+            return []
+
+        rows = (
+            await db.execute(
+                select(
+                    ARContent.id,
+                    ARContent.company_id,
+                    ARContent.order_number,
+                    ARContent.unique_id,
+                    ARContent.marker_phash,
+                ).where(ARContent.id.in_(keys))
+            )
+        ).all()
+        found = {row.id: row for row in rows}
+        duplicates = []
+        for key in keys:
+            row = found.get(key)
+            current = from_hex(row.marker_phash) if row is not None else None
+            if current is None:
+                self.discard(key)  # deleted or hash cleared by another worker
+                continue
+            if current != self._index.get(key) or row.company_id != company_id:
+                self.add(row.id, row.company_id, row.marker_phash)  # re-hashed by another worker
+            distance = hamming(value, current)
+            if row.company_id != company_id or distance > max_distance:
+                continue
+            duplicates.append(
+                {
+                    "ar_content_id": row.id,
+                    "order_number": row.order_number,
+                    "unique_id": str(row.unique_id) if row.unique_id else None,
+                    "distance": distance,
+                    "similarity": round(1 - distance / HASH_BITS, 4),
+                }
+            )
+        duplicates.sort(key=lambda item: (item["distance"], item["ar_content_id"]))
+        return duplicates[:limit]
+
+
+marker_similarity_service = MarkerSimilarityService()
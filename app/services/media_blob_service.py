@@ -0,0 +1,378 @@
+"""Content-addressed media storage with reference counting.
+
+Uploads are hashed (SHA-256) while they stream to disk; the digest is looked
+up in ``media_blobs`` per company.  A hit reuses the stored file and its
+derived artefacts (thumbnails, cached analysis, video preview) instead of
+storing and processing the same bytes again.
+
+Blobs live outside order folders so deleting one order never removes a file
+another order still references:
+
+* local:        ``{STORAGE_BASE_PATH}/blobs/ab/<sha256>/<kind><ext>``
+* Yandex Disk:  ``yadisk://blobs/ab/<sha256>/<kind><ext>``
+* S3:           ``s3://blobs/ab/<sha256>/<kind><ext>``
+
+``release`` decrements ``ref_count``; the last release deletes the row and
+the whole blob folder (best-effort).  Folders are keyed by the digest alone,
+so the folder is kept while another company still has a row for the same
+bytes.  ``ref_count`` only changes through an
+atomic ``UPDATE … SET ref_count = ref_count ± 1 … RETURNING ref_count``, so
+concurrent uploads and deletes of the same bytes never lose a reference.
+"""
+
+from __future__ import annotations
+
+import shutil
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.models.media_blob import MediaBlob
+from app.services.storage_usage_service import local_tree_files, storage_usage
+
+logger = structlog.get_logger()
+
+BLOB_ROOT = "blobs"
+
+MEDIA_BLOB_LOOKUPS = Counter(
+    "media_blob_lookups_total",
+    "Content-addressed upload lookups",
+    ["kind", "result"],
+)
+
+MEDIA_BLOB_GC = Counter(
+    "media_blob_gc_total",
+    "Blobs garbage-collected after their last reference was released",
+    ["provider"],
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def blob_relative_dir(sha256: str) -> str:
+    """Relative folder of a blob, shared by local and remote providers."""
+    return f"{BLOB_ROOT}/{sha256[:2]}/{sha256}"
+
+
+def blob_local_dir(sha256: str) -> Path:
+    """Local folder of a blob under ``STORAGE_BASE_PATH``."""
+    return Path(settings.STORAGE_BASE_PATH) / blob_relative_dir(sha256)
+
+
+def blob_filename(kind: str, original_filename: Optional[str]) -> str:
+    """Deterministic file name inside the blob folder (``photo.jpg``)."""
+    suffix = Path(original_filename or "").suffix.lower()
+    return f"{kind}{suffix}"
+
+
+class MediaBlobGone(Exception):
+    """The blob was released and collected after it was looked up; retry the upload."""
+
+
+@dataclass
+class StoredMedia:
+    """Outcome of storing an upload through the blob store."""
+
+    sha256: str
+    size_bytes: int
+    storage_path: str
+    public_url: str
+    # Local file that can be read for analysis / thumbnails (None once removed)
+    local_path: Optional[Path]
+    blob: Optional[MediaBlob] = None
+
+    @property
+    def reused(self) -> bool:
+        return self.blob is not None
+
+    @property
+    def derived(self) -> dict[str, Any]:
+        return dict(self.blob.derived or {}) if self.blob is not None else {}
+
+
+@dataclass
+class CollectedBlob:
+    """A blob whose last reference was released; files still to be purged."""
+
+    sha256: str
+    storage_provider: str
+    company_id: Optional[int] = None
+
+
+class MediaBlobService:
+    """Lookup, registration and reference counting of ``MediaBlob`` rows."""
+
+    async def find(self, db: AsyncSession, company_id: int, sha256: str) -> Optional[MediaBlob]:
+        """Return the blob for *sha256* in the company's storage, if any."""
+        stmt = select(MediaBlob).where(
+            MediaBlob.company_id == company_id,
+            MediaBlob.sha256 == sha256,
+        )
+        result = await db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def find_by_path(
+        self, db: AsyncSession, company_id: Optional[int], storage_path: Optional[str]
+    ) -> Optional[MediaBlob]:
+        """Return the blob stored at *storage_path* (legacy per-order files return None)."""
+        if not storage_path or company_id is None:
+            return None
+        stmt = select(MediaBlob).where(
+            MediaBlob.company_id == company_id,
+            MediaBlob.storage_path == storage_path,
+        )
+        result = await db.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def lookup(self, db: AsyncSession, company_id: int, sha256: str, kind: str) -> Optional[MediaBlob]:
+        """``find`` plus hit/miss metrics."""
+        blob = await self.find(db, company_id, sha256)
+        MEDIA_BLOB_LOOKUPS.labels(kind=kind, result="hit" if blob else "miss").inc()
+        return blob
+
+    async def store(
+        self,
+        *,
+        staged_path: Path,
+        sha256: str,
+        size_bytes: int,
+        kind: str,
+        original_filename: Optional[str],
+        provider,
+        existing: Optional[MediaBlob],
+        keep_local: bool = False,
+    ) -> StoredMedia:
+        """Move a staged upload into its blob location (or drop it on a hit).
+
+        Does not touch the database, so it can run concurrently with other
+        stages; ``register`` persists the result afterwards.
+
+        Args:
+            staged_path: Local file written by ``save_uploaded_file_hashed``.
+            existing: Blob found by ``lookup`` (``None`` on a miss).
+            keep_local: Keep the staged file for remote providers (e.g. the
+                photo is needed locally for quality analysis).
+        """
+        from app.core.storage_providers import RemoteStorageProvider
+        from app.utils.ar_content import build_public_url
+
+        is_remote = isinstance(provider, RemoteStorageProvider)
+
+        if existing is not None:
+            local_path: Optional[Path] = staged_path
+            if not is_remote:
+                local_path = Path(existing.storage_path)
+                if local_path.exists():
+                    # Identical bytes are already stored locally.
+                    staged_path.unlink(missing_ok=True)
+                else:
+                    # Blob file went missing on disk — restore it from this upload.
+                    local_path.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(str(staged_path), str(local_path))
+            elif not keep_local:
+                staged_path.unlink(missing_ok=True)
+                local_path = None
+            return StoredMedia(
+                sha256=sha256,
+                size_bytes=size_bytes,
+                storage_path=existing.storage_path,
+                public_url=existing.public_url or existing.storage_path,
+                local_path=local_path,
+                blob=existing,
+            )
+
+        filename = blob_filename(kind, original_filename)
+        if is_remote:
+            relative = f"{blob_relative_dir(sha256)}/{filename}"
+            ref = await provider.save_file(str(staged_path), relative)
+            local_path = staged_path
+            if not keep_local:
+                staged_path.unlink(missing_ok=True)
+                local_path = None
+            return StoredMedia(
+                sha256=sha256,
+                size_bytes=size_bytes,
+                storage_path=ref,
+                public_url=ref or provider.get_public_url(relative),
+                local_path=local_path,
+            )
+
+        target = blob_local_dir(sha256) / filename
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(staged_path), str(target))
+        storage_usage.record_saved(str(target), size_bytes)
+        return StoredMedia(
+            sha256=sha256,
+            size_bytes=size_bytes,
+            storage_path=str(target),
+            public_url=build_public_url(target, provider=provider),
+            local_path=target,
+        )
+
+    async def register(
+        self,
+        db: AsyncSession,
+        *,
+        company_id: int,
+        stored: StoredMedia,
+        kind: str,
+        storage_provider: str,
+        mime_type: Optional[str] = None,
+        derived: Optional[dict[str, Any]] = None,
+    ) -> MediaBlob:
+        """Persist a new blob or take another reference on an existing one.
+
+        Flushes but does not commit; the caller commits together with the row
+        that references the blob.
+        """
+        if stored.blob is not None:
+            blob = stored.blob
+            if derived:
+                blob.derived = {**(blob.derived or {}), **derived}
+            await self._add_references(db, blob, 1)
+            return blob
+
+        blob = MediaBlob(
+            company_id=company_id,
+            sha256=stored.sha256,
+            kind=kind,
+            storage_provider=storage_provider,
+            storage_path=stored.storage_path,
+            public_url=stored.public_url,
+            size_bytes=stored.size_bytes,
+            mime_type=mime_type,
+            derived=derived or {},
+            ref_count=1,
+        )
+        try:
+            async with db.begin_nested():
+                db.add(blob)
+        except IntegrityError:
+            # A concurrent upload of the same bytes registered first; the file
+            # at the content-addressed location is identical, so just share it.
+            existing = await self.find(db, company_id, stored.sha256)
+            if existing is None:
+                raise
+            await self._add_references(db, existing, 1)
+            return existing
+        return blob
+
+    async def _add_references(self, db: AsyncSession, blob: MediaBlob, delta: int) -> int:
+        """Atomically add *delta* to ``ref_count`` and return the new count.
+
+        The row stays locked until the caller commits, so a release that
+        reaches zero can delete it without a concurrent register slipping in.
+        """
+        await db.flush()
+        new_count = (await db.execute(
+            update(MediaBlob)
+            .where(MediaBlob.id == blob.id)
+            .values(ref_count=MediaBlob.ref_count + delta, last_used_at=_utcnow())
+            .returning(MediaBlob.ref_count)
+            .execution_options(synchronize_session=False)
+        )).scalar_one_or_none()
+        if new_count is None:
+            # Released to zero and collected by another request after the lookup
+            raise MediaBlobGone(blob.sha256)
+        set_committed_value(blob, "ref_count", new_count)
+        return new_count
+
+    async def update_derived(self, db: AsyncSession, blob: MediaBlob, **values: Any) -> None:
+        """Merge derived artefact info (thumbnail URLs, previews) into *blob*."""
+        blob.derived = {**(blob.derived or {}), **values}
+        await db.flush()
+
+    async def release(
+        self,
+        db: AsyncSession,
+        company_id: Optional[int],
+        storage_path: Optional[str],
+    ) -> Optional[CollectedBlob]:
+        """Drop one reference to the blob at *storage_path*.
+
+        When the last reference goes the row is deleted (flushed, not
+        committed) and a :class:`CollectedBlob` is returned; pass it to
+        :meth:`purge` after the commit to remove the files.  Paths that are
+        not blob-managed (legacy per-order files) are ignored.
+        """
+        blob = await self.find_by_path(db, company_id, storage_path)
+        if blob is None:
+            return None
+        try:
+            if await self._add_references(db, blob, -1) > 0:
+                return None
+        except MediaBlobGone:
+            return None
+
+        collected = CollectedBlob(
+            sha256=blob.sha256, storage_provider=blob.storage_provider, company_id=blob.company_id
+        )
+        await db.delete(blob)
+        await db.flush()
+        return collected
+
+    async def _sharing_providers(self, db: Optional[AsyncSession], sha256: str) -> set[str]:
+        """Storage providers of the rows (any company) still holding *sha256*."""
+        stmt = select(MediaBlob.storage_provider).where(MediaBlob.sha256 == sha256).distinct()
+        if db is not None:
+            return set((await db.execute(stmt)).scalars().all())
+
+        from app.core.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            return set((await session.execute(stmt)).scalars().all())
+
+    async def purge(self, collected: CollectedBlob, provider=None, db: Optional[AsyncSession] = None) -> None:
+        """Delete the files of a garbage-collected blob (best-effort).
+
+        Blob folders are shared by every company that stored the same bytes,
+        so they are only removed once no ``MediaBlob`` row references the
+        digest any more (for the remote folder: no row on the same provider).
+        *db* defaults to a new session, as purge runs after the request.
+        """
+        sharing = await self._sharing_providers(db, collected.sha256)
+        if sharing:
+            logger.info(
+                "media_blob_purge_skipped_shared",
+                sha256=collected.sha256,
+                providers=sorted(sharing),
+            )
+        # Local artefacts (blob folder, and local thumbnails of remote blobs)
+        local_dir = blob_local_dir(collected.sha256)
+        if not sharing and local_dir.exists():
+            removed = local_tree_files(local_dir)
+            shutil.rmtree(local_dir, ignore_errors=True)
+            storage_usage.record_tree_deleted(removed, company_id=collected.company_id)
+        if (
+            collected.storage_provider != "local"
+            and collected.storage_provider not in sharing
+            and provider is not None
+        ):
+            try:
+                await provider.delete_file(blob_relative_dir(collected.sha256))
+            except Exception as exc:
+                logger.warning(
+                    "media_blob_remote_delete_failed",
+                    sha256=collected.sha256,
+                    error=str(exc),
+                )
+        MEDIA_BLOB_GC.labels(provider=collected.storage_provider).inc()
+        logger.info(
+            "media_blob_collected",
+            sha256=collected.sha256,
+            provider=collected.storage_provider,
+        )
+
+
+media_blob_service = MediaBlobService()
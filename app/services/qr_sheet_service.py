@@ -0,0 +1,116 @@
+"""Printable QR sheets (A4 PDF or ZIP of PNG labels) for a whole project.
+
+Labels are rendered in batches on the shared process pool.  At most
+``QR_SHEET_LOOKAHEAD`` batches are in flight; results are consumed in order
+and written straight to the response, so memory stays bounded by the window
+rather than by the project size.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence
+
+import structlog
+from prometheus_client import Histogram
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.process_pool import run_in_process
+from app.models.ar_content import ARContent
+from app.utils.ar_content import build_unique_link, sanitize_filename
+from app.utils.qr_sheet import (
+    LABELS_PER_PAGE,
+    LabelSpec,
+    PdfStreamWriter,
+    ZipStreamWriter,
+    render_label_pngs,
+    render_sheet_page,
+)
+
+logger = structlog.get_logger()
+
+QR_SHEET_DURATION = Histogram(
+    "qr_sheet_generation_seconds",
+    "Time to stream a project QR sheet",
+    ["format"],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+SHEET_FORMATS = {
+    "pdf": "application/pdf",
+    "zip": "application/zip",
+}
+ZIP_BATCH_SIZE = 25
+
+
+async def load_project_labels(db: AsyncSession, project_id: int) -> list[tuple[LabelSpec, str]]:
+    """``[((public_url, order_number), file_stem)]`` for every AR content of the project."""
+    base = (settings.PUBLIC_URL or "").rstrip("/")
+    rows = await db.execute(
+        select(ARContent.unique_id, ARContent.order_number)
+        .where(ARContent.project_id == project_id)
+        .order_by(ARContent.order_number, ARContent.id)
+    )
+    return [
+        ((f"{base}{build_unique_link(unique_id)}", order_number), sanitize_filename(order_number or str(unique_id)))
+        for unique_id, order_number in rows.all()
+    ]
+
+
+def _batches(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def _render_ordered(func: Callable[..., Any], batches: Iterator[Sequence[Any]]) -> AsyncIterator[Any]:
+    """Render *batches* on the process pool, yielding results in input order."""
+    window = max(1, settings.QR_SHEET_LOOKAHEAD)
+    pending: deque[asyncio.Future] = deque()
+
+    def _submit() -> None:
+        batch = next(batches, None)
+        if batch is not None:
+            pending.append(asyncio.ensure_future(run_in_process(func, list(batch))))
+
+    try:
+        for _ in range(window):
+            _submit()
+        while pending:
+            result = await pending.popleft()
+            _submit()
+            yield result
+    finally:
+        # Client went away (or a batch failed): don't leave work queued
+        for future in pending:
+            future.cancel()
+
+
+async def stream_qr_sheet(labels: list[tuple[LabelSpec, str]], fmt: str) -> AsyncIterator[bytes]:
+    """Yield the PDF / ZIP byte stream for *labels*."""
+    started = time.perf_counter()
+    specs = [spec for spec, _name in labels]
+    if fmt == "pdf":
+        writer = PdfStreamWriter()
+        yield writer.header()
+        async for width, height, pixels in _render_ordered(render_sheet_page, _batches(specs, LABELS_PER_PAGE)):
+            yield writer.page(width, height, pixels)
+        yield writer.trailer()
+    else:
+        archive = ZipStreamWriter()
+        names = iter([name for _spec, name in labels])
+        async for pngs in _render_ordered(render_label_pngs, _batches(specs, ZIP_BATCH_SIZE)):
+            for png in pngs:
+                yield archive.add(f"{next(names)}.png", png)
+        yield archive.close()
+    elapsed = time.perf_counter() - started
+    QR_SHEET_DURATION.labels(format=fmt).observe(elapsed)
+    logger.info("qr_sheet_streamed", format=fmt, labels=len(labels), elapsed_s=round(elapsed, 2))
+
+
+def sheet_filename(project_name: Optional[str], project_id: int, fmt: str) -> str:
+    stem = sanitize_filename(project_name) if project_name else f"project_{project_id}"
+    return f"qr_{stem}.{fmt}"
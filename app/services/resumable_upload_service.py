@@ -0,0 +1,325 @@
+"""Resumable chunked uploads (a subset of the tus 1.0 protocol).
+
+A single multipart POST of a 100+ MB video restarts from zero whenever a
+mobile or office connection drops.  Instead the client:
+
+1. ``POST /api/uploads`` with ``Upload-Length`` and ``Upload-Metadata``
+   (``filename``, ``filetype``, optional ``kind``) → ``Location``;
+2. ``PATCH`` the upload URL with ``Upload-Offset`` and a chunk of the body,
+   repeatedly; after a failure ``HEAD`` returns the offset to resume from;
+3. finalizes by passing the upload id(s) to the AR content / video creation
+   endpoints, which adopt the file (hash + rename, no second copy).
+
+Chunks are written straight into ``{STORAGE_BASE_PATH}/.uploads/<id>``,
+on the same filesystem as the content folders.  State lives in the
+``resumable_uploads`` table so every worker can continue an upload;
+``expire_stale_uploads`` (scheduled in ``app.core.scheduler``) removes
+abandoned ones.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import binascii
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from uuid import uuid4
+
+import aiofiles
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.resumable_upload import ResumableUpload
+
+logger = structlog.get_logger()
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination,expiration"
+UPLOAD_CONTENT_TYPE = "application/offset+octet-stream"
+
+RESUMABLE_UPLOAD_EVENTS = Counter(
+    "resumable_upload_events_total",
+    "Resumable upload lifecycle events",
+    ["event"],
+)
+
+RESUMABLE_UPLOAD_BYTES = Counter(
+    "resumable_upload_bytes_total",
+    "Bytes received through resumable upload PATCH requests",
+)
+
+# Uploads with a PATCH in progress in this worker (they must not interleave)
+_writing: set[str] = set()
+
+
+class UploadError(Exception):
+    """Protocol or validation error with the HTTP status to answer."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class StagedUpload:
+    """A completed resumable upload presented like a FastAPI ``UploadFile``.
+
+    ``save_uploaded_file_hashed`` / ``save_uploaded_video`` recognise
+    ``staged_path`` and move the file instead of copying it; ``read`` is
+    there for any other consumer.
+    """
+
+    def __init__(self, upload: ResumableUpload) -> None:
+        self.upload_id = upload.id
+        self.filename = upload.filename
+        self.content_type = upload.content_type
+        self.size = upload.length
+        self.staged_path = Path(upload.storage_path)
+        self._handle = None
+
+    async def read(self, size: int = -1) -> bytes:
+        if self._handle is None:
+            self._handle = await aiofiles.open(self.staged_path, "rb")
+        return await self._handle.read(size)
+
+    async def seek(self, offset: int) -> None:
+        if self._handle is not None:
+            await self._handle.seek(offset)
+
+    async def close(self) -> None:
+        if self._handle is not None:
+            await self._handle.close()
+            self._handle = None
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def uploads_dir() -> Path:
+    return Path(settings.STORAGE_BASE_PATH) / ".uploads"
+
+
+def parse_metadata(header: Optional[str]) -> dict[str, str]:
+    """Decode tus ``Upload-Metadata``: ``key base64value,key2 base64value2``."""
+    metadata: dict[str, str] = {}
+    for pair in (header or "").split(","):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode("utf-8") if value else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise UploadError(f"Invalid Upload-Metadata value for {key!r}")
+    return metadata
+
+
+def _limits(kind: str) -> tuple[set[str], int]:
+    from app.utils.video_utils import ALLOWED_VIDEO_EXTENSIONS, MAX_VIDEO_SIZE
+
+    if kind == "photo":
+        return {f".{ext}" for ext in settings.ALLOWED_FILE_EXTENSIONS_PHOTO}, settings.MAX_FILE_SIZE_PHOTO
+    return ALLOWED_VIDEO_EXTENSIONS, MAX_VIDEO_SIZE
+
+
+def _infer_kind(filename: str) -> Optional[str]:
+    suffix = Path(filename).suffix.lower()
+    for kind in ("photo", "video"):
+        if suffix in _limits(kind)[0]:
+            return kind
+    return None
+
+
+def expires_at_for(now: Optional[datetime] = None) -> datetime:
+    return (now or _utcnow()) + timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)
+
+
+async def create_upload(db: AsyncSession, length: Optional[str], metadata_header: Optional[str]) -> ResumableUpload:
+    """Register a new upload and create its (empty) staging file."""
+    try:
+        total = int(length) if length is not None else -1
+    except ValueError:
+        total = -1
+    if total <= 0:
+        raise UploadError("Upload-Length must be a positive integer")  # no deferred length
+
+    metadata = parse_metadata(metadata_header)
+    filename = Path(metadata.pop("filename", "") or "").name
+    if not filename:
+        raise UploadError("Upload-Metadata must include filename")
+    kind = metadata.pop("kind", None) or _infer_kind(filename)
+    if kind not in ("photo", "video"):
+        raise UploadError("Unsupported file type", status_code=415)
+    extensions, max_size = _limits(kind)
+    if Path(filename).suffix.lower() not in extensions:
+        raise UploadError(f"Unsupported {kind} extension", status_code=415)
+    if total > max_size:
+        raise UploadError(f"Upload exceeds the {max_size // (1024 * 1024)} MB limit", status_code=413)
+
+    upload_id = uuid4().hex
+    path = uploads_dir() / upload_id
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    now = _utcnow()
+    upload = ResumableUpload(
+        id=upload_id,
+        kind=kind,
+        filename=filename,
+        content_type=metadata.pop("filetype", None) or None,
+        length=total,
+        offset=0,
+        storage_path=str(path),
+        upload_metadata=metadata or None,
+        created_at=now,
+        updated_at=now,
+        expires_at=expires_at_for(now),
+    )
+    db.add(upload)
+    await db.commit()
+    RESUMABLE_UPLOAD_EVENTS.labels(event="created").inc()
+    logger.info("resumable_upload_created", upload_id=upload_id, kind=kind, length=total)
+    return upload
+
+
+async def get_upload(db: AsyncSession, upload_id: str) -> ResumableUpload:
+    upload = await db.get(ResumableUpload, upload_id)
+    if upload is None or upload.expires_at < _utcnow():
+        raise UploadError("Upload not found", status_code=404)
+    return upload
+
+
+async def append_chunk(
+    db: AsyncSession,
+    upload: ResumableUpload,
+    offset: Optional[str],
+    chunks: AsyncIterator[bytes],
+) -> int:
+    """Write a PATCH body at *offset*; returns the new offset.
+
+    Bytes received before a dropped connection are kept (the offset is
+    committed in ``finally``), so the client resumes exactly where the
+    server stopped.
+    """
+    try:
+        start = int(offset) if offset is not None else -1
+    except ValueError:
+        start = -1
+    if start != upload.offset:
+        raise UploadError(f"Upload-Offset mismatch: expected {upload.offset}", status_code=409)
+
+    if upload.id in _writing:
+        raise UploadError("Another request is writing this upload", status_code=423)
+    _writing.add(upload.id)
+    position = start
+    received = 0
+    try:
+        async with aiofiles.open(upload.storage_path, "r+b") as fh:
+            await fh.seek(start)
+            await fh.truncate()  # drop bytes of a request that failed after the last commit
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if position + len(chunk) > upload.length:
+                    raise UploadError("Chunk exceeds Upload-Length", status_code=413)
+                await fh.write(chunk)
+                position += len(chunk)
+                received += len(chunk)
+            await fh.flush()
+    except FileNotFoundError:
+        raise UploadError("Upload not found", status_code=404)
+    finally:
+        _writing.discard(upload.id)
+        RESUMABLE_UPLOAD_BYTES.inc(received)
+        upload.offset = position
+        upload.updated_at = _utcnow()
+        upload.expires_at = expires_at_for(upload.updated_at)
+        await db.commit()
+
+    if position == upload.length:
+        RESUMABLE_UPLOAD_EVENTS.labels(event="completed").inc()
+        logger.info("resumable_upload_completed", upload_id=upload.id, length=upload.length)
+    return position
+
+
+async def claim_completed(db: AsyncSession, upload_id: str, kind: str) -> StagedUpload:
+    """The finished upload *upload_id* of *kind*, ready to be adopted."""
+    upload = await get_upload(db, upload_id)
+    if upload.kind != kind:
+        raise UploadError(f"Upload {upload_id} is not a {kind}", status_code=422)
+    if upload.offset != upload.length:
+        raise UploadError(f"Upload {upload_id} is incomplete ({upload.offset}/{upload.length})", status_code=409)
+    if not Path(upload.storage_path).is_file():
+        raise UploadError("Upload not found", status_code=404)
+    return StagedUpload(upload)
+
+
+async def release(db: AsyncSession, staged: list[StagedUpload]) -> None:
+    """Forget uploads whose file has been adopted (moved away).
+
+    Uploads still on disk (creation failed before adopting them) stay
+    available for another finalize attempt until they expire.
+    """
+    for item in staged:
+        await item.close()
+        if item.staged_path.exists():
+            continue
+        upload = await db.get(ResumableUpload, item.upload_id)
+        if upload is not None:
+            await db.delete(upload)
+            RESUMABLE_UPLOAD_EVENTS.labels(event="finalized").inc()
+    await db.commit()
+
+
+async def delete_upload(db: AsyncSession, upload: ResumableUpload) -> None:
+    """tus termination: drop the upload and its file."""
+    Path(upload.storage_path).unlink(missing_ok=True)
+    await db.delete(upload)
+    await db.commit()
+    RESUMABLE_UPLOAD_EVENTS.labels(event="terminated").inc()
+
+
+async def expire_stale_uploads(db: Optional[AsyncSession] = None) -> int:
+    """Delete expired uploads and staging files that have no row.
+
+    Returns the number of uploads removed.  Scheduled every
+    ``RESUMABLE_UPLOAD_CLEANUP_MINUTES``.
+    """
+    if db is None:
+        from app.core.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as session:
+            return await expire_stale_uploads(session)
+
+    now = _utcnow()
+    expired = (await db.execute(select(ResumableUpload).where(ResumableUpload.expires_at < now))).scalars().all()
+    for upload in expired:
+        Path(upload.storage_path).unlink(missing_ok=True)
+        await db.delete(upload)
+    await db.commit()
+
+    # Files left behind by a crash between file creation and commit
+    known = set((await db.execute(select(ResumableUpload.id))).scalars().all())
+    cutoff = (now - timedelta(hours=settings.RESUMABLE_UPLOAD_EXPIRY_HOURS)).timestamp()
+    orphans = await asyncio.to_thread(_remove_orphans, uploads_dir(), known, cutoff)
+
+    if expired or orphans:
+        RESUMABLE_UPLOAD_EVENTS.labels(event="expired").inc(len(expired))
+        logger.info("resumable_uploads_expired", uploads=len(expired), orphan_files=orphans)
+    return len(expired)
+
+
+def _remove_orphans(directory: Path, known: set[str], cutoff: float) -> int:
+    removed = 0
+    if not directory.is_dir():
+        return 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name not in known and entry.stat().st_mtime < cutoff:
+            os.unlink(entry.path)
+            removed += 1
+    return removed
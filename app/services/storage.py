@@ -11,6 +11,7 @@ from typing import Dict, Any, Optional
 import structlog
 
 from app.core.config import settings
+from app.services.storage_usage_service import local_tree_files, storage_usage
 
 logger = structlog.get_logger()
 
@@ -57,10 +58,12 @@ class LocalStorageAdapter:
             
             # Create directory if needed
             full_path.parent.mkdir(parents=True, exist_ok=True)
+            previous_size = full_path.stat().st_size if full_path.is_file() else None
             
             # Write file
             with open(full_path, 'wb') as f:
                 f.write(file_content)
+            storage_usage.record_saved(file_path, len(file_content), previous_size)
             
             logger.info("file_saved_to_local_storage", 
                        file_path=file_path,
@@ -126,10 +129,12 @@ class LocalStorageAdapter:
             return False
         
         try:
+            removed = local_tree_files(full_path)
             if full_path.is_file():
                 full_path.unlink()
             elif full_path.is_dir():
                 shutil.rmtree(full_path)
+            storage_usage.record_tree_deleted(removed)
             
             logger.info("file_deleted_from_local_storage", file_path=file_path)
             return True
@@ -157,39 +162,22 @@ class LocalStorageAdapter:
         """
         Get storage usage statistics.
         
+        Answered from the incremental ``storage_usage`` accounting (see
+        ``app.services.storage_usage_service``), not by walking the tree.
+        
         Returns:
             Dictionary with usage statistics
         """
-        try:
-            total_size = 0
-            file_count = 0
-            
-            if self.base_path.exists():
-                for item in self.base_path.rglob("*"):
-                    if item.is_file():
-                        total_size += item.stat().st_size
-                        file_count += 1
-            
-            stats = {
-                "total_files": file_count,
-                "total_size_bytes": total_size,
-                "total_size_mb": round(total_size / (1024 * 1024), 2),
-                "base_path": str(self.base_path),
-                "exists": self.base_path.exists()
-            }
-            
-            logger.info("storage_usage_stats_calculated", **stats)
-            return stats
-            
-        except Exception as e:
-            logger.error("failed_to_calculate_storage_usage", error=str(e))
-            return {
-                "total_files": 0,
-                "total_size_bytes": 0,
-                "total_size_mb": 0,
-                "base_path": str(self.base_path),
-                "exists": False
-            }
+        summary = storage_usage.summary()
+        total_size = summary["total_bytes"]
+        return {
+            "total_files": summary["file_count"],
+            "total_size_bytes": total_size,
+            "total_size_mb": round(total_size / (1024 * 1024), 2),
+            "base_path": str(self.base_path),
+            "exists": self.base_path.exists(),
+            "by_kind": summary["by_kind"],
+        }
 
 
 # Global storage adapter instance
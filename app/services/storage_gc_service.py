@@ -0,0 +1,509 @@
+"""Garbage collection of unreferenced media, stale caches and staging files.
+
+Content deletes remove their order folder, but Yandex Disk uploads,
+failed creates, regenerations and storage migrations leave files nobody
+points at.  A run:
+
+1. streams every stored path/URL/reference out of ``ar_content``,
+   ``videos`` and ``media_blobs`` in one ``UNION ALL`` query and keeps them
+   as sets of storage keys — local ones and, per company, remote ones;
+2. walks the local content roots (``VertexAR/``, ``blobs/``, ``hls/``,
+   ``previews/``) in a worker thread and pages each remote company folder,
+   diffing the listings against those sets in memory;
+3. checks the service folders: ``.cache/img`` variants of deleted content
+   or replaced photos, ``.cache/yd`` copies of unreferenced objects and
+   partial downloads, ``.uploads`` files without an upload row.
+
+A file is live when it is referenced or sits in a folder holding a
+referenced file (renditions, HLS segments and markers live next to the
+file the DB points at); legacy ``hls/video_<id>`` and
+``previews/video_<id>`` folders live as long as their video does.
+Nothing younger than ``STORAGE_GC_GRACE_HOURS`` is touched, so uploads
+whose row is not committed yet are safe.
+
+``STORAGE_GC_DRY_RUN`` only reports the reclaimable bytes.  Otherwise
+local content is moved to ``.trash/{date}/`` and purged after
+``STORAGE_GC_QUARANTINE_DAYS``; cache, staging and remote files are
+deleted (remote providers have no quarantine of their own here).  A file
+that cannot be removed is recorded in the report's ``errors`` and skipped.
+
+The scheduled run holds a job lease, so one worker collects; the report
+of the last run is kept in ``system_settings`` for every worker to serve.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import re
+import shutil
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import unquote, urlsplit
+
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.storage_providers import (
+    REMOTE_REF_SCHEMES,
+    RemoteStorageProvider,
+    get_provider_for_company,
+    split_remote_ref,
+)
+from app.services.media_blob_service import BLOB_ROOT
+from app.services.storage_usage_service import storage_key, storage_usage
+
+logger = structlog.get_logger()
+
+LOCAL_CONTENT_ROOTS = ("VertexAR", BLOB_ROOT, "hls", "previews")
+TRASH_DIR = ".trash"
+_TRASH_DATE_FORMAT = "%Y%m%d"
+_LEGACY_VIDEO_DIR = re.compile(r"^(?:hls|previews)/video_(\d+)(?:/|$)")
+_REMOTE_CONCURRENCY = 4
+_SAMPLE_SIZE = 50
+REPORT_SETTING_KEY = "storage_gc_last_report"
+
+STORAGE_GC_FILES = Counter(
+    "storage_gc_files_total",
+    "Unreferenced files found / removed by the storage GC",
+    ["area", "action"],
+)
+
+STORAGE_GC_BYTES = Counter(
+    "storage_gc_reclaimed_bytes_total",
+    "Bytes removed by the storage GC",
+    ["area"],
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+@dataclass
+class GcReport:
+    """What a run found and removed, per area (``local``, ``img_cache``, …)."""
+
+    dry_run: bool
+    grace_hours: int
+    started_at: str
+    duration_seconds: float = 0.0
+    scanned_files: int = 0
+    orphan_files: int = 0
+    reclaimable_bytes: int = 0
+    removed_files: int = 0
+    removed_bytes: int = 0
+    areas: dict[str, dict[str, int]] = field(default_factory=dict)
+    samples: list[str] = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+
+    def found(self, area: str, path: str, size: int) -> None:
+        stats = self.areas.setdefault(area, {"files": 0, "bytes": 0, "removed_files": 0, "removed_bytes": 0})
+        stats["files"] += 1
+        stats["bytes"] += size
+        self.orphan_files += 1
+        self.reclaimable_bytes += size
+        if len(self.samples) < _SAMPLE_SIZE:
+            self.samples.append(f"{area}:{path}")
+        STORAGE_GC_FILES.labels(area=area, action="found").inc()
+
+    def removed(self, area: str, size: int) -> None:
+        stats = self.areas[area]
+        stats["removed_files"] += 1
+        stats["removed_bytes"] += size
+        self.removed_files += 1
+        self.removed_bytes += size
+        STORAGE_GC_FILES.labels(area=area, action="removed").inc()
+        STORAGE_GC_BYTES.labels(area=area).inc(size)
+
+
+class ReferenceSet:
+    """Referenced storage keys and the folders holding them."""
+
+    def __init__(self) -> None:
+        self.keys: set[str] = set()
+        self.folders: set[str] = set()
+
+    def add(self, key: str) -> None:
+        self.keys.add(key)
+        parent = key.rpartition("/")[0]
+        if parent:
+            self.folders.add(parent)
+
+    def __contains__(self, key: str) -> bool:
+        if key in self.keys:
+            return True
+        while "/" in key:
+            key = key.rpartition("/")[0]
+            if key in self.folders:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+@dataclass
+class References:
+    local: ReferenceSet = field(default_factory=ReferenceSet)
+    remote: dict[int, ReferenceSet] = field(default_factory=dict)
+    video_ids: set[int] = field(default_factory=set)
+    # content id → current ``variant_version`` of its photo
+    image_versions: dict[int, str] = field(default_factory=dict)
+    upload_ids: set[str] = field(default_factory=set)
+
+    def is_live(self, key: str, refs: ReferenceSet) -> bool:
+        legacy = _LEGACY_VIDEO_DIR.match(key)
+        if legacy:
+            return int(legacy.group(1)) in self.video_ids
+        return key in refs
+
+
+def _local_key(value: str) -> Optional[str]:
+    """Storage key of a local path or ``…/storage/…`` URL."""
+    if "://" in value:
+        path = urlsplit(value).path
+        return storage_key(unquote(path)) if path.startswith("/storage/") else None
+    return storage_key(value)
+
+
+async def collect_references(db: AsyncSession) -> References:
+    """Every referenced path, read with one streaming query."""
+    from app.models.ar_content import ARContent
+    from app.models.media_blob import MediaBlob
+    from app.models.resumable_upload import ResumableUpload
+    from app.models.video import Video
+    from app.services.image_variant_service import variant_version
+
+    content_columns = (
+        ARContent.photo_path, ARContent.photo_url, ARContent.thumbnail_url, ARContent.video_path,
+        ARContent.video_url, ARContent.qr_code_path, ARContent.qr_code_url, ARContent.marker_path,
+        ARContent.marker_url,
+    )
+    video_columns = (
+        Video.video_path, Video.video_url, Video.thumbnail_path, Video.preview_url, Video.hls_path,
+        Video.hls_url, Video.poster_url, Video.animated_preview_url, Video.sprite_url, Video.sprite_vtt_url,
+    )
+    selects = [select(ARContent.company_id, column.label("value")) for column in content_columns]
+    selects += [
+        select(ARContent.company_id, column.label("value")).join(Video, Video.ar_content_id == ARContent.id)
+        for column in video_columns
+    ]
+    selects += [select(MediaBlob.company_id, column.label("value"))
+                for column in (MediaBlob.storage_path, MediaBlob.public_url)]
+
+    refs = References()
+    async for company_id, value in await db.stream(union_all(*selects)):
+        if not value:
+            continue
+        remote = split_remote_ref(value)
+        if remote is not None:
+            if remote[1]:
+                refs.remote.setdefault(company_id, ReferenceSet()).add(remote[1].strip("/"))
+            continue
+        key = _local_key(value)
+        if key:
+            refs.local.add(key)
+
+    async for (video_id,) in await db.stream(select(Video.id)):
+        refs.video_ids.add(video_id)
+    async for content_id, photo_path in await db.stream(select(ARContent.id, ARContent.photo_path)):
+        refs.image_versions[content_id] = variant_version(content_id, photo_path)
+    async for (upload_id,) in await db.stream(select(ResumableUpload.id)):
+        refs.upload_ids.add(upload_id)
+    return refs
+
+
+def _parse_modified(value: Any) -> Optional[datetime]:
+    """``modified`` of Yandex Disk (ISO 8601) or S3 (RFC 1123) as naive UTC."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(str(value))
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+# ----------------------------------------------------------------------
+# Local scans (worker thread)
+# ----------------------------------------------------------------------
+
+
+def _walk(root: Path, base: Path):
+    """``(key relative to base, path, stat)`` of every file below *root*."""
+    if not root.is_dir():
+        return
+    for current, _dirs, names in os.walk(root):
+        for name in names:
+            path = os.path.join(current, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield Path(path).relative_to(base).as_posix(), path, stat
+
+
+def _scan_local(base: Path, refs: References, cutoff: float) -> tuple[int, list[tuple[str, str, str, int]]]:
+    """Scanned file count and ``(area, key, path, size)`` of local orphans."""
+    scanned = 0
+    orphans: list[tuple[str, str, str, int]] = []
+
+    for root in LOCAL_CONTENT_ROOTS:
+        for key, path, stat in _walk(base / root, base):
+            scanned += 1
+            if stat.st_mtime < cutoff and not refs.is_live(key, refs.local):
+                orphans.append(("local", key, path, stat.st_size))
+
+    img_root = base / ".cache" / "img"
+    for key, path, stat in _walk(img_root, img_root):
+        scanned += 1
+        content_id, _, rest = key.partition("/")
+        version = rest.partition("/")[0]
+        current = refs.image_versions.get(int(content_id)) if content_id.isdigit() else None
+        if stat.st_mtime < cutoff and version != current:
+            orphans.append(("img_cache", key, path, stat.st_size))
+
+    yd_root = base / ".cache" / "yd"
+    for key, path, stat in _walk(yd_root, yd_root):
+        scanned += 1
+        if stat.st_mtime < cutoff and _yd_cache_orphan(Path(path), refs):
+            orphans.append(("yd_cache", key, path, stat.st_size))
+
+    uploads = base / ".uploads"
+    if uploads.is_dir():
+        for entry in os.scandir(uploads):
+            scanned += 1
+            stat = entry.stat()
+            if entry.is_file() and entry.name not in refs.upload_ids and stat.st_mtime < cutoff:
+                orphans.append(("uploads", entry.name, entry.path, stat.st_size))
+    return scanned, orphans
+
+
+def _yd_cache_orphan(path: Path, refs: References) -> bool:
+    """A ``.cache/yd`` file without its pair, a partial download, or a copy of an unreferenced object."""
+    if path.suffix == ".part":
+        return True
+    if path.suffix == ".json":
+        data = path.with_suffix("")
+        return not data.is_file() or _yd_cache_orphan(data, refs)
+    sidecar = path.with_name(f"{path.name}.json")
+    try:
+        data = json.loads(sidecar.read_text())
+        company_id, relative = int(data["company_id"]), str(data["path"]).lstrip("/")
+    except (OSError, ValueError, TypeError, KeyError):
+        return True
+    company_refs = refs.remote.get(company_id)
+    return company_refs is None or not refs.is_live(relative, company_refs)
+
+
+def _scan_trash(trash: Path, keep_days: int) -> list[tuple[str, str, str, int]]:
+    """Quarantine folders older than *keep_days*."""
+    expired = []
+    if not trash.is_dir():
+        return expired
+    cutoff = _utcnow() - timedelta(days=keep_days)
+    for entry in os.scandir(trash):
+        try:
+            day = datetime.strptime(entry.name, _TRASH_DATE_FORMAT)
+        except ValueError:
+            continue
+        if day < cutoff:
+            files = [("trash", key, path, stat.st_size) for key, path, stat in _walk(Path(entry.path), trash)]
+            # An emptied day folder goes as a whole
+            expired.extend(files or [("trash", entry.name, entry.path, 0)])
+    return expired
+
+
+def _remove_local(area: str, key: str, path: str, base: Path, quarantine_days: int) -> bool:
+    """Delete (or quarantine) one local file and prune emptied folders."""
+    try:
+        if area == "local" and quarantine_days > 0:
+            target = base / TRASH_DIR / _utcnow().strftime(_TRASH_DATE_FORMAT) / key
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(path, target)
+        elif os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    except FileNotFoundError:
+        return False
+    stop = {base, base / ".cache" / "img", base / ".cache" / "yd", base / ".uploads", base / TRASH_DIR}
+    stop.update(base / root for root in LOCAL_CONTENT_ROOTS)
+    parent = Path(path).parent
+    while parent not in stop and base in parent.parents:
+        try:
+            parent.rmdir()
+        except OSError:
+            break
+        parent = parent.parent
+    return True
+
+
+class StorageGarbageCollector:
+    """Find and remove storage nobody references; see the module docstring."""
+
+    def __init__(self) -> None:
+        self._lock = asyncio.Lock()
+
+    async def run(self, dry_run: Optional[bool] = None, db: Optional[AsyncSession] = None) -> GcReport:
+        """One collection pass; ``dry_run`` defaults to ``STORAGE_GC_DRY_RUN``."""
+        if db is None:
+            from app.core.database import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as session:
+                return await self.run(dry_run, session)
+
+        dry_run = settings.STORAGE_GC_DRY_RUN if dry_run is None else dry_run
+        async with self._lock:
+            started = time.monotonic()
+            report = GcReport(
+                dry_run=dry_run,
+                grace_hours=settings.STORAGE_GC_GRACE_HOURS,
+                started_at=_utcnow().isoformat(timespec="seconds"),
+            )
+            refs = await collect_references(db)
+            if not len(refs.local) and not any(len(company_refs) for company_refs in refs.remote.values()):
+                # An empty or wrong database would make every file an orphan
+                report.errors.append("No referenced files found; nothing collected")
+                logger.warning("storage_gc_skipped", reason="no_references")
+            else:
+                await self._collect_local(report, refs, dry_run)
+                await self._collect_remote(db, report, refs, dry_run)
+            report.duration_seconds = round(time.monotonic() - started, 2)
+            await self._save_report(db, report)
+
+        logger.info(
+            "storage_gc_completed",
+            dry_run=dry_run,
+            scanned_files=report.scanned_files,
+            orphan_files=report.orphan_files,
+            reclaimable_bytes=report.reclaimable_bytes,
+            removed_files=report.removed_files,
+            removed_bytes=report.removed_bytes,
+            errors=len(report.errors),
+            duration_seconds=report.duration_seconds,
+        )
+        return report
+
+    @staticmethod
+    async def _save_report(db: AsyncSession, report: GcReport) -> None:
+        from app.services.settings_service import SettingsService
+
+        try:
+            await SettingsService(db).set_setting(
+                REPORT_SETTING_KEY,
+                asdict(report),
+                data_type="json",
+                category="storage",
+                description="Report of the last storage GC run",
+            )
+        except Exception as exc:
+            await db.rollback()
+            logger.warning("storage_gc_report_not_saved", error=str(exc))
+
+    async def last_report(self, db: AsyncSession) -> Optional[dict[str, Any]]:
+        """Report of the last run in any worker (``None`` before the first)."""
+        from app.services.settings_service import SettingsService
+
+        return await SettingsService(db).get_setting_value(REPORT_SETTING_KEY)
+
+    async def _collect_local(self, report: GcReport, refs: References, dry_run: bool) -> None:
+        base = Path(settings.STORAGE_BASE_PATH)
+        cutoff = time.time() - settings.STORAGE_GC_GRACE_HOURS * 3600
+        scanned, orphans = await asyncio.to_thread(_scan_local, base, refs, cutoff)
+        report.scanned_files += scanned
+        quarantine_days = settings.STORAGE_GC_QUARANTINE_DAYS
+        if quarantine_days > 0:
+            orphans += await asyncio.to_thread(_scan_trash, base / TRASH_DIR, quarantine_days)
+
+        for area, key, path, size in orphans:
+            report.found(area, key, size)
+            if dry_run:
+                continue
+            if area == "yd_cache":
+                self._forget_yd_copy(Path(path))
+            try:
+                removed = await asyncio.to_thread(_remove_local, area, key, path, base, quarantine_days)
+            except OSError as exc:
+                report.errors.append(f"{area}:{key}: {exc}")
+                logger.warning("storage_gc_remove_failed", area=area, path=path, error=str(exc))
+                continue
+            if removed:
+                report.removed(area, size)
+                if area == "local":
+                    storage_usage.record_deleted(key, size, company_id=0, project_id=0)
+
+    @staticmethod
+    def _forget_yd_copy(path: Path) -> None:
+        """Drop the entry from this worker's in-memory index of the YD cache."""
+        from app.services.yandex_disk_file_cache_service import yd_file_cache
+
+        sidecar = path if path.suffix == ".json" else path.with_name(f"{path.name}.json")
+        try:
+            data = json.loads(sidecar.read_text())
+            yd_file_cache.invalidate(int(data["company_id"]), str(data["path"]))
+        except (OSError, ValueError, TypeError, KeyError):
+            pass
+
+    async def _collect_remote(self, db: AsyncSession, report: GcReport, refs: References, dry_run: bool) -> None:
+        from app.models.company import Company
+        from app.services.settings_service import SettingsService
+
+        backup_folder = (await SettingsService(db).get_all_settings()).backup.backup_yd_folder.strip("/")
+        companies = (await db.execute(
+            select(Company).where(Company.storage_provider.in_(tuple(REMOTE_REF_SCHEMES.values())))
+        )).scalars().all()
+        cutoff = _utcnow() - timedelta(hours=settings.STORAGE_GC_GRACE_HOURS)
+        semaphore = asyncio.Semaphore(_REMOTE_CONCURRENCY)
+
+        for company in companies:
+            try:
+                provider = await get_provider_for_company(company)
+                if not isinstance(provider, RemoteStorageProvider):
+                    continue
+                company_refs = refs.remote.get(company.id, ReferenceSet())
+                candidates: list[tuple[str, int]] = []
+                async for key, size in provider.iter_files():
+                    report.scanned_files += 1
+                    # Backups are rotated by the backup service
+                    if key.split("/", 1)[0] == backup_folder or refs.is_live(key, company_refs):
+                        continue
+                    candidates.append((key, size))
+            except Exception as exc:
+                report.errors.append(f"company {company.id}: {exc}")
+                logger.warning("storage_gc_remote_scan_failed", company_id=company.id, error=str(exc))
+                continue
+
+            async def _one(key: str, size: int, provider=provider, company_id=company.id) -> None:
+                async with semaphore:
+                    try:
+                        # Listings carry no age; the metadata also proves the file still exists
+                        info = await provider.get_file_info(key)
+                        modified = _parse_modified((info or {}).get("modified"))
+                        if modified is None or modified >= cutoff:
+                            return
+                        area = provider.provider_name
+                        report.found(area, f"{company_id}/{key}", size)
+                        if not dry_run and await provider.delete_file(key):
+                            report.removed(area, size)
+                    except Exception as exc:
+                        report.errors.append(f"company {company_id}: {key}: {exc}")
+
+            await asyncio.gather(*(_one(key, size) for key, size in candidates))
+
+
+storage_gc = StorageGarbageCollector()
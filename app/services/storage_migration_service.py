@@ -0,0 +1,692 @@
+"""Copy a company's files to another storage provider and repoint the DB.
+
+A migration runs in three resumable phases, all progress kept in
+``storage_migrations`` / ``storage_migration_items``:
+
+1. **planning** — referenced paths are read from ``ar_content``, ``videos``
+   and ``media_blobs`` in keyset batches; the folders holding them (order
+   folders, blob folders with their renditions, legacy preview/HLS roots)
+   are listed on the source and every file becomes an item.
+2. **copying** — pending items are transferred ``STORAGE_MIGRATION_CONCURRENCY``
+   at a time, streamed through a temporary file for remote sources, and
+   verified (size + MD5) on the target before they count as copied.
+3. **rewriting** — references are repointed in batches of
+   ``STORAGE_MIGRATION_BATCH_SIZE`` rows and the company is switched to the
+   target provider.
+
+Uploads keep going to the source while a migration runs, so after the
+rewrite the references are read again: files referenced since the plan are
+added, copied and repointed, up to ``CATCH_UP_ROUNDS`` times.  The company
+is only switched once no reference to an existing source file is left;
+otherwise the migration fails and can be resumed.
+
+Source files are left in place (local blobs may be shared by companies);
+orphans are the business of the storage GC.  Interrupted or failed runs
+continue where they stopped: copied items are never transferred again and
+failed ones are retried.  Transfers are network/thread-bound, so running
+inside an API worker does not block request handling.
+
+Local layout differs from remote providers only by the ``VertexAR/`` root
+of order folders (``VertexAR/{project}/{order}`` vs ``{project}/{order}``);
+``blobs/``, ``hls/`` and ``previews/`` keep their paths.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path, PurePosixPath
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Optional
+from urllib.parse import unquote, urlsplit
+
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.storage_providers import (
+    RemoteStorageProvider,
+    StorageProvider,
+    get_provider_for_company,
+    get_storage_provider,
+    invalidate_company_provider,
+    split_remote_ref,
+)
+from app.models.ar_content import ARContent
+from app.models.company import Company
+from app.models.media_blob import MediaBlob
+from app.models.storage_migration import StorageMigration, StorageMigrationItem
+from app.models.video import Video
+from app.services.media_blob_service import BLOB_ROOT, blob_relative_dir
+from app.services.storage_usage_service import local_tree_files
+
+logger = structlog.get_logger()
+
+LOCAL_ORDER_ROOT = "VertexAR"
+# Top-level folders shared by the local and the remote layout
+SHARED_ROOTS = (BLOB_ROOT, "hls", "previews")
+PROVIDERS = ("local", "yandex_disk", "s3")
+ACTIVE_STATUSES = ("planning", "copying", "rewriting")
+# An active migration without progress for this long was interrupted
+STALE_AFTER = timedelta(minutes=10)
+# Re-plan/copy/rewrite passes for files added while the migration ran
+CATCH_UP_ROUNDS = 5
+
+AR_CONTENT_COLUMNS = (
+    "photo_path", "photo_url", "thumbnail_url", "video_path", "video_url",
+    "qr_code_path", "qr_code_url", "marker_path", "marker_url", "marker_metadata",
+)
+VIDEO_COLUMNS = (
+    "video_path", "video_url", "thumbnail_path", "preview_url", "hls_path", "hls_url",
+    "poster_url", "animated_preview_url", "sprite_url", "sprite_vtt_url",
+)
+MEDIA_BLOB_COLUMNS = ("storage_path", "public_url", "derived")
+
+STORAGE_MIGRATION_FILES = Counter(
+    "storage_migration_files_total",
+    "Files processed by storage migrations",
+    ["target", "result"],
+)
+
+STORAGE_MIGRATION_BYTES = Counter(
+    "storage_migration_bytes_total",
+    "Bytes copied by storage migrations",
+    ["target"],
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class MigrationError(Exception):
+    """Invalid migration request, with the HTTP status to answer."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ChecksumMismatch(Exception):
+    """The copy on the target does not match the source file."""
+
+
+@dataclass
+class MigrationProgress:
+    """Progress and throughput of a migration, as reported to the admin/CLI."""
+
+    id: int
+    company_id: int
+    source_provider: str
+    target_provider: str
+    status: str
+    total_files: int
+    copied_files: int
+    failed_files: int
+    total_bytes: int
+    copied_bytes: int
+    rewritten_rows: int
+    percent: float
+    bytes_per_second: float
+    eta_seconds: Optional[int]
+    error_message: Optional[str]
+
+    @classmethod
+    def of(cls, migration: StorageMigration) -> "MigrationProgress":
+        end = migration.finished_at or _utcnow()
+        elapsed = (end - migration.started_at).total_seconds() if migration.started_at else 0.0
+        rate = migration.run_copied_bytes / elapsed if elapsed > 0 else 0.0
+        remaining = max(migration.total_bytes - migration.copied_bytes, 0)
+        total = migration.total_bytes or 0
+        return cls(
+            id=migration.id,
+            company_id=migration.company_id,
+            source_provider=migration.source_provider,
+            target_provider=migration.target_provider,
+            status=migration.status,
+            total_files=migration.total_files,
+            copied_files=migration.copied_files,
+            failed_files=migration.failed_files,
+            total_bytes=total,
+            copied_bytes=migration.copied_bytes,
+            rewritten_rows=migration.rewritten_rows,
+            percent=round(100.0 * migration.copied_bytes / total, 1) if total else 100.0,
+            bytes_per_second=round(rate, 1),
+            eta_seconds=int(remaining / rate) if rate > 0 and migration.status == "copying" else None,
+            error_message=migration.error_message,
+        )
+
+
+# ----------------------------------------------------------------------
+# Paths and references
+# ----------------------------------------------------------------------
+
+
+def target_relative(relative: str, source: str, target: str) -> str:
+    """Map a path relative to the *source* root to the *target* layout."""
+    relative = relative.lstrip("/")
+    if source == "local" and target != "local":
+        prefix = f"{LOCAL_ORDER_ROOT}/"
+        return relative[len(prefix):] if relative.startswith(prefix) else relative
+    if target == "local" and source != "local":
+        if relative.split("/", 1)[0] in SHARED_ROOTS:
+            return relative
+        return f"{LOCAL_ORDER_ROOT}/{relative}"
+    return relative
+
+
+def local_relative(value: str) -> Optional[str]:
+    """Path below ``STORAGE_BASE_PATH`` of a local path or ``/storage/…`` URL."""
+    if "://" not in value:
+        try:
+            relative = Path(value).resolve().relative_to(Path(settings.STORAGE_BASE_PATH).resolve())
+            return relative.as_posix() if relative.parts else None
+        except (ValueError, OSError):
+            pass
+    url_path = urlsplit(value).path if "://" in value else value
+    if url_path.startswith("/storage/"):
+        return unquote(url_path[len("/storage/"):]) or None
+    return None
+
+
+def source_relative(value: Any, source: str) -> Optional[str]:
+    """Relative path of *value* if it is a reference into the *source* provider."""
+    if not isinstance(value, str) or not value:
+        return None
+    remote = split_remote_ref(value)
+    if remote:
+        return remote[1] if remote[0] == source else None
+    return local_relative(value) if source == "local" else None
+
+
+def _walk_strings(value: Any, visit: Callable[[str, str], Optional[str]], key: str = "") -> Any:
+    """Apply *visit* to every string in a JSON value; returns the new value."""
+    if isinstance(value, str):
+        replaced = visit(value, key)
+        return value if replaced is None else replaced
+    if isinstance(value, dict):
+        return {k: _walk_strings(v, visit, str(k)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_walk_strings(v, visit, key) for v in value]
+    return value
+
+
+async def provider_named(company: Company, name: str) -> StorageProvider:
+    """The company's provider of type *name*, whatever it currently uses."""
+    if name == "local":
+        return get_storage_provider()
+    # Stand-in without an id: must not replace the company's cached provider
+    stand_in = SimpleNamespace(
+        id=None,
+        storage_provider=name,
+        yandex_disk_token=company.yandex_disk_token,
+        slug=company.slug,
+        name=company.name,
+    )
+    provider = await get_provider_for_company(stand_in)
+    if not isinstance(provider, RemoteStorageProvider) or provider.provider_name != name:
+        raise MigrationError(f"Storage provider '{name}' is not configured for this company")
+    provider.company_id = company.id
+    return provider
+
+
+def _file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StorageMigrationService:
+    """Create, run and report storage migrations."""
+
+    # ------------------------------------------------------------------
+    # Creation and reporting
+    # ------------------------------------------------------------------
+
+    async def create(
+        self,
+        db: AsyncSession,
+        company_id: int,
+        target_provider: str,
+        source_provider: Optional[str] = None,
+    ) -> StorageMigration:
+        """Register a migration (run it with :meth:`run`)."""
+        company = await db.get(Company, company_id)
+        if company is None:
+            raise MigrationError("Company not found", status_code=404)
+        source_provider = source_provider or company.storage_provider or "local"
+        for name in (source_provider, target_provider):
+            if name not in PROVIDERS:
+                raise MigrationError(f"Unknown storage provider '{name}'")
+        if source_provider == target_provider:
+            raise MigrationError("Source and target storage are the same")
+        active = await db.scalar(
+            select(StorageMigration.id).where(
+                StorageMigration.company_id == company_id,
+                StorageMigration.status.in_(ACTIVE_STATUSES),
+            )
+        )
+        if active is not None:
+            raise MigrationError(f"Migration {active} of this company is not finished", status_code=409)
+        # Fail now rather than in the background task
+        await provider_named(company, source_provider)
+        await provider_named(company, target_provider)
+
+        migration = StorageMigration(
+            company_id=company_id,
+            source_provider=source_provider,
+            target_provider=target_provider,
+            status="planning",
+        )
+        db.add(migration)
+        await db.commit()
+        await db.refresh(migration)
+        logger.info(
+            "storage_migration_created",
+            migration_id=migration.id,
+            company_id=company_id,
+            source=source_provider,
+            target=target_provider,
+        )
+        return migration
+
+    async def get(self, db: AsyncSession, migration_id: int) -> Optional[StorageMigration]:
+        return await db.get(StorageMigration, migration_id)
+
+    async def check_resumable(self, db: AsyncSession, migration_id: int) -> StorageMigration:
+        """The migration, if it may be resumed now (failed or interrupted)."""
+        migration = await db.get(StorageMigration, migration_id)
+        if migration is None:
+            raise MigrationError("Migration not found", status_code=404)
+        if migration.status == "completed":
+            raise MigrationError("Migration is already completed")
+        if migration.status in ACTIVE_STATUSES and _utcnow() - migration.updated_at < STALE_AFTER:
+            raise MigrationError("Migration is still running", status_code=409)
+        return migration
+
+    async def list_for_company(self, db: AsyncSession, company_id: int, limit: int = 20) -> list[StorageMigration]:
+        stmt = (
+            select(StorageMigration)
+            .where(StorageMigration.company_id == company_id)
+            .order_by(StorageMigration.id.desc())
+            .limit(limit)
+        )
+        return list((await db.execute(stmt)).scalars().all())
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+
+    async def run(
+        self,
+        migration_id: int,
+        session_factory=None,
+        on_progress: Optional[Callable[[MigrationProgress], None]] = None,
+    ) -> Optional[MigrationProgress]:
+        """Run (or resume) a migration to completion; never raises."""
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+
+            session_factory = AsyncSessionLocal
+
+        async with session_factory() as db:
+            migration = await db.get(StorageMigration, migration_id)
+            if migration is None:
+                return None
+            if migration.status == "completed":
+                return MigrationProgress.of(migration)
+            log = logger.bind(migration_id=migration.id, company_id=migration.company_id)
+            migration.started_at = _utcnow()
+            migration.run_copied_bytes = 0
+            migration.finished_at = None
+            migration.error_message = None
+            await db.commit()
+            try:
+                company = await db.get(Company, migration.company_id)
+                source = await provider_named(company, migration.source_provider)
+                target = await provider_named(company, migration.target_provider)
+
+                # Planning commits once, so a failed plan leaves no items behind
+                if migration.status == "planning" or (migration.status == "failed" and not migration.total_files):
+                    await self._plan(db, migration, source)
+                if migration.status in ("copying", "failed"):
+                    migration.status = "copying"
+                    await self._copy(db, migration, source, target, log, on_progress)
+                    if migration.failed_files:
+                        raise MigrationError(f"{migration.failed_files} file(s) failed to copy")
+                    migration.status = "rewriting"
+                    await db.commit()
+                await self._rewrite(db, migration, company, target)
+                await self._catch_up(db, migration, company, source, target, log, on_progress)
+
+                company.storage_provider = migration.target_provider
+                migration.status = "completed"
+                migration.finished_at = migration.updated_at = _utcnow()
+                await db.commit()
+                invalidate_company_provider(company.id)
+                log.info("storage_migration_completed", **_log_fields(migration))
+            except Exception as exc:
+                await db.rollback()
+                migration = await db.get(StorageMigration, migration_id)
+                migration.status = "failed"
+                migration.error_message = str(exc)[:2000]
+                migration.finished_at = migration.updated_at = _utcnow()
+                await db.commit()
+                log.error("storage_migration_failed", error=str(exc), **_log_fields(migration))
+            progress = MigrationProgress.of(migration)
+            if on_progress is not None:
+                on_progress(progress)
+            return progress
+
+    # -- planning ------------------------------------------------------
+
+    async def _plan(self, db: AsyncSession, migration: StorageMigration, source: StorageProvider) -> None:
+        """List every file of the company on the source and store the items."""
+        roots = await self._source_roots(db, migration)
+        await db.execute(delete(StorageMigrationItem).where(StorageMigrationItem.migration_id == migration.id))
+        migration.total_files = migration.total_bytes = 0
+        migration.copied_files = migration.copied_bytes = migration.failed_files = 0
+        await self._add_items(db, migration, source, roots, planned={})
+        migration.status = "copying"
+        migration.updated_at = _utcnow()
+        await db.commit()
+        logger.info(
+            "storage_migration_planned",
+            migration_id=migration.id,
+            roots=len(roots),
+            files=migration.total_files,
+            bytes=migration.total_bytes,
+        )
+
+    async def _source_roots(self, db: AsyncSession, migration: StorageMigration) -> list[str]:
+        """Top-level source folders (or files) of everything the company references there."""
+        roots: set[str] = set()
+
+        def _collect(value: str, _key: str) -> None:
+            relative = source_relative(value, migration.source_provider)
+            if relative:
+                parent = PurePosixPath(relative).parent.as_posix()
+                roots.add(relative if parent == "." else parent)
+
+        async for rows in self._company_rows(db, migration.company_id):
+            for row, columns in rows:
+                for column in columns:
+                    _walk_strings(getattr(row, column), _collect)
+                if isinstance(row, MediaBlob) and row.storage_provider == migration.source_provider:
+                    roots.add(blob_relative_dir(row.sha256))
+                db.expunge(row)
+
+        # Nested roots would list the same files twice
+        ordered = sorted(roots)
+        return [root for i, root in enumerate(ordered)
+                if not any(root.startswith(f"{other}/") for other in ordered[:i])]
+
+    async def _add_items(
+        self,
+        db: AsyncSession,
+        migration: StorageMigration,
+        source: StorageProvider,
+        roots: list[str],
+        planned: Optional[dict[str, StorageMigrationItem]] = None,
+    ) -> int:
+        """Add an item per source file under *roots* that is new or changed since it was planned.
+
+        Returns the number of files to (re)copy; flushes, does not commit.
+        """
+        if planned is None:
+            planned = {item.source_path: item for item in (await db.execute(
+                select(StorageMigrationItem).where(StorageMigrationItem.migration_id == migration.id)
+            )).scalars()}
+        added = 0
+        batch: list[dict] = []
+        async for relative, size in self._list_source(source, roots):
+            item = planned.get(relative)
+            if item is not None:
+                if item.status == "copied" and item.size_bytes != size:
+                    # Replaced in place after it was copied (a new photo of the same order)
+                    migration.copied_files -= 1
+                    migration.copied_bytes -= item.size_bytes
+                    migration.total_bytes += size - item.size_bytes
+                    item.status, item.size_bytes, item.md5 = "pending", size, None
+                    added += 1
+                continue
+            batch.append({
+                "migration_id": migration.id,
+                "source_path": relative,
+                "target_path": target_relative(relative, migration.source_provider, migration.target_provider),
+                "size_bytes": size,
+                "status": "pending",
+            })
+            migration.total_files += 1
+            migration.total_bytes += size
+            added += 1
+            if len(batch) >= settings.STORAGE_MIGRATION_BATCH_SIZE:
+                await db.execute(insert(StorageMigrationItem), batch)
+                batch = []
+        if batch:
+            await db.execute(insert(StorageMigrationItem), batch)
+        await db.flush()
+        return added
+
+    async def _catch_up(self, db, migration, company, source, target, log, on_progress) -> None:
+        """Copy and repoint files referenced after planning until none is left on the source.
+
+        References to files that do not exist on the source cannot be
+        migrated and do not hold the switch back.
+        """
+        for _round in range(CATCH_UP_ROUNDS):
+            roots = await self._source_roots(db, migration)
+            added = await self._add_items(db, migration, source, roots) if roots else 0
+            if not added:
+                if roots:
+                    log.warning("storage_migration_dangling_references", roots=len(roots))
+                return
+            log.info("storage_migration_catch_up", files=added, **_log_fields(migration))
+            migration.status = "copying"
+            await db.commit()
+            await self._copy(db, migration, source, target, log, on_progress)
+            if migration.failed_files:
+                raise MigrationError(f"{migration.failed_files} file(s) failed to copy")
+            migration.status = "rewriting"
+            await db.commit()
+            await self._rewrite(db, migration, company, target)
+        raise MigrationError(
+            f"Files are still being added to the {migration.source_provider} storage after "
+            f"{CATCH_UP_ROUNDS} passes; the company was not switched, resume the migration"
+        )
+
+    async def _list_source(self, source: StorageProvider, roots: list[str]) -> AsyncIterator[tuple[str, int]]:
+        seen: set[str] = set()
+        for root in roots:
+            if isinstance(source, RemoteStorageProvider):
+                info = await source.get_file_info(root)
+                if info is not None:
+                    files = [(root, int(info.get("size") or 0))]
+                else:
+                    files = [item async for item in source.iter_files(root)]
+            else:
+                base = Path(settings.STORAGE_BASE_PATH)
+                local = await asyncio.to_thread(local_tree_files, base / root) if (base / root).exists() else []
+                files = [(Path(path).relative_to(base).as_posix(), size) for path, size in local]
+            for relative, size in files:
+                if relative not in seen:
+                    seen.add(relative)
+                    yield relative, size
+
+    # -- copying -------------------------------------------------------
+
+    async def _copy(self, db, migration, source, target, log, on_progress) -> None:
+        await db.execute(
+            update(StorageMigrationItem)
+            .where(StorageMigrationItem.migration_id == migration.id, StorageMigrationItem.status == "failed")
+            .values(status="pending", error=None)
+        )
+        migration.failed_files = 0
+        await db.commit()
+        semaphore = asyncio.Semaphore(max(settings.STORAGE_MIGRATION_CONCURRENCY, 1))
+
+        async def _one(item: StorageMigrationItem) -> None:
+            async with semaphore:
+                try:
+                    item.md5 = await self._transfer(item, source, target)
+                    item.status = "copied"
+                    STORAGE_MIGRATION_FILES.labels(target=migration.target_provider, result="copied").inc()
+                    STORAGE_MIGRATION_BYTES.labels(target=migration.target_provider).inc(item.size_bytes)
+                except Exception as exc:
+                    item.status, item.error = "failed", str(exc)[:1000]
+                    STORAGE_MIGRATION_FILES.labels(target=migration.target_provider, result="failed").inc()
+                    log.warning("storage_migration_item_failed", path=item.source_path, error=str(exc))
+
+        last_id = 0
+        while True:
+            items = (await db.execute(
+                select(StorageMigrationItem)
+                .where(
+                    StorageMigrationItem.migration_id == migration.id,
+                    StorageMigrationItem.status == "pending",
+                    StorageMigrationItem.id > last_id,
+                )
+                .order_by(StorageMigrationItem.id)
+                .limit(settings.STORAGE_MIGRATION_BATCH_SIZE)
+            )).scalars().all()
+            if not items:
+                break
+            last_id = items[-1].id
+            await asyncio.gather(*(_one(item) for item in items))
+            for item in items:
+                if item.status == "copied":
+                    migration.copied_files += 1
+                    migration.copied_bytes += item.size_bytes
+                    migration.run_copied_bytes += item.size_bytes
+                else:
+                    migration.failed_files += 1
+            migration.updated_at = _utcnow()
+            await db.commit()
+            progress = MigrationProgress.of(migration)
+            log.info(
+                "storage_migration_progress",
+                percent=progress.percent,
+                mb_per_second=round(progress.bytes_per_second / (1024 * 1024), 2),
+                eta_seconds=progress.eta_seconds,
+                **_log_fields(migration),
+            )
+            if on_progress is not None:
+                on_progress(progress)
+
+    async def _transfer(self, item: StorageMigrationItem, source: StorageProvider, target: StorageProvider) -> str:
+        """Copy one file and verify it on the target; returns its MD5."""
+        if not isinstance(source, RemoteStorageProvider):
+            return await self._upload_verified(
+                str(Path(settings.STORAGE_BASE_PATH) / item.source_path), item, target
+            )
+        fd, tmp_path = tempfile.mkstemp(prefix="migrate_", suffix=PurePosixPath(item.source_path).suffix)
+        os.close(fd)
+        try:
+            if not await source.get_file(item.source_path, tmp_path):
+                raise FileNotFoundError(f"Download of {item.source_path} failed")
+            return await self._upload_verified(tmp_path, item, target)
+        finally:
+            os.remove(tmp_path)
+
+    async def _upload_verified(self, local_path: str, item: StorageMigrationItem, target: StorageProvider) -> str:
+        md5 = await asyncio.to_thread(_file_md5, local_path)
+        size = os.path.getsize(local_path)
+        await target.save_file(local_path, item.target_path)
+        if isinstance(target, RemoteStorageProvider):
+            info = await target.get_file_info(item.target_path)
+            # S3 multipart ETags ("<md5 of md5s>-<parts>") are not content MD5s
+            remote_md5 = str((info or {}).get("md5") or "")
+            if info is None or int(info.get("size") or 0) != size or (remote_md5 and "-" not in remote_md5
+                                                                      and remote_md5 != md5):
+                raise ChecksumMismatch(f"{item.target_path}: target copy does not match the source")
+        else:
+            copied = str(Path(settings.STORAGE_BASE_PATH) / item.target_path)
+            if await asyncio.to_thread(_file_md5, copied) != md5:
+                raise ChecksumMismatch(f"{item.target_path}: target copy does not match the source")
+        item.size_bytes = size
+        return md5
+
+    # -- rewriting -----------------------------------------------------
+
+    async def _rewrite(self, db: AsyncSession, migration: StorageMigration, company, target) -> None:
+        """Repoint references of copied files, one batch of rows per commit."""
+        copied = set((await db.execute(
+            select(StorageMigrationItem.source_path).where(
+                StorageMigrationItem.migration_id == migration.id,
+                StorageMigrationItem.status == "copied",
+            )
+        )).scalars().all())
+        source_name, target_name = migration.source_provider, migration.target_provider
+
+        def _visit(value: str, key: str) -> Optional[str]:
+            relative = source_relative(value, source_name)
+            if relative is None or relative not in copied:
+                return None
+            new_relative = target_relative(relative, source_name, target_name)
+            if isinstance(target, RemoteStorageProvider):
+                return target.ref(new_relative)
+            if key.endswith("_path"):
+                return str(Path(settings.STORAGE_BASE_PATH) / new_relative)
+            return target.get_public_url(new_relative)
+
+        async for rows in self._company_rows(db, migration.company_id):
+            changed = 0
+            for row, columns in rows:
+                dirty = False
+                for column in columns:
+                    value = getattr(row, column)
+                    new_value = _walk_strings(value, _visit, column)
+                    if new_value != value:
+                        setattr(row, column, new_value)
+                        dirty = True
+                if isinstance(row, MediaBlob) and row.storage_provider == source_name:
+                    row.storage_provider = target_name
+                    dirty = True
+                changed += dirty
+            migration.rewritten_rows += changed
+            migration.updated_at = _utcnow()
+            await db.commit()
+
+    async def _company_rows(self, db: AsyncSession, company_id: int) -> AsyncIterator[list[tuple[Any, tuple]]]:
+        """Keyset batches of ``(row, reference columns)`` of the company."""
+        content_ids = select(ARContent.id).where(ARContent.company_id == company_id)
+        sources = (
+            (ARContent, ARContent.company_id == company_id, AR_CONTENT_COLUMNS),
+            (Video, Video.ar_content_id.in_(content_ids), VIDEO_COLUMNS),
+            (MediaBlob, MediaBlob.company_id == company_id, MEDIA_BLOB_COLUMNS),
+        )
+        for model, condition, columns in sources:
+            last_id = 0
+            while True:
+                rows = (await db.execute(
+                    select(model)
+                    .where(condition, model.id > last_id)
+                    .order_by(model.id)
+                    .limit(settings.STORAGE_MIGRATION_BATCH_SIZE)
+                )).scalars().all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                yield [(row, columns) for row in rows]
+
+
+def _log_fields(migration: StorageMigration) -> dict:
+    return {
+        "status": migration.status,
+        "copied_files": migration.copied_files,
+        "total_files": migration.total_files,
+        "failed_files": migration.failed_files,
+        "copied_bytes": migration.copied_bytes,
+        "total_bytes": migration.total_bytes,
+    }
+
+
+storage_migration_service = StorageMigrationService()
@@ -0,0 +1,483 @@
+"""Incremental storage usage accounting.
+
+Computing usage by walking the tree (``rglob`` + ``stat`` per file locally,
+paging every folder on Yandex Disk) made the storage page and the stats
+endpoints slower with every upload.  Instead:
+
+* providers report each save and delete to :data:`storage_usage`, which
+  buffers ``(bytes, files)`` deltas in-process per
+  ``(company_id, project_id, kind)`` bucket;
+* ``flush`` (every ``STORAGE_USAGE_FLUSH_SECONDS``) adds the deltas to the
+  ``storage_usage`` rows with ``UPDATE … SET total_bytes = total_bytes + :d``,
+  so several workers can flush concurrently, and reloads the rows into an
+  in-memory snapshot;
+* readers (``summary`` / ``by_company``) combine snapshot and pending deltas
+  — cost is proportional to the number of buckets, not files;
+* ``reconcile`` (every ``STORAGE_USAGE_RECONCILE_HOURS``) rebuilds the table
+  from a scan — the local tree is walked in a worker thread, Yandex Disk
+  folders and S3 prefixes are paged — which corrects writes that bypass the providers
+  (thumbnails and previews written in place) and folder deletes on Disk
+  whose size is unknown.  The scheduled run holds a job lease so only one
+  worker scans, and the table is rewritten in one transaction that keeps
+  other workers' flushes waiting until it commits.
+
+The project of a save is taken from :func:`usage_scope`, set by the routes
+that create content; remote providers know their company.  Files that
+cannot be attributed are counted under company/project ``0``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+import structlog
+from prometheus_client import Counter
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.storage_providers import split_remote_ref
+from app.models.storage_usage import StorageUsage
+
+logger = structlog.get_logger()
+
+KINDS = ("photo", "video", "thumbnail", "qr", "backup", "other")
+
+STORAGE_USAGE_EVENTS = Counter(
+    "storage_usage_events_total",
+    "Storage usage accounting events",
+    ["event"],
+)
+
+_PHOTO_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic", ".avif"}
+_VIDEO_SUFFIXES = {".mp4", ".webm", ".mov", ".avi", ".mkv", ".m4v", ".m3u8", ".ts", ".m4s"}
+_THUMBNAIL_DIRS = ("previews/", ".cache/", "thumbnails/")
+_THUMBNAIL_PREFIXES = ("thumb", "poster", "preview", "sprite")
+# Staging area of resumable uploads (not content yet) and GC quarantine
+_SKIPPED_DIRS = {".uploads", ".trash"}
+
+Bucket = tuple[int, int, str]
+
+_scope: ContextVar[tuple[Optional[int], Optional[int]]] = ContextVar("storage_usage_scope", default=(None, None))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def classify_path(path: str) -> str:
+    """Usage kind of a stored file, from its name and folder."""
+    posix = str(path).replace("\\", "/").lower()
+    name = posix.rsplit("/", 1)[-1]
+    if name.startswith("qr"):
+        return "qr"
+    if name.startswith("backup_") or name.endswith((".sql", ".sql.gz", ".dump")):
+        return "backup"
+    if name.startswith(_THUMBNAIL_PREFIXES) or name.endswith(".vtt") or any(
+        f"/{folder}" in f"/{posix}" for folder in _THUMBNAIL_DIRS
+    ):
+        return "thumbnail"
+    suffix = os.path.splitext(name)[1]
+    if suffix in _VIDEO_SUFFIXES:
+        return "video"
+    if suffix in _PHOTO_SUFFIXES:
+        return "photo"
+    return "other"
+
+
+def storage_key(value: Optional[str]) -> Optional[str]:
+    """Normalise a stored path/reference to a path relative to the storage root.
+
+    Accepts remote references (``yadisk://``, ``s3://``), absolute paths
+    under ``STORAGE_BASE_PATH``, ``/storage/…`` URLs and relative paths.
+    """
+    if not value:
+        return None
+    text = str(value).replace("\\", "/")
+    remote = split_remote_ref(text)
+    if remote is not None:
+        return remote[1].strip("/") or None
+    if "://" in text:
+        return None
+    for base in {Path(settings.STORAGE_BASE_PATH).as_posix(), Path(settings.STORAGE_BASE_PATH).resolve().as_posix()}:
+        prefix = base.rstrip("/") + "/"
+        if text.startswith(prefix):
+            return text[len(prefix):].strip("/") or None
+    if text.startswith("/storage/"):
+        text = text[len("/storage/"):]
+    return text.strip("/") or None
+
+
+def bind_usage_scope(company_id: Optional[int], project_id: Optional[int] = None) -> None:
+    """Attribute saves/deletes for the rest of the current request (task)."""
+    _scope.set((company_id, project_id))
+
+
+@contextmanager
+def usage_scope(company_id: Optional[int], project_id: Optional[int] = None) -> Iterator[None]:
+    """Attribute saves/deletes in this task to *company_id* / *project_id*."""
+    token = _scope.set((company_id, project_id))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def local_tree_files(path: Path) -> list[tuple[str, int]]:
+    """``(posix path, size)`` of *path* itself or every file below it."""
+    if path.is_file():
+        return [(path.as_posix(), path.stat().st_size)]
+    files: list[tuple[str, int]] = []
+    for root, _dirs, names in os.walk(path):
+        for name in names:
+            try:
+                files.append((f"{Path(root).as_posix()}/{name}", os.stat(os.path.join(root, name)).st_size))
+            except OSError:
+                continue
+    return files
+
+
+class StorageUsageTracker:
+    """Buffered usage deltas plus the last loaded ``storage_usage`` rows."""
+
+    def __init__(self) -> None:
+        self._pending: dict[Bucket, list[int]] = {}
+        self._snapshot: dict[Bucket, tuple[int, int]] = {}
+        self._snapshot_at: Optional[datetime] = None
+        self._reconcile_lock = asyncio.Lock()
+
+    # ------------------------------------------------------------------
+    # Recording (called by providers, never touches the database)
+    # ------------------------------------------------------------------
+
+    def _bucket(self, path: str, company_id: Optional[int], project_id: Optional[int] = None) -> Bucket:
+        scope_company, scope_project = _scope.get()
+        if project_id is None and (company_id is None or company_id == scope_company):
+            project_id = scope_project
+        return (company_id or scope_company or 0, project_id or 0, classify_path(path))
+
+    def _add(self, bucket: Bucket, size_delta: int, file_delta: int) -> None:
+        totals = self._pending.setdefault(bucket, [0, 0])
+        totals[0] += size_delta
+        totals[1] += file_delta
+
+    def record_saved(
+        self,
+        path: str,
+        size: int,
+        previous_size: Optional[int] = None,
+        company_id: Optional[int] = None,
+        project_id: Optional[int] = None,
+    ) -> None:
+        """A file of *size* bytes was written (replacing one of *previous_size*)."""
+        bucket = self._bucket(path, company_id, project_id)
+        self._add(bucket, size - (previous_size or 0), 0 if previous_size is not None else 1)
+        STORAGE_USAGE_EVENTS.labels(event="saved").inc()
+
+    def record_deleted(
+        self,
+        path: str,
+        size: int,
+        company_id: Optional[int] = None,
+        project_id: Optional[int] = None,
+    ) -> None:
+        """A file of *size* bytes was removed."""
+        self._add(self._bucket(path, company_id, project_id), -size, -1)
+        STORAGE_USAGE_EVENTS.labels(event="deleted").inc()
+
+    def record_tree_deleted(
+        self,
+        files: list[tuple[str, int]],
+        company_id: Optional[int] = None,
+        project_id: Optional[int] = None,
+    ) -> None:
+        """Record the removal of *files* (from :func:`local_tree_files`)."""
+        for path, size in files:
+            self.record_deleted(path, size, company_id, project_id)
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _current(self) -> dict[Bucket, tuple[int, int]]:
+        current = dict(self._snapshot)
+        for bucket, (size_delta, file_delta) in self._pending.items():
+            size, files = current.get(bucket, (0, 0))
+            current[bucket] = (size + size_delta, files + file_delta)
+        return current
+
+    def summary(self, company_id: Optional[int] = None, project_id: Optional[int] = None) -> dict:
+        """Totals and per-kind breakdown, optionally for one company/project."""
+        by_kind = {kind: {"total_bytes": 0, "file_count": 0} for kind in KINDS}
+        for (company, project, kind), (size, files) in self._current().items():
+            if company_id is not None and company != company_id:
+                continue
+            if project_id is not None and project != project_id:
+                continue
+            entry = by_kind.setdefault(kind, {"total_bytes": 0, "file_count": 0})
+            entry["total_bytes"] += size
+            entry["file_count"] += files
+        for entry in by_kind.values():
+            entry["total_bytes"] = max(entry["total_bytes"], 0)
+            entry["file_count"] = max(entry["file_count"], 0)
+        return {
+            "total_bytes": sum(entry["total_bytes"] for entry in by_kind.values()),
+            "file_count": sum(entry["file_count"] for entry in by_kind.values()),
+            "by_kind": by_kind,
+            "updated_at": self._snapshot_at.isoformat() if self._snapshot_at else None,
+        }
+
+    def by_company(self) -> dict[int, dict[str, int]]:
+        """``company_id → {"total_bytes", "file_count"}`` in one pass."""
+        companies: dict[int, dict[str, int]] = {}
+        for (company, _project, _kind), (size, files) in self._current().items():
+            entry = companies.setdefault(company, {"total_bytes": 0, "file_count": 0})
+            entry["total_bytes"] += max(size, 0)
+            entry["file_count"] += max(files, 0)
+        return companies
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    async def load(self, db: AsyncSession) -> None:
+        rows = (await db.execute(select(StorageUsage))).scalars().all()
+        self._snapshot = {(row.company_id, row.project_id, row.kind): (row.total_bytes, row.file_count) for row in rows}
+        self._snapshot_at = _utcnow()
+
+    async def flush(self, db: Optional[AsyncSession] = None) -> int:
+        """Add pending deltas to ``storage_usage`` and reload the snapshot.
+
+        Returns the number of buckets written.  On failure the deltas are
+        put back and retried by the next flush.
+        """
+        if db is None:
+            from app.core.database import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as session:
+                return await self.flush(session)
+
+        batch, self._pending = self._pending, {}
+        batch = {bucket: delta for bucket, delta in batch.items() if delta != [0, 0]}
+        now = _utcnow()
+        try:
+            for (company_id, project_id, kind), (size_delta, file_delta) in batch.items():
+                result = await db.execute(
+                    update(StorageUsage)
+                    .where(
+                        StorageUsage.company_id == company_id,
+                        StorageUsage.project_id == project_id,
+                        StorageUsage.kind == kind,
+                    )
+                    .values(
+                        total_bytes=StorageUsage.total_bytes + size_delta,
+                        file_count=StorageUsage.file_count + file_delta,
+                        updated_at=now,
+                    )
+                )
+                if result.rowcount == 0:
+                    db.add(StorageUsage(
+                        company_id=company_id,
+                        project_id=project_id,
+                        kind=kind,
+                        total_bytes=max(size_delta, 0),
+                        file_count=max(file_delta, 0),
+                        updated_at=now,
+                    ))
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            for bucket, (size_delta, file_delta) in batch.items():
+                self._add(bucket, size_delta, file_delta)
+            raise
+        await self.load(db)
+        return len(batch)
+
+    # ------------------------------------------------------------------
+    # Reconciliation
+    # ------------------------------------------------------------------
+
+    async def reconcile(self, db: Optional[AsyncSession] = None) -> dict[Bucket, tuple[int, int]]:
+        """Rebuild ``storage_usage`` from a full scan of every provider.
+
+        Deltas recorded while the scan runs are kept and flushed on top, so
+        a file saved mid-scan may be counted twice until the next run.
+        """
+        if db is None:
+            from app.core.database import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as session:
+                return await self.reconcile(session)
+
+        async with self._reconcile_lock:
+            self._pending = {}  # the scan sees everything recorded so far
+            index = await _attribution_index(db)
+            totals = await asyncio.to_thread(_scan_local, Path(settings.STORAGE_BASE_PATH), index)
+            failed = await _scan_remote(db, index, totals)
+            if failed:
+                # Keep the last known numbers of companies whose storage could not be listed
+                totals = {bucket: value for bucket, value in totals.items() if bucket[0] not in failed}
+                totals.update({bucket: value for bucket, value in self._snapshot.items() if bucket[0] in failed})
+
+            now = _utcnow()
+            await db.commit()  # end the scan's read transaction; the rewrite gets its own
+            await _lock_for_rewrite(db)
+            await db.execute(delete(StorageUsage))
+            for (company_id, project_id, kind), (size, files) in totals.items():
+                db.add(StorageUsage(
+                    company_id=company_id,
+                    project_id=project_id,
+                    kind=kind,
+                    total_bytes=size,
+                    file_count=files,
+                    updated_at=now,
+                ))
+            await db.commit()
+            await self.load(db)
+
+        STORAGE_USAGE_EVENTS.labels(event="reconciled").inc()
+        logger.info(
+            "storage_usage_reconciled",
+            buckets=len(totals),
+            total_bytes=sum(size for size, _ in totals.values()),
+            file_count=sum(files for _, files in totals.values()),
+        )
+        return totals
+
+    def reset(self) -> None:
+        """Drop all in-memory state (for tests)."""
+        self._pending.clear()
+        self._snapshot.clear()
+        self._snapshot_at = None
+
+
+storage_usage = StorageUsageTracker()
+
+
+async def _lock_for_rewrite(db: AsyncSession) -> None:
+    """Make concurrent flushes wait until the reconciliation commits.
+
+    Without it a flush could update a row the rewrite just deleted and
+    insert a duplicate bucket.  PostgreSQL needs an explicit table lock
+    (``SHARE ROW EXCLUSIVE`` conflicts with the ``UPDATE``/``INSERT`` of
+    ``flush``); SQLite already serialises writers for the whole transaction.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text(f"LOCK TABLE {StorageUsage.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+
+
+async def _attribution_index(db: AsyncSession) -> dict[str, tuple[int, int]]:
+    """Storage key → ``(company_id, project_id)`` for referenced files and their folders.
+
+    A file found by a scan is attributed to the nearest indexed ancestor,
+    so thumbnails and previews next to a referenced file follow it.
+    """
+    from app.models.ar_content import ARContent
+    from app.models.backup import BackupHistory
+    from app.models.media_blob import MediaBlob
+    from app.models.video import Video
+
+    index: dict[str, tuple[int, int]] = {}
+
+    def _add(value: Optional[str], company_id: Optional[int], project_id: Optional[int]) -> None:
+        key = storage_key(value)
+        if not key or not company_id:
+            return
+        scope = (company_id, project_id or 0)
+        index.setdefault(key, scope)
+        parent = key.rpartition("/")[0]
+        if parent:
+            index.setdefault(parent, scope)
+
+    content_rows = await db.stream(select(
+        ARContent.company_id, ARContent.project_id, ARContent.photo_path, ARContent.video_path,
+        ARContent.qr_code_path, ARContent.marker_path, ARContent.thumbnail_url,
+    ))
+    async for company_id, project_id, *paths in content_rows:
+        for path in paths:
+            _add(path, company_id, project_id)
+
+    video_rows = await db.stream(
+        select(
+            ARContent.company_id, ARContent.project_id, Video.video_path, Video.thumbnail_path,
+            Video.hls_path, Video.poster_url, Video.animated_preview_url, Video.sprite_url,
+        ).join(Video, Video.ar_content_id == ARContent.id)
+    )
+    async for company_id, project_id, *paths in video_rows:
+        for path in paths:
+            _add(path, company_id, project_id)
+
+    async for company_id, path in await db.stream(select(MediaBlob.company_id, MediaBlob.storage_path)):
+        _add(path, company_id, 0)
+    async for company_id, path in await db.stream(select(BackupHistory.company_id, BackupHistory.yd_path)):
+        _add(path, company_id, 0)
+    return index
+
+
+def _attribute(key: str, index: dict[str, tuple[int, int]]) -> tuple[int, int]:
+    while key:
+        scope = index.get(key)
+        if scope is not None:
+            return scope
+        key = key.rpartition("/")[0]
+    return (0, 0)
+
+
+def _accumulate(totals: dict[Bucket, tuple[int, int]], bucket: Bucket, size: int) -> None:
+    current_size, current_files = totals.get(bucket, (0, 0))
+    totals[bucket] = (current_size + size, current_files + 1)
+
+
+def _scan_local(root: Path, index: dict[str, tuple[int, int]]) -> dict[Bucket, tuple[int, int]]:
+    """Walk the local storage tree once (runs in a worker thread)."""
+    totals: dict[Bucket, tuple[int, int]] = {}
+    if not root.is_dir():
+        return totals
+    for current, dirs, names in os.walk(root):
+        relative_dir = Path(current).relative_to(root).as_posix()
+        if relative_dir == ".":
+            relative_dir = ""
+            dirs[:] = [name for name in dirs if name not in _SKIPPED_DIRS]
+        for name in names:
+            try:
+                size = os.stat(os.path.join(current, name)).st_size
+            except OSError:
+                continue
+            key = f"{relative_dir}/{name}" if relative_dir else name
+            company_id, project_id = _attribute(key, index)
+            _accumulate(totals, (company_id, project_id, classify_path(key)), size)
+    return totals
+
+
+async def _scan_remote(db: AsyncSession, index: dict[str, tuple[int, int]], totals: dict) -> set[int]:
+    """Add every file of each remote (Yandex Disk, S3) company folder to *totals*.
+
+    Returns the ids of companies whose folder could not be listed.
+    """
+    from app.core.storage_providers import REMOTE_REF_SCHEMES, RemoteStorageProvider, get_provider_for_company
+    from app.models.company import Company
+
+    companies = (await db.execute(
+        select(Company).where(Company.storage_provider.in_(tuple(REMOTE_REF_SCHEMES.values())))
+    )).scalars().all()
+    failed: set[int] = set()
+    for company in companies:
+        try:
+            provider = await get_provider_for_company(company)
+            if not isinstance(provider, RemoteStorageProvider):
+                continue
+            async for key, size in provider.iter_files():
+                company_id, project_id = _attribute(key, index)
+                if company_id != company.id:
+                    project_id = 0
+                _accumulate(totals, (company.id, project_id, classify_path(key)), size)
+        except Exception as exc:
+            failed.add(company.id)
+            logger.warning("storage_usage_remote_scan_failed", company_id=company.id, error=str(exc))
+    return failed
@@ -0,0 +1,296 @@
+"""Video ingest: one ffprobe pass plus fast-start MP4 normalisation.
+
+Customer MP4/MOV files often have the ``moov`` atom at the end, so the AR
+app has to download most of the file before the first frame.  At ingest we:
+
+1. run ``ffprobe`` once and keep duration / size / codec / MIME type for the
+   ``videos`` columns and the blob's ``derived["video_meta"]`` (duplicates
+   skip the probe entirely);
+2. read the top-level MP4 boxes to see whether ``moov`` precedes ``mdat``;
+3. if not, and the streams are already playable on mobile (H.264/HEVC +
+   AAC/MP3), remux in place with ``-c copy -movflags +faststart`` — no
+   re-encode, cost is a single sequential copy of the file.
+
+ffmpeg jobs share the process-wide ``media`` pool of the AR content pipeline
+so concurrent uploads cannot saturate the CPU/disk.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import struct
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+from app.core.config import settings
+from app.services.ar_content_pipeline import POOL_MEDIA, get_pool_semaphore
+
+logger = structlog.get_logger()
+
+VIDEO_INGEST_DURATION = Histogram(
+    "video_ingest_duration_seconds",
+    "Time spent in video ingest steps",
+    ["step"],
+)
+
+VIDEO_INGEST_FASTSTART = Counter(
+    "video_ingest_faststart_total",
+    "Fast-start normalisation outcomes",
+    ["result"],
+)
+
+# Streams that mobile players decode natively — remux only, never re-encode.
+_COMPATIBLE_VIDEO_CODECS = {"h264", "hevc", "mpeg4"}
+_COMPATIBLE_AUDIO_CODECS = {"aac", "mp3"}
+_ISO_BMFF_EXTENSIONS = {".mp4", ".m4v", ".mov", ".3gp"}
+
+_MIME_BY_EXTENSION = {
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".mov": "video/quicktime",
+    ".3gp": "video/3gpp",
+    ".webm": "video/webm",
+    ".mkv": "video/x-matroska",
+    ".avi": "video/x-msvideo",
+    ".flv": "video/x-flv",
+    ".wmv": "video/x-ms-wmv",
+}
+
+
+@dataclass
+class VideoIngestResult:
+    """Metadata and normalisation outcome for one ingested video."""
+
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    size_bytes: Optional[int] = None
+    mime_type: Optional[str] = None
+    codec: Optional[str] = None
+    audio_codec: Optional[str] = None
+    fps: Optional[float] = None
+    bit_rate: Optional[int] = None
+    faststart: Optional[bool] = None
+    remuxed: bool = False
+    skipped_reason: Optional[str] = None
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def as_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data.pop("timings", None)
+        return data
+
+
+def mime_type_for(format_name: Optional[str], path: Path) -> Optional[str]:
+    """Map ffprobe ``format_name`` (e.g. ``mov,mp4,m4a,...``) to a real MIME type."""
+    ext = path.suffix.lower()
+    formats = set((format_name or "").split(","))
+    if formats & {"mov", "mp4"}:
+        return _MIME_BY_EXTENSION.get(ext, "video/mp4") if ext in _ISO_BMFF_EXTENSIONS else "video/mp4"
+    if "webm" in formats or "matroska" in formats:
+        return "video/webm" if ext == ".webm" else "video/x-matroska"
+    if "avi" in formats:
+        return "video/x-msvideo"
+    return _MIME_BY_EXTENSION.get(ext)
+
+
+def moov_before_mdat(path: Path) -> Optional[bool]:
+    """Walk top-level ISO-BMFF boxes; ``None`` when the file is not MP4-like."""
+    try:
+        file_size = path.stat().st_size
+        with path.open("rb") as fh:
+            offset = 0
+            while offset + 8 <= file_size:
+                fh.seek(offset)
+                header = fh.read(8)
+                if len(header) < 8:
+                    return None
+                size, box_type = struct.unpack(">I4s", header)
+                if size == 1:
+                    largesize = fh.read(8)
+                    if len(largesize) < 8:
+                        return None
+                    size = struct.unpack(">Q", largesize)[0]
+                elif size == 0:
+                    size = file_size - offset
+                if size < 8:
+                    return None
+                if box_type == b"moov":
+                    return True
+                if box_type == b"mdat":
+                    return False
+                offset += size
+    except OSError:
+        return None
+    return None
+
+
+async def _ffprobe(path: Path) -> Optional[dict]:
+    """Run ffprobe once; ``None`` when ffprobe is not installed."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "ffprobe",
+            "-v", "quiet",
+            "-print_format", "json",
+            "-show_format",
+            "-show_streams",
+            str(path),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        return None
+    stdout, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffprobe failed: {stderr.decode(errors='replace')[:500]}")
+    return json.loads(stdout.decode() or "{}")
+
+
+def _parse_fps(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    num, _, den = value.partition("/")
+    try:
+        return float(num) / float(den) if den else float(num)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+def _apply_probe(result: VideoIngestResult, probe: dict, path: Path) -> None:
+    streams = probe.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise RuntimeError("No video stream found in file")
+    fmt = probe.get("format", {})
+    result.duration = float(fmt.get("duration") or 0) or None
+    result.width = int(video.get("width") or 0) or None
+    result.height = int(video.get("height") or 0) or None
+    result.codec = video.get("codec_name")
+    result.audio_codec = audio.get("codec_name") if audio else None
+    result.fps = _parse_fps(video.get("r_frame_rate"))
+    result.bit_rate = int(fmt.get("bit_rate") or 0) or None
+    result.mime_type = mime_type_for(fmt.get("format_name"), path)
+
+
+async def probe_video(file_path: Path | str) -> Optional[VideoIngestResult]:
+    """Probe without normalising; ``None`` when ffprobe is missing or fails."""
+    path = Path(file_path)
+    try:
+        probe = await _ffprobe(path)
+        if probe is None:
+            return None
+        result = VideoIngestResult(size_bytes=path.stat().st_size)
+        _apply_probe(result, probe, path)
+        return result
+    except Exception as exc:
+        logger.warning("video_probe_failed", video_path=str(path), error=str(exc))
+        return None
+
+
+async def _remux_faststart(path: Path) -> None:
+    tmp_path = path.with_name(f".{path.stem}.faststart{path.suffix}")
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg",
+        "-v", "error",
+        "-y",
+        "-i", str(path),
+        "-map", "0",
+        "-c", "copy",
+        "-movflags", "+faststart",
+        str(tmp_path),
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0 or not tmp_path.exists():
+        tmp_path.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg remux failed: {stderr.decode(errors='replace')[:500]}")
+    os.replace(tmp_path, path)
+
+
+async def ingest_video(file_path: Path | str, faststart: Optional[bool] = None) -> VideoIngestResult:
+    """Probe *file_path* once and normalise it to fast-start in place.
+
+    Never raises for a missing ffmpeg/ffprobe or a failed remux — the upload
+    proceeds with whatever metadata could be collected.
+    """
+    if faststart is None:
+        faststart = settings.VIDEO_FASTSTART_ENABLED
+    path = Path(file_path)
+    result = VideoIngestResult(size_bytes=path.stat().st_size)
+    log = logger.bind(video_path=str(path))
+
+    async with get_pool_semaphore(POOL_MEDIA):
+        started = time.perf_counter()
+        try:
+            probe = await _ffprobe(path)
+        except Exception as exc:
+            log.warning("video_ingest_probe_failed", error=str(exc))
+            probe = None
+            result.skipped_reason = "probe_failed"
+        result.timings["probe"] = time.perf_counter() - started
+        VIDEO_INGEST_DURATION.labels(step="probe").observe(result.timings["probe"])
+
+        if probe is None:
+            result.mime_type = _MIME_BY_EXTENSION.get(path.suffix.lower())
+            result.skipped_reason = result.skipped_reason or "ffprobe_missing"
+            VIDEO_INGEST_FASTSTART.labels(result=result.skipped_reason).inc()
+            return result
+        try:
+            _apply_probe(result, probe, path)
+        except Exception as exc:
+            log.warning("video_ingest_probe_parse_failed", error=str(exc))
+            result.skipped_reason = "no_video_stream"
+            VIDEO_INGEST_FASTSTART.labels(result=result.skipped_reason).inc()
+            return result
+
+        if path.suffix.lower() not in _ISO_BMFF_EXTENSIONS:
+            result.skipped_reason = "not_mp4"
+        else:
+            result.faststart = await asyncio.to_thread(moov_before_mdat, path)
+            if result.faststart is None:
+                result.skipped_reason = "unparsable_container"
+            elif result.faststart:
+                result.skipped_reason = "already_faststart"
+            elif not faststart:
+                result.skipped_reason = "disabled"
+            elif result.codec not in _COMPATIBLE_VIDEO_CODECS or (
+                result.audio_codec is not None and result.audio_codec not in _COMPATIBLE_AUDIO_CODECS
+            ):
+                # Would need a re-encode — left to the transcoding stage.
+                result.skipped_reason = "incompatible_codecs"
+            else:
+                started = time.perf_counter()
+                try:
+                    await _remux_faststart(path)
+                    result.remuxed = True
+                    result.faststart = True
+                    result.size_bytes = path.stat().st_size
+                except FileNotFoundError:
+                    result.skipped_reason = "ffmpeg_missing"
+                except Exception as exc:
+                    log.warning("video_ingest_remux_failed", error=str(exc))
+                    result.skipped_reason = "remux_failed"
+                result.timings["remux"] = time.perf_counter() - started
+                VIDEO_INGEST_DURATION.labels(step="remux").observe(result.timings["remux"])
+
+    VIDEO_INGEST_FASTSTART.labels(result="remuxed" if result.remuxed else result.skipped_reason).inc()
+    log.info(
+        "video_ingested",
+        duration=result.duration,
+        width=result.width,
+        height=result.height,
+        codec=result.codec,
+        mime_type=result.mime_type,
+        remuxed=result.remuxed,
+        skipped_reason=result.skipped_reason,
+    )
+    return result
@@ -0,0 +1,277 @@
+"""Lightweight scrub previews for the admin: animated WebP + sprite sheet with VTT.
+
+Video cards on the AR content pages used to fall back to ``<video src>`` on
+the original upload; for Yandex Disk content every byte of that went through
+the ``/api/storage/yd-file`` proxy.  After upload the preview task (which
+already has the video on local disk) also renders:
+
+* ``preview.webp`` — a short, low-frame-rate, looping animated WebP taken a
+  little after the start (intros are often black);
+* ``sprites.jpg`` — ``VIDEO_SPRITE_FRAMES`` evenly spaced frames tiled in a
+  grid, plus ``sprites.vtt`` mapping time ranges to ``#xywh=`` regions
+  (the WebVTT thumbnail convention used by video players).
+
+Assets live next to the video blob (``blobs/ab/<sha>/preview/``) so
+duplicates reuse them via ``derived["scrub"]``; legacy videos without a blob
+use ``previews/video_<id>/``.  ffmpeg runs inside the ``media`` pipeline pool.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import shutil
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+import structlog
+from prometheus_client import Counter, Histogram
+
+from app.core.config import settings
+from app.services.ar_content_pipeline import POOL_MEDIA, POOL_UPLOAD, get_pool_semaphore
+from app.services.video_ingest_service import probe_video
+
+logger = structlog.get_logger()
+
+_YADISK_PREFIX = "yadisk://"
+PREVIEW_FILENAME = "preview.webp"
+SPRITE_FILENAME = "sprites.jpg"
+SPRITE_VTT_FILENAME = "sprites.vtt"
+
+VIDEO_SCRUB_JOBS = Counter(
+    "video_scrub_preview_jobs_total",
+    "Animated preview / sprite sheet jobs by outcome",
+    ["result"],
+)
+
+VIDEO_SCRUB_DURATION = Histogram(
+    "video_scrub_preview_duration_seconds",
+    "Time to render the animated preview and sprite sheet (ffmpeg only)",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+
+@dataclass(frozen=True)
+class SpriteLayout:
+    frames: int
+    columns: int
+    rows: int
+    tile_width: int
+    tile_height: int
+    interval: float  # seconds between frames
+
+    def region(self, index: int) -> tuple[int, int, int, int]:
+        row, column = divmod(index, self.columns)
+        return column * self.tile_width, row * self.tile_height, self.tile_width, self.tile_height
+
+
+def sprite_layout(
+    duration: float,
+    width: int,
+    height: int,
+    frames: Optional[int] = None,
+    columns: Optional[int] = None,
+    tile_width: Optional[int] = None,
+) -> SpriteLayout:
+    """Grid for *frames* evenly spaced thumbnails (fewer for very short clips)."""
+    frames = max(1, frames or settings.VIDEO_SPRITE_FRAMES)
+    # At most one frame per 0.5 s — a 2 s clip does not need 20 identical tiles
+    frames = max(1, min(frames, int(duration * 2) or 1))
+    columns = max(1, min(columns or settings.VIDEO_SPRITE_COLUMNS, frames))
+    tile_width = max(16, tile_width or settings.VIDEO_SPRITE_TILE_WIDTH)
+    # Even height keeps ffmpeg's scale filter happy with yuv420p sources
+    tile_height = max(2, int(round(tile_width * height / width / 2)) * 2) if width and height else tile_width
+    return SpriteLayout(
+        frames=frames,
+        columns=columns,
+        rows=math.ceil(frames / columns),
+        tile_width=tile_width,
+        tile_height=tile_height,
+        interval=duration / frames,
+    )
+
+
+def build_animated_preview_command(source: Path, output: Path, duration: float) -> list[str]:
+    """ffmpeg arguments for the looping animated WebP preview."""
+    length = min(settings.VIDEO_PREVIEW_SECONDS, duration)
+    start = min(duration * 0.1, max(0.0, duration - length))
+    return [
+        "ffmpeg", "-v", "error", "-y",
+        "-ss", f"{start:.3f}",
+        "-t", f"{length:.3f}",
+        "-i", str(source),
+        "-vf", f"fps={settings.VIDEO_PREVIEW_FPS},scale={settings.VIDEO_PREVIEW_WIDTH}:-2:flags=lanczos",
+        "-an",
+        "-c:v", "libwebp",
+        "-lossless", "0",
+        "-quality", str(settings.VIDEO_PREVIEW_QUALITY),
+        "-compression_level", "4",
+        "-loop", "0",
+        str(output),
+    ]
+
+
+def build_sprite_command(source: Path, output: Path, layout: SpriteLayout) -> list[str]:
+    """ffmpeg arguments for the tiled sprite sheet (one output image)."""
+    return [
+        "ffmpeg", "-v", "error", "-y",
+        "-i", str(source),
+        "-vf", (
+            f"fps=1/{layout.interval:.6f},"
+            f"scale={layout.tile_width}:{layout.tile_height},"
+            f"tile={layout.columns}x{layout.rows}"
+        ),
+        "-an",
+        "-frames:v", "1",
+        "-q:v", "5",
+        str(output),
+    ]
+
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3_600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def build_sprite_vtt(layout: SpriteLayout, duration: float, sprite_url: str) -> str:
+    """WebVTT thumbnail track: one cue per tile, ``sprite_url#xywh=x,y,w,h``."""
+    lines = ["WEBVTT", ""]
+    for index in range(layout.frames):
+        start = index * layout.interval
+        end = duration if index == layout.frames - 1 else (index + 1) * layout.interval
+        x, y, w, h = layout.region(index)
+        lines += [
+            f"{_vtt_timestamp(start)} --> {_vtt_timestamp(end)}",
+            f"{sprite_url}#xywh={x},{y},{w},{h}",
+            "",
+        ]
+    return "\n".join(lines)
+
+
+async def _run_ffmpeg(cmd: list[str]) -> None:
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace')[:500]}")
+
+
+async def render_scrub_assets(source: Path, output_dir: Path) -> SpriteLayout:
+    """Render ``preview.webp`` and ``sprites.jpg`` of *source* into *output_dir*."""
+    meta = await probe_video(source)
+    if meta is None or not meta.duration:
+        raise RuntimeError("Unable to probe source video")
+    layout = sprite_layout(meta.duration, meta.width or 0, meta.height or 0)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    async with get_pool_semaphore(POOL_MEDIA):
+        started = time.perf_counter()
+        await _run_ffmpeg(build_animated_preview_command(source, output_dir / PREVIEW_FILENAME, meta.duration))
+        await _run_ffmpeg(build_sprite_command(source, output_dir / SPRITE_FILENAME, layout))
+        VIDEO_SCRUB_DURATION.observe(time.perf_counter() - started)
+    for name in (PREVIEW_FILENAME, SPRITE_FILENAME):
+        if not (output_dir / name).exists():
+            raise RuntimeError(f"ffmpeg did not produce {name}")
+    (output_dir / SPRITE_VTT_FILENAME).write_text(
+        build_sprite_vtt(layout, meta.duration, SPRITE_FILENAME), encoding="utf-8"
+    )
+    return layout
+
+
+async def publish_scrub_assets(
+    output_dir: Path,
+    root: str,
+    provider,
+    company_id: int,
+    layout: SpriteLayout,
+    duration: float,
+) -> dict:
+    """Store the rendered assets under *root*; returns ``derived["scrub"]``."""
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.services.hls_service import yd_proxy_url
+    from app.utils.ar_content import build_public_url
+
+    if isinstance(provider, YandexDiskStorageProvider):
+        # Cues must reference the sprite through the proxy: YD links expire
+        sprite_url = yd_proxy_url(f"{root}/{SPRITE_FILENAME}", company_id)
+        (output_dir / SPRITE_VTT_FILENAME).write_text(
+            build_sprite_vtt(layout, duration, sprite_url), encoding="utf-8"
+        )
+        semaphore = get_pool_semaphore(POOL_UPLOAD)
+
+        async def _upload(name: str) -> None:
+            async with semaphore:
+                await provider.save_file(str(output_dir / name), f"{root}/{name}")
+
+        # The VTT last: once it is visible the sprite it points at exists
+        await asyncio.gather(_upload(PREVIEW_FILENAME), _upload(SPRITE_FILENAME))
+        await _upload(SPRITE_VTT_FILENAME)
+        urls = {
+            "animated_preview_url": f"{_YADISK_PREFIX}{root}/{PREVIEW_FILENAME}",
+            "sprite_url": f"{_YADISK_PREFIX}{root}/{SPRITE_FILENAME}",
+            "sprite_vtt_url": f"{_YADISK_PREFIX}{root}/{SPRITE_VTT_FILENAME}",
+        }
+    else:
+        target = Path(settings.STORAGE_BASE_PATH) / root
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(str(output_dir), str(target))
+        # Local files get local URLs, whatever the company's provider (S3 would give s3:// refs)
+        sprite_url = build_public_url(target / SPRITE_FILENAME)
+        (target / SPRITE_VTT_FILENAME).write_text(build_sprite_vtt(layout, duration, sprite_url), encoding="utf-8")
+        urls = {
+            "animated_preview_url": build_public_url(target / PREVIEW_FILENAME),
+            "sprite_url": sprite_url,
+            "sprite_vtt_url": build_public_url(target / SPRITE_VTT_FILENAME),
+        }
+    return {**urls, "sprite": asdict(layout)}
+
+
+async def generate_scrub_assets(source: Path | str, root: str, provider, company_id: int) -> Optional[dict]:
+    """Render and store the previews of a local video file; ``None`` on failure.
+
+    Best-effort: a missing ffmpeg or an undecodable file only costs the
+    admin its lightweight preview.
+    """
+    if not settings.VIDEO_SCRUB_PREVIEW_ENABLED:
+        return None
+    log = logger.bind(source=str(source), root=root)
+    try:
+        with tempfile.TemporaryDirectory(prefix="scrub_") as tmp:
+            output_dir = Path(tmp) / "preview"
+            layout = await render_scrub_assets(Path(source), output_dir)
+            duration = layout.interval * layout.frames
+            result = await publish_scrub_assets(output_dir, root, provider, company_id, layout, duration)
+    except FileNotFoundError:
+        VIDEO_SCRUB_JOBS.labels(result="ffmpeg_missing").inc()
+        log.warning("video_scrub_preview_skipped", reason="ffmpeg_missing")
+        return None
+    except Exception as exc:
+        VIDEO_SCRUB_JOBS.labels(result="failed").inc()
+        log.warning("video_scrub_preview_failed", error=str(exc))
+        return None
+    VIDEO_SCRUB_JOBS.labels(result="ready").inc()
+    log.info("video_scrub_preview_ready", frames=result["sprite"]["frames"])
+    return result
+
+
+def legacy_root(video_id: int) -> str:
+    return f"previews/video_{video_id}"
+
+
+def apply_scrub_preview(video, scrub: Optional[dict]) -> None:
+    """Copy ``derived["scrub"]`` URLs onto a ``Video`` row."""
+    if not scrub:
+        return
+    video.animated_preview_url = scrub.get("animated_preview_url")
+    video.sprite_url = scrub.get("sprite_url")
+    video.sprite_vtt_url = scrub.get("sprite_vtt_url")
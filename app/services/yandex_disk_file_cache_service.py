@@ -0,0 +1,333 @@
+"""Local read-through disk cache of Yandex Disk files for ``/api/storage/yd-file``.
+
+Every admin preview and landing-page fallback for Yandex Disk companies
+used to resolve a fresh download link and stream the bytes from Yandex on
+each request, including every ``Range`` request a ``<video>`` makes while
+seeking.  Hot objects are now kept under
+``{STORAGE_BASE_PATH}/.cache/yd/{key[:2]}/{key}`` (``key`` = SHA-256 of
+``company_id:path``) with a JSON sidecar holding the Disk ``md5``/``modified``:
+
+* filled on first access — concurrent requests for the same object share
+  one download (single-flight);
+* served locally, ranges included (``app.utils.range_response``);
+* trusted for ``YD_FILE_CACHE_REVALIDATE_SECONDS``, then validated with a
+  metadata request and re-downloaded only if ``md5`` (or ``modified``)
+  changed; provider saves and deletes drop the copy immediately;
+* evicted least-recently-used beyond ``YD_FILE_CACHE_MAX_BYTES``; objects
+  above ``YD_FILE_CACHE_MAX_OBJECT_BYTES`` are proxied as before.
+
+The directory is shared by all workers, each with its own in-memory index,
+so the directory itself is the source of truth: a worker adopts a copy
+another one downloaded (from its sidecar), a hit touches the file's mtime
+(the shared LRU order) and finds out if the file is gone, and eviction
+scans the directory against the budget, sparing files used within
+``EVICT_GRACE_SECONDS`` since a response may be about to open them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import aiofiles
+import structlog
+from prometheus_client import Counter, Gauge
+
+from app.core.config import settings
+from app.core.http_client import get_http_client
+
+logger = structlog.get_logger()
+
+YD_FILE_CACHE_REQUESTS = Counter(
+    "yd_file_cache_requests_total",
+    "Yandex Disk file requests by cache outcome",
+    ["result"],
+)
+
+YD_FILE_CACHE_HIT_RATIO = Gauge(
+    "yd_file_cache_hit_ratio",
+    "Share of Yandex Disk file requests served from the local copy",
+)
+
+YD_FILE_CACHE_BYTES = Gauge(
+    "yd_file_cache_bytes",
+    "Bytes held in the local Yandex Disk file cache",
+)
+
+YD_FILE_CACHE_EVICTED_BYTES = Counter(
+    "yd_file_cache_evicted_bytes_total",
+    "Bytes evicted from the local Yandex Disk file cache",
+)
+
+_DOWNLOAD_TIMEOUT = 600.0
+_CHUNK_SIZE = 256 * 1024
+EVICT_GRACE_SECONDS = 60.0
+
+
+class YandexFileNotFound(Exception):
+    """The object does not exist on Yandex Disk."""
+
+
+@dataclass
+class CachedFile:
+    """One cached object; ``etag`` is the Disk ``md5`` (``modified`` if absent)."""
+
+    company_id: int
+    path: str
+    size: int
+    etag: str
+    modified: Optional[str] = None
+    validated_at: float = field(default=0.0, compare=False)  # monotonic; 0 = validate on next use
+
+    def sidecar(self) -> dict:
+        data = asdict(self)
+        data.pop("validated_at")
+        return data
+
+
+def cache_key(company_id: int, path: str) -> str:
+    return hashlib.sha256(f"{company_id}:{path.lstrip('/')}".encode()).hexdigest()
+
+
+class YandexDiskFileCache:
+    """Byte-bounded LRU of Yandex Disk objects on local disk."""
+
+    def __init__(self, cache_dir: Optional[Path] = None) -> None:
+        self._cache_dir = cache_dir
+        self._entries: OrderedDict[str, CachedFile] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._hits = 0
+        self._lookups = 0
+
+    @property
+    def cache_dir(self) -> Path:
+        return self._cache_dir or Path(settings.STORAGE_BASE_PATH) / ".cache" / "yd"
+
+    def file_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    # -- index --------------------------------------------------------------
+
+    async def _ensure_loaded(self) -> None:
+        """Rebuild the index from the sidecars once per process (LRU order = mtime)."""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for key, entry in await asyncio.to_thread(self._scan):
+                self._entries[key] = entry
+                self._bytes += entry.size
+            self._loaded = True
+            YD_FILE_CACHE_BYTES.set(self._bytes)
+            await self._evict()
+
+    def _scan(self) -> list[tuple[str, CachedFile]]:
+        found = []
+        if not self.cache_dir.is_dir():
+            return found
+        for sidecar in self.cache_dir.glob("*/*.json"):
+            data_path = sidecar.with_suffix("")
+            try:
+                entry = CachedFile(**json.loads(sidecar.read_text()))
+                mtime = data_path.stat().st_mtime
+            except (OSError, ValueError, TypeError):
+                sidecar.unlink(missing_ok=True)
+                data_path.unlink(missing_ok=True)
+                continue
+            found.append((mtime, data_path.name, entry))
+        found.sort(key=lambda item: item[0])
+        return [(key, entry) for _mtime, key, entry in found]
+
+    def _remove(self, key: str) -> Optional[CachedFile]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            YD_FILE_CACHE_BYTES.set(self._bytes)
+        return entry
+
+    def _add(self, key: str, entry: CachedFile) -> None:
+        self._remove(key)
+        self._entries[key] = entry
+        self._bytes += entry.size
+        YD_FILE_CACHE_BYTES.set(self._bytes)
+
+    def _unlink(self, key: str) -> None:
+        path = self.file_path(key)
+        path.unlink(missing_ok=True)
+        path.with_name(f"{key}.json").unlink(missing_ok=True)
+
+    def _touch(self, key: str) -> bool:
+        """Mark the copy as just used; ``False`` if another worker removed it."""
+        try:
+            os.utime(self.file_path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _read_sidecar(self, key: str) -> Optional[CachedFile]:
+        """Entry of a copy on disk (possibly downloaded by another worker)."""
+        try:
+            return CachedFile(**json.loads(self.file_path(key).with_name(f"{key}.json").read_text()))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _trim(self, budget: int) -> tuple[list[tuple[str, int]], int]:
+        """Delete the least recently used copies beyond *budget*; ``(victims, bytes left)``."""
+        copies = []
+        total = 0
+        for path in self.cache_dir.glob("*/*"):
+            if path.suffix:  # sidecars and partial downloads; copies are bare keys
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            copies.append((stat.st_mtime, path.name, stat.st_size))
+            total += stat.st_size
+        copies.sort()
+        recent = time.time() - EVICT_GRACE_SECONDS
+        victims = []
+        for mtime, key, size in copies:
+            if total <= budget or mtime >= recent:
+                break
+            self._unlink(key)
+            total -= size
+            victims.append((key, size))
+        return victims, total
+
+    async def _evict(self) -> None:
+        victims, total = await asyncio.to_thread(self._trim, settings.YD_FILE_CACHE_MAX_BYTES)
+        for key, size in victims:
+            self._remove(key)
+            YD_FILE_CACHE_EVICTED_BYTES.inc(size)
+        self._bytes = total
+        YD_FILE_CACHE_BYTES.set(self._bytes)
+
+    def invalidate(self, company_id: int, path: str) -> None:
+        """Forget the copy of *path* (the object was overwritten or deleted)."""
+        key = cache_key(company_id, path)
+        if self._remove(key) is not None:
+            self._unlink(key)
+
+    def _count(self, result: str) -> None:
+        YD_FILE_CACHE_REQUESTS.labels(result=result).inc()
+        self._lookups += 1
+        if result in ("hit", "revalidated"):
+            self._hits += 1
+        YD_FILE_CACHE_HIT_RATIO.set(self._hits / self._lookups)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hit_ratio": self._hits / self._lookups if self._lookups else 0.0,
+        }
+
+    # -- lookups ------------------------------------------------------------
+
+    async def get(self, provider, company_id: int, path: str) -> Optional[tuple[Path, CachedFile]]:
+        """Local copy of *path*, downloading it on first access.
+
+        Returns ``None`` when the object must be proxied instead (too large,
+        cache disabled, download failed).  Raises :class:`YandexFileNotFound`.
+        """
+        if not settings.YD_FILE_CACHE_ENABLED:
+            return None
+        await self._ensure_loaded()
+        path = path.lstrip("/")
+        key = cache_key(company_id, path)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.validated_at < settings.YD_FILE_CACHE_REVALIDATE_SECONDS:
+            if self._touch(key):
+                self._entries.move_to_end(key)
+                self._count("hit")
+                return self.file_path(key), entry
+            self._remove(key)  # evicted or invalidated by another worker
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._validate_or_fill(provider, key, company_id, path))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        # shield: one client going away must not abort a download others wait on
+        entry = await asyncio.shield(future)
+        return None if entry is None else (self.file_path(key), entry)
+
+    async def _validate_or_fill(self, provider, key: str, company_id: int, path: str) -> Optional[CachedFile]:
+        try:
+            info = await provider.get_file_info(path)
+        except Exception as exc:
+            logger.warning("yd_file_cache_info_failed", company_id=company_id, path=path, error=str(exc))
+            self._count("bypass")
+            return None
+        if info is None:
+            if self._remove(key) is not None:
+                await asyncio.to_thread(self._unlink, key)
+            raise YandexFileNotFound(path)
+
+        etag = str(info.get("md5") or info.get("modified") or "")
+        size = int(info.get("size") or 0)
+        entry = self._entries.get(key) or await asyncio.to_thread(self._read_sidecar, key)
+        if entry is not None and etag and entry.etag == etag and await asyncio.to_thread(self._touch, key):
+            entry.validated_at = time.monotonic()
+            self._add(key, entry)
+            self._count("revalidated")
+            return entry
+        if size > settings.YD_FILE_CACHE_MAX_OBJECT_BYTES:
+            self._count("bypass")
+            return None
+
+        fresh = CachedFile(company_id=company_id, path=path, size=size, etag=etag, modified=info.get("modified"))
+        try:
+            fresh.size = await self._download(provider, key, fresh)
+        except Exception as exc:
+            logger.warning("yd_file_cache_fill_failed", company_id=company_id, path=path, error=str(exc))
+            self._count("bypass")
+            return None
+        fresh.validated_at = time.monotonic()
+        self._add(key, fresh)
+        self._count("fill")
+        await self._evict()
+        logger.info("yd_file_cached", company_id=company_id, path=path, size=fresh.size)
+        return fresh
+
+    async def _download(self, provider, key: str, entry: CachedFile) -> int:
+        url = await provider.get_download_url(entry.path)
+        if not url:
+            raise RuntimeError("no download link")
+        target = self.file_path(key)
+        await asyncio.to_thread(target.parent.mkdir, parents=True, exist_ok=True)
+        partial = target.with_name(f"{key}.{os.getpid()}.part")
+        written = 0
+        try:
+            client = get_http_client()
+            async with client.stream("GET", url, follow_redirects=True, timeout=_DOWNLOAD_TIMEOUT) as resp:
+                resp.raise_for_status()
+                async with aiofiles.open(partial, "wb") as fh:
+                    async for chunk in resp.aiter_bytes(_CHUNK_SIZE):
+                        await fh.write(chunk)
+                        written += len(chunk)
+            if entry.size and written != entry.size:
+                raise RuntimeError(f"short download: {written} of {entry.size} bytes")
+            await asyncio.to_thread(os.replace, partial, target)
+        except BaseException:
+            await asyncio.to_thread(partial.unlink, True)
+            raise
+        entry.size = written
+        async with aiofiles.open(target.with_name(f"{key}.json"), "w") as fh:
+            await fh.write(json.dumps(entry.sidecar()))
+        return written
+
+
+yd_file_cache = YandexDiskFileCache()
@@ -0,0 +1,220 @@
+"""Cached, concurrent Yandex Disk folder listings.
+
+The Disk REST API only lists one folder (one page) per request, so sizing a
+company folder with thousands of orders used to take one sequential request
+per page per folder, every time.  This service:
+
+* keeps each folder listing (only the ``fields`` we use) in a process-wide
+  LRU keyed by ``(oauth_token, path)``;
+* serves listings younger than ``YD_METADATA_CACHE_TTL_SECONDS`` without a
+  request; an older listing is revalidated with a one-field request for the
+  folder's ``modified`` timestamp and re-listed only when it changed (adding
+  or removing a child changes the parent's ``modified``);
+* walks trees breadth-wise with at most ``YD_METADATA_CONCURRENCY`` folder
+  requests in flight;
+* shares one request between concurrent callers of the same folder.
+
+Used by the OAuth folder picker, ``YandexDiskStorageProvider.iter_files`` /
+``get_folder_size`` and, through them, the storage usage reconciliation that
+feeds the admin storage page.  Providers invalidate the parent folder on
+every save and delete.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+import structlog
+from prometheus_client import Counter
+
+from app.core import yandex_disk_provider
+from app.core.config import settings
+from app.core.http_client import get_http_client
+
+logger = structlog.get_logger()
+
+YD_METADATA_LOOKUPS = Counter(
+    "yd_metadata_lookups_total",
+    "Yandex Disk folder listings by cache outcome",
+    ["result"],
+)
+
+ITEM_FIELDS = ("name", "path", "type", "size", "modified", "created")
+_LISTING_FIELDS = ",".join(
+    ["modified", "_embedded.total", *(f"_embedded.items.{field}" for field in ITEM_FIELDS)]
+)
+
+
+@dataclass
+class DirectoryListing:
+    """Children of one folder, as returned by the Disk API (``ITEM_FIELDS`` only)."""
+
+    path: str
+    modified: Optional[str]
+    items: list[dict[str, Any]]
+    checked_at: float
+
+    @property
+    def folders(self) -> list[dict[str, Any]]:
+        return [item for item in self.items if item.get("type") == "dir"]
+
+    @property
+    def files(self) -> list[dict[str, Any]]:
+        return [item for item in self.items if item.get("type") == "file"]
+
+
+class YandexDiskMetadataService:
+    """Process-wide cache of folder listings with bounded-concurrency walks."""
+
+    def __init__(self) -> None:
+        self._listings: OrderedDict[tuple[str, str], DirectoryListing] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+    # ------------------------------------------------------------------
+    # Cache maintenance
+    # ------------------------------------------------------------------
+
+    def _store(self, token: str, listing: DirectoryListing) -> None:
+        key = (token, listing.path)
+        self._listings.pop(key, None)
+        self._listings[key] = listing
+        while len(self._listings) > settings.YD_METADATA_CACHE_MAX_ENTRIES:
+            self._listings.popitem(last=False)
+
+    def invalidate(self, token: str, path: Optional[str] = None) -> None:
+        """Forget the listing of *path* (every listing of *token* if ``None``)."""
+        if path is None:
+            for key in [k for k in self._listings if k[0] == token]:
+                del self._listings[key]
+        else:
+            self._listings.pop((token, path.rstrip("/") or path), None)
+
+    def clear(self) -> None:
+        self._listings.clear()
+
+    # ------------------------------------------------------------------
+    # Disk API
+    # ------------------------------------------------------------------
+
+    async def _fetch_listing(self, token: str, path: str) -> DirectoryListing:
+        client = get_http_client()
+        headers = {"Authorization": f"OAuth {token}"}
+        page_size = settings.YD_METADATA_PAGE_SIZE
+        items: list[dict[str, Any]] = []
+        modified = None
+        offset = 0
+        while True:
+            resp = await client.get(
+                f"{yandex_disk_provider._DISK_API}/resources",
+                params={"path": path, "limit": page_size, "offset": offset, "fields": _LISTING_FIELDS},
+                headers=headers,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            modified = data.get("modified", modified)
+            embedded = data.get("_embedded") or {}
+            page = embedded.get("items", [])
+            items.extend(page)
+            offset += page_size
+            if not page or offset >= embedded.get("total", 0):
+                break
+        return DirectoryListing(path=path, modified=modified, items=items, checked_at=time.monotonic())
+
+    async def _fetch_modified(self, token: str, path: str) -> Optional[str]:
+        client = get_http_client()
+        resp = await client.get(
+            f"{yandex_disk_provider._DISK_API}/resources",
+            params={"path": path, "limit": 1, "fields": "modified"},
+            headers={"Authorization": f"OAuth {token}"},
+        )
+        resp.raise_for_status()
+        return resp.json().get("modified")
+
+    async def _refresh(self, token: str, path: str, cached: Optional[DirectoryListing]) -> DirectoryListing:
+        if cached is not None and cached.modified is not None:
+            if await self._fetch_modified(token, path) == cached.modified:
+                cached.checked_at = time.monotonic()
+                self._store(token, cached)
+                YD_METADATA_LOOKUPS.labels(result="revalidated").inc()
+                return cached
+        listing = await self._fetch_listing(token, path)
+        self._store(token, listing)
+        YD_METADATA_LOOKUPS.labels(result="miss" if cached is None else "changed").inc()
+        return listing
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def list_directory(self, token: str, path: str) -> DirectoryListing:
+        """Listing of *path*, from cache when fresh.
+
+        Raises ``httpx.HTTPStatusError`` for Disk API errors (401/403/404…).
+        """
+        path = path.rstrip("/") or path
+        key = (token, path)
+        cached = self._listings.get(key)
+        if cached is not None and time.monotonic() - cached.checked_at < settings.YD_METADATA_CACHE_TTL_SECONDS:
+            self._listings.move_to_end(key)
+            YD_METADATA_LOOKUPS.labels(result="hit").inc()
+            return cached
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(token, path, cached))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _f: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def walk_files(
+        self,
+        token: str,
+        path: str,
+        max_depth: int = 10,
+        concurrency: Optional[int] = None,
+    ) -> list[tuple[str, dict[str, Any]]]:
+        """``(path, item)`` for every file below *path*.
+
+        Paths are built from *path* and item names (the API reports
+        ``disk:/…`` paths even for ``app:/…`` requests).  Sub-folders are
+        listed concurrently, at most *concurrency* at a time.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.YD_METADATA_CONCURRENCY)
+        files: list[tuple[str, dict[str, Any]]] = []
+
+        async def _visit(folder: str, depth: int) -> None:
+            async with semaphore:
+                try:
+                    listing = await self.list_directory(token, folder)
+                except httpx.HTTPStatusError as exc:
+                    if depth == 0 or exc.response.status_code != 404:
+                        raise
+                    return  # removed while walking
+            children = []
+            for item in listing.items:
+                child = f"{folder.rstrip('/')}/{item.get('name', '')}"
+                if item.get("type") == "file":
+                    files.append((child, item))
+                elif item.get("type") == "dir" and depth < max_depth:
+                    children.append(child)
+            if children:
+                await asyncio.gather(*(_visit(child, depth + 1) for child in children))
+
+        await _visit(path.rstrip("/") or path, 0)
+        return files
+
+    async def folder_size(self, token: str, path: str) -> dict[str, int]:
+        """``{"total_bytes", "file_count"}`` of the tree below *path*."""
+        files = await self.walk_files(token, path)
+        return {
+            "total_bytes": sum(int(item.get("size", 0) or 0) for _, item in files),
+            "file_count": len(files),
+        }
+
+
+yd_metadata = YandexDiskMetadataService()
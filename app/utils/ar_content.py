@@ -6,8 +6,11 @@ Supports both local and Yandex Disk storage providers via the
 """
 from __future__ import annotations
 
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional, TYPE_CHECKING
+import hashlib
+import os
 import qrcode
 from PIL import Image, ImageDraw, ImageFont
 import io
@@ -17,6 +20,7 @@ import re
 from app.core.config import settings
 from app.core.storage import get_storage_provider_instance
 from app.utils.slug_utils import generate_slug
+from app.services.storage_usage_service import storage_usage
 
 if TYPE_CHECKING:
     from app.core.storage_providers import StorageProvider
@@ -216,26 +220,16 @@ async def generate_qr_code(
     """
     unique_link = build_unique_link(unique_id)
     unique_url = f"{settings.PUBLIC_URL.rstrip('/')}{unique_link}"
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(unique_url)
-    qr.make(fit=True)
-
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
-    qr_img = compose_printable_qr(qr_img, order_number=order_number)
+    qr_img = render_qr_label(unique_url, order_number=order_number)
 
     # Render to bytes
     img_byte_arr = io.BytesIO()
     qr_img.save(img_byte_arr, format='PNG')
     qr_bytes = img_byte_arr.getvalue()
 
-    # Check if provider is Yandex Disk
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
-    if isinstance(provider, YandexDiskStorageProvider):
+    # Remote providers (Yandex Disk, S3) store the bytes
+    from app.core.storage_providers import RemoteStorageProvider
+    if isinstance(provider, RemoteStorageProvider):
         relative = str(storage_path).replace("\\", "/").lstrip("/")
         dest = f"{relative}/qr_code.png"
         return await provider.save_file_bytes(qr_bytes, dest)
@@ -243,22 +237,31 @@ async def generate_qr_code(
     # Local: write to disk directly
     qr_code_path = storage_path / "qr_code.png"
     qr_code_path.parent.mkdir(parents=True, exist_ok=True)
+    previous_size = qr_code_path.stat().st_size if qr_code_path.is_file() else None
     async with aiofiles.open(qr_code_path, "wb") as f:
         await f.write(qr_bytes)
+    storage_usage.record_saved(str(qr_code_path), len(qr_bytes), previous_size)
 
     return build_public_url(qr_code_path, provider=provider)
 
 
+_QR_FONT_CANDIDATES = (
+    "DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/local/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "C:/Windows/Fonts/arialbd.ttf",
+    "C:/Windows/Fonts/Arialbd.ttf",
+)
+
+
+@lru_cache(maxsize=None)
 def _load_qr_font(size: int) -> ImageFont.ImageFont:
-    """Load a bold system font for printable QR labels."""
-    font_candidates = [
-        "DejaVuSans-Bold.ttf",
-        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
-        "/usr/local/share/fonts/dejavu/DejaVuSans-Bold.ttf",
-        "C:/Windows/Fonts/arialbd.ttf",
-        "C:/Windows/Fonts/Arialbd.ttf",
-    ]
-    for font_path in font_candidates:
+    """Load a bold system font for printable QR labels.
+
+    Cached per size (and per process): probing the candidates hits the disk,
+    and bulk label rendering asks for the same two sizes every time.
+    """
+    for font_path in _QR_FONT_CANDIDATES:
         try:
             return ImageFont.truetype(font_path, size=size)
         except OSError:
@@ -266,6 +269,20 @@ def _load_qr_font(size: int) -> ImageFont.ImageFont:
     return ImageFont.load_default()
 
 
+def render_qr_label(url: str, order_number: Optional[str] = None) -> Image.Image:
+    """Print-ready QR label (600×600) for *url* with the order number on top."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(url)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("RGB")
+    return compose_printable_qr(qr_img, order_number=order_number)
+
+
 def _draw_centered_text(
     draw: ImageDraw.ImageDraw,
     text: str,
@@ -335,9 +352,9 @@ async def save_uploaded_file(
     Returns:
         ``yadisk://…`` reference for remote providers, ``None`` for local.
     """
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.core.storage_providers import RemoteStorageProvider
 
-    if isinstance(provider, YandexDiskStorageProvider) and relative_storage_path:
+    if isinstance(provider, RemoteStorageProvider) and relative_storage_path:
         # Read full file into bytes and upload
         content = await upload_file.read()
         return await provider.save_file_bytes(content, relative_storage_path)
@@ -350,6 +367,81 @@ async def save_uploaded_file(
     return None
 
 
+async def save_uploaded_file_hashed(upload_file, destination_path: Path, scanner=None) -> tuple[str, int]:
+    """Stream an upload to *destination_path*, hashing it on the way.
+
+    The SHA-256 is computed chunk by chunk while writing, so deduplication
+    (see ``media_blob_service``) costs no extra pass over the file.
+    Finished resumable uploads (objects with ``staged_path``) are adopted
+    via :func:`adopt_staged_file` instead of being copied.
+
+    Args:
+        upload_file: The uploaded file object (FastAPI ``UploadFile``).
+        destination_path: Where to write the file.
+        scanner: Optional ``StreamingUploadScanner`` fed every chunk (it then
+            owns the hash).  If it rejects the stream, reading stops, the
+            partial file is removed and ``UploadRejected`` propagates.
+
+    Returns:
+        ``(sha256_hex, size_bytes)`` of the written file.
+    """
+    staged_path = getattr(upload_file, "staged_path", None)
+    if staged_path is not None:
+        return await adopt_staged_file(staged_path, destination_path, scanner=scanner)
+    digest = hashlib.sha256() if scanner is None else None
+    size = 0
+    destination_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        async with aiofiles.open(destination_path, "wb") as f:
+            while chunk := await upload_file.read(1024 * 1024):
+                if scanner is not None:
+                    scanner.update(chunk)
+                else:
+                    digest.update(chunk)
+                size += len(chunk)
+                await f.write(chunk)
+        if scanner is not None:
+            scanner.finish()
+    except BaseException:
+        destination_path.unlink(missing_ok=True)
+        raise
+    return (scanner.sha256 if scanner is not None else digest.hexdigest()), size
+
+
+async def scan_stored_file(path: Path, scanner=None) -> tuple[str, int]:
+    """Read a file that is already on disk once, for the hash / scanner checks.
+
+    Returns ``(sha256_hex, size_bytes)``; a rejection by *scanner*
+    propagates and the file is left untouched.
+    """
+    digest = hashlib.sha256() if scanner is None else None
+    size = 0
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(1024 * 1024):
+            if scanner is not None:
+                scanner.update(chunk)
+            else:
+                digest.update(chunk)
+            size += len(chunk)
+    if scanner is not None:
+        scanner.finish()
+    return (scanner.sha256 if scanner is not None else digest.hexdigest()), size
+
+
+async def adopt_staged_file(staged_path: Path, destination_path: Path, scanner=None) -> tuple[str, int]:
+    """Hash a file that is already on disk and move it to *destination_path*.
+
+    Used for resumable uploads: the chunks were written to the staging file
+    as they arrived, so instead of a second copy the file is read once for
+    the hash / scanner checks and renamed into place (same filesystem).
+    On rejection the staged file is left untouched.
+    """
+    file_hash, size = await scan_stored_file(staged_path, scanner=scanner)
+    destination_path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staged_path, destination_path)
+    return file_hash, size
+
+
 def validate_email_format(email: str) -> bool:
     """Validate email format using regex.
     
@@ -410,7 +502,7 @@ async def generate_thumbnail(
     Returns:
         ``yadisk://…`` reference for remote, ``None`` for local.
     """
-    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.core.storage_providers import RemoteStorageProvider
 
     with Image.open(image_path) as img:
         img.thumbnail(size, Image.Resampling.LANCZOS)
@@ -418,7 +510,7 @@ async def generate_thumbnail(
         offset = ((size[0] - img.size[0]) // 2, (size[1] - img.size[1]) // 2)
         thumb.paste(img, offset)
 
-        if isinstance(provider, YandexDiskStorageProvider) and relative_storage_path:
+        if isinstance(provider, RemoteStorageProvider) and relative_storage_path:
             buf = io.BytesIO()
             thumb.save(buf, format="PNG", optimize=True, quality=85)
             return await provider.save_file_bytes(buf.getvalue(), relative_storage_path)
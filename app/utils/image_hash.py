@@ -0,0 +1,72 @@
+"""Perceptual image hashes (64-bit pHash / dHash) and Hamming helpers.
+
+Pure cv2/numpy so it can run in process-pool workers.  Hashes are stored as
+16-char lowercase hex strings and handled as Python ints in memory.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+
+
+def phash(gray: np.ndarray) -> int:
+    """DCT hash: sign of the 8×8 low-frequency block vs. its median."""
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8]
+    # Skip the DC term when taking the median so flat brightness shifts don't matter
+    median = np.median(low.ravel()[1:])
+    return _bits_to_int(low > median)
+
+
+def dhash(gray: np.ndarray) -> int:
+    """Gradient hash: is each pixel brighter than its right neighbour (9×8 grid)."""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _bits_to_int(small[:, 1:] > small[:, :-1])
+
+
+def to_hex(value: int) -> str:
+    return f"{value:016x}"
+
+
+def from_hex(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value, 16)
+    except ValueError:
+        return None
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def hash_image_file(image_path: str) -> Optional[tuple[str, str]]:
+    """``(phash_hex, dhash_hex)`` of an image file, ``None`` if undecodable.
+
+    EXIF orientation is applied so a rotated re-upload of the same photo
+    hashes the same as the original.
+    """
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(image_path) as img:
+            img.draft("L", (256, 256))  # JPEG: decode at reduced scale
+            gray = np.asarray(ImageOps.exif_transpose(img).convert("L"))
+    except Exception:
+        return None
+    if gray.size == 0:
+        return None
+    return to_hex(phash(gray)), to_hex(dhash(gray))
@@ -0,0 +1,189 @@
+"""Vectorised, feature-based trackability metrics for AR marker images.
+
+Kept free of app imports (only cv2/numpy/Pillow) so that process-pool workers
+import it cheaply.
+
+Every image is decoded once, straight to grayscale and — for JPEG — at a
+reduced scale by libjpeg, then resized to a fixed working long edge.  All
+metrics run on that working image:
+
+* global photometrics (brightness, contrast, Laplacian sharpness, Canny edge
+  density) — the legacy inputs of ``recognition_probability``;
+* ORB keypoints: count and spatial distribution over a grid (ARCore needs
+  features spread across the whole image, not clustered in one corner);
+* repetitive texture: share of keypoints whose descriptor has a near-twin
+  elsewhere in the image (ambiguous matches break pose estimation);
+* symmetry: correlation of the image with its mirror / 180° rotation.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Optional
+
+import cv2
+import numpy as np
+
+WORKING_LONG_EDGE = 640
+GRID_SIZE = 8
+ORB_FEATURES = 500
+# Hamming distance (of 256 bits) under which two ORB descriptors are "twins"
+REPEAT_DISTANCE = 40
+MIN_KEYPOINTS = 150
+
+_EDGE_DENSITY_TARGET = 0.2
+_CONTRAST_NORM = 50.0
+_SHARPNESS_NORM = 500.0
+
+_orb = None
+
+
+def _get_orb():
+    global _orb
+    if _orb is None:
+        _orb = cv2.ORB_create(nfeatures=ORB_FEATURES, fastThreshold=12)
+    return _orb
+
+
+def legacy_probability(contrast: float, brightness: float, sharpness: float, edge_density: float) -> float:
+    """Photometric score (pre-feature formula), kept for compatibility."""
+    contrast_score = min(1.0, contrast / _CONTRAST_NORM)
+    sharpness_score = min(1.0, sharpness / _SHARPNESS_NORM)
+    edge_score = min(1.0, edge_density / _EDGE_DENSITY_TARGET)
+    brightness_score = 1.0 - min(1.0, abs(brightness - 128.0) / 128.0)
+    score = 0.35 * edge_score + 0.25 * contrast_score + 0.25 * sharpness_score + 0.15 * brightness_score
+    return round(min(max(score, 0.0), 1.0), 4)
+
+
+def to_working_gray(image: np.ndarray, long_edge: int = WORKING_LONG_EDGE) -> np.ndarray:
+    """Grayscale image resized (down only) to the working long edge."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    height, width = gray.shape[:2]
+    scale = long_edge / max(height, width)
+    if scale < 1.0:
+        gray = cv2.resize(
+            gray,
+            (max(1, round(width * scale)), max(1, round(height * scale))),
+            interpolation=cv2.INTER_AREA,
+        )
+    return gray
+
+
+def read_working_gray(image_path: str) -> tuple[Optional[np.ndarray], Optional[tuple[int, int]]]:
+    """Decode *image_path* once at the smallest sufficient scale.
+
+    Returns ``(working_gray, (width, height) of the original)``.
+    """
+    size = None
+    flag = cv2.IMREAD_GRAYSCALE
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as header:  # header only, no pixel decode
+            size = header.size
+            is_jpeg = header.format == "JPEG"
+        if is_jpeg:
+            ratio = max(size) / WORKING_LONG_EDGE
+            for factor, reduced in ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+                                    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                                    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2)):
+                if ratio >= factor:
+                    flag = reduced
+                    break
+    except Exception:
+        size = None
+    image = cv2.imread(str(image_path), flag)
+    if image is None:
+        return None, size
+    if size is None:
+        size = (int(image.shape[1]), int(image.shape[0]))
+    return to_working_gray(image), size
+
+
+def _grid_stats(points: np.ndarray, shape: tuple[int, int], grid: int = GRID_SIZE) -> tuple[float, float]:
+    """(coverage, evenness) of keypoints over a ``grid × grid`` partition."""
+    if points.size == 0:
+        return 0.0, 0.0
+    height, width = shape
+    cols = np.minimum((points[:, 0] * grid / width).astype(np.int32), grid - 1)
+    rows = np.minimum((points[:, 1] * grid / height).astype(np.int32), grid - 1)
+    counts = np.bincount(rows * grid + cols, minlength=grid * grid).astype(np.float64)
+    coverage = float(np.count_nonzero(counts) / counts.size)
+    probs = counts[counts > 0] / counts.sum()
+    entropy = float(-(probs * np.log(probs)).sum())
+    evenness = entropy / np.log(counts.size)
+    return coverage, float(evenness)
+
+
+def _repetition_ratio(descriptors: Optional[np.ndarray]) -> float:
+    """Share of descriptors with a near-identical twin (all-pairs Hamming, vectorised)."""
+    if descriptors is None or len(descriptors) < 2:
+        return 0.0
+    bits = np.unpackbits(descriptors, axis=1).astype(np.float32)
+    ones = bits.sum(axis=1)
+    # Hamming(a, b) = |a| + |b| - 2·(a·b)
+    distances = ones[:, None] + ones[None, :] - 2.0 * (bits @ bits.T)
+    np.fill_diagonal(distances, np.inf)
+    return float(np.mean(distances.min(axis=1) < REPEAT_DISTANCE))
+
+
+def _symmetry(gray: np.ndarray) -> float:
+    """Max correlation with horizontal / vertical mirror and 180° rotation (0..1)."""
+    small = cv2.resize(gray, (128, 128), interpolation=cv2.INTER_AREA).astype(np.float32)
+    centered = small - small.mean()
+    norm = float(np.sqrt((centered * centered).sum()))
+    if norm == 0.0:
+        return 1.0  # flat image is perfectly symmetric (and untrackable)
+    variants = np.stack([centered[:, ::-1], centered[::-1, :], centered[::-1, ::-1]])
+    correlations = (variants * centered).sum(axis=(1, 2)) / (norm * norm)
+    return float(max(0.0, correlations.max()))
+
+
+def analyze_gray(gray: np.ndarray) -> dict[str, Any]:
+    """All metrics for a working-size grayscale image."""
+    brightness = float(gray.mean())
+    contrast = float(gray.std())
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    edges = cv2.Canny(gray, 50, 150)
+    edge_density = float(np.count_nonzero(edges) / edges.size)
+
+    keypoints, descriptors = _get_orb().detectAndCompute(gray, None)
+    points = np.array([kp.pt for kp in keypoints], dtype=np.float32).reshape(-1, 2)
+    coverage, evenness = _grid_stats(points, gray.shape[:2])
+    repetition = _repetition_ratio(descriptors)
+    symmetry = _symmetry(gray)
+
+    photometric = legacy_probability(contrast, brightness, sharpness, edge_density)
+    keypoint_score = min(1.0, len(keypoints) / MIN_KEYPOINTS)
+    feature_score = keypoint_score * (0.6 * coverage + 0.4 * evenness)
+    penalty = 0.5 * max(0.0, repetition - 0.2) + 0.4 * max(0.0, symmetry - 0.6)
+    probability = 0.4 * photometric + 0.6 * feature_score - penalty
+
+    return {
+        "brightness": brightness,
+        "contrast": contrast,
+        "sharpness": sharpness,
+        "edge_density": edge_density,
+        "recognition_probability": round(min(max(probability, 0.0), 1.0), 4),
+        "keypoint_count": int(len(keypoints)),
+        "keypoint_coverage": round(coverage, 4),
+        "keypoint_evenness": round(evenness, 4),
+        "repetition_ratio": round(repetition, 4),
+        "symmetry": round(symmetry, 4),
+        "working_size": [int(gray.shape[1]), int(gray.shape[0])],
+    }
+
+
+def analyze_path(image_path: str) -> dict[str, Any]:
+    """Analyze one file: ``{"metrics", "width", "height"}`` or ``{"error"}``."""
+    try:
+        gray, size = read_working_gray(image_path)
+        if gray is None:
+            return {"error": "decode_failed"}
+        return {"metrics": analyze_gray(gray), "width": size[0], "height": size[1]}
+    except Exception as exc:
+        return {"error": str(exc)}
+
+
+def analyze_paths(image_paths: list[str]) -> list[dict[str, Any]]:
+    """Batch entry point for the process pool (one round-trip per batch)."""
+    return [analyze_path(path) for path in image_paths]
@@ -0,0 +1,185 @@
+"""Bulk QR label rendering and streaming PDF/ZIP writers.
+
+The render functions are module-level and return plain bytes so they can run
+in the shared process pool (``app.core.process_pool``); each worker keeps its
+own font cache (``_load_qr_font``).  The writers emit output piece by piece so
+a sheet for thousands of orders never has to exist in memory as a whole.
+"""
+
+from __future__ import annotations
+
+import io
+import time
+import zipfile
+import zlib
+from typing import Optional, Sequence
+
+from PIL import Image
+
+from app.utils.ar_content import render_qr_label
+
+LABEL_SIZE = 600  # px, see compose_printable_qr
+# A4 at 300 dpi: 4 × 5 labels of 600 px (≈ 5 cm) per page
+PAGE_WIDTH_PX = 2480
+PAGE_HEIGHT_PX = 3508
+PAGE_COLUMNS = 4
+PAGE_ROWS = 5
+LABELS_PER_PAGE = PAGE_COLUMNS * PAGE_ROWS
+_A4_POINTS = (595.28, 841.89)
+
+# (public_url, order_number)
+LabelSpec = tuple[str, Optional[str]]
+
+
+def render_label_pngs(labels: Sequence[LabelSpec]) -> list[bytes]:
+    """PNG bytes of each label (process-pool entry point)."""
+    result = []
+    for url, order_number in labels:
+        buffer = io.BytesIO()
+        render_qr_label(url, order_number).convert("L").save(buffer, format="PNG", optimize=False)
+        result.append(buffer.getvalue())
+    return result
+
+
+def render_sheet_page(labels: Sequence[LabelSpec]) -> tuple[int, int, bytes]:
+    """One A4 page of up to ``LABELS_PER_PAGE`` labels.
+
+    Returns ``(width, height, zlib-compressed 8-bit grayscale pixels)`` —
+    ready to be embedded as a FlateDecode image by ``PdfStreamWriter``.
+    """
+    page = Image.new("L", (PAGE_WIDTH_PX, PAGE_HEIGHT_PX), 255)
+    left = (PAGE_WIDTH_PX - PAGE_COLUMNS * LABEL_SIZE) // 2
+    top = (PAGE_HEIGHT_PX - PAGE_ROWS * LABEL_SIZE) // 2
+    for index, (url, order_number) in enumerate(labels[:LABELS_PER_PAGE]):
+        row, column = divmod(index, PAGE_COLUMNS)
+        label = render_qr_label(url, order_number).convert("L")
+        page.paste(label, (left + column * LABEL_SIZE, top + row * LABEL_SIZE))
+    return PAGE_WIDTH_PX, PAGE_HEIGHT_PX, zlib.compress(page.tobytes(), 6)
+
+
+class PdfStreamWriter:
+    """Minimal PDF 1.4 writer: one full-page grayscale image per page.
+
+    ``header()``, ``page()`` and ``trailer()`` return the bytes to send; byte
+    offsets for the xref table are tracked as output is produced.  The page
+    tree (object 2) is written last, once all page ids are known.
+    """
+
+    _CATALOG = 1
+    _PAGES = 2
+
+    def __init__(self) -> None:
+        self._position = 0
+        self._offsets: dict[int, int] = {}
+        self._page_ids: list[int] = []
+        self._next_id = 3
+
+    def _emit(self, data: bytes) -> bytes:
+        self._position += len(data)
+        return data
+
+    def _object(self, number: int, body: bytes, stream: Optional[bytes] = None) -> bytes:
+        self._offsets[number] = self._position
+        parts = [f"{number} 0 obj\n".encode(), body]
+        if stream is not None:
+            parts += [b"\nstream\n", stream, b"\nendstream"]
+        parts.append(b"\nendobj\n")
+        return self._emit(b"".join(parts))
+
+    def _allocate(self) -> int:
+        number = self._next_id
+        self._next_id += 1
+        return number
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def page(self, width: int, height: int, flate_gray: bytes) -> bytes:
+        image_id, content_id, page_id = self._allocate(), self._allocate(), self._allocate()
+        page_w, page_h = _A4_POINTS
+        content = f"q {page_w} 0 0 {page_h} 0 0 cm /Im0 Do Q".encode()
+        chunks = [
+            self._object(
+                image_id,
+                (
+                    f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+                    f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode "
+                    f"/Length {len(flate_gray)} >>"
+                ).encode(),
+                flate_gray,
+            ),
+            self._object(content_id, f"<< /Length {len(content)} >>".encode(), content),
+            self._object(
+                page_id,
+                (
+                    f"<< /Type /Page /Parent {self._PAGES} 0 R /MediaBox [0 0 {page_w} {page_h}] "
+                    f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>"
+                ).encode(),
+            ),
+        ]
+        self._page_ids.append(page_id)
+        return b"".join(chunks)
+
+    def trailer(self) -> bytes:
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        chunks = [
+            self._object(self._PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode()),
+            self._object(self._CATALOG, f"<< /Type /Catalog /Pages {self._PAGES} 0 R >>".encode()),
+        ]
+        xref_offset = self._position
+        size = self._next_id
+        xref = [f"xref\n0 {size}\n".encode(), b"0000000000 65535 f \n"]
+        for number in range(1, size):
+            xref.append(f"{self._offsets[number]:010d} 00000 n \n".encode())
+        xref.append(f"trailer\n<< /Size {size} /Root {self._CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+        chunks.append(self._emit(b"".join(xref)))
+        return b"".join(chunks)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink; zipfile then uses data descriptors."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStreamWriter:
+    """Incremental ZIP writer; ``add()`` / ``close()`` return the bytes to send.
+
+    PNG labels are already deflated, so entries are stored uncompressed.
+    """
+
+    def __init__(self) -> None:
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w", compression=zipfile.ZIP_STORED)
+        self._names: set[str] = set()
+        self._date_time = time.localtime()[:6]
+
+    def _unique(self, name: str) -> str:
+        stem, dot, suffix = name.rpartition(".")
+        candidate, counter = name, 1
+        while candidate in self._names:
+            counter += 1
+            candidate = f"{stem}_{counter}{dot}{suffix}"
+        self._names.add(candidate)
+        return candidate
+
+    def add(self, name: str, data: bytes) -> bytes:
+        self._zip.writestr(zipfile.ZipInfo(self._unique(name), date_time=self._date_time), data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._sink.drain()
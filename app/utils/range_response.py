@@ -0,0 +1,117 @@
+"""Serve a local file with single-range ``Range`` and ``If-None-Match`` support.
+
+Starlette's ``FileResponse`` (0.35) always sends the whole file, so a
+``<video>`` element seeking through a cached copy would re-download it from
+the start.  Full-file responses still go through ``FileResponse``; a single
+byte range is streamed from the open file; multi-range requests get the
+whole file (allowed by RFC 9110).
+
+With ``ACCEL_REDIRECT_ENABLED`` files under ``STORAGE_BASE_PATH`` are not
+read by Python at all: the response carries ``X-Accel-Redirect`` to the
+internal nginx location ``ACCEL_REDIRECT_STORAGE_LOCATION`` and nginx sends
+the bytes (sendfile, ranges) — see ``deploy/nginx/arv.conf``.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import aiofiles
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.core.config import settings
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Inclusive ``(start, end)`` of a single-range header.
+
+    ``None`` means "send the whole file" (no header, multi-range, or a
+    syntax we ignore); ``ValueError`` means unsatisfiable (416).
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip().replace(" ", ""))
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+async def _read_slice(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    remaining = end - start + 1
+    async with aiofiles.open(path, "rb") as fh:
+        await fh.seek(start)
+        while remaining > 0:
+            chunk = await fh.read(min(_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def accel_redirect_uri(path: str) -> Optional[str]:
+    """Internal nginx URI for *path*; ``None`` if disabled or outside storage."""
+    if not settings.ACCEL_REDIRECT_ENABLED:
+        return None
+    try:
+        relative = Path(path).resolve().relative_to(Path(settings.STORAGE_BASE_PATH).resolve())
+    except ValueError:
+        return None
+    return f"{settings.ACCEL_REDIRECT_STORAGE_LOCATION.rstrip('/')}/{quote(relative.as_posix())}"
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    headers: Optional[dict] = None,
+    etag: Optional[str] = None,
+) -> Response:
+    """``200``/``206``/``304``/``416`` response for the local file at *path*."""
+    headers = dict(headers or {})
+    headers["Accept-Ranges"] = "bytes"
+    if etag:
+        headers["ETag"] = f'"{etag}"'
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip().removeprefix("W/").strip('"') for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+    accel_uri = accel_redirect_uri(path)
+    if accel_uri is not None:
+        # nginx keeps Content-Type and Cache-Control from this response
+        headers["X-Accel-Redirect"] = accel_uri
+        return Response(media_type=media_type, headers=headers)
+
+    stat = os.stat(path)
+    try:
+        byte_range = parse_range(request.headers.get("range"), stat.st_size)
+    except ValueError:
+        headers["Content-Range"] = f"bytes */{stat.st_size}"
+        return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_read_slice(path, start, end), status_code=206, media_type=media_type, headers=headers)
@@ -2,6 +2,7 @@
 Video processing utilities for validation, metadata extraction, and ffprobe operations.
 """
 import asyncio
+import hashlib
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -204,7 +205,7 @@ async def get_video_middle_frame_time(file_path: str) -> float:
     return duration / 2.0
 
 
-async def save_uploaded_video(upload_file: UploadFile, destination_path: Path) -> None:
+async def save_uploaded_video(upload_file: UploadFile, destination_path: Path) -> str:
     """
     Save an uploaded video file to the destination path asynchronously.
     
@@ -212,14 +213,26 @@ async def save_uploaded_video(upload_file: UploadFile, destination_path: Path) -
         upload_file: The uploaded file object
         destination_path: The destination path to save the file
         
+    Returns:
+        SHA-256 hex digest of the saved file (computed while streaming)
+        
     Raises:
         HTTPException: If file size exceeds limit or save fails
     """
+    # Resumable upload: already on disk (size checked on creation) — hash and move
+    staged_path = getattr(upload_file, "staged_path", None)
+    if staged_path is not None:
+        from app.utils.ar_content import adopt_staged_file
+
+        sha256, _size = await adopt_staged_file(staged_path, destination_path)
+        return sha256
+
     # Ensure parent directory exists
     destination_path.parent.mkdir(parents=True, exist_ok=True)
     
     # Check file size during upload
     total_size = 0
+    digest = hashlib.sha256()
     
     too_large = False
 
@@ -236,6 +249,7 @@ async def save_uploaded_video(upload_file: UploadFile, destination_path: Path) -
                         path=str(destination_path),
                     )
                     break
+                digest.update(chunk)
                 f.write(chunk)
         if too_large:
             if destination_path.exists():
@@ -256,6 +270,8 @@ async def save_uploaded_video(upload_file: UploadFile, destination_path: Path) -
         logger.error("video_save_failed", error=str(exc), path=str(destination_path))
         raise HTTPException(status_code=500, detail=f"Failed to save video file: {str(exc)}")
 
+    return digest.hexdigest()
+
 
 def generate_video_filename(original_filename: str, video_id: Optional[int] = None) -> str:
     """
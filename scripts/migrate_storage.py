@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Move a company's files to another storage provider (local, yandex_disk, s3).
+
+    python scripts/migrate_storage.py 3 yandex_disk            # from the current provider
+    python scripts/migrate_storage.py 3 s3 --source local
+    python scripts/migrate_storage.py --resume 12              # continue an interrupted run
+
+Progress is stored in the database, so an interrupted run (Ctrl+C, crash)
+continues from the last copied batch with ``--resume``.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add project root to path
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.core.database import AsyncSessionLocal
+from app.services.storage_migration_service import MigrationError, MigrationProgress, storage_migration_service
+
+
+def _print_progress(progress: MigrationProgress) -> None:
+    rate = progress.bytes_per_second / (1024 * 1024)
+    eta = f", ETA {progress.eta_seconds}s" if progress.eta_seconds is not None else ""
+    print(
+        f"[{progress.status}] {progress.copied_files}/{progress.total_files} files, "
+        f"{progress.percent}% of {progress.total_bytes / (1024 * 1024):.1f} MB, "
+        f"{rate:.2f} MB/s{eta}, failed: {progress.failed_files}"
+    )
+
+
+async def main(args: argparse.Namespace) -> int:
+    async with AsyncSessionLocal() as db:
+        try:
+            if args.resume:
+                migration = await storage_migration_service.check_resumable(db, args.resume)
+            else:
+                migration = await storage_migration_service.create(db, args.company_id, args.target, args.source)
+        except MigrationError as exc:
+            print(f"[ERROR] {exc}")
+            return 1
+    print(f"[*] Migration {migration.id}: {migration.source_provider} -> {migration.target_provider}")
+    progress = await storage_migration_service.run(migration.id, on_progress=_print_progress)
+    if progress is None or progress.status != "completed":
+        print(f"[ERROR] {progress.error_message if progress else 'migration not found'}")
+        print(f"[*] Continue with: python scripts/migrate_storage.py --resume {migration.id}")
+        return 1
+    print(f"[OK] {progress.rewritten_rows} database rows now point at {progress.target_provider}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("company_id", type=int, nargs="?")
+    parser.add_argument("target", nargs="?", choices=["local", "yandex_disk", "s3"])
+    parser.add_argument("--source", choices=["local", "yandex_disk", "s3"], default=None)
+    parser.add_argument("--resume", type=int, metavar="MIGRATION_ID", default=None)
+    parsed = parser.parse_args()
+    if not parsed.resume and (parsed.company_id is None or parsed.target is None):
+        parser.error("company_id and target are required unless --resume is given")
+    sys.exit(asyncio.run(main(parsed)))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""Benchmark: L1 ``MemoryCache`` vs the old list-based LRU at 100k entries.
+
+The old cache kept recency in a plain list (``remove(key)`` on every hit,
+``pop(0)`` on every eviction) and sized each value with ``pickle.dumps``;
+the current one keeps an ``OrderedDict`` per cache type, estimates sizes
+with ``sys.getsizeof`` and shards its locks.  Both are filled with
+``--entries`` payloads (small dicts or 4 KB thumbnails), then timed on:
+
+* ``fill``  — inserting every entry;
+* ``get``   — random hits (each moves the key to the MRU end);
+* ``churn`` — inserting new keys into a full cache (each evicts the LRU).
+
+The old cache is O(n) per hit/eviction, so it only runs ``--legacy-ops``
+of the get/churn operations; rates are per second either way.
+
+Usage::
+
+    python scripts/testing/bench_memory_cache.py --entries 100000 --ops 100000
+    python scripts/testing/bench_memory_cache.py --payload thumbnail
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import pickle
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from app.services.enhanced_cache_service import CacheEntry, CacheLevel, MemoryCache  # noqa: E402
+
+
+class LegacyMemoryCache:
+    """The list-based LRU the L1 cache used before (kept here for comparison)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.current_size = 0
+        self.cache: Dict[str, CacheEntry] = {}
+        self.access_order: List[str] = []
+        self.lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        async with self.lock:
+            entry = self.cache.get(key)
+            if entry:
+                entry.accessed_at = time.time()
+                entry.access_count += 1
+                self.access_order.remove(key)
+                self.access_order.append(key)
+                return entry
+            return None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+        async with self.lock:
+            size = len(pickle.dumps(value))
+            while self.current_size + size > self.max_size and self.access_order:
+                oldest_entry = self.cache.pop(self.access_order.pop(0))
+                self.current_size -= oldest_entry.size_bytes
+            now = time.time()
+            self.cache[key] = CacheEntry(key, value, now, now, 1, ttl, size, CacheLevel.L1_MEMORY)
+            self.access_order.append(key)
+            self.current_size += size
+            return True
+
+
+PAYLOADS = {
+    "dict": lambda i: {"id": i, "name": f"item-{i}", "tags": ["a", "b", "c"], "score": i * 0.5},
+    "thumbnail": lambda i: i.to_bytes(4, "big") * 1024,  # 4 KB, like the L1 ``thumbnails`` type
+}
+_payload = PAYLOADS["dict"]
+
+
+async def _bench(cache, entries: int, ops: int) -> Dict[str, float]:
+    rates = {}
+    started = time.perf_counter()
+    for i in range(entries):
+        await cache.set(f"key:{i}", _payload(i), ttl=3600)
+    rates["fill"] = entries / (time.perf_counter() - started)
+
+    rng = random.Random(42)
+    keys = [f"key:{rng.randrange(entries)}" for _ in range(ops)]
+    started = time.perf_counter()
+    for key in keys:
+        await cache.get(key)
+    rates["get"] = ops / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(entries, entries + ops):
+        await cache.set(f"key:{i}", _payload(i), ttl=3600)
+    rates["churn"] = ops / (time.perf_counter() - started)
+    return rates
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=100_000)
+    parser.add_argument("--legacy-ops", type=int, default=2_000)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--payload", choices=sorted(PAYLOADS), default="dict")
+    args = parser.parse_args()
+
+    global _payload
+    _payload = PAYLOADS[args.payload]
+
+    # Size each cache so it is exactly full after the fill phase
+    probe = MemoryCache(max_size=1 << 62)
+    await probe.set("probe", _payload(0))
+    current = MemoryCache(max_size=probe.current_size * args.entries, shards=args.shards)
+    legacy = LegacyMemoryCache(max_size=len(pickle.dumps(_payload(0))) * args.entries)
+
+    results = {
+        "legacy": await _bench(legacy, args.entries, args.legacy_ops),
+        "current": await _bench(current, args.entries, args.ops),
+    }
+    print(f"{args.entries} {args.payload} entries, {args.ops} ops ({args.legacy_ops} for legacy)")
+    for label, rates in results.items():
+        print(f"{label:>8}: " + "  ".join(f"{phase} {rate:>10,.0f} ops/s" for phase, rate in rates.items()))
+    for phase in ("get", "churn"):
+        print(f"{phase} speedup: {results['current'][phase] / results['legacy'][phase]:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
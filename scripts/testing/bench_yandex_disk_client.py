@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+"""Benchmark: Yandex Disk provider calls with a client per call vs the shared pool.
+
+Starts a local fake Disk API over HTTPS (self-signed certificate, so every
+new connection pays a real TLS handshake), points the provider at it and
+times ``file_exists`` + ``get_download_url`` round trips:
+
+* ``per-call`` — the old behaviour, a new ``httpx.AsyncClient`` per request;
+* ``pooled``   — the shared keep-alive client from ``app.core.http_client``.
+
+Usage::
+
+    python scripts/testing/bench_yandex_disk_client.py --requests 300 --concurrency 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+from app.core import http_client, yandex_disk_provider  # noqa: E402
+from app.core.yandex_disk_provider import YandexDiskStorageProvider  # noqa: E402
+
+
+async def _resource(request):
+    return JSONResponse({"type": "file", "path": request.query_params.get("path"), "size": 1024})
+
+
+async def _download(request):
+    return JSONResponse({"href": "https://downloader.invalid/file", "method": "GET"})
+
+
+fake_disk = Starlette(routes=[
+    Route("/v1/disk/resources", _resource),
+    Route("/v1/disk/resources/download", _download),
+])
+
+
+def _self_signed_cert(directory: Path) -> tuple[str, str]:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_file, key_file = directory / "cert.pem", directory / "key.pem"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return str(cert_file), str(key_file)
+
+
+async def _run(provider: YandexDiskStorageProvider, total: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def _one(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            assert await provider.file_exists(f"bench/{index}.jpg")
+            assert await provider.get_download_url(f"bench/{index}.jpg")
+            latencies.append((time.perf_counter() - started) * 1000 / 2)
+
+    await asyncio.gather(*(_one(i) for i in range(total)))
+    return latencies
+
+
+def _report(label: str, latencies: list[float], elapsed: float) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(
+        f"{label:>9}: {len(ordered) * 2 / elapsed:8.1f} calls/s  "
+        f"median {statistics.median(ordered):6.2f} ms  p95 {p95:6.2f} ms"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--port", type=int, default=18443)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_file, key_file = _self_signed_cert(Path(tmp))
+        os.environ["SSL_CERT_FILE"] = cert_file  # httpx trusts the fake server
+        server = uvicorn.Server(uvicorn.Config(
+            fake_disk, host="127.0.0.1", port=args.port, log_level="warning",
+            ssl_certfile=cert_file, ssl_keyfile=key_file,
+        ))
+        server_task = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        yandex_disk_provider._DISK_API = f"https://127.0.0.1:{args.port}/v1/disk"
+        provider = YandexDiskStorageProvider(oauth_token="bench", base_prefix="Bench")
+
+        # Old behaviour: a fresh client (new TCP + TLS) for every request
+        opened: list[httpx.AsyncClient] = []
+
+        def _client_per_call() -> httpx.AsyncClient:
+            opened.append(httpx.AsyncClient(timeout=http_client.DEFAULT_TIMEOUT))
+            return opened[-1]
+
+        yandex_disk_provider.get_http_client = _client_per_call
+        started = time.perf_counter()
+        latencies = await _run(provider, args.requests, args.concurrency)
+        _report("per-call", latencies, time.perf_counter() - started)
+        for client in opened:
+            await client.aclose()
+
+        yandex_disk_provider.get_http_client = http_client.get_http_client
+        await _run(provider, args.concurrency, args.concurrency)  # warm the pool
+        started = time.perf_counter()
+        latencies = await _run(provider, args.requests, args.concurrency)
+        _report("pooled", latencies, time.perf_counter() - started)
+        print(f"http2 available: {http_client.http2_available()}")
+
+        await http_client.close_http_client()
+        server.should_exit = True
+        await server_task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,7 +3,35 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 # Add project root to PYTHONPATH for 'from app import ...' to work
 _root = Path(__file__).resolve().parent.parent
 if str(_root) not in sys.path:
     sys.path.insert(0, str(_root))
+
+
+@pytest.fixture
+async def sqlite_session_factory():
+    """Build an in-memory aiosqlite session factory with only the given tables.
+
+    Usage: ``session_factory = await sqlite_session_factory(Company, ARContent)``;
+    engines are disposed after the test.
+    """
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.core.database import Base
+
+    engines = []
+
+    async def _factory(*models):
+        tables = [model.__table__ for model in models]
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        engines.append(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=tables))
+        return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    yield _factory
+    for engine in engines:
+        await engine.dispose()
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_pipeline_runs_independent_stages_concurrently_and_respects_deps():
+    from app.services.ar_content_pipeline import POOL_IO, StagePipeline
+
+    order: list[str] = []
+    pipeline = StagePipeline(name="test")
+
+    async def _slow(name: str, value):
+        order.append(f"{name}:start")
+        await asyncio.sleep(0.05)
+        order.append(f"{name}:end")
+        return value
+
+    async def _a():
+        return await _slow("a", 1)
+
+    async def _b():
+        return await _slow("b", 2)
+
+    async def _sum(a, b):
+        order.append("sum")
+        return a + b
+
+    pipeline.add("a", _a, pool=POOL_IO)
+    pipeline.add("b", _b, pool=POOL_IO)
+    pipeline.add("sum", _sum, deps=("a", "b"), pool=POOL_IO)
+
+    results = await pipeline.run()
+
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    # a and b both started before either finished
+    assert order[:2] == ["a:start", "b:start"]
+    assert order[-1] == "sum"
+    breakdown = pipeline.breakdown()
+    assert set(breakdown["stages"]) == {"a", "b", "sum"}
+    assert breakdown["stages"]["sum"]["started_s"] >= breakdown["stages"]["a"]["duration_s"]
+    assert breakdown["parallelism"] > 1.0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_pool_limit_serializes_stages(monkeypatch):
+    from app.services import ar_content_pipeline as mod
+
+    monkeypatch.setattr(mod.settings, "AR_PIPELINE_CPU_CONCURRENCY", 1)
+    mod._loop_semaphores.pop(asyncio.get_running_loop(), None)
+
+    running = 0
+    peak = 0
+
+    async def _work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    pipeline = mod.StagePipeline(name="test")
+    for idx in range(3):
+        pipeline.add(f"cpu_{idx}", _work, pool=mod.POOL_CPU)
+
+    await pipeline.run()
+
+    assert peak == 1
+    waits = [pipeline.timings[f"cpu_{idx}"].wait_s for idx in range(3)]
+    assert max(waits) > 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_optional_failure_yields_none_and_required_failure_cancels():
+    from app.services.ar_content_pipeline import StagePipeline
+
+    async def _boom(*_args):
+        raise RuntimeError("boom")
+
+    async def _echo(value):
+        return value
+
+    pipeline = StagePipeline(name="test")
+    pipeline.add("thumb", _boom, optional=True)
+    pipeline.add("after", _echo, deps=("thumb",))
+    results = await pipeline.run()
+    assert results["thumb"] is None
+    assert results["after"] is None
+    assert pipeline.timings["thumb"].status == "failed"
+
+    cancelled = asyncio.Event()
+
+    async def _long():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    failing = StagePipeline(name="test")
+    failing.add("long", _long)
+    failing.add("upload", _boom)
+    with pytest.raises(RuntimeError, match="boom"):
+        await failing.run()
+    assert cancelled.is_set()
+    assert failing.timings["long"].status == "cancelled"
+
+
+def test_pipeline_rejects_unknown_dependencies_and_duplicates():
+    from app.services.ar_content_pipeline import StagePipeline
+
+    async def _noop():
+        return None
+
+    pipeline = StagePipeline(name="test")
+    pipeline.add("a", _noop)
+    with pytest.raises(ValueError):
+        pipeline.add("a", _noop)
+    with pytest.raises(ValueError):
+        pipeline.add("b", _noop, deps=("missing",))
@@ -141,11 +141,7 @@ async def test_generate_qr_code_save_uploaded_file_and_thumbnail_remote(monkeypa
             saved[dest] = content
             return f"yadisk://{dest}"
 
-    monkeypatch.setitem(
-        __import__("sys").modules,
-        "app.core.yandex_disk_provider",
-        SimpleNamespace(YandexDiskStorageProvider=FakeYandexProvider),
-    )
+    monkeypatch.setattr("app.core.storage_providers.RemoteStorageProvider", FakeYandexProvider)
     monkeypatch.setattr(mod.settings, "PUBLIC_URL", "https://example.com")
 
     provider = FakeYandexProvider()
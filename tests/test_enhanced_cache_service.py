@@ -1,6 +1,9 @@
 import importlib
 import asyncio
+import fnmatch
 import json
+import pickle
+import time
 from pathlib import Path
 from types import SimpleNamespace
 from uuid import uuid4
@@ -8,6 +11,11 @@ from uuid import uuid4
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def _no_invalidation_bus(monkeypatch):
+    monkeypatch.setattr(_service_module().settings, "CACHE_INVALIDATION_BUS_ENABLED", False)
+
+
 def test_disk_cache_default_path_and_module_import():
     service_module = _service_module()
     cache = service_module.DiskCache()
@@ -23,17 +31,18 @@ async def test_memory_cache_lru_delete_clear_and_stats():
 
     assert await cache.get("missing") is None
 
-    await cache.set("a", "x" * 40, ttl=10)
-    await cache.set("b", "y" * 40, ttl=10)
+    await cache.set("a", "x" * 40, ttl=10, size=40)
+    await cache.set("b", "y" * 40, ttl=10, size=40)
     entry = await cache.get("a")
 
     assert entry.value == "x" * 40
     assert entry.access_count == 2
-    assert cache.access_order[-1] == "a"
 
-    await cache.set("c", "z" * 40, ttl=10)
+    await cache.set("c", "z" * 40, ttl=10, size=40)
+    await cache.set("d", "w" * 40, ttl=10, size=40)
 
-    assert "b" not in cache.cache
+    assert "b" not in cache and "a" in cache and len(cache) == 3
+    assert await cache.set("huge", "h", size=121) is False
     assert await cache.delete("a") is True
     assert await cache.delete("a") is False
 
@@ -45,6 +54,56 @@ async def test_memory_cache_lru_delete_clear_and_stats():
     assert cache.stats()["entries"] == 0
 
 
+@pytest.mark.asyncio
+async def test_memory_cache_type_budgets_ttl_heap_and_shards(monkeypatch):
+    service_module = _service_module()
+    cache = service_module.MemoryCache(max_size=1000, budgets={"thumbnails": 600, "big": 900}, shards=2)
+
+    # Budgets over max_size are scaled down, the rest is shared by other types
+    assert cache.budgets == {"thumbnails": 400, "big": 600, "*": 0}
+    cache = service_module.MemoryCache(max_size=1000, budgets={"thumbnails": 400}, shards=4)
+    for i in range(100):
+        await cache.set(f"k{i}", i, size=1)
+    assert len(cache) == 100 and cache.stats()["shards"] == 4
+
+    cache = service_module.MemoryCache(max_size=1000, budgets={"thumbnails": 400})
+    assert cache.budgets == {"thumbnails": 400, "*": 600}
+
+    for i in range(20):
+        assert await cache.set(f"t{i}", i, cache_type="thumbnails", size=40) is True
+    for i in range(5):
+        await cache.set(f"m{i}", i, size=10)
+    stats = cache.stats()
+    assert stats["segments"]["thumbnails"]["size_bytes"] <= 400
+    assert stats["segments"]["*"]["entries"] == 5  # thumbnails never evict other types
+    assert stats["evictions"] == 10
+    assert all(f"t{i}" in cache for i in range(15, 20))
+
+    clock = [1000.0]
+    monkeypatch.setattr(service_module.time, "time", lambda: clock[0])
+    await cache.clear()
+    await cache.set("short", 1, ttl=5, size=1)
+    await cache.set("long", 2, ttl=50, size=1)
+    await cache.set("short", 3, ttl=100, size=1)  # rewrite leaves a stale heap item behind
+    await cache.set("gone", 4, ttl=1, size=1)
+    clock[0] += 10
+
+    assert await cache.get("gone") is None
+    assert await cache.purge_expired() == 0
+    clock[0] += 50
+    assert await cache.purge_expired() == 1
+    assert "long" not in cache and (await cache.get("short")).value == 3
+
+
+def test_estimate_size_is_cheap_and_monotonic():
+    service_module = _service_module()
+    small = service_module.estimate_size({"id": 1, "name": "x"})
+    large = service_module.estimate_size({"id": 1, "items": [{"name": "x" * 100}] * 1000})
+
+    assert 0 < small < large
+    assert large > 100 * 1000
+
+
 @pytest.mark.asyncio
 async def test_disk_cache_get_set_delete_clear_and_corruption_handling():
     service_module = _service_module()
@@ -71,23 +130,57 @@ async def test_disk_cache_get_set_delete_clear_and_corruption_handling():
     assert cache.stats()["files"] == 0
 
 
+@pytest.mark.asyncio
+async def test_disk_cache_reindexes_files_after_index_reset():
+    service_module = _service_module()
+    cache_dir = _make_temp_dir()
+    cache = service_module.DiskCache(str(cache_dir))
+    await cache.set("alpha", {"value": 1}, ttl=300, tags=["content:1"])
+    await cache.set("stale", {"value": 2}, ttl=1)
+    cache._db.close()
+
+    # A flat file from the pre-index layout, an expired shard file and junk
+    legacy_path = cache_dir / cache._get_path("legacy").name
+    now = time.time()
+    legacy_path.write_bytes(pickle.dumps(service_module.CacheEntry("legacy", {"value": 3}, now, now)))
+    stale_path = cache._get_path("stale")
+    entry = cache._read(stale_path)
+    entry.created_at -= 10
+    stale_path.write_bytes(pickle.dumps(entry))
+    junk_path = cache_dir / "ab" / "junk.cache"
+    junk_path.parent.mkdir(exist_ok=True)
+    junk_path.write_bytes(b"not-a-pickle")
+    cache.index_path.write_bytes(b"not-a-database" * 100)
+
+    reopened = service_module.DiskCache(str(cache_dir))
+    assert reopened.stats()["files"] == 2
+    assert (await reopened.get("alpha")).value == {"value": 1}
+    assert (await reopened.get("legacy")).value == {"value": 3}
+    assert not legacy_path.exists() and reopened._get_path("legacy").exists()
+    assert not stale_path.exists() and not junk_path.exists()
+    assert await reopened.invalidate_tags(["content:1"]) == 1
+
+
 @pytest.mark.asyncio
 async def test_disk_cache_expired_and_write_failure_paths(monkeypatch):
     service_module = _service_module()
     cache = service_module.DiskCache(str(_make_temp_dir()))
 
-    await cache.set("alpha", {"value": "old"})
+    clock = [1000.0]
+    monkeypatch.setattr(service_module.time, "time", lambda: clock[0])
+    await cache.set("alpha", {"value": "old"}, ttl=10)
+    await cache.set("beta", {"value": "default ttl"})
     path = cache._get_path("alpha")
+    assert path.parent.name == path.name[:2]
 
-    class _OldStat:
-        st_mtime = 0
-        st_size = 10
-
-    monkeypatch.setattr(service_module.time, "time", lambda: 90000)
-    monkeypatch.setattr(type(path), "stat", lambda self: _OldStat(), raising=False)
-
+    clock[0] += 11
     assert await cache.get("alpha") is None
     assert path.exists() is False
+    assert (await cache.get("beta")).value == {"value": "default ttl"}
+
+    clock[0] += service_module.settings.CACHE_L3_DEFAULT_TTL_SECONDS
+    assert await cache.purge_expired() == 1
+    assert cache.stats()["files"] == 0
 
     broken_dir = _make_temp_dir() / "missing-parent" / "nested"
     failing_cache = service_module.DiskCache(str(broken_dir))
@@ -96,6 +189,34 @@ async def test_disk_cache_expired_and_write_failure_paths(monkeypatch):
     assert await failing_cache.set("broken", {"v": 1}) is False
 
 
+@pytest.mark.asyncio
+async def test_disk_cache_evicts_lru_to_byte_budget_and_keeps_index(monkeypatch):
+    service_module = _service_module()
+    cache_dir = _make_temp_dir()
+    cache = service_module.DiskCache(str(cache_dir), max_bytes=1700)
+
+    clock = [1000.0]
+    monkeypatch.setattr(service_module.time, "time", lambda: clock[0])
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        assert await cache.set(key, "x" * 300, compress=False) is True
+    clock[0] += 1
+    await cache.get("a")  # b is now the least recently used
+    clock[0] += 1
+    await cache.set("d", "y" * 300, compress=False)
+
+    assert await cache.get("b") is None and not cache._get_path("b").exists()
+    assert (await cache.get("a")).value == "x" * 300
+    stats = cache.stats()
+    assert stats["files"] == 3 and 0 < stats["size_bytes"] <= 1700
+    assert await cache.set("huge", "z" * 5000, compress=False) is False
+
+    # The index is persistent: a new instance (another worker) sees the same entries
+    reopened = service_module.DiskCache(str(cache_dir), max_bytes=1700)
+    assert reopened.stats()["size_bytes"] == stats["size_bytes"]
+    assert (await reopened.get("d")).value == "y" * 300
+
+
 @pytest.mark.asyncio
 async def test_enhanced_cache_get_set_delete_and_get_or_set(monkeypatch):
     service_module = _service_module()
@@ -108,11 +229,10 @@ async def test_enhanced_cache_get_set_delete_and_get_or_set(monkeypatch):
     assert await service.set("thumb-1", {"name": "demo"}, cache_type="thumbnails") is True
     assert await service.get("thumb-1", cache_type="thumbnails") == {"name": "demo"}
 
-    service.l1_cache.cache.clear()
-    service.l1_cache.access_order.clear()
+    await service.l1_cache.clear()
     l2_value = await service.get("thumb-1", cache_type="thumbnails", strategy=service_module.CacheStrategy.WRITE_THROUGH)
     assert l2_value == {"name": "demo"}
-    assert "thumb-1" in service.l1_cache.cache
+    assert "thumb-1" in service.l1_cache
 
     await service.delete("thumb-1", cache_type="thumbnails")
     assert await service.get("thumb-1", cache_type="thumbnails") is None
@@ -155,7 +275,7 @@ async def test_enhanced_cache_get_promotes_disk_and_handles_errors(monkeypatch):
     value = await service.get("media-1", cache_type="media_info", strategy=service_module.CacheStrategy.WRITE_THROUGH)
 
     assert value == {"value": "from-disk"}
-    assert "media-1" in service.l1_cache.cache
+    assert "media-1" in service.l1_cache
 
     expired_entry = service_module.CacheEntry(key="x", value=1, created_at=0, accessed_at=0, ttl=1)
     monkeypatch.setattr(service_module.time, "time", lambda: 10)
@@ -189,10 +309,10 @@ async def test_enhanced_cache_set_strategies_and_error_paths(monkeypatch):
     monkeypatch.setattr(service_module.asyncio, "create_task", _fake_create_task)
 
     assert await service.set("lazy-key", {"v": 1}, cache_type="metadata", strategy=service_module.CacheStrategy.LAZY) is True
-    assert redis.last_setex[0] == "lazy-key"
+    assert redis.last_setex[0] == "vertex:cache:lazy-key"
 
     assert await service.set("back-key", {"v": 2}, cache_type="thumbnails", strategy=service_module.CacheStrategy.WRITE_BACK) is True
-    assert "back-key" in service.l1_cache.cache
+    assert "back-key" in service.l1_cache
     assert len(tasks) == 1
 
     monkeypatch.setattr(service, "_get_config", _raise_sync(RuntimeError("set boom")))
@@ -210,10 +330,13 @@ async def test_delete_invalidate_pattern_warm_cache_and_clear_all(monkeypatch):
 
     await service.set("a:1", {"v": 1}, cache_type="thumbnails")
     await service.set("a:2", {"v": 2}, cache_type="metadata")
-    redis.store["a:extra"] = json.dumps({"v": 3})
+    redis.store["vertex:cache:a:extra"] = json.dumps({"v": 3})
+    redis.store["a:foreign"] = "other app"
 
     deleted = await service.invalidate_pattern("a:*", cache_type="metadata")
-    assert deleted >= 1
+    assert deleted >= 3
+    assert "a:1" not in service.l1_cache and await disk.get("a:2") is None
+    assert list(redis.store) == ["a:foreign"]
 
     warmed = await service.warm_cache(["w1", "w2"], lambda key: {"key": key}, cache_type="metadata")
     assert warmed == [{"key": "w1"}, {"key": "w2"}]
@@ -224,7 +347,7 @@ async def test_delete_invalidate_pattern_warm_cache_and_clear_all(monkeypatch):
 
     await service.clear_all()
     assert service.l1_cache.stats()["entries"] == 0
-    assert redis.store == {}
+    assert redis.store == {"a:foreign": "other app"}  # only our namespace is cleared
     assert service.stats["hits"][service_module.CacheLevel.L1_MEMORY.value] == 0
 
     monkeypatch.setattr(service, "_get_config", _raise_sync(RuntimeError("delete boom")))
@@ -232,6 +355,89 @@ async def test_delete_invalidate_pattern_warm_cache_and_clear_all(monkeypatch):
     assert await service.invalidate_pattern("x:*") == 0
 
 
+@pytest.mark.asyncio
+async def test_invalidate_tags_across_tiers_and_workers(monkeypatch):
+    service_module = _service_module()
+    monkeypatch.setattr(service_module.settings, "CACHE_INVALIDATION_BUS_ENABLED", True)
+    redis = _FakeRedis()
+    workers = []
+    for _ in range(2):
+        worker = _make_service(service_module)
+        worker.l2_cache = redis
+        worker.l3_cache = service_module.DiskCache(str(_make_temp_dir()))
+        worker._bus_task = "subscribed"
+        workers.append(worker)
+    first, second = workers
+
+    await first.set("thumb:42", {"v": 1}, cache_type="thumbnails", tags=["content:42", "company:7"])
+    await first.set("info:42", {"v": 2}, cache_type="media_info", tags=["content:42"])
+    await first.set("thumb:43", {"v": 3}, cache_type="thumbnails", tags=["content:43", "company:7"])
+    assert redis.store["vertex:cache:tag:content:42"] == {"thumb:42"}
+    # The other worker promotes the shared Redis copy into its own L1 (without tags)
+    assert await second.get("thumb:42", "thumbnails", service_module.CacheStrategy.WRITE_THROUGH) == {"v": 1}
+    assert "thumb:42" in second.l1_cache
+
+    assert await first.invalidate_tags("content:42") == 4  # L1 + Redis + two on disk
+    assert "thumb:42" not in first.l1_cache and "thumb:43" in first.l1_cache
+    assert await first.l3_cache.get("info:42") is None
+    assert "vertex:cache:thumb:42" not in redis.store and "vertex:cache:tag:content:42" not in redis.store
+
+    channel, message = redis.published[-1]
+    assert channel == service_module.settings.CACHE_INVALIDATION_CHANNEL
+    assert message["tags"] == ["content:42"] and message["keys"] == ["thumb:42"]
+    await first.apply_invalidation(message)  # own broadcasts are ignored
+    await second.apply_invalidation(message)
+    assert "thumb:42" not in second.l1_cache
+
+    # An overwrite drops the stale L1 copy in the other workers
+    await second.set("thumb:43", {"v": 4}, cache_type="thumbnails", tags=["company:7"])
+    assert redis.published[-1][1]["keys"] == ["thumb:43"]
+    await first.apply_invalidation(redis.published[-1][1])
+    assert "thumb:43" not in first.l1_cache
+    assert await first.get("thumb:43", "thumbnails") == {"v": 4}
+
+    await first.delete("thumb:43", cache_type="thumbnails")
+    await second.apply_invalidation(redis.published[-1][1])
+    assert "thumb:43" not in second.l1_cache
+
+    # A remote clear only empties L1: the shared tiers were cleared by the sender
+    await first.set("info:43", {"v": 5}, cache_type="media_info")
+    await first.apply_invalidation({"origin": "other", "clear": True})
+    assert await first.l3_cache.get("info:43") is not None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_bus_listener_applies_messages(monkeypatch):
+    service_module = _service_module()
+    service = _make_service(service_module)
+    service.l3_cache = service_module.DiskCache(str(_make_temp_dir()))
+    await service.l1_cache.set("k1", 1, tags=["content:1"])
+    await service.l1_cache.set("k2", 2)
+
+    class _PubSub:
+        closed = False
+
+        async def subscribe(self, channel):
+            self.channel = channel
+
+        async def listen(self):
+            yield {"type": "subscribe", "data": 1}
+            yield {"type": "message", "data": json.dumps({"origin": "other", "tags": ["content:1"]})}
+            yield {"type": "message", "data": json.dumps({"origin": "other", "patterns": ["k*"]})}
+            raise asyncio.CancelledError()
+
+        async def close(self):
+            self.closed = True
+
+    pubsub = _PubSub()
+    service.l2_cache = SimpleNamespace(pubsub=lambda: pubsub)
+
+    with pytest.raises(asyncio.CancelledError):
+        await service._listen()
+    assert len(service.l1_cache) == 0
+    assert pubsub.channel == service_module.settings.CACHE_INVALIDATION_CHANNEL and pubsub.closed
+
+
 @pytest.mark.asyncio
 async def test_set_l2_background_write_hit_rate_and_cleanup(monkeypatch):
     service_module = _service_module()
@@ -248,17 +454,17 @@ async def test_set_l2_background_write_hit_rate_and_cleanup(monkeypatch):
     pickle_config = service_module.CacheConfig(service_module.CacheLevel.L2_REDIS, ttl=0, serialization="pickle")
 
     await service._set_l2("json-key", {"v": 1}, json_config, ttl=5)
-    assert redis.last_setex[0] == "json-key"
+    assert redis.last_setex[0] == "vertex:cache:json-key"
 
     await service._set_l2("pickle-key", {"v": 2}, pickle_config, ttl=0)
-    assert "pickle-key" in redis.store
+    assert "vertex:cache:pickle-key" in redis.store
 
     redis.fail_set = True
     await service._set_l2("broken-key", {"v": 3}, json_config, ttl=5)
 
     redis.fail_set = False
     await service._background_write("bg-key", {"v": 4}, json_config)
-    assert "bg-key" in redis.store
+    assert "vertex:cache:bg-key" in redis.store
 
     service.stats["hits"][service_module.CacheLevel.L1_MEMORY.value] = 3
     service.stats["misses"][service_module.CacheLevel.L1_MEMORY.value] = 1
@@ -326,6 +532,7 @@ class _FakeRedis:
         self.fail_set = fail_set
         self.fail_keys = fail_keys
         self.last_setex = None
+        self.published = []
 
     async def get(self, key):
         if self.fail_get:
@@ -351,13 +558,23 @@ class _FakeRedis:
                 del self.store[key]
         return deleted
 
-    async def keys(self, pattern):
+    async def scan_iter(self, match=None, count=None):
         if self.fail_keys:
-            raise RuntimeError("redis keys failed")
-        if pattern == "*":
-            return list(self.store.keys())
-        prefix = pattern.rstrip("*")
-        return [key for key in self.store if key.startswith(prefix)]
+            raise RuntimeError("redis scan failed")
+        for key in [key for key in self.store if fnmatch.fnmatchcase(key, match or "*")]:
+            yield key
+
+    async def sadd(self, key, *members):
+        self.store.setdefault(key, set()).update(members)
+
+    async def smembers(self, key):
+        return set(self.store.get(key, ()))
+
+    async def expire(self, key, ttl):
+        return key in self.store
+
+    async def publish(self, channel, message):
+        self.published.append((channel, json.loads(message)))
 
 
 def _async_return(value):
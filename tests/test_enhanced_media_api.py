@@ -35,9 +35,10 @@ async def test_generate_thumbnail_cached_generated_and_failure(monkeypatch):
 
     saved = {}
 
-    async def _cache_set(key, value, cache_type, ttl=None):
+    async def _cache_set(key, value, cache_type, ttl=None, tags=()):
         saved["cache_type"] = cache_type
         saved["ttl"] = ttl
+        saved["tags"] = tags
         saved["value"] = value
         return True
 
@@ -58,6 +59,7 @@ async def test_generate_thumbnail_cached_generated_and_failure(monkeypatch):
     assert generated["config"]["format"] == "png"
     assert saved["cache_type"] == "thumbnails"
     assert saved["ttl"] == 3600
+    assert saved["tags"] == ["file:photo.png"]
 
     monkeypatch.setattr(
         mod,
@@ -74,7 +76,8 @@ async def test_generate_batch_thumbnails_success_partial_failure_and_outer_failu
     mod = _module()
     request = mod.BatchThumbnailRequest(file_paths=["a.png", "b.png"], sizes=["small"], formats=["webp"])
 
-    async def _generate_multiple(file_path, configs, force_regenerate):
+    async def _generate_multiple(file_path, configs, force_regenerate, in_process=False):
+        assert in_process is True
         if file_path == "b.png":
             raise RuntimeError("bad file")
         return [
@@ -89,9 +92,11 @@ async def test_generate_batch_thumbnails_success_partial_failure_and_outer_failu
         ]
 
     monkeypatch.setattr(mod, "enhanced_thumbnail_service", SimpleNamespace(generate_multiple_thumbnails=_generate_multiple))
-    result = await mod.generate_batch_thumbnails(request, _bg())
-    assert result[0]["thumbnails"][0]["url"] == "/a-small.webp"
-    assert result[1]["error"] == "bad file"
+    response = await mod.generate_batch_thumbnails(request, _bg())
+    assert response.media_type == "application/x-ndjson"
+    result = {item["file_path"]: item for item in await _ndjson_items(response)}
+    assert result["a.png"]["thumbnails"][0]["url"] == "/a-small.webp"
+    assert result["b.png"]["error"] == "bad file"
 
     monkeypatch.setattr(mod, "ThumbnailSize", _broken_enum())
     with pytest.raises(HTTPException) as exc:
@@ -125,9 +130,10 @@ async def test_validate_file_cached_generated_and_failure(monkeypatch):
     )
     stored = {}
 
-    async def _cache_set(key, value, cache_type, ttl=None):
+    async def _cache_set(key, value, cache_type, ttl=None, tags=()):
         stored["cache_type"] = cache_type
         stored["ttl"] = ttl
+        stored["tags"] = tags
         return True
 
     monkeypatch.setattr(
@@ -135,18 +141,19 @@ async def test_validate_file_cached_generated_and_failure(monkeypatch):
         "enhanced_cache_service",
         SimpleNamespace(get=_async_return(None), set=_cache_set),
     )
-    monkeypatch.setattr(mod, "enhanced_validation_service", SimpleNamespace(validate_file=_async_return(validation_result)))
+    monkeypatch.setattr(mod, "enhanced_validation_service", SimpleNamespace(validate_upload=_async_return(validation_result)))
     generated = await mod.validate_file(request)
 
     assert generated["is_valid"] is False
     assert generated["threat_level"] == "suspicious"
     assert stored["cache_type"] == "validation"
     assert stored["ttl"] == 300
+    assert stored["tags"] == ["file:media.bin"]
 
     monkeypatch.setattr(
         mod,
         "enhanced_validation_service",
-        SimpleNamespace(validate_file=_async_raise(RuntimeError("bad validate"))),
+        SimpleNamespace(validate_upload=_async_raise(RuntimeError("bad validate"))),
     )
     with pytest.raises(HTTPException):
         await mod.validate_file(request)
@@ -156,38 +163,28 @@ async def test_validate_file_cached_generated_and_failure(monkeypatch):
 async def test_validate_batch_files_and_failure(monkeypatch):
     mod = _module()
     request = mod.BatchValidationRequest(file_paths=["a", "b"], validation_level="standard")
-    results = [
-        SimpleNamespace(
-            is_valid=True,
-            threat_level=SimpleNamespace(value="safe"),
-            errors=[],
-            warnings=[],
-            metadata={},
-            security_info={},
-            file_info={},
-            validation_time=0.1,
-            validation_level=SimpleNamespace(value="standard"),
-        ),
-        SimpleNamespace(
-            is_valid=False,
-            threat_level=SimpleNamespace(value="malicious"),
-            errors=["err"],
-            warnings=["warn"],
-            metadata={"x": 1},
-            security_info={"y": 2},
-            file_info={"z": 3},
-            validation_time=0.2,
-            validation_level=SimpleNamespace(value="standard"),
-        ),
-    ]
-    monkeypatch.setattr(mod, "enhanced_validation_service", SimpleNamespace(batch_validate=_async_return(results)))
-    payload = await mod.validate_batch_files(request)
-    assert payload[0]["file_path"] == "a"
-    assert payload[1]["threat_level"] == "malicious"
-
-    monkeypatch.setattr(mod, "enhanced_validation_service", SimpleNamespace(batch_validate=_async_raise(RuntimeError("kaput"))))
-    with pytest.raises(HTTPException):
+    calls = []
+
+    async def _run_in_process(func, file_path, level, file_type):
+        calls.append((func, file_path, level, file_type))
+        if file_path == "b":
+            raise RuntimeError("kaput")
+        return {"is_valid": True, "threat_level": "safe", "errors": [], "validation_level": level}
+
+    monkeypatch.setattr(mod, "run_in_process", _run_in_process)
+    response = await mod.validate_batch_files(request)
+    payload = {item["file_path"]: item for item in await _ndjson_items(response)}
+    assert payload["a"]["is_valid"] is True
+    assert payload["a"]["index"] == 0
+    assert payload["b"]["is_valid"] is False
+    assert "kaput" in payload["b"]["errors"][0]
+    assert {call[0] for call in calls} == {mod.validate_path_in_worker}
+    assert calls[0][2] == "standard"
+
+    monkeypatch.setattr(mod.settings, "MEDIA_BATCH_MAX_ITEMS", 1)
+    with pytest.raises(HTTPException) as exc:
         await mod.validate_batch_files(request)
+    assert exc.value.status_code == 413
 
 
 @pytest.mark.asyncio
@@ -199,7 +196,7 @@ async def test_get_media_info_clear_cache_stats_and_health(monkeypatch):
         mod,
         "enhanced_validation_service",
         SimpleNamespace(
-            validate_file=_async_return(
+            validate_upload=_async_return(
                 SimpleNamespace(
                     is_valid=True,
                     threat_level=SimpleNamespace(value="safe"),
@@ -436,3 +433,12 @@ def _broken_enum():
             raise ValueError("bad enum")
 
     return _Broken
+
+
+async def _ndjson_items(response):
+    import json
+
+    lines = []
+    async for chunk in response.body_iterator:
+        lines.extend(line for line in chunk.decode().splitlines() if line)
+    return [json.loads(line) for line in lines]
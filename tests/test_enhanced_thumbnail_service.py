@@ -1,3 +1,4 @@
+import fnmatch
 import importlib
 import json
 from pathlib import Path
@@ -418,10 +419,9 @@ class _FakeRedis:
                 del self.store[key]
         return deleted
 
-    async def keys(self, pattern):
-        if pattern == "thumb:*":
-            return [key for key in self.store if key.startswith("thumb:")]
-        return []
+    async def scan_iter(self, match=None, count=None):
+        for key in [key for key in self.store if fnmatch.fnmatchcase(key, match or "*")]:
+            yield key
 
 
 def _enhanced_thumbnail_module():
@@ -98,7 +98,7 @@ async def test_validate_image_content_extracts_metadata_and_suspicious_exif():
     Image.new("RGB", (320, 240), (50, 60, 70)).save(image_path, format="JPEG", exif=exif)
 
     result = service_module.ValidationResult()
-    await service._validate_image_content(image_path, service.image_constraints, result)
+    service._validate_image_content(image_path, service.image_constraints, result)
 
     assert result.is_valid is True
     assert result.metadata["format"] == "JPEG"
@@ -119,9 +119,9 @@ async def test_validate_image_content_handles_invalid_and_anomalies():
     broken_path.write_text("not-an-image", encoding="utf-8")
 
     tiny_result = service_module.ValidationResult()
-    await service._validate_image_content(tiny_path, service.image_constraints, tiny_result)
+    service._validate_image_content(tiny_path, service.image_constraints, tiny_result)
     broken_result = service_module.ValidationResult()
-    await service._validate_image_content(broken_path, service.image_constraints, broken_result)
+    service._validate_image_content(broken_path, service.image_constraints, broken_result)
 
     assert tiny_result.is_valid is False
     assert any("Resolution too small" in error for error in tiny_result.errors)
@@ -139,14 +139,14 @@ async def test_validate_video_content_success_and_ffprobe_failures(monkeypatch):
     video_path = temp_dir / "clip.mp4"
     video_path.write_bytes(b"video")
 
-    async def _fake_anomalies(file_path, result):
+    def _fake_anomalies(file_path, result):
         result.warnings.append("checked anomalies")
 
     monkeypatch.setattr(service, "_detect_video_anomalies", _fake_anomalies)
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(
+        service_module.subprocess,
+        "run",
+        _return(
             _FakeProcess(
                 returncode=0,
                 stdout=json.dumps(
@@ -170,7 +170,7 @@ async def test_validate_video_content_success_and_ffprobe_failures(monkeypatch):
     )
 
     result = service_module.ValidationResult()
-    await service._validate_video_content(video_path, service.video_constraints, result)
+    service._validate_video_content(video_path, service.video_constraints, result)
 
     assert result.is_valid is True
     assert result.metadata["codec"] == "h264"
@@ -180,21 +180,21 @@ async def test_validate_video_content_success_and_ffprobe_failures(monkeypatch):
 
     invalid_result = service_module.ValidationResult()
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(_FakeProcess(returncode=1, stderr=b"broken file")),
+        service_module.subprocess,
+        "run",
+        _return(_FakeProcess(returncode=1, stderr=b"broken file")),
     )
-    await service._validate_video_content(video_path, service.video_constraints, invalid_result)
+    service._validate_video_content(video_path, service.video_constraints, invalid_result)
     assert invalid_result.is_valid is False
     assert any("Invalid video file" in error for error in invalid_result.errors)
 
     missing_stream_result = service_module.ValidationResult()
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(_FakeProcess(returncode=0, stdout=b'{"format": {}, "streams": []}')),
+        service_module.subprocess,
+        "run",
+        _return(_FakeProcess(returncode=0, stdout=b'{"format": {}, "streams": []}')),
     )
-    await service._validate_video_content(video_path, service.video_constraints, missing_stream_result)
+    service._validate_video_content(video_path, service.video_constraints, missing_stream_result)
     assert missing_stream_result.is_valid is False
     assert "No video stream found" in missing_stream_result.errors
 
@@ -223,7 +223,7 @@ async def test_detect_video_anomalies_and_error_path(monkeypatch):
             return None
 
     monkeypatch.setattr(service_module.cv2, "VideoCapture", lambda *args, **kwargs: _Capture())
-    await service._detect_video_anomalies(Path("clip.mp4"), result)
+    service._detect_video_anomalies(Path("clip.mp4"), result)
 
     assert "Video starts with black frame" in result.warnings
     assert "Video ends with black frame" in result.warnings
@@ -238,13 +238,13 @@ async def test_detect_video_anomalies_and_error_path(monkeypatch):
             return None
 
     monkeypatch.setattr(service_module.cv2, "VideoCapture", lambda *args, **kwargs: _NoFramesCapture())
-    await service._detect_video_anomalies(Path("clip.mp4"), no_frames)
+    service._detect_video_anomalies(Path("clip.mp4"), no_frames)
     assert no_frames.is_valid is False
     assert "Video has no frames" in no_frames.errors
 
     warning_result = service_module.ValidationResult()
     monkeypatch.setattr(service_module.cv2, "VideoCapture", _raise_sync(RuntimeError("cv failure")))
-    await service._detect_video_anomalies(Path("clip.mp4"), warning_result)
+    service._detect_video_anomalies(Path("clip.mp4"), warning_result)
     assert any("Could not analyze video anomalies" in warning for warning in warning_result.warnings)
 
 
@@ -254,21 +254,26 @@ async def test_comprehensive_and_paranoid_validation_dispatch(monkeypatch):
     service = service_module.EnhancedValidationService()
     calls = []
 
-    async def _record(name):
+    def _record(name):
+        def _inner(*args, **kwargs):
+            calls.append(name)
+        return _inner
+
+    def _record_async(name):
         async def _inner(*args, **kwargs):
             calls.append(name)
         return _inner
 
-    monkeypatch.setattr(service, "_virus_scan", await _record("virus"))
-    monkeypatch.setattr(service, "_deep_image_analysis", await _record("deep_image"))
-    monkeypatch.setattr(service, "_deep_video_analysis", await _record("deep_video"))
-    monkeypatch.setattr(service, "_check_metadata_sanitization", await _record("metadata"))
-    monkeypatch.setattr(service, "_analyze_file_signatures", await _record("signatures"))
-    monkeypatch.setattr(service, "_entropy_analysis", await _record("entropy"))
-    monkeypatch.setattr(service, "_behavioral_analysis", await _record("behavior"))
+    monkeypatch.setattr(service, "_virus_scan", _record("virus"))
+    monkeypatch.setattr(service, "_deep_image_analysis", _record("deep_image"))
+    monkeypatch.setattr(service, "_deep_video_analysis", _record("deep_video"))
+    monkeypatch.setattr(service, "_check_metadata_sanitization", _record("metadata"))
+    monkeypatch.setattr(service, "_analyze_file_signatures", _record_async("signatures"))
+    monkeypatch.setattr(service, "_entropy_analysis", _record_async("entropy"))
+    monkeypatch.setattr(service, "_behavioral_analysis", _record_async("behavior"))
 
-    await service._comprehensive_validation(Path("photo.png"), "image", service_module.ValidationResult())
-    await service._comprehensive_validation(Path("clip.mp4"), "video", service_module.ValidationResult())
+    service._comprehensive_validation(Path("photo.png"), "image", service_module.ValidationResult())
+    service._comprehensive_validation(Path("clip.mp4"), "video", service_module.ValidationResult())
     await service._paranoid_validation(Path("photo.png"), "image", service_module.ValidationResult())
     await service._paranoid_validation(Path("clip.mp4"), "video", service_module.ValidationResult())
 
@@ -297,35 +302,35 @@ async def test_virus_scan_signature_entropy_and_behavior_paths(monkeypatch):
 
     clean_result = service_module.ValidationResult()
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(_FakeProcess(returncode=0, stdout=b"clean")),
+        service_module.subprocess,
+        "run",
+        _return(_FakeProcess(returncode=0, stdout=b"clean")),
     )
-    await service._virus_scan(jpeg_path, clean_result)
+    service._virus_scan(jpeg_path, clean_result)
     assert clean_result.security_info["virus_scan"] == "clean"
 
     infected_result = service_module.ValidationResult()
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(_FakeProcess(returncode=1, stdout=b"infected")),
+        service_module.subprocess,
+        "run",
+        _return(_FakeProcess(returncode=1, stdout=b"infected")),
     )
-    await service._virus_scan(jpeg_path, infected_result)
+    service._virus_scan(jpeg_path, infected_result)
     assert infected_result.is_valid is False
     assert infected_result.threat_level == service_module.ThreatLevel.MALICIOUS
 
     failed_result = service_module.ValidationResult()
     monkeypatch.setattr(
-        service_module.asyncio,
-        "create_subprocess_exec",
-        _async_return(_FakeProcess(returncode=2, stderr=b"engine down")),
+        service_module.subprocess,
+        "run",
+        _return(_FakeProcess(returncode=2, stderr=b"engine down")),
     )
-    await service._virus_scan(jpeg_path, failed_result)
+    service._virus_scan(jpeg_path, failed_result)
     assert failed_result.security_info["virus_scan"] == "failed"
 
     unavailable_result = service_module.ValidationResult()
-    monkeypatch.setattr(service_module.asyncio, "create_subprocess_exec", _async_raise(RuntimeError("missing clamd")))
-    await service._virus_scan(jpeg_path, unavailable_result)
+    monkeypatch.setattr(service_module.subprocess, "run", _raise_sync(FileNotFoundError("missing clamd")))
+    service._virus_scan(jpeg_path, unavailable_result)
     assert unavailable_result.security_info["virus_scan"] == "unavailable"
 
     signature_result = service_module.ValidationResult()
@@ -365,7 +370,7 @@ async def test_deep_image_and_video_analysis_paths(monkeypatch):
     monkeypatch.setattr(service_module.cv2, "Canny", lambda *args, **kwargs: np.zeros((12, 12), dtype=np.uint8))
     monkeypatch.setattr(service_module.cv2, "Laplacian", lambda *args, **kwargs: np.ones((12, 12), dtype=np.float64))
 
-    await service._deep_image_analysis(Path("photo.png"), result)
+    service._deep_image_analysis(Path("photo.png"), result)
 
     assert "color_histogram" in result.metadata
     assert result.metadata["edge_density"] == 0.0
@@ -390,14 +395,14 @@ async def test_deep_image_and_video_analysis_paths(monkeypatch):
             return None
 
     monkeypatch.setattr(service_module.cv2, "VideoCapture", lambda *args, **kwargs: _VideoCapture())
-    await service._deep_video_analysis(Path("clip.mp4"), bright_result)
+    service._deep_video_analysis(Path("clip.mp4"), bright_result)
 
     assert bright_result.metadata["avg_brightness"] == 255.0
     assert any("very bright" in warning.lower() for warning in bright_result.warnings)
 
     error_result = service_module.ValidationResult()
     monkeypatch.setattr(service_module.cv2, "imread", _raise_sync(RuntimeError("cv read failed")))
-    await service._deep_image_analysis(Path("photo.png"), error_result)
+    service._deep_image_analysis(Path("photo.png"), error_result)
     assert any("Deep image analysis failed" in warning for warning in error_result.warnings)
 
 
@@ -424,10 +429,10 @@ async def test_validate_file_orchestration_and_error_paths(monkeypatch):
     async def _basic(file_path, constraints, result):
         order.append("basic")
 
-    async def _standard(file_path, file_type, constraints, result):
+    def _standard(file_path, file_type, constraints, result):
         order.append("standard")
 
-    async def _comprehensive(file_path, file_type, result):
+    def _comprehensive(file_path, file_type, result):
         order.append("comprehensive")
         result.warnings.append("careful")
 
@@ -500,6 +505,103 @@ async def test_batch_validate_and_summary(monkeypatch):
     assert summary["total_errors"] == 2
 
 
+class _ChunkedUpload:
+    def __init__(self, data: bytes, filename: str, chunk_size: int = 1024):
+        self.filename = filename
+        self.content_type = None
+        self._chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        self.reads = 0
+
+    async def read(self, _size=-1):
+        self.reads += 1
+        return self._chunks.pop(0) if self._chunks else b""
+
+
+@pytest.mark.asyncio
+async def test_validate_upload_single_pass_records_hash_for_thumbnails(tmp_path, monkeypatch):
+    import hashlib
+    import io
+
+    service_module = _service_module()
+    from app.services import enhanced_thumbnail_service as thumb_module
+
+    service = service_module.EnhancedValidationService()
+    buffer = io.BytesIO()
+    rng = np.random.default_rng(1)
+    Image.fromarray((rng.random((160, 200, 3)) * 255).astype(np.uint8)).save(buffer, format="PNG")
+    data = buffer.getvalue()
+    destination = tmp_path / "photo.png"
+
+    result = await service.validate_upload(
+        _ChunkedUpload(data, "photo.png"), destination, validation_level=service_module.ValidationLevel.PARANOID
+    )
+
+    assert result.is_valid is True, result.errors
+    assert destination.read_bytes() == data
+    assert result.file_info["sha256"] == hashlib.sha256(data).hexdigest()
+    assert result.file_info["mime_type"] == "image/png"
+    assert result.file_info["width"] == 200
+    assert result.security_info["file_signature"] == "PNG"
+    reference = service_module.ValidationResult()
+    await service._entropy_analysis(destination, reference)
+    assert result.metadata["entropy"] == pytest.approx(reference.metadata["entropy"])
+
+    # The thumbnail cache key comes from the upload, not from re-reading the file
+    def _no_open(*args, **kwargs):
+        raise AssertionError("file re-read")
+
+    monkeypatch.setattr(thumb_module, "open", _no_open, raising=False)
+    assert await thumb_module.enhanced_thumbnail_service.get_file_hash(str(destination)) == result.file_info["sha256"]
+
+
+@pytest.mark.asyncio
+async def test_validate_upload_rejects_early_and_removes_partial_file(tmp_path):
+    service_module = _service_module()
+    service = service_module.EnhancedValidationService()
+    service.image_constraints.max_file_size = 8 * 1024
+
+    oversized = _ChunkedUpload(b"\x89PNG\r\n\x1a\n" + b"\0" * 64 * 1024, "big.png")
+    result = await service.validate_upload(oversized, tmp_path / "big.png")
+    assert result.is_valid is False
+    assert "File too large" in result.errors[0]
+    assert oversized.reads <= 10  # stopped reading the body
+    assert not (tmp_path / "big.png").exists()
+
+    disguised = _ChunkedUpload(b"#!/bin/sh\necho pwned\n" * 300, "photo.png")
+    result = await service.validate_upload(disguised, tmp_path / "photo.png")
+    assert result.is_valid is False
+    assert "MIME type not allowed" in result.errors[0]
+    assert not (tmp_path / "photo.png").exists()
+
+    wrong_ext = await service.validate_upload(_ChunkedUpload(b"data", "notes.txt"), tmp_path / "notes.txt")
+    assert wrong_ext.is_valid is False
+    assert not (tmp_path / "notes.txt").exists()
+
+
+@pytest.mark.asyncio
+async def test_validate_upload_checks_stored_file_in_place(tmp_path):
+    service_module = _service_module()
+    service = service_module.EnhancedValidationService()
+    stored = tmp_path / "photo.png"
+    Image.new("RGB", (200, 160), (10, 200, 30)).save(stored, format="PNG")
+    data = stored.read_bytes()
+
+    result = await service.validate_upload(None, stored)
+    assert result.is_valid is True, result.errors
+    assert result.file_info["size_bytes"] == len(data)
+    assert result.file_info["width"] == 200
+    assert stored.read_bytes() == data
+
+    disguised = tmp_path / "script.png"
+    disguised.write_bytes(b"#!/bin/sh\necho pwned\n" * 300)
+    rejected = await service.validate_upload(None, disguised)
+    assert rejected.is_valid is False
+    assert disguised.exists()  # a stored file is never removed
+
+    missing = await service.validate_upload(None, tmp_path / "missing.png")
+    assert missing.errors == ["File does not exist"]
+
+
 def _service_module():
     return importlib.import_module("app.services.enhanced_validation_service")
 
@@ -513,11 +615,15 @@ def _make_temp_dir() -> Path:
 class _FakeProcess:
     def __init__(self, returncode=0, stdout=b"", stderr=b""):
         self.returncode = returncode
-        self._stdout = stdout
-        self._stderr = stderr
+        self.stdout = stdout
+        self.stderr = stderr
+
 
-    async def communicate(self):
-        return self._stdout, self._stderr
+def _return(value):
+    def _inner(*args, **kwargs):
+        return value
+
+    return _inner
 
 
 def _async_return(value):
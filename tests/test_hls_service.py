@@ -0,0 +1,126 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+
+def test_select_renditions_never_upscales_and_command_aligns_keyframes():
+    from app.services.hls_service import build_hls_command, select_renditions
+
+    ladder = select_renditions(720, [360, 540, 720, 1080])
+    assert [r.name for r in ladder] == ["360p", "540p", "720p"]
+    # Tiny sources still get the lowest rung
+    assert [r.name for r in select_renditions(240, [360, 540])] == ["360p"]
+
+    cmd = build_hls_command(
+        Path("in.mp4"),
+        Path("out"),
+        ladder,
+        has_audio=True,
+        fps=25.0,
+        segment_seconds=4,
+        threads=2,
+    )
+    assert cmd[cmd.index("-g") + 1] == "100"
+    assert cmd[cmd.index("-keyint_min") + 1] == "100"
+    assert cmd[cmd.index("-sc_threshold") + 1] == "0"
+    assert cmd[cmd.index("-force_key_frames") + 1] == "expr:gte(t,n_forced*4)"
+    assert cmd[cmd.index("-var_stream_map") + 1] == "v:0,a:0,name:360p v:1,a:1,name:540p v:2,a:2,name:720p"
+    assert "split=3[s0][s1][s2]" in cmd[cmd.index("-filter_complex") + 1]
+
+    silent = build_hls_command(Path("in.mp4"), Path("out"), ladder[:1], has_audio=False, fps=None, segment_seconds=4, threads=1)
+    assert "-c:a" not in silent
+    assert silent[silent.index("-var_stream_map") + 1] == "v:0,name:360p"
+
+
+@pytest.mark.asyncio
+async def test_publish_to_yandex_disk_rewrites_playlists_to_proxy(tmp_path):
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.services.hls_service import publish
+
+    out = tmp_path / "hls"
+    (out / "360p").mkdir(parents=True)
+    (out / "master.m3u8").write_text("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=800000\n360p/index.m3u8\n")
+    (out / "360p" / "index.m3u8").write_text("#EXTM3U\n#EXTINF:4.0,\nseg_000.ts\n#EXT-X-ENDLIST\n")
+    (out / "360p" / "seg_000.ts").write_bytes(b"ts")
+    (out / "poster.jpg").write_bytes(b"jpg")
+    uploaded: list[tuple[str, str]] = []
+
+    class _FakeYD(YandexDiskStorageProvider):
+        def __init__(self):
+            super().__init__(oauth_token="token", base_prefix="Vertex")
+
+        async def save_file(self, source_path, destination_path):
+            uploaded.append((destination_path, Path(source_path).read_text(errors="ignore")))
+            return f"yadisk://{destination_path}"
+
+    result = await publish(out, "blobs/ab/abc/hls", _FakeYD(), company_id=7)
+
+    assert result["hls_url"] == "yadisk://blobs/ab/abc/hls/master.m3u8"
+    assert result["poster_url"] == "yadisk://blobs/ab/abc/hls/poster.jpg"
+    # Master playlist goes last so a visible master is always complete
+    assert uploaded[-1][0] == "blobs/ab/abc/hls/master.m3u8"
+    contents = dict(uploaded)
+    assert "/api/storage/yd-file?path=blobs/ab/abc/hls/360p/index.m3u8&company_id=7" in contents["blobs/ab/abc/hls/master.m3u8"]
+    assert "/api/storage/yd-file?path=blobs/ab/abc/hls/360p/seg_000.ts&company_id=7" in contents["blobs/ab/abc/hls/360p/index.m3u8"]
+
+
+@pytest.mark.asyncio
+async def test_publish_for_s3_company_keeps_ladder_local_with_local_urls(tmp_path, monkeypatch):
+    from app.core import storage_providers
+    from app.core.s3_provider import S3StorageProvider
+    from app.services import hls_service as mod
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setattr(mod.settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"))
+    storage_providers.reset_storage_provider()
+    out = tmp_path / "hls"
+    out.mkdir()
+    (out / "master.m3u8").write_text("#EXTM3U\n")
+    (out / "poster.jpg").write_bytes(b"jpg")
+    provider = S3StorageProvider("http://minio:9000", "media", "key", "secret", base_prefix="acme", company_id=3)
+
+    try:
+        result = await mod.publish(out, "blobs/ab/abc/hls", provider, company_id=3)
+    finally:
+        storage_providers.reset_storage_provider()
+
+    assert result["hls_url"] == "/storage/blobs/ab/abc/hls/master.m3u8"
+    assert result["poster_url"] == "/storage/blobs/ab/abc/hls/poster.jpg"
+    assert (tmp_path / "storage" / "blobs" / "ab" / "abc" / "hls" / "master.m3u8").is_file()
+
+@pytest.mark.asyncio
+async def test_worker_bounds_concurrency_and_drops_when_queue_full(monkeypatch):
+    from app.services import hls_service as mod
+
+    monkeypatch.setattr(mod.settings, "VIDEO_HLS_ENABLED", True)
+    monkeypatch.setattr(mod.settings, "VIDEO_HLS_WORKERS", 1)
+    monkeypatch.setattr(mod.settings, "VIDEO_HLS_QUEUE_SIZE", 2)
+    running = 0
+    peak = 0
+    done: list[int] = []
+
+    async def _fake_process(video_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        done.append(video_id)
+
+    monkeypatch.setattr(mod, "process_video_hls", _fake_process)
+    worker = mod.HlsWorker()
+    try:
+        assert worker.submit(1) is True
+        assert worker.submit(1) is True  # already pending, not queued twice
+        assert worker.submit(2) is True
+        assert worker.submit(3) is False  # queue full
+        await worker.join()
+    finally:
+        await worker.stop()
+
+    assert done == [1, 2]
+    assert peak == 1
+
+    monkeypatch.setattr(mod.settings, "VIDEO_HLS_ENABLED", False)
+    assert mod.HlsWorker().submit(4) is False
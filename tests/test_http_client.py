@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core import http_client
+from app.core import storage_providers
+from app.core import yandex_disk_provider
+from app.core.yandex_disk_provider import YandexDiskStorageProvider
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused_and_closed():
+    await http_client.close_http_client()
+    client = http_client.get_http_client()
+    assert http_client.get_http_client() is client
+    assert client.timeout.read == http_client.DEFAULT_TIMEOUT
+
+    await http_client.close_http_client()
+    assert client.is_closed
+    replacement = http_client.get_http_client()
+    assert replacement is not client
+    await http_client.close_http_client()
+    await http_client.close_http_client()  # idempotent
+
+
+@pytest.mark.asyncio
+async def test_client_per_event_loop_and_all_closed_on_shutdown():
+    import asyncio
+    import threading
+
+    await http_client.close_http_client()
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    thread.start()
+
+    async def _get():
+        return http_client.get_http_client()
+
+    try:
+        other = asyncio.run_coroutine_threadsafe(_get(), other_loop).result(5)
+        mine = http_client.get_http_client()
+        assert mine is not other  # the other loop's pool is not replaced (nor leaked)
+        assert asyncio.run_coroutine_threadsafe(_get(), other_loop).result(5) is other
+
+        await http_client.close_http_client()
+        assert mine.is_closed and other.is_closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(5)
+        other_loop.close()
+
+    # A client whose loop has ended is dropped when the next one is created
+    seen = {}
+
+    async def _remember():
+        seen["loop"], seen["client"] = asyncio.get_running_loop(), http_client.get_http_client()
+
+    finished = threading.Thread(target=lambda: asyncio.run(_remember()))
+    finished.start()
+    finished.join(5)
+    assert http_client.get_http_client() is not seen["client"]
+    assert seen["loop"] not in http_client._clients
+    await http_client.close_http_client()
+
+
+@pytest.mark.asyncio
+async def test_yandex_disk_provider_uses_one_pooled_client(monkeypatch):
+    seen: list[tuple[str, str]] = []
+
+    def _handler(request: httpx.Request) -> httpx.Response:
+        seen.append((request.method, request.url.path))
+        assert request.headers["authorization"] == "OAuth token"
+        if request.url.path.endswith("/resources/download"):
+            return httpx.Response(200, json={"href": "https://downloader.example/file"})
+        if request.url.path.endswith("/resources"):
+            return httpx.Response(200, json={"type": "file"})
+        return httpx.Response(404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+    calls = []
+
+    def _get_client():
+        calls.append(client)
+        return client
+
+    monkeypatch.setattr(yandex_disk_provider, "get_http_client", _get_client)
+    provider = YandexDiskStorageProvider(oauth_token="token", base_prefix="Vertex")
+
+    assert await provider.file_exists("a/b.jpg") is True
+    assert await provider.get_download_url("a/b.jpg") == "https://downloader.example/file"
+    assert seen == [("GET", "/v1/disk/resources"), ("GET", "/v1/disk/resources/download")]
+    assert not client.is_closed  # provider calls must not close the shared pool
+    await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_company_provider_is_cached_until_token_or_settings_change(monkeypatch):
+    from app.utils import token_encryption as token_module
+
+    decrypts = []
+
+    def _decrypt(value):
+        decrypts.append(value)
+        return {"access_token": f"access-{value}"}
+
+    monkeypatch.setattr(token_module.token_encryption, "decrypt_credentials", _decrypt)
+    storage_providers.invalidate_company_provider()
+    company = SimpleNamespace(id=5, storage_provider="yandex_disk", yandex_disk_token="enc-1", slug="acme", name="Acme")
+
+    first = await storage_providers.get_provider_for_company(company)
+    assert await storage_providers.get_provider_for_company(company) is first
+    assert decrypts == ["enc-1"]
+
+    company.yandex_disk_token = "enc-2"  # token rotated
+    second = await storage_providers.get_provider_for_company(company)
+    assert second is not first and second._token == "access-enc-2"
+
+    company.slug = "acme-renamed"  # root folder changed
+    third = await storage_providers.get_provider_for_company(company)
+    assert third is not second and third._base_prefix == "acme-renamed"
+
+    storage_providers.invalidate_company_provider(5)
+    assert await storage_providers.get_provider_for_company(company) is not third
+    assert len(decrypts) == 4
+
+    company.storage_provider = "local"
+    assert await storage_providers.get_provider_for_company(company) is storage_providers.get_storage_provider()
+    assert 5 not in storage_providers._company_providers
@@ -0,0 +1,182 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from app.api.routes import images as images_route
+from app.services import image_variant_service as mod
+
+
+def _photo(path, size=(800, 600)):
+    Image.new("RGB", size, (200, 40, 40)).save(path, format="JPEG")
+    return str(path)
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def test_parse_variant_and_negotiation():
+    spec = mod.parse_variant("300x0.webp")
+    assert (spec.width, spec.height, spec.fmt) == (304, 0, "webp")  # snapped to 16 px
+    assert mod.parse_variant("320x240").fmt is None
+    assert mod.parse_variant("320x240.jpeg").fmt == "jpg"
+    assert mod.parse_variant("0x0.jpg") is None
+    assert mod.parse_variant("99999x10.jpg") is None
+    assert mod.parse_variant("320x240.gif") is None
+    assert mod.parse_variant("../etc") is None
+
+    assert mod.negotiate_format("image/webp,*/*") == "webp"
+    assert mod.negotiate_format("*/*") == "jpg"
+    assert mod.negotiate_format(None) == "jpg"
+
+
+def test_variant_urls_change_with_photo(tmp_path):
+    first = mod.variant_url(7, "/storage/a/photo.jpg", 320)
+    assert first.startswith("/img/7/320x0?v=")
+    assert first != mod.variant_url(7, "/storage/b/photo.jpg", 320)
+    assert first != mod.variant_url(8, "/storage/a/photo.jpg", 320)
+    srcset = mod.variant_srcset(7, "/storage/a/photo.jpg", [160, 320])
+    assert srcset.endswith(" 320w") and " 160w, " in srcset
+
+    # A photo replaced under the same path gets a new version
+    photo = _photo(tmp_path / "photo.jpg")
+    before = mod.variant_version(7, photo)
+    assert before == mod.variant_version(7, photo)
+    _photo(tmp_path / "photo.jpg", size=(640, 480))
+    assert mod.variant_version(7, photo) != before
+
+
+@pytest.mark.asyncio
+async def test_get_variant_renders_once_then_serves_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(mod, "run_in_process", _inline)
+    renders = []
+    original_render = mod.render_variant
+
+    def _render(*args):
+        renders.append(args)
+        return original_render(*args)
+
+    monkeypatch.setattr(mod, "render_variant", _render)
+    service = mod.ImageVariantService(cache_dir=tmp_path / "cache")
+    photo = _photo(tmp_path / "photo.jpg")
+    spec = mod.parse_variant("320x320")
+
+    first, second = await asyncio.gather(
+        service.get_variant(1, photo, spec, "webp"),
+        service.get_variant(1, photo, spec, "webp"),
+    )
+    assert first == second
+    assert len(renders) == 1  # single-flight
+    with Image.open(io.BytesIO(first)) as image:
+        assert image.format == "WEBP"
+        assert image.size == (320, 240)
+    assert list((tmp_path / "cache" / "1").rglob("320x320.webp"))
+
+    # Fresh process: memory tier empty, disk tier hit
+    again = mod.ImageVariantService(cache_dir=tmp_path / "cache")
+    assert await again.get_variant(1, photo, spec, "webp") == first
+    assert len(renders) == 1
+
+    await again.discard(1)
+    assert not (tmp_path / "cache" / "1").exists()
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_is_byte_bounded(monkeypatch):
+    monkeypatch.setattr(mod.settings, "IMAGE_VARIANT_MEMORY_BYTES", 1000)
+    service = mod.ImageVariantService()
+    for index in range(5):
+        service._memory_put(f"1/v/{index}", b"x" * 200)
+    service._memory_get("1/v/1")  # refresh → survives the next eviction
+    service._memory_put("1/v/5", b"x" * 200)
+    assert service._memory_bytes <= 1000
+    assert "1/v/0" not in service._memory and "1/v/1" in service._memory
+    service._memory_put("1/v/big", b"x" * 600)  # > budget / 4: not kept in memory
+    assert "1/v/big" not in service._memory
+
+
+@pytest.mark.asyncio
+async def test_image_route_headers_and_version_check(tmp_path, monkeypatch):
+    photo = _photo(tmp_path / "photo.jpg")
+    ar_content = SimpleNamespace(id=3, photo_path=photo, company_id=None)
+
+    class _Db:
+        async def get(self, model, key):
+            return ar_content if key == 3 else None
+
+    async def _variant(content_id, photo_path, spec, fmt, provider=None):
+        return b"variant-bytes"
+
+    monkeypatch.setattr(images_route.image_variant_service, "get_variant", _variant)
+    version = mod.variant_version(3, photo)
+
+    def _request(headers):
+        return SimpleNamespace(headers=headers)
+
+    response = await images_route.get_image_variant(3, "320x0", _request({"accept": "image/webp"}), v=version, db=_Db())
+    assert response.body == b"variant-bytes"
+    assert response.media_type == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["vary"] == "Accept"
+
+    explicit = await images_route.get_image_variant(3, "320x0.jpg", _request({}), v=version, db=_Db())
+    assert explicit.media_type == "image/jpeg" and "vary" not in explicit.headers
+
+    not_modified = await images_route.get_image_variant(
+        3, "320x0.jpg", _request({"if-none-match": explicit.headers["etag"]}), v=version, db=_Db()
+    )
+    assert not_modified.status_code == 304
+
+    for content_id, variant, token in ((3, "320x0", "stale"), (4, "320x0", version), (3, "huge", version)):
+        with pytest.raises(HTTPException) as exc:
+            await images_route.get_image_variant(content_id, variant, _request({}), v=token, db=_Db())
+        assert exc.value.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_image_route_fetches_s3_photo_through_company_provider(tmp_path, monkeypatch):
+    import shutil
+
+    from app.core.s3_provider import S3StorageProvider
+
+    original = _photo(tmp_path / "original.jpg")
+    fetched = []
+
+    class _FakeS3(S3StorageProvider):
+        def __init__(self):
+            super().__init__(endpoint_url="http://s3.local", bucket="media", access_key="a", secret_key="s")
+
+        async def get_file(self, storage_path, local_path):
+            fetched.append(storage_path)
+            shutil.copyfile(original, local_path)
+            return True
+
+    photo_path = "s3://blobs/ab/abc/photo.jpg"
+    ar_content = SimpleNamespace(id=5, photo_path=photo_path, company_id=9)
+    company = SimpleNamespace(id=9, storage_provider="s3")
+
+    class _Db:
+        async def get(self, model, key):
+            return ar_content if model is images_route.ARContent else company
+
+    async def _provider(value):
+        assert value is company
+        return _FakeS3()
+
+    monkeypatch.setattr(mod, "run_in_process", _inline)
+    monkeypatch.setattr(images_route, "get_provider_for_company", _provider)
+    monkeypatch.setattr(images_route, "image_variant_service", mod.ImageVariantService(cache_dir=tmp_path / "cache"))
+    version = mod.variant_version(5, photo_path)
+    assert mod.variant_srcset(5, photo_path, [320]) == f"/img/5/320x0?v={version} 320w"
+
+    for _ in range(2):
+        response = await images_route.get_image_variant(
+            5, "320x0.jpg", SimpleNamespace(headers={}), v=version, db=_Db()
+        )
+        with Image.open(io.BytesIO(response.body)) as image:
+            assert image.format == "JPEG" and image.size == (320, 240)
+    assert fetched == ["blobs/ab/abc/photo.jpg"]  # fetched once per photo version
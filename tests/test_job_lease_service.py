@@ -0,0 +1,57 @@
+import pytest
+
+from app.models import JobLease
+from app.services import job_lease_service as mod
+from app.services.job_lease_service import acquire_lease, leased, release_lease
+
+
+@pytest.mark.asyncio
+async def test_lease_is_exclusive_until_released_or_expired(monkeypatch, sqlite_session_factory):
+    session_factory = await sqlite_session_factory(JobLease)
+    async with session_factory() as db:
+        monkeypatch.setattr(mod, "worker_id", lambda: "host:1")
+        assert await acquire_lease(db, "reconcile", 60)
+        assert await acquire_lease(db, "reconcile", 60)  # renewal by the holder
+
+        monkeypatch.setattr(mod, "worker_id", lambda: "host:2")
+        assert not await acquire_lease(db, "reconcile", 60)
+        assert await acquire_lease(db, "gc", 60)
+        await release_lease(db, "reconcile")  # not the holder: no effect
+        assert not await acquire_lease(db, "reconcile", 60)
+
+        monkeypatch.setattr(mod, "worker_id", lambda: "host:1")
+        await release_lease(db, "reconcile")
+        monkeypatch.setattr(mod, "worker_id", lambda: "host:2")
+        assert await acquire_lease(db, "reconcile", 0)
+
+        # A lease of 0 seconds has already expired
+        monkeypatch.setattr(mod, "worker_id", lambda: "host:3")
+        assert await acquire_lease(db, "reconcile", 60)
+        assert (await db.get(JobLease, "reconcile")).owner == "host:3"
+
+
+@pytest.mark.asyncio
+async def test_leased_job_runs_in_one_worker_and_releases_on_failure(monkeypatch, sqlite_session_factory):
+    session_factory = await sqlite_session_factory(JobLease)
+    monkeypatch.setattr("app.core.database.AsyncSessionLocal", session_factory)
+    runs = []
+
+    @leased("job", 3600)
+    async def job(fail=False):
+        runs.append(mod.worker_id())
+        if fail:
+            raise RuntimeError("boom")
+        return "done"
+
+    monkeypatch.setattr(mod, "worker_id", lambda: "host:1")
+    assert await job() == "done"
+    monkeypatch.setattr(mod, "worker_id", lambda: "host:2")
+    assert await job() is None
+    assert runs == ["host:1"]
+
+    monkeypatch.setattr(mod, "worker_id", lambda: "host:1")
+    with pytest.raises(RuntimeError):
+        await job(fail=True)
+    monkeypatch.setattr(mod, "worker_id", lambda: "host:2")
+    assert await job() == "done"
+    assert runs == ["host:1", "host:1", "host:2"]
@@ -0,0 +1,114 @@
+import cv2
+import numpy as np
+import pytest
+
+
+def _checkerboard() -> np.ndarray:
+    return (np.kron(np.indices((8, 8)).sum(0) % 2, np.ones((32, 32))) * 255).astype(np.uint8)
+
+
+def _texture(height=600, width=800) -> np.ndarray:
+    noise = (np.random.default_rng(0).random((height, width)) * 255).astype(np.uint8)
+    return cv2.GaussianBlur(noise, (3, 3), 0)
+
+
+def test_feature_metrics_penalize_repetitive_symmetric_patterns():
+    from app.utils.marker_analysis import WORKING_LONG_EDGE, analyze_gray, to_working_gray
+
+    checker = analyze_gray(to_working_gray(_checkerboard()))
+    texture = analyze_gray(to_working_gray(_texture()))
+
+    assert texture["working_size"] == [WORKING_LONG_EDGE, 480]
+    assert texture["keypoint_coverage"] > 0.8
+    assert texture["repetition_ratio"] < 0.1
+    assert texture["symmetry"] < 0.2
+    assert checker["repetition_ratio"] > 0.5
+    assert checker["symmetry"] > 0.9
+    assert 0.0 <= checker["recognition_probability"] < 0.35 < 0.6 <= texture["recognition_probability"] <= 1.0
+
+
+def test_jpeg_is_decoded_at_reduced_scale(tmp_path, monkeypatch):
+    from app.utils import marker_analysis as mod
+
+    path = tmp_path / "big.jpg"
+    cv2.imwrite(str(path), _texture(3000, 4000))
+    flags = []
+    real_imread = cv2.imread
+    monkeypatch.setattr(mod.cv2, "imread", lambda p, flag=None: flags.append(flag) or real_imread(p, flag))
+
+    result = mod.analyze_path(str(path))
+
+    assert flags == [cv2.IMREAD_REDUCED_GRAYSCALE_4]
+    assert (result["width"], result["height"]) == (4000, 3000)
+    assert result["metrics"]["working_size"] == [640, 480]
+    assert mod.analyze_path(str(tmp_path / "missing.png")) == {"error": "decode_failed"}
+
+
+class _Upload:
+    def __init__(self, filename: str, data: bytes):
+        self.filename = filename
+        self._data = data
+
+    async def read(self, _size=-1):
+        return self._data
+
+
+def _png(image: np.ndarray) -> bytes:
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+@pytest.mark.asyncio
+async def test_photo_analyze_endpoint_single_and_batch(monkeypatch):
+    from fastapi import HTTPException
+
+    from app.api.routes import ar_content as routes
+    from app.core import process_pool
+
+    calls = []
+
+    async def _inline(func, *args):
+        calls.append(len(args[0]))
+        return func(*args)
+
+    monkeypatch.setattr(process_pool, "run_in_process", _inline)
+
+    single = await routes.analyze_photo_quality(photo_file=_Upload("a.png", _png(_texture(300, 400))), photo_files=None)
+    assert single["quality_level"] in {"good", "fair", "poor"}
+    assert single["resolution"] == {"width": 400, "height": 300}
+    assert "keypoint_coverage" in single["metrics"]
+
+    batch = await routes.analyze_photo_quality(
+        photo_file=None,
+        photo_files=[
+            _Upload("a.png", _png(_texture(300, 400))),
+            _Upload("b.gif", b"GIF89a"),
+            _Upload("c.jpg", b"not an image"),
+            _Upload("d.png", _png(_checkerboard())),
+        ],
+    )
+    assert [r["filename"] for r in batch["results"]] == ["a.png", "b.gif", "c.jpg", "d.png"]
+    assert "error" in batch["results"][1] and "error" in batch["results"][2]
+    assert batch["results"][0]["recognition_probability"] > batch["results"][3]["recognition_probability"]
+    # Whole batch scored in a single pool call
+    assert calls == [1, 3]
+
+    with pytest.raises(HTTPException) as exc_info:
+        await routes.analyze_photo_quality(photo_file=_Upload("c.jpg", b"not an image"), photo_files=None)
+    assert exc_info.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_process_pool_runs_batch_analysis(tmp_path, monkeypatch):
+    from app.core import process_pool
+    from app.utils.marker_analysis import analyze_paths
+
+    monkeypatch.setattr(process_pool.settings, "PROCESS_POOL_WORKERS", 1)
+    path = tmp_path / "t.png"
+    cv2.imwrite(str(path), _texture(120, 160))
+    try:
+        results = await process_pool.run_in_process(analyze_paths, [str(path)])
+    finally:
+        process_pool.shutdown_process_pool()
+
+    assert results[0]["width"] == 160
+    assert 0.0 <= results[0]["metrics"]["recognition_probability"] <= 1.0
@@ -0,0 +1,86 @@
+import hashlib
+
+import pytest
+from PIL import Image
+
+
+@pytest.mark.asyncio
+async def test_derivative_applies_exif_orientation_downscales_and_strips_metadata(tmp_path, monkeypatch):
+    from app.services import marker_derivative_service as mod
+
+    monkeypatch.setattr(mod.settings, "MARKER_DERIVATIVE_LONG_EDGE", 200)
+    monkeypatch.setattr(mod.settings, "MARKER_DERIVATIVE_MODE", "grayscale")
+    monkeypatch.setattr("app.utils.ar_content.build_public_url", lambda path, provider=None: f"/storage/{path.name}")
+
+    source = tmp_path / "photo.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90° CW on display
+    exif[0x010F] = "CameraMaker"
+    Image.new("RGB", (800, 400), (200, 10, 10)).save(source, exif=exif.tobytes())
+
+    derivative = await mod.create_marker_derivative(source, tmp_path)
+
+    marker = tmp_path / "marker.jpg"
+    assert derivative.storage_path == str(marker)
+    assert derivative.url == "/storage/marker.jpg"
+    # Portrait after orientation, long edge capped
+    assert (derivative.width, derivative.height) == (100, 200)
+    assert derivative.size_bytes == marker.stat().st_size
+    assert derivative.sha256 == hashlib.sha256(marker.read_bytes()).hexdigest()
+    with Image.open(marker) as result:
+        assert result.mode == "L"
+        assert result.size == (100, 200)
+        assert not result.getexif()
+    # Original untouched
+    with Image.open(source) as original:
+        assert original.size == (800, 400)
+
+
+def test_render_flattens_alpha_and_never_upscales(tmp_path):
+    from app.services.marker_derivative_service import render_marker_derivative
+
+    source = tmp_path / "logo.png"
+    Image.new("RGBA", (120, 80), (0, 0, 0, 0)).save(source)
+
+    width, height, size_bytes, _sha = render_marker_derivative(
+        source, tmp_path / "marker.jpg", long_edge=1024, mode="jpeg", quality=85
+    )
+
+    assert (width, height) == (120, 80)
+    with Image.open(tmp_path / "marker.jpg") as result:
+        assert result.mode == "RGB"
+        assert result.getpixel((0, 0)) == pytest.approx((255, 255, 255), abs=2)
+
+    # Grayscale markers flatten on white too (transparent is not black)
+    for image_mode, transparent in (("RGBA", (0, 0, 0, 0)), ("LA", (0, 0))):
+        Image.new(image_mode, (120, 80), transparent).save(source)
+        render_marker_derivative(source, tmp_path / "gray.jpg", long_edge=1024, mode="grayscale", quality=85)
+        with Image.open(tmp_path / "gray.jpg") as result:
+            assert result.mode == "L"
+            assert result.getpixel((0, 0)) >= 253
+
+
+def test_reusable_derivative_requires_matching_settings(monkeypatch):
+    from app.services import marker_derivative_service as mod
+
+    monkeypatch.setattr(mod.settings, "MARKER_DERIVATIVE_LONG_EDGE", 1024)
+    monkeypatch.setattr(mod.settings, "MARKER_DERIVATIVE_MODE", "grayscale")
+    cached = {
+        "storage_path": "/s/marker.jpg",
+        "url": "/storage/marker.jpg",
+        "width": 1024,
+        "height": 768,
+        "size_bytes": 1000,
+        "sha256": "ab",
+        "mode": "grayscale",
+        "long_edge": 1024,
+        "source": "original",
+        "quality": mod.derivative_params()["quality"],
+    }
+
+    assert mod.reusable_derivative(cached, "original").url == "/storage/marker.jpg"
+    assert mod.reusable_derivative(cached, "enhanced") is None
+    assert mod.reusable_derivative({**cached, "quality": 60}, "original") is None
+    assert mod.reusable_derivative({**cached, "mode": "jpeg"}, "original") is None
+    monkeypatch.setattr(mod.settings, "MARKER_DERIVATIVE_LONG_EDGE", 512)
+    assert mod.reusable_derivative(cached, "original") is None
@@ -82,13 +82,17 @@ def test_analyze_image_quality_success_missing_and_exception(monkeypatch):
         _write_pattern_image(image_path)
 
         result = service.analyze_image_quality(str(image_path))
-        assert set(result) == {
+        assert {
             "brightness",
             "contrast",
             "sharpness",
             "edge_density",
             "recognition_probability",
-        }
+            "keypoint_count",
+            "keypoint_coverage",
+            "repetition_ratio",
+            "symmetry",
+        } <= set(result)
         assert 0.0 <= result["recognition_probability"] <= 1.0
 
         assert service.analyze_image_quality(str(workdir / "missing.png")) == {}
@@ -100,6 +104,18 @@ def test_analyze_image_quality_success_missing_and_exception(monkeypatch):
         shutil.rmtree(workdir, ignore_errors=True)
 
 
+def test_sharpness_threshold_is_calibrated_for_working_size(tmp_path):
+    service = ARCoreMarkerService()
+    rng = np.random.default_rng(7)
+    texture = cv2.resize(rng.integers(0, 256, (1200, 1600), dtype=np.uint8), (2400, 1800), interpolation=cv2.INTER_CUBIC)
+    sharp, blurred = tmp_path / "sharp.jpg", tmp_path / "blurred.jpg"
+    cv2.imwrite(str(sharp), texture)
+    cv2.imwrite(str(blurred), cv2.GaussianBlur(texture, (0, 0), 4))
+
+    assert service.analyze_image_quality(str(sharp))["sharpness"] >= service._MIN_SHARPNESS
+    assert service.analyze_image_quality(str(blurred))["sharpness"] < service._MIN_SHARPNESS
+
+
 def test_enhance_image_for_marker_success_and_read_failure(monkeypatch):
     service = ARCoreMarkerService()
     workdir = _make_workspace_tempdir()
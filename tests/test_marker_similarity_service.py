@@ -0,0 +1,124 @@
+import random
+
+import numpy as np
+import pytest
+
+
+def test_multi_index_search_matches_brute_force():
+    from app.services.marker_similarity_service import MultiIndexHashIndex
+    from app.utils.image_hash import hamming
+
+    rng = random.Random(7)
+    index = MultiIndexHashIndex()
+    values = {}
+    for key in range(2000):
+        values[key] = rng.getrandbits(64)
+        index.add(key, values[key], group=key % 3)
+    # Plant near-duplicates of key 0 at known distances
+    for offset, flips in enumerate((1, 4, 9, 10, 11), start=10_000):
+        value = values[0]
+        for bit in rng.sample(range(64), flips):
+            value ^= 1 << bit
+        values[offset] = value
+        index.add(offset, value, group=0)
+
+    query = values[0]
+    expected = sorted(
+        (key, hamming(query, value))
+        for key, value in values.items()
+        if hamming(query, value) <= 10 and (key >= 10_000 or key % 3 == 0)
+    )
+    result = index.search(query, 10, group=0)
+    assert sorted(result) == expected
+    assert [distance for _key, distance in result] == sorted(distance for _key, distance in result)
+    assert {10_000, 10_001, 10_002, 10_003} <= {key for key, _ in result}
+    assert 10_004 not in {key for key, _ in result}
+
+    index.discard(10_000)
+    assert 10_000 not in {key for key, _ in index.search(query, 10, group=0)}
+    assert len(index) == len(values) - 1
+
+
+def test_phash_is_stable_for_re_encoded_photo_and_differs_for_other_images(tmp_path):
+    from PIL import Image
+
+    from app.utils.image_hash import from_hex, hamming, hash_image_file
+
+    rng = np.random.default_rng(3)
+    base = (rng.random((60, 80)) * 255).astype(np.uint8)
+    image = Image.fromarray(base).resize((800, 600), Image.BICUBIC).convert("RGB")
+    image.save(tmp_path / "a.png")
+    image.resize((400, 300)).save(tmp_path / "a_small.jpg", quality=70)
+    other = (rng.random((60, 80)) * 255).astype(np.uint8)
+    Image.fromarray(other).resize((800, 600), Image.BICUBIC).save(tmp_path / "b.png")
+
+    a = hash_image_file(str(tmp_path / "a.png"))
+    a_small = hash_image_file(str(tmp_path / "a_small.jpg"))
+    b = hash_image_file(str(tmp_path / "b.png"))
+
+    assert len(a[0]) == 16 and len(a[1]) == 16
+    assert hamming(from_hex(a[0]), from_hex(a_small[0])) <= 6
+    assert hamming(from_hex(a[0]), from_hex(b[0])) > 16
+    assert hash_image_file(str(tmp_path / "missing.png")) is None
+
+
+@pytest.mark.asyncio
+async def test_service_loads_from_db_scopes_by_company_and_drops_deleted_rows(monkeypatch):
+    from sqlalchemy import delete, update
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    from app.core.database import Base
+    from app.models.ar_content import ARContent
+    from app.services import marker_similarity_service as mod
+
+    monkeypatch.setattr(mod.settings, "MARKER_HASH_INDEX_REFRESH_SECONDS", 0)
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: Base.metadata.create_all(sync_conn, tables=[ARContent.__table__]))
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    def _row(id_, company_id, phash):
+        return ARContent(
+            id=id_, project_id=1, company_id=company_id, order_number=f"ORD-{id_}", marker_phash=phash
+        )
+
+    service = mod.MarkerSimilarityService()
+    try:
+        async with session_factory() as db:
+            db.add_all([
+                _row(1, 1, "ffff0000ffff0000"),
+                _row(2, 1, "ffff0000ffff0001"),  # 1 bit away
+                _row(3, 2, "ffff0000ffff0000"),  # other company
+                _row(4, 1, "0000ffff0000ffff"),  # far away
+            ])
+            await db.commit()
+
+            found = await service.find_near_duplicates(db, "ffff0000ffff0000", 1, exclude_id=1)
+            assert [(item["ar_content_id"], item["distance"]) for item in found] == [(2, 1)]
+            assert found[0]["order_number"] == "ORD-2"
+            assert service.size == 4
+
+            # Row added by "another worker" is picked up incrementally
+            db.add(_row(5, 1, "ffff0000ffff0003"))
+            await db.commit()
+            found = await service.find_near_duplicates(db, "ffff0000ffff0000", 1, exclude_id=1)
+            assert [item["ar_content_id"] for item in found] == [2, 5]
+
+            # Row deleted elsewhere is verified away and dropped from the index
+            await db.execute(delete(ARContent).where(ARContent.id == 2))
+            await db.commit()
+            found = await service.find_near_duplicates(db, "ffff0000ffff0000", 1, exclude_id=1)
+            assert [item["ar_content_id"] for item in found] == [5]
+            assert service.size == 4
+
+            # Photo replaced elsewhere: reported with the new hash, then dropped once far away
+            await db.execute(update(ARContent).where(ARContent.id == 5).values(marker_phash="ffff0000ffff0007"))
+            await db.commit()
+            found = await service.find_near_duplicates(db, "ffff0000ffff0000", 1, exclude_id=1)
+            assert [(item["ar_content_id"], item["distance"]) for item in found] == [(5, 3)]
+            await db.execute(update(ARContent).where(ARContent.id == 5).values(marker_phash="0000ffff0000fff0"))
+            await db.commit()
+            assert await service.find_near_duplicates(db, "ffff0000ffff0000", 1, exclude_id=1) == []
+            assert service._index.get(5) == mod.from_hex("0000ffff0000fff0")
+    finally:
+        await engine.dispose()
@@ -0,0 +1,221 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.media_blob import MediaBlob
+
+
+class _Upload:
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+
+    async def read(self, _size=-1):
+        return self._chunks.pop(0) if self._chunks else b""
+
+
+@pytest.mark.asyncio
+async def test_save_uploaded_file_hashed_streams_digest(tmp_path):
+    import hashlib
+
+    from app.utils.ar_content import save_uploaded_file_hashed
+
+    destination = tmp_path / "order" / "photo.jpg"
+    sha256, size = await save_uploaded_file_hashed(_Upload([b"abc", b"def"]), destination)
+
+    assert destination.read_bytes() == b"abcdef"
+    assert size == 6
+    assert sha256 == hashlib.sha256(b"abcdef").hexdigest()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_local_upload_reuses_blob_and_gc_on_last_release(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.services import media_blob_service as mod
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr("app.utils.ar_content.build_public_url", lambda path, provider=None: f"/storage/{path.name}")
+    service = mod.MediaBlobService()
+    session_factory = await sqlite_session_factory(MediaBlob)
+    sha = "ab" + "0" * 62
+
+    async with session_factory() as db:
+        first_staged = tmp_path / "order1" / "photo.jpg"
+        first_staged.parent.mkdir()
+        first_staged.write_bytes(b"same")
+        assert await service.lookup(db, 1, sha, "photo") is None
+        first = await service.store(
+            staged_path=first_staged,
+            sha256=sha,
+            size_bytes=4,
+            kind="photo",
+            original_filename="IMG.JPG",
+            provider=None,
+            existing=None,
+        )
+        assert first.storage_path == str(tmp_path / "blobs" / "ab" / sha / "photo.jpg")
+        assert not first_staged.exists()
+        await service.register(
+            db,
+            company_id=1,
+            stored=first,
+            kind="photo",
+            storage_provider="local",
+            derived={"thumbnail_url": "/storage/thumb.webp"},
+        )
+        await db.commit()
+
+        second_staged = tmp_path / "order2" / "photo.jpg"
+        second_staged.parent.mkdir()
+        second_staged.write_bytes(b"same")
+        existing = await service.lookup(db, 1, sha, "photo")
+        second = await service.store(
+            staged_path=second_staged,
+            sha256=sha,
+            size_bytes=4,
+            kind="photo",
+            original_filename="copy.jpg",
+            provider=None,
+            existing=existing,
+        )
+        assert second.reused is True
+        assert second.storage_path == first.storage_path
+        assert second.derived["thumbnail_url"] == "/storage/thumb.webp"
+        assert not second_staged.exists()
+        blob = await service.register(db, company_id=1, stored=second, kind="photo", storage_provider="local")
+        await db.commit()
+        assert blob.ref_count == 2
+
+        # Other companies never share blobs
+        assert await service.lookup(db, 2, sha, "photo") is None
+
+        assert await service.release(db, 1, first.storage_path) is None
+        collected = await service.release(db, 1, first.storage_path)
+        await db.commit()
+        assert collected.sha256 == sha
+        assert await service.find(db, 1, sha) is None
+        assert Path(first.storage_path).exists()
+
+        await service.purge(collected, db=db)
+        assert not (tmp_path / "blobs" / "ab" / sha).exists()
+
+        # Legacy per-order paths are not blob-managed
+        assert await service.release(db, 1, str(tmp_path / "order1" / "video.mp4")) is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_releases_do_not_lose_references(tmp_path, sqlite_session_factory):
+    from app.services import media_blob_service as mod
+
+    service = mod.MediaBlobService()
+    session_factory = await sqlite_session_factory(MediaBlob)
+    path = str(tmp_path / "blobs" / "ef" / "photo.jpg")
+    async with session_factory() as db:
+        db.add(MediaBlob(company_id=1, sha256="ef" * 32, kind="photo", storage_path=path, ref_count=2))
+        await db.commit()
+
+    async with session_factory() as first, session_factory() as second:
+        # Both requests loaded the row while it still had two references
+        assert (await service.find_by_path(first, 1, path)).ref_count == 2
+        assert (await service.find_by_path(second, 1, path)).ref_count == 2
+        assert await service.release(first, 1, path) is None
+        await first.commit()
+        collected = await service.release(second, 1, path)
+        await second.commit()
+
+    assert collected is not None and collected.sha256 == "ef" * 32
+    async with session_factory() as db:
+        assert await service.find(db, 1, "ef" * 32) is None
+        with pytest.raises(mod.MediaBlobGone):
+            await service.register(
+                db,
+                company_id=1,
+                stored=mod.StoredMedia("ef" * 32, 4, path, "/storage/photo.jpg", None, blob=MediaBlob(id=1)),
+                kind="photo",
+                storage_provider="local",
+            )
+
+@pytest.mark.asyncio
+async def test_purge_keeps_folder_another_company_still_uses(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.services import media_blob_service as mod
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr("app.utils.ar_content.build_public_url", lambda path, provider=None: f"/storage/{path.name}")
+    service = mod.MediaBlobService()
+    session_factory = await sqlite_session_factory(MediaBlob)
+    sha = "aa" + "2" * 62
+
+    async with session_factory() as db:
+        stored = []
+        for company_id in (1, 2):
+            staged = tmp_path / f"order{company_id}" / "photo.jpg"
+            staged.parent.mkdir()
+            staged.write_bytes(b"same")
+            media = await service.store(
+                staged_path=staged,
+                sha256=sha,
+                size_bytes=4,
+                kind="photo",
+                original_filename="photo.jpg",
+                provider=None,
+                existing=await service.lookup(db, company_id, sha, "photo"),
+            )
+            await service.register(db, company_id=company_id, stored=media, kind="photo", storage_provider="local")
+            stored.append(media)
+        await db.commit()
+        assert stored[0].storage_path == stored[1].storage_path
+
+        collected = await service.release(db, 1, stored[0].storage_path)
+        await db.commit()
+        await service.purge(collected, db=db)
+        assert Path(stored[1].storage_path).read_bytes() == b"same"
+
+        collected = await service.release(db, 2, stored[1].storage_path)
+        await db.commit()
+        await service.purge(collected, db=db)
+        assert not (tmp_path / "blobs" / "aa" / sha).exists()
+
+
+@pytest.mark.asyncio
+async def test_remote_store_uploads_once_and_purges_remote_folder(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.services import media_blob_service as mod
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    calls = SimpleNamespace(saved=[], deleted=[])
+
+    class _FakeYD(YandexDiskStorageProvider):
+        def __init__(self):
+            super().__init__(oauth_token="token", base_prefix="Vertex")
+
+        async def save_file(self, source_path, destination_path):
+            calls.saved.append(destination_path)
+            return f"yadisk://{destination_path}"
+
+        async def delete_file(self, storage_path):
+            calls.deleted.append(storage_path)
+            return True
+
+    provider = _FakeYD()
+    sha = "cd" + "1" * 62
+    staged = tmp_path / "video.mp4"
+    staged.write_bytes(b"video")
+
+    stored = await mod.MediaBlobService().store(
+        staged_path=staged,
+        sha256=sha,
+        size_bytes=5,
+        kind="video",
+        original_filename="clip.MP4",
+        provider=provider,
+        existing=None,
+    )
+
+    assert calls.saved == [f"blobs/cd/{sha}/video.mp4"]
+    assert stored.storage_path == f"yadisk://blobs/cd/{sha}/video.mp4"
+    assert stored.local_path is None
+    assert not staged.exists()
+
+    session_factory = await sqlite_session_factory(MediaBlob)
+    monkeypatch.setattr("app.core.database.AsyncSessionLocal", session_factory)
+    await mod.MediaBlobService().purge(mod.CollectedBlob(sha256=sha, storage_provider="yandex_disk"), provider)
+    assert calls.deleted == [f"blobs/cd/{sha}"]
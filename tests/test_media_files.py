@@ -0,0 +1,43 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.api.routes import media_files
+from app.core.config import settings
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_BASE_PATH", str(tmp_path))
+    order = tmp_path / "VertexAR" / "proj" / "001"
+    order.mkdir(parents=True)
+    (order / "photo 1.jpg").write_bytes(b"jpeg")
+    (tmp_path / ".uploads").mkdir()
+    (tmp_path / ".uploads" / "partial").write_bytes(b"secret")
+    (tmp_path.parent / "outside.txt").write_text("nope")
+    app = FastAPI()
+    app.include_router(media_files.router)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_accelerated_mode_hands_authorized_files_to_nginx(storage, monkeypatch):
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_ENABLED", True)
+    async with storage as client:
+        resp = await client.get("/storage/VertexAR/proj/001/photo%201.jpg", headers={"Range": "bytes=0-1"})
+        assert resp.status_code == 200 and resp.content == b""
+        assert resp.headers["x-accel-redirect"] == "/_accel/storage/VertexAR/proj/001/photo%201.jpg"
+        assert resp.headers["content-type"] == "image/jpeg"
+        assert resp.headers["cache-control"] == media_files.STORAGE_CACHE_CONTROL
+
+        for path in ("/storage/.uploads/partial", "/storage/..%2Foutside.txt", "/storage/VertexAR/missing.jpg"):
+            assert (await client.get(path)).status_code == 404, path
+
+
+@pytest.mark.asyncio
+async def test_without_nginx_the_app_serves_the_bytes(storage, monkeypatch):
+    monkeypatch.setattr(settings, "ACCEL_REDIRECT_ENABLED", False)
+    async with storage as client:
+        resp = await client.get("/storage/VertexAR/proj/001/photo%201.jpg", headers={"Range": "bytes=1-2"})
+        assert resp.status_code == 206 and resp.content == b"pe"
+        assert "x-accel-redirect" not in resp.headers
@@ -195,32 +195,21 @@ async def test_list_yandex_folders_returns_directory_payload(monkeypatch):
 
     monkeypatch.setattr(oauth.token_encryption, "decrypt_credentials", lambda value: {"oauth_token": "token-123"})
 
-    class FakeAsyncClient:
-        def __init__(self, timeout):
-            self.timeout = timeout
-
-        async def __aenter__(self):
-            return self
-
-        async def __aexit__(self, exc_type, exc, tb):
-            return False
-
-        async def get(self, url, params, headers):
-            assert params == {"path": "/demo/folder", "limit": 100}
-            assert headers["Authorization"] == "OAuth token-123"
-            return _FakeResponse(
-                200,
-                {
-                    "_embedded": {
-                        "items": [
-                            {"name": "Folder A", "path": "disk:/demo/folder/A", "type": "dir", "created": "c1", "modified": "m1"},
-                            {"name": "file.jpg", "path": "disk:/demo/folder/file.jpg", "type": "file"},
-                        ]
-                    }
-                },
-            )
+    from app.services.yandex_disk_metadata_service import DirectoryListing
+
+    async def fake_list_directory(token, path):
+        assert (token, path) == ("token-123", "/demo/folder")
+        return DirectoryListing(
+            path=path,
+            modified="m0",
+            items=[
+                {"name": "Folder A", "path": "disk:/demo/folder/A", "type": "dir", "created": "c1", "modified": "m1"},
+                {"name": "file.jpg", "path": "disk:/demo/folder/file.jpg", "type": "file"},
+            ],
+            checked_at=0.0,
+        )
 
-    monkeypatch.setattr(oauth.httpx, "AsyncClient", FakeAsyncClient)
+    monkeypatch.setattr(oauth.yd_metadata, "list_directory", fake_list_directory)
 
     result = await oauth.list_yandex_folders(7, path="/demo/folder", db=db)
 
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from app.core.process_pool import map_unordered
+
+
+@pytest.mark.asyncio
+async def test_map_unordered_bounds_concurrency_and_reports_errors():
+    running = 0
+    peak = 0
+
+    async def _work(item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - item))
+        running -= 1
+        if item == 3:
+            raise ValueError("three")
+        return item * 10
+
+    results = {index: outcome async for index, outcome in map_unordered(_work, range(5), 2)}
+    assert peak == 2
+    assert results[0] == 0 and results[4] == 40
+    assert isinstance(results[3], ValueError)
+
+
+@pytest.mark.asyncio
+async def test_map_unordered_cancels_in_flight_work_on_close():
+    cancelled = []
+
+    async def _work(item):
+        try:
+            await asyncio.sleep(0 if item == 0 else 10)
+        except asyncio.CancelledError:
+            cancelled.append(item)
+            raise
+        return item
+
+    stream = map_unordered(_work, range(4), 3)
+    index, outcome = await stream.__anext__()
+    assert (index, outcome) == (0, 0)
+    await stream.aclose()
+    await asyncio.sleep(0)
+    assert sorted(cancelled) == [1, 2]  # item 3 is never submitted
@@ -0,0 +1,99 @@
+import io
+import re
+import zipfile
+
+import pytest
+from PIL import Image
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+async def _collect(stream):
+    return [chunk async for chunk in stream]
+
+
+@pytest.mark.asyncio
+async def test_pdf_sheet_streams_pages_with_valid_xref(monkeypatch):
+    from app.services import qr_sheet_service as mod
+    from app.utils.qr_sheet import LABELS_PER_PAGE
+
+    monkeypatch.setattr(mod, "run_in_process", _inline)
+    labels = [((f"https://example.com/view/{i}", f"ORD-{i}"), f"ORD-{i}") for i in range(LABELS_PER_PAGE + 3)]
+
+    chunks = await _collect(mod.stream_qr_sheet(labels, "pdf"))
+    pdf = b"".join(chunks)
+
+    assert len(chunks) == 4  # header, 2 pages, trailer
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"/Count 2" in pdf
+    startxref = int(re.search(rb"startxref\n(\d+)", pdf).group(1))
+    assert pdf[startxref:].startswith(b"xref")
+    entries = re.findall(rb"(\d{10}) 00000 n", pdf[startxref:])
+    for number, offset in enumerate(entries, start=1):
+        assert pdf[int(offset):].startswith(f"{number} 0 obj".encode())
+
+
+@pytest.mark.asyncio
+async def test_zip_sheet_is_readable_with_unique_names(monkeypatch):
+    from app.services import qr_sheet_service as mod
+
+    monkeypatch.setattr(mod, "run_in_process", _inline)
+    monkeypatch.setattr(mod, "ZIP_BATCH_SIZE", 2)
+    labels = [
+        (("https://example.com/view/a", "A-1"), "A-1"),
+        (("https://example.com/view/b", "A-1"), "A-1"),
+        (("https://example.com/view/c", None), "c"),
+    ]
+
+    chunks = await _collect(mod.stream_qr_sheet(labels, "zip"))
+
+    assert len(chunks) == 4  # one chunk per label + central directory
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.namelist() == ["A-1.png", "A-1_2.png", "c.png"]
+        with Image.open(io.BytesIO(archive.read("c.png"))) as label:
+            assert label.size == (600, 600)
+
+
+@pytest.mark.asyncio
+async def test_render_ordered_bounds_in_flight_batches_and_cancels_on_close(monkeypatch):
+    import asyncio
+
+    from app.services import qr_sheet_service as mod
+
+    monkeypatch.setattr(mod.settings, "QR_SHEET_LOOKAHEAD", 2)
+    submitted = []
+    futures = []
+
+    def _slow(func, batch):
+        submitted.append(batch[0])
+
+        async def _run():
+            await asyncio.sleep(0.01 if batch[0] % 2 else 0.02)
+            return func(batch)
+
+        futures.append(asyncio.ensure_future(_run()))
+        return futures[-1]
+
+    monkeypatch.setattr(mod, "run_in_process", _slow)
+    stream = mod._render_ordered(lambda batch: batch[0], mod._batches(list(range(10)), 1))
+
+    assert await stream.__anext__() == 0
+    assert await stream.__anext__() == 1
+    await stream.aclose()
+    await asyncio.sleep(0)
+    # two in flight initially + one refill per consumed result
+    assert submitted == [0, 1, 2, 3]
+    assert all(future.cancelled() for future in futures[2:])
+
+
+def test_qr_font_is_loaded_once_per_size():
+    from app.utils.ar_content import _load_qr_font, render_qr_label
+
+    _load_qr_font.cache_clear()
+    render_qr_label("https://example.com/view/1", "ORD-1")
+    render_qr_label("https://example.com/view/2", "ORD-2")
+
+    info = _load_qr_font.cache_info()
+    assert info.misses == 2 and info.hits == 2
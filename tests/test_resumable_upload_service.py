@@ -0,0 +1,145 @@
+import base64
+import hashlib
+import os
+import time
+from datetime import timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.models.resumable_upload import ResumableUpload
+from app.services import resumable_upload_service as mod
+
+
+def _metadata(**pairs):
+    return ",".join(f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in pairs.items())
+
+
+async def _body(*chunks, fail=False):
+    for chunk in chunks:
+        yield chunk
+    if fail:
+        raise ConnectionResetError("client went away")
+
+
+@pytest.mark.asyncio
+async def test_chunks_resume_after_drop_and_finished_upload_is_adopted(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.utils.ar_content import save_uploaded_file_hashed
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    session_factory = await sqlite_session_factory(ResumableUpload)
+    payload = os.urandom(3000)
+    async with session_factory() as db:
+        upload = await mod.create_upload(db, str(len(payload)), _metadata(filename="clip.mp4", filetype="video/mp4"))
+        assert (upload.kind, upload.content_type, upload.offset) == ("video", "video/mp4", 0)
+
+        # Connection drops mid-request: what arrived is kept
+        with pytest.raises(ConnectionResetError):
+            await mod.append_chunk(db, upload, "0", _body(payload[:1000], payload[1000:1500], fail=True))
+        assert upload.offset == 1500
+
+        with pytest.raises(mod.UploadError) as stale:
+            await mod.append_chunk(db, upload, "1000", _body(payload[1000:2000]))
+        assert stale.value.status_code == 409
+        with pytest.raises(mod.UploadError) as too_long:
+            await mod.append_chunk(db, upload, "1500", _body(payload[1500:], b"extra"))
+        assert too_long.value.status_code == 413
+        assert upload.offset == 3000  # the in-range part was written
+
+        with pytest.raises(mod.UploadError) as wrong_kind:
+            await mod.claim_completed(db, upload.id, "photo")
+        assert wrong_kind.value.status_code == 422
+
+        staged = await mod.claim_completed(db, upload.id, "video")
+        destination = tmp_path / "order" / "video.mp4"
+        sha256, size = await save_uploaded_file_hashed(staged, destination)
+        assert destination.read_bytes() == payload
+        assert (sha256, size) == (hashlib.sha256(payload).hexdigest(), len(payload))
+        assert not staged.staged_path.exists()  # moved, not copied
+
+        await mod.release(db, [staged])
+        with pytest.raises(mod.UploadError):
+            await mod.get_upload(db, upload.id)
+
+
+@pytest.mark.asyncio
+async def test_create_rejects_bad_requests(tmp_path, monkeypatch, sqlite_session_factory):
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr(mod.settings, "MAX_FILE_SIZE_PHOTO", 100)
+    session_factory = await sqlite_session_factory(ResumableUpload)
+    async with session_factory() as db:
+        cases = [
+            (None, _metadata(filename="a.mp4"), 400),
+            ("10", None, 400),
+            ("10", _metadata(filename="a.exe"), 415),
+            ("10", _metadata(filename="a.mp4", kind="photo"), 415),
+            ("101", _metadata(filename="a.jpg"), 413),
+            ("10", "filename !!!", 400),
+        ]
+        for length, metadata, status in cases:
+            with pytest.raises(mod.UploadError) as exc:
+                await mod.create_upload(db, length, metadata)
+            assert exc.value.status_code == status, (length, metadata)
+
+
+@pytest.mark.asyncio
+async def test_tus_routes_round_trip(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.api.routes import uploads
+    from app.core.database import get_db
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    session_factory = await sqlite_session_factory(ResumableUpload)
+
+    async def _db():
+        async with session_factory() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(uploads.router, prefix="/api/uploads")
+    app.dependency_overrides[get_db] = _db
+    patch_headers = {"Content-Type": mod.UPLOAD_CONTENT_TYPE}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        created = await client.post(
+            "/api/uploads", headers={"Upload-Length": "6", "Upload-Metadata": _metadata(filename="p.jpg")}
+        )
+        assert created.status_code == 201
+        location = created.headers["location"]
+        assert location.startswith("/api/uploads/") and created.headers["tus-resumable"] == "1.0.0"
+
+        first = await client.patch(location, content=b"abc", headers={**patch_headers, "Upload-Offset": "0"})
+        assert first.status_code == 204 and first.headers["upload-offset"] == "3"
+        head = await client.head(location)
+        assert head.headers["upload-offset"] == "3" and head.headers["upload-length"] == "6"
+
+        conflict = await client.patch(location, content=b"def", headers={**patch_headers, "Upload-Offset": "0"})
+        assert conflict.status_code == 409
+        wrong_type = await client.patch(location, content=b"def", headers={"Upload-Offset": "3"})
+        assert wrong_type.status_code == 415
+        done = await client.patch(location, content=b"def", headers={**patch_headers, "Upload-Offset": "3"})
+        assert done.headers["upload-offset"] == "6"
+
+        assert (await client.delete(location)).status_code == 204
+        assert (await client.head(location)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_expire_stale_uploads_removes_rows_and_orphans(tmp_path, monkeypatch, sqlite_session_factory):
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    session_factory = await sqlite_session_factory(ResumableUpload)
+    async with session_factory() as db:
+        stale = await mod.create_upload(db, "10", _metadata(filename="old.mp4"))
+        fresh = await mod.create_upload(db, "10", _metadata(filename="new.mp4"))
+        stale.expires_at = stale.expires_at - timedelta(hours=48)
+        await db.commit()
+        orphan = mod.uploads_dir() / "orphan"
+        orphan.write_bytes(b"x")
+        old = time.time() - 3 * 24 * 3600
+        os.utime(orphan, (old, old))
+
+        assert await mod.expire_stale_uploads(db) == 1
+        assert not os.path.exists(stale.storage_path)
+        assert os.path.exists(fresh.storage_path)
+        assert not orphan.exists()
+        assert (await mod.get_upload(db, fresh.id)).id == fresh.id
@@ -0,0 +1,275 @@
+import json
+import os
+import time
+from dataclasses import asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from app.core.storage_providers import RemoteStorageProvider
+from app.models import ARContent, Company, MediaBlob, SystemSettings, Video
+from app.models.resumable_upload import ResumableUpload
+from app.services import storage_gc_service as mod
+from app.services.image_variant_service import variant_version
+from app.services.storage_gc_service import ReferenceSet, StorageGarbageCollector
+from app.services.yandex_disk_file_cache_service import cache_key
+
+OLD = time.time() - 7 * 86400
+_TABLES = (Company, ARContent, Video, MediaBlob, ResumableUpload, SystemSettings)
+
+
+def _write(path: Path, data: bytes = b"x", old: bool = True) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if old:
+        os.utime(path, (OLD, OLD))
+    return path
+
+
+class _FakeDisk(RemoteStorageProvider):
+    ref_scheme = "yadisk://"
+    provider_name = "yandex_disk"
+
+    def __init__(self, files):
+        self.files = files  # path → (size, modified)
+        self.deleted: list[str] = []
+
+    async def iter_files(self, relative_path="", max_depth=10):
+        for name, (size, _modified) in sorted(self.files.items()):
+            yield name, size
+
+    async def get_file_info(self, storage_path):
+        size, modified = self.files[storage_path]
+        return {"size": size, "modified": modified}
+
+    async def delete_file(self, storage_path):
+        self.deleted.append(storage_path)
+        return self.files.pop(storage_path, None) is not None
+
+    async def save_file(self, source_path, destination_path):
+        raise NotImplementedError
+
+    async def save_file_bytes(self, content, destination_path):
+        raise NotImplementedError
+
+    async def get_file(self, storage_path, local_path):
+        return False
+
+    async def file_exists(self, storage_path):
+        return storage_path in self.files
+
+    def get_public_url(self, storage_path):
+        return self.ref(storage_path)
+
+    async def get_download_url(self, storage_path):
+        return None
+
+    async def get_usage_stats(self, path=""):
+        return {}
+
+
+def test_reference_set_keeps_files_next_to_referenced_ones():
+    refs = ReferenceSet()
+    refs.add("VertexAR/proj/001/photo.jpg")
+    refs.add("blobs/ab/abc/video.mp4")
+
+    assert "VertexAR/proj/001/marker.mind" in refs
+    assert "blobs/ab/abc/renditions/720p/seg_1.ts" in refs
+    assert "VertexAR/proj/002/photo.jpg" not in refs
+    assert "blobs/ab/abd/video.mp4" not in refs
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        ("2026-10-11T08:00:00+00:00", datetime(2026, 10, 11, 8)),
+        ("Sun, 11 Oct 2026 08:00:00 GMT", datetime(2026, 10, 11, 8)),
+        (None, None),
+        ("garbage", None),
+    ],
+)
+def test_parse_modified(value, expected):
+    assert mod._parse_modified(value) == expected
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr(mod.settings, "STORAGE_GC_GRACE_HOURS", 24)
+    monkeypatch.setattr(mod.settings, "STORAGE_GC_QUARANTINE_DAYS", 7)
+    return tmp_path
+
+
+@pytest.mark.asyncio
+async def test_gc_reports_then_quarantines_unreferenced_files(storage, monkeypatch, sqlite_session_factory):
+    from app.models import ARContent, Company, MediaBlob, Video
+    from app.models.resumable_upload import ResumableUpload
+
+    live_photo = _write(storage / "VertexAR" / "proj" / "001" / "photo.jpg")
+    live_marker = _write(storage / "VertexAR" / "proj" / "001" / "marker.mind")
+    orphan = _write(storage / "VertexAR" / "proj" / "002" / "photo.jpg", b"12345")
+    young = _write(storage / "VertexAR" / "proj" / "003" / "photo.jpg", old=False)
+    live_blob = _write(storage / "blobs" / "ab" / "abc" / "video.mp4")
+    orphan_blob = _write(storage / "blobs" / "cd" / "cde" / "video.mp4", b"123")
+    live_preview = _write(storage / "previews" / "video_1" / "anim.webp")
+    orphan_preview = _write(storage / "previews" / "video_9" / "anim.webp")
+    unmanaged = _write(storage / "Demo" / "demo_1" / "photo.jpg")
+
+    version = variant_version(1, str(live_photo))
+    live_variant = _write(storage / ".cache" / "img" / "1" / version / "320x0.webp")
+    stale_variant = _write(storage / ".cache" / "img" / "1" / "0123456789abcdef" / "320x0.webp")
+    deleted_variant = _write(storage / ".cache" / "img" / "7" / "0123456789abcdef" / "320x0.webp")
+
+    yd_live = cache_key(2, "proj/010/photo.jpg")
+    yd_orphan = cache_key(2, "proj/011/photo.jpg")
+    for key, path in ((yd_live, "proj/010/photo.jpg"), (yd_orphan, "proj/011/photo.jpg")):
+        _write(storage / ".cache" / "yd" / key[:2] / key)
+        sidecar = storage / ".cache" / "yd" / key[:2] / f"{key}.json"
+        _write(sidecar, json.dumps({"company_id": 2, "path": path, "size": 1, "etag": "e"}).encode())
+    partial = _write(storage / ".cache" / "yd" / "ff" / "ffff.123.part")
+
+    live_upload = _write(storage / ".uploads" / "u1")
+    orphan_upload = _write(storage / ".uploads" / "u2")
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    disk = _FakeDisk({
+        "proj/010/photo.jpg": (1, "2026-01-01T00:00:00+00:00"),
+        "proj/010/qr_code.png": (1, "2026-01-01T00:00:00+00:00"),
+        "proj/011/photo.jpg": (4, "2026-01-01T00:00:00+00:00"),
+        "proj/012/photo.jpg": (4, now.isoformat() + "+00:00"),
+        "backups/backup_20260101_000000.sql.gz": (9, "2026-01-01T00:00:00+00:00"),
+    })
+
+    async def _provider(company):
+        return disk
+
+    monkeypatch.setattr(mod, "get_provider_for_company", _provider)
+
+    session_factory = await sqlite_session_factory(*_TABLES)
+    async with session_factory() as db:
+        db.add_all([
+            Company(id=1, name="Local", slug="local", storage_provider="local"),
+            Company(id=2, name="Disk", slug="disk", storage_provider="yandex_disk"),
+            ARContent(id=1, project_id=1, company_id=1, order_number="001", photo_path=str(live_photo),
+                      video_url="/storage/blobs/ab/abc/video.mp4"),
+            ARContent(id=2, project_id=2, company_id=2, order_number="010",
+                      photo_path="yadisk://proj/010/photo.jpg"),
+            Video(id=1, ar_content_id=1, filename="v.mp4"),
+            MediaBlob(company_id=1, sha256="abc", kind="video", storage_path=str(live_blob)),
+            ResumableUpload(id="u1", kind="photo", filename="p.jpg", length=1,
+                            storage_path=str(live_upload), expires_at=now + timedelta(hours=1)),
+        ])
+        await db.commit()
+
+        gc = StorageGarbageCollector()
+        report = await gc.run(dry_run=True, db=db)
+
+        assert report.dry_run and report.removed_files == 0 and not report.errors
+        assert orphan.exists() and disk.deleted == []
+        assert report.areas["local"]["files"] == 3  # order 002, blob cde, previews/video_9
+        assert report.areas["local"]["bytes"] == 5 + 3 + 1
+        assert report.areas["img_cache"]["files"] == 2
+        assert report.areas["yd_cache"]["files"] == 3  # copy + sidecar + partial download
+        assert report.areas["uploads"]["files"] == 1
+        assert report.areas["yandex_disk"] == {"files": 1, "bytes": 4, "removed_files": 0, "removed_bytes": 0}
+
+        report = await gc.run(dry_run=False, db=db)
+
+    assert report.removed_files == report.orphan_files == 10
+    for kept in (live_photo, live_marker, young, live_blob, live_preview, unmanaged, live_variant, live_upload,
+                 storage / ".cache" / "yd" / yd_live[:2] / yd_live):
+        assert kept.exists(), kept
+    for gone in (orphan, orphan_blob, orphan_preview, stale_variant, deleted_variant, partial, orphan_upload,
+                 storage / ".cache" / "yd" / yd_orphan[:2] / yd_orphan):
+        assert not gone.exists(), gone
+    assert disk.deleted == ["proj/011/photo.jpg"]
+
+    # Local content is quarantined, emptied folders are pruned
+    day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    assert (storage / ".trash" / day / "VertexAR" / "proj" / "002" / "photo.jpg").read_bytes() == b"12345"
+    assert not (storage / "VertexAR" / "proj" / "002").exists()
+    assert (storage / "blobs").is_dir()
+
+
+@pytest.mark.asyncio
+async def test_gc_purges_expired_quarantine_and_refuses_without_references(storage, sqlite_session_factory):
+    expired = _write(storage / ".trash" / "20200101" / "VertexAR" / "p" / "1.jpg")
+    recent_day = datetime.now(timezone.utc).strftime("%Y%m%d")
+    recent = _write(storage / ".trash" / recent_day / "VertexAR" / "p" / "2.jpg")
+    orphan = _write(storage / "VertexAR" / "p" / "3" / "photo.jpg")
+
+    session_factory = await sqlite_session_factory(*_TABLES)
+    gc = StorageGarbageCollector()
+    async with session_factory() as db:
+        report = await gc.run(dry_run=False, db=db)
+        assert report.errors and report.orphan_files == 0 and orphan.exists()
+
+        from app.models import ARContent
+
+        db.add(ARContent(id=1, project_id=1, company_id=1, order_number="1",
+                         photo_path=str(_write(storage / "VertexAR" / "p" / "1" / "photo.jpg"))))
+        await db.commit()
+        report = await gc.run(dry_run=False, db=db)
+
+        # Every worker serves the report of the last run
+        async with session_factory() as other_worker_db:
+            assert await StorageGarbageCollector().last_report(other_worker_db) == json.loads(
+                json.dumps(asdict(report))
+            )
+
+    assert report.areas["trash"]["removed_files"] == 1
+    assert not expired.exists() and not (storage / ".trash" / "20200101").exists()
+    assert recent.exists()
+    assert not orphan.exists()
+
+
+@pytest.mark.asyncio
+async def test_gc_records_files_it_cannot_remove_and_goes_on(storage, monkeypatch, sqlite_session_factory):
+    from app.models import ARContent
+
+    stuck = _write(storage / ".uploads" / "stuck")
+    gone = _write(storage / ".uploads" / "gone")
+    unlink = os.unlink
+
+    def _unlink(path, *args, **kwargs):
+        if str(path) == str(stuck):
+            raise PermissionError(13, "Permission denied", str(path))
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(mod.os, "unlink", _unlink)
+    session_factory = await sqlite_session_factory(*_TABLES)
+    async with session_factory() as db:
+        db.add(ARContent(id=1, project_id=1, company_id=1, order_number="1",
+                         photo_path=str(_write(storage / "VertexAR" / "p" / "1" / "photo.jpg"))))
+        await db.commit()
+        report = await StorageGarbageCollector().run(dry_run=False, db=db)
+
+    assert report.orphan_files == 2 and report.removed_files == 1
+    assert len(report.errors) == 1 and "uploads:stuck" in report.errors[0]
+    assert stuck.exists() and not gone.exists()
+
+
+@pytest.mark.asyncio
+async def test_scheduled_temp_sweep_only_touches_app_prefixes(tmp_path, monkeypatch):
+    from app.background_tasks import storage_tasks
+
+    monkeypatch.setattr(storage_tasks.tempfile, "gettempdir", lambda: str(tmp_path))
+    monkeypatch.setattr(storage_tasks.settings, "TEMP_FILE_MAX_AGE_HOURS", 1)
+    stale_file = _write(tmp_path / "migrate_abc.mp4")
+    stale_dir = _write(tmp_path / "hls_x" / "seg.ts").parent
+    os.utime(stale_dir, (OLD, OLD))
+    fresh = _write(tmp_path / "scrub_new" / "frame.png", old=False).parent
+    foreign = _write(tmp_path / "other_tool.tmp")
+
+    await storage_tasks.cleanup_app_temp_files()
+
+    assert not stale_file.exists() and not stale_dir.exists()
+    assert fresh.exists() and foreign.exists()
+
+
+def test_gc_report_is_serialisable():
+    report = mod.GcReport(dry_run=True, grace_hours=1, started_at="now")
+    report.found("local", "VertexAR/p/1.jpg", 3)
+    data = json.loads(json.dumps(asdict(report)))
+    assert data["reclaimable_bytes"] == 3 and data["samples"] == ["local:VertexAR/p/1.jpg"]
@@ -0,0 +1,307 @@
+import hashlib
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import storage_providers
+from app.core.storage_providers import RemoteStorageProvider
+from app.models import ARContent, Company, MediaBlob, StorageMigration, StorageMigrationItem, Video
+from app.services import storage_migration_service as mod
+from app.services.storage_migration_service import StorageMigrationService, local_relative, target_relative
+
+_TABLES = (Company, ARContent, Video, MediaBlob, StorageMigration, StorageMigrationItem)
+
+
+class _FakeRemote(RemoteStorageProvider):
+    """In-memory remote storage; ``fail`` paths raise on their first upload."""
+
+    ref_scheme = "yadisk://"
+    provider_name = "yandex_disk"
+
+    def __init__(self, fail=()):
+        self.files: dict[str, bytes] = {}
+        self.fail = set(fail)
+        self.uploads: list[str] = []
+
+    async def save_file(self, source_path, destination_path):
+        self.uploads.append(destination_path)
+        if destination_path in self.fail:
+            self.fail.discard(destination_path)
+            raise ConnectionError("upload interrupted")
+        self.files[destination_path] = Path(source_path).read_bytes()
+        return self.ref(destination_path)
+
+    async def save_file_bytes(self, content, destination_path):
+        self.files[destination_path] = content
+        return self.ref(destination_path)
+
+    async def get_file(self, storage_path, local_path):
+        Path(local_path).write_bytes(self.files[storage_path])
+        return True
+
+    async def get_file_info(self, storage_path):
+        if storage_path not in self.files:
+            return None
+        content = self.files[storage_path]
+        return {"size": len(content), "md5": hashlib.md5(content).hexdigest()}
+
+    async def iter_files(self, relative_path="", max_depth=10):
+        for name, content in sorted(self.files.items()):
+            if name.startswith(f"{relative_path}/"):
+                yield name, len(content)
+
+    async def delete_file(self, storage_path):
+        return self.files.pop(storage_path, None) is not None
+
+    async def file_exists(self, storage_path):
+        return storage_path in self.files
+
+    def get_public_url(self, storage_path):
+        return self.ref(storage_path)
+
+    async def get_download_url(self, storage_path):
+        return None
+
+    async def get_usage_stats(self, path=""):
+        return {}
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    monkeypatch.setattr(mod.settings, "LOCAL_STORAGE_PATH", str(tmp_path))
+    monkeypatch.setattr(mod.settings, "STORAGE_MIGRATION_BATCH_SIZE", 2)
+    storage_providers.reset_storage_provider()
+    yield tmp_path
+    storage_providers.reset_storage_provider()
+
+
+@pytest.mark.parametrize(
+    ("relative", "source", "target", "expected"),
+    [
+        ("VertexAR/proj/001/photo.jpg", "local", "yandex_disk", "proj/001/photo.jpg"),
+        ("blobs/ab/abc/video.mp4", "local", "s3", "blobs/ab/abc/video.mp4"),
+        ("proj/001/photo.jpg", "s3", "local", "VertexAR/proj/001/photo.jpg"),
+        ("previews/video_7/anim.webp", "yandex_disk", "local", "previews/video_7/anim.webp"),
+        ("proj/001/photo.jpg", "yandex_disk", "s3", "proj/001/photo.jpg"),
+    ],
+)
+def test_target_relative_maps_order_folders(relative, source, target, expected):
+    assert target_relative(relative, source, target) == expected
+
+
+def test_local_relative_accepts_paths_and_storage_urls(storage):
+    assert local_relative(str(storage / "VertexAR" / "p" / "1.jpg")) == "VertexAR/p/1.jpg"
+    assert local_relative("http://localhost:8000/storage/VertexAR/p/a%20b.jpg") == "VertexAR/p/a b.jpg"
+    assert local_relative("/storage/blobs/ab/abc/photo.jpg") == "blobs/ab/abc/photo.jpg"
+    assert local_relative("https://cdn.example.com/other.jpg") is None
+    assert local_relative("yadisk://p/1.jpg") is None
+
+
+@pytest.mark.asyncio
+async def test_migration_copies_verifies_rewrites_and_resumes(storage, monkeypatch, sqlite_session_factory):
+    from app.models import ARContent, Company, MediaBlob, StorageMigrationItem
+
+    order = storage / "VertexAR" / "proj" / "001"
+    order.mkdir(parents=True)
+    (order / "photo.jpg").write_bytes(b"photo")
+    (order / "qr_code.png").write_bytes(b"qr")
+    sha = "ab" + "0" * 62
+    blob = storage / "blobs" / "ab" / sha
+    blob.mkdir(parents=True)
+    (blob / "video.mp4").write_bytes(b"video-bytes")
+    (blob / "thumbnail.webp").write_bytes(b"thumb")
+    (storage / "VertexAR" / "other").mkdir()
+    (storage / "VertexAR" / "other" / "unrelated.jpg").write_bytes(b"not ours")
+
+    remote = _FakeRemote(fail={"blobs/ab/" + sha + "/video.mp4"})
+
+    async def _provider_named(company, name):
+        return storage_providers.get_storage_provider() if name == "local" else remote
+
+    monkeypatch.setattr(mod, "provider_named", _provider_named)
+
+    session_factory = await sqlite_session_factory(*_TABLES)
+    service = StorageMigrationService()
+    async with session_factory() as db:
+        db.add(Company(id=1, name="Acme", slug="acme", storage_provider="local"))
+        db.add(ARContent(
+            id=1, project_id=1, company_id=1, order_number="001",
+            photo_path=str(order / "photo.jpg"),
+            photo_url="http://localhost:8000/storage/VertexAR/proj/001/photo.jpg",
+            qr_code_url="/storage/VertexAR/proj/001/qr_code.png",
+            video_url=f"/storage/blobs/ab/{sha}/video.mp4",
+            marker_metadata={"thumbnails": {"small": f"/storage/blobs/ab/{sha}/thumbnail.webp"}},
+        ))
+        db.add(MediaBlob(
+            company_id=1, sha256=sha, kind="video", storage_provider="local",
+            storage_path=str(blob / "video.mp4"), size_bytes=11,
+        ))
+        await db.commit()
+
+        migration = await service.create(db, 1, "yandex_disk")
+        assert migration.source_provider == "local"
+        with pytest.raises(mod.MigrationError) as exc:
+            await service.create(db, 1, "yandex_disk")
+        assert exc.value.status_code == 409
+
+    progress = await service.run(migration.id, session_factory=session_factory)
+    assert progress.status == "failed" and progress.failed_files == 1
+    assert (progress.total_files, progress.copied_files) == (4, 3)
+    assert "proj/001/photo.jpg" in remote.files and "other/unrelated.jpg" not in remote.files
+
+    async with session_factory() as db:
+        await service.check_resumable(db, migration.id)
+        # Nothing is repointed before every file is on the target
+        content = await db.get(ARContent, 1)
+        assert content.photo_path == str(order / "photo.jpg")
+
+    remote.uploads.clear()
+    seen = []
+    progress = await service.run(migration.id, session_factory=session_factory, on_progress=seen.append)
+    assert progress.status == "completed", progress.error_message
+    assert remote.uploads == [f"blobs/ab/{sha}/video.mp4"]
+    assert (progress.copied_files, progress.failed_files, progress.percent) == (4, 0, 100.0)
+    assert seen and seen[-1].status == "completed"
+
+    async with session_factory() as db:
+        content = await db.get(ARContent, 1)
+        assert content.photo_path == "yadisk://proj/001/photo.jpg"
+        assert content.photo_url == "yadisk://proj/001/photo.jpg"
+        assert content.qr_code_url == "yadisk://proj/001/qr_code.png"
+        assert content.video_url == f"yadisk://blobs/ab/{sha}/video.mp4"
+        assert content.marker_metadata == {"thumbnails": {"small": f"yadisk://blobs/ab/{sha}/thumbnail.webp"}}
+        media = (await db.execute(mod.select(MediaBlob))).scalars().one()
+        assert (media.storage_provider, media.storage_path) == ("yandex_disk", f"yadisk://blobs/ab/{sha}/video.mp4")
+        assert (await db.get(Company, 1)).storage_provider == "yandex_disk"
+        items = (await db.execute(mod.select(StorageMigrationItem))).scalars().all()
+        assert all(item.md5 for item in items)
+        assert (storage / "VertexAR" / "proj" / "001" / "photo.jpg").exists()  # sources are kept
+
+
+
+@pytest.mark.asyncio
+async def test_files_uploaded_during_migration_are_caught_up(storage, monkeypatch, sqlite_session_factory):
+    from app.models import ARContent, Company
+
+    first = storage / "VertexAR" / "proj" / "001"
+    first.mkdir(parents=True)
+    (first / "photo.jpg").write_bytes(b"photo")
+    session_factory = await sqlite_session_factory(*_TABLES)
+
+    class _UploadingWhileCopying(_FakeRemote):
+        """A new order is created while the first file is being copied."""
+
+        async def save_file(self, source_path, destination_path):
+            if not self.uploads:
+                late = storage / "VertexAR" / "proj" / "002"
+                late.mkdir(parents=True)
+                (late / "photo.jpg").write_bytes(b"late photo")
+                async with session_factory() as other:
+                    other.add(ARContent(id=2, project_id=1, company_id=1, order_number="002",
+                                        photo_path=str(late / "photo.jpg")))
+                    await other.commit()
+            return await super().save_file(source_path, destination_path)
+
+    remote = _UploadingWhileCopying()
+    monkeypatch.setattr(
+        mod, "provider_named",
+        lambda company, name: _resolved(storage_providers.get_storage_provider() if name == "local" else remote),
+    )
+    service = StorageMigrationService()
+    async with session_factory() as db:
+        db.add(Company(id=1, name="Acme", slug="acme", storage_provider="local"))
+        db.add(ARContent(id=1, project_id=1, company_id=1, order_number="001",
+                         photo_path=str(first / "photo.jpg"),
+                         # The file is gone: nothing to copy, the switch is not held back
+                         qr_code_url="/storage/VertexAR/proj/001/missing/qr_code.png"))
+        await db.commit()
+        migration = await service.create(db, 1, "yandex_disk")
+
+    progress = await service.run(migration.id, session_factory=session_factory)
+
+    assert progress.status == "completed", progress.error_message
+    assert (progress.total_files, progress.copied_files) == (2, 2)
+    assert remote.files["proj/002/photo.jpg"] == b"late photo"
+    async with session_factory() as db:
+        assert (await db.get(ARContent, 2)).photo_path == "yadisk://proj/002/photo.jpg"
+        assert (await db.get(Company, 1)).storage_provider == "yandex_disk"
+
+
+async def _resolved_none(*_args, **_kwargs):
+    return None
+
+
+@pytest.mark.asyncio
+async def test_catch_up_fails_instead_of_switching_while_uploads_continue(monkeypatch):
+    service = StorageMigrationService()
+    migration = SimpleNamespace(source_provider="local", failed_files=0, status="rewriting", company_id=1)
+    db = SimpleNamespace(commit=_resolved_none)
+
+    async def _roots(db, migration):
+        return ["VertexAR/proj/new"]
+
+    async def _one_more_file(db, migration, source, roots, planned=None):
+        return 1
+
+    monkeypatch.setattr(service, "_source_roots", _roots)
+    monkeypatch.setattr(service, "_add_items", _one_more_file)
+    monkeypatch.setattr(service, "_copy", _resolved_none)
+    monkeypatch.setattr(service, "_rewrite", _resolved_none)
+    monkeypatch.setattr(mod, "_log_fields", lambda migration: {})
+
+    with pytest.raises(mod.MigrationError, match="not switched"):
+        await service._catch_up(db, migration, None, None, None, mod.logger, None)
+
+
+@pytest.mark.asyncio
+async def test_remote_to_local_migration_verifies_local_copies(storage, monkeypatch, sqlite_session_factory):
+    from app.models import Company, MediaBlob
+
+    remote = _FakeRemote()
+    sha = "cd" + "1" * 62
+    remote.files[f"blobs/cd/{sha}/photo.jpg"] = b"remote photo"
+    monkeypatch.setattr(
+        mod, "provider_named",
+        lambda company, name: _resolved(storage_providers.get_storage_provider() if name == "local" else remote),
+    )
+
+    session_factory = await sqlite_session_factory(*_TABLES)
+    service = StorageMigrationService()
+    async with session_factory() as db:
+        db.add(Company(id=1, name="Acme", slug="acme", storage_provider="yandex_disk"))
+        db.add(MediaBlob(
+            company_id=1, sha256=sha, kind="photo", storage_provider="yandex_disk",
+            storage_path=f"yadisk://blobs/cd/{sha}/photo.jpg", public_url=f"yadisk://blobs/cd/{sha}/photo.jpg",
+        ))
+        await db.commit()
+        migration = await service.create(db, 1, "local")
+
+    progress = await service.run(migration.id, session_factory=session_factory)
+
+    assert progress.status == "completed", progress.error_message
+    assert (storage / "blobs" / "cd" / sha / "photo.jpg").read_bytes() == b"remote photo"
+    async with session_factory() as db:
+        media = (await db.execute(mod.select(MediaBlob))).scalars().one()
+        assert media.storage_path == str(storage / "blobs" / "cd" / sha / "photo.jpg")
+        assert media.public_url == f"/storage/blobs/cd/{sha}/photo.jpg"
+
+
+async def _resolved(value):
+    return value
+
+
+def test_progress_reports_throughput():
+    from datetime import timedelta
+
+    started = mod._utcnow() - timedelta(seconds=10)
+    migration = SimpleNamespace(
+        id=1, company_id=1, source_provider="local", target_provider="s3", status="copying",
+        total_files=10, copied_files=5, failed_files=0, total_bytes=2000, copied_bytes=1000,
+        run_copied_bytes=500, rewritten_rows=0, error_message=None, started_at=started, finished_at=None,
+    )
+    progress = mod.MigrationProgress.of(migration)
+    assert progress.percent == 50.0
+    assert 45 <= progress.bytes_per_second <= 50
+    assert 19 <= progress.eta_seconds <= 21
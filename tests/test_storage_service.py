@@ -47,31 +47,28 @@ def test_local_storage_adapter_directory_delete_and_missing_file():
         shutil.rmtree(workdir, ignore_errors=True)
 
 
-def test_local_storage_adapter_storage_usage_and_fallback(monkeypatch):
+def test_local_storage_adapter_storage_usage_is_incremental(monkeypatch):
     workdir = _make_workspace_tempdir()
+    mod.storage_usage.reset()
     try:
         adapter = mod.LocalStorageAdapter(base_path=str(workdir), public_url_base="/storage")
-        (workdir / "one.bin").write_bytes(b"a" * 10)
-        (workdir / "two.bin").write_bytes(b"b" * 20)
+        adapter.save_file("one.mp4", b"a" * 10)
+        adapter.save_file("nested/two.jpg", b"b" * 20)
+        adapter.save_file("nested/two.jpg", b"b" * 25)  # overwrite: same file count
 
+        # Usage comes from the accounting, never from walking the tree
+        monkeypatch.setattr(Path, "rglob", lambda self, pattern: (_ for _ in ()).throw(AssertionError("walked")))
         stats = adapter.get_storage_usage()
         assert stats["total_files"] == 2
-        assert stats["total_size_bytes"] == 30
+        assert stats["total_size_bytes"] == 35
+        assert stats["by_kind"]["video"] == {"total_bytes": 10, "file_count": 1}
         assert stats["exists"] is True
 
-        original_rglob = Path.rglob
-
-        def _broken_rglob(self, pattern):
-            if self == adapter.base_path:
-                raise OSError("scan failed")
-            return original_rglob(self, pattern)
-
-        monkeypatch.setattr(Path, "rglob", _broken_rglob)
-        failed = adapter.get_storage_usage()
-        assert failed["total_files"] == 0
-        assert failed["total_size_bytes"] == 0
-        assert failed["exists"] is False
+        assert adapter.delete_file("nested") is True
+        stats = adapter.get_storage_usage()
+        assert (stats["total_files"], stats["total_size_bytes"]) == (1, 10)
     finally:
+        mod.storage_usage.reset()
         shutil.rmtree(workdir, ignore_errors=True)
 
 
@@ -0,0 +1,99 @@
+import pytest
+
+from app.models import ARContent, BackupHistory, Company, MediaBlob, StorageUsage, Video
+from app.services import storage_usage_service as mod
+from app.services.storage_usage_service import StorageUsageTracker, usage_scope
+
+_TABLES = (Company, ARContent, Video, MediaBlob, BackupHistory, StorageUsage)
+
+
+@pytest.mark.parametrize(
+    ("path", "kind"),
+    [
+        ("VertexAR/proj/001/qr_code.png", "qr"),
+        ("blobs/ab/abc/photo.jpg", "photo"),
+        ("blobs/ab/abc/video.MP4", "video"),
+        ("blobs/ab/abc/thumbnail.png", "thumbnail"),
+        ("previews/video_7/anim.webp", "thumbnail"),
+        ("backups/backup_20261018_120000.sql.gz", "backup"),
+        ("VertexAR/proj/001/marker.mind", "other"),
+    ],
+)
+def test_classify_path(path, kind):
+    assert mod.classify_path(path) == kind
+
+
+@pytest.mark.asyncio
+async def test_deltas_are_attributed_and_flushed_incrementally(sqlite_session_factory):
+    session_factory = await sqlite_session_factory(*_TABLES)
+    tracker = StorageUsageTracker()
+    with usage_scope(1, 10):
+        tracker.record_saved("blobs/aa/1/photo.jpg", 100)
+        tracker.record_saved("blobs/aa/1/video.mp4", 1000)
+        tracker.record_saved("VertexAR/p/001/qr_code.png", 10)
+        tracker.record_saved("VertexAR/p/001/qr_code.png", 12, previous_size=10)  # regenerated
+    tracker.record_saved("backup_1.sql.gz", 50, company_id=2)
+
+    # Readers see pending deltas before any flush
+    assert tracker.summary(company_id=1)["total_bytes"] == 1112
+    assert tracker.summary(company_id=1, project_id=10)["by_kind"]["qr"] == {"total_bytes": 12, "file_count": 1}
+
+    async with session_factory() as db:
+        assert await tracker.flush(db) == 4
+        tracker.record_deleted("blobs/aa/1/video.mp4", 1000, company_id=1, project_id=10)
+        assert await tracker.flush(db) == 1
+
+        fresh = StorageUsageTracker()  # another worker
+        await fresh.load(db)
+    summary = fresh.summary(company_id=1)
+    assert (summary["total_bytes"], summary["file_count"]) == (112, 2)
+    assert summary["by_kind"]["video"] == {"total_bytes": 0, "file_count": 0}
+    assert fresh.by_company()[2] == {"total_bytes": 50, "file_count": 1}
+
+
+@pytest.mark.asyncio
+async def test_reconcile_rebuilds_table_from_local_and_yandex_disk(tmp_path, monkeypatch, sqlite_session_factory):
+    from app.core import storage_providers
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.models import ARContent, Company
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path))
+    order = tmp_path / "VertexAR" / "proj" / "001"
+    order.mkdir(parents=True)
+    (order / "photo.jpg").write_bytes(b"p" * 40)
+    (order / "thumbnail.png").write_bytes(b"t" * 4)  # written in place, never reported
+    (order / "qr_code.png").write_bytes(b"q" * 3)
+    (tmp_path / "stray.bin").write_bytes(b"s" * 7)
+    (tmp_path / ".uploads").mkdir()
+    (tmp_path / ".uploads" / "partial").write_bytes(b"u" * 100)
+
+    class _Disk(YandexDiskStorageProvider):
+        async def iter_files(self, relative_path="", max_depth=10):
+            yield "blobs/cd/1/video.mp4", 500
+            yield "backups/backup_1.sql.gz", 60
+
+    async def _provider(company):
+        return _Disk(oauth_token="t", base_prefix="acme", company_id=company.id)
+
+    monkeypatch.setattr(storage_providers, "get_provider_for_company", _provider)
+
+    session_factory = await sqlite_session_factory(*_TABLES)
+    tracker = StorageUsageTracker()
+    async with session_factory() as db:
+        db.add(Company(id=2, name="Acme", slug="acme", storage_provider="yandex_disk"))
+        db.add(ARContent(id=1, company_id=1, project_id=10, order_number="001",
+                         photo_path=str(order / "photo.jpg")))
+        db.add(ARContent(id=2, company_id=2, project_id=20, order_number="002",
+                         video_path="yadisk://blobs/cd/1/video.mp4"))
+        await db.commit()
+
+        tracker.record_saved("stale.jpg", 999)  # pending drift is discarded by the scan
+        await tracker.reconcile(db)
+
+    local = tracker.summary(company_id=1, project_id=10)["by_kind"]
+    assert local["photo"] == {"total_bytes": 40, "file_count": 1}
+    assert local["thumbnail"] == {"total_bytes": 4, "file_count": 1}
+    assert local["qr"] == {"total_bytes": 3, "file_count": 1}
+    assert tracker.summary(company_id=0)["total_bytes"] == 7  # unattributed, .uploads skipped
+    assert tracker.summary(company_id=2, project_id=20)["by_kind"]["video"]["total_bytes"] == 500
+    assert tracker.summary(company_id=2, project_id=0)["by_kind"]["backup"]["total_bytes"] == 60
@@ -0,0 +1,120 @@
+import json
+import struct
+from pathlib import Path
+
+import pytest
+
+
+def _box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+class _Process:
+    def __init__(self, returncode=0, stdout=b"", stderr=b"", on_run=None):
+        self.returncode = returncode
+        self._stdout = stdout
+        self._stderr = stderr
+        self._on_run = on_run
+
+    async def communicate(self):
+        if self._on_run:
+            self._on_run()
+        return self._stdout, self._stderr
+
+
+def _probe(video_codec="h264", audio_codec="aac"):
+    streams = [{"codec_type": "video", "codec_name": video_codec, "width": 1280, "height": 720, "r_frame_rate": "30/1"}]
+    if audio_codec:
+        streams.append({"codec_type": "audio", "codec_name": audio_codec})
+    return {"format": {"duration": "9.6", "format_name": "mov,mp4,m4a,3gp,3g2,mj2", "bit_rate": "1000"}, "streams": streams}
+
+
+def test_moov_before_mdat_walks_top_level_boxes(tmp_path):
+    from app.services.video_ingest_service import moov_before_mdat
+
+    faststart = tmp_path / "fast.mp4"
+    faststart.write_bytes(_box(b"ftyp", b"isom") + _box(b"moov", b"x" * 16) + _box(b"mdat", b"y" * 32))
+    tail = tmp_path / "tail.mp4"
+    tail.write_bytes(_box(b"ftyp", b"isom") + _box(b"mdat", b"y" * 32) + _box(b"moov", b"x" * 16))
+    garbage = tmp_path / "garbage.mp4"
+    garbage.write_bytes(b"\x00\x00\x00\x02junk")
+
+    assert moov_before_mdat(faststart) is True
+    assert moov_before_mdat(tail) is False
+    assert moov_before_mdat(garbage) is None
+
+
+@pytest.mark.asyncio
+async def test_ingest_probes_once_and_remuxes_moov_at_end(tmp_path, monkeypatch):
+    from app.services import video_ingest_service as mod
+
+    video = tmp_path / "video.mp4"
+    video.write_bytes(_box(b"ftyp", b"isom") + _box(b"mdat", b"y" * 32) + _box(b"moov", b"x" * 16))
+    remuxed_bytes = _box(b"ftyp", b"isom") + _box(b"moov", b"x" * 16) + _box(b"mdat", b"y" * 32)
+    calls: list[tuple] = []
+
+    async def _exec(*args, **_kwargs):
+        calls.append(args)
+        if args[0] == "ffprobe":
+            return _Process(stdout=json.dumps(_probe()).encode())
+        assert args[args.index("-movflags") + 1] == "+faststart"
+        assert args[args.index("-c") + 1] == "copy"
+        return _Process(on_run=lambda: Path(args[-1]).write_bytes(remuxed_bytes))
+
+    monkeypatch.setattr(mod.asyncio, "create_subprocess_exec", _exec)
+
+    result = await mod.ingest_video(video)
+
+    assert [c[0] for c in calls] == ["ffprobe", "ffmpeg"]
+    assert result.remuxed is True and result.faststart is True
+    assert video.read_bytes() == remuxed_bytes
+    assert list(tmp_path.iterdir()) == [video]
+    assert result.mime_type == "video/mp4"
+    assert (result.duration, result.width, result.height, result.codec) == (9.6, 1280, 720, "h264")
+    assert result.size_bytes == len(remuxed_bytes)
+
+
+@pytest.mark.asyncio
+async def test_ingest_skips_remux_when_not_needed_or_incompatible(tmp_path, monkeypatch):
+    from app.services import video_ingest_service as mod
+
+    calls: list[str] = []
+    payload = {"probe": _probe()}
+
+    async def _exec(*args, **_kwargs):
+        calls.append(args[0])
+        return _Process(stdout=json.dumps(payload["probe"]).encode())
+
+    monkeypatch.setattr(mod.asyncio, "create_subprocess_exec", _exec)
+
+    fast = tmp_path / "fast.mov"
+    fast.write_bytes(_box(b"ftyp", b"qt  ") + _box(b"moov") + _box(b"mdat", b"y"))
+    result = await mod.ingest_video(fast)
+    assert result.skipped_reason == "already_faststart"
+    assert result.mime_type == "video/quicktime"
+
+    payload["probe"] = _probe(video_codec="prores", audio_codec="pcm_s16le")
+    tail = tmp_path / "tail.mp4"
+    tail.write_bytes(_box(b"ftyp", b"isom") + _box(b"mdat", b"y") + _box(b"moov"))
+    result = await mod.ingest_video(tail)
+    assert result.skipped_reason == "incompatible_codecs"
+    assert result.remuxed is False
+    assert calls == ["ffprobe", "ffprobe"]
+
+
+@pytest.mark.asyncio
+async def test_ingest_without_ffprobe_falls_back_to_extension(tmp_path, monkeypatch):
+    from app.services import video_ingest_service as mod
+
+    async def _missing(*_args, **_kwargs):
+        raise FileNotFoundError("ffprobe")
+
+    monkeypatch.setattr(mod.asyncio, "create_subprocess_exec", _missing)
+    video = tmp_path / "clip.webm"
+    video.write_bytes(b"webm")
+
+    result = await mod.ingest_video(video)
+
+    assert result.skipped_reason == "ffprobe_missing"
+    assert result.mime_type == "video/webm"
+    assert result.size_bytes == 4
@@ -0,0 +1,116 @@
+from pathlib import Path
+
+import pytest
+
+
+def test_sprite_layout_and_vtt_cover_the_whole_video():
+    from app.services.video_preview_service import build_sprite_vtt, sprite_layout
+
+    layout = sprite_layout(60.0, 1920, 1080, frames=20, columns=5, tile_width=160)
+    assert (layout.frames, layout.columns, layout.rows) == (20, 5, 4)
+    assert (layout.tile_width, layout.tile_height) == (160, 90)
+    assert layout.interval == pytest.approx(3.0)
+    assert layout.region(7) == (320, 90, 160, 90)
+
+    vtt = build_sprite_vtt(layout, 60.0, "sprites.jpg")
+    assert vtt.startswith("WEBVTT\n")
+    assert "00:00:00.000 --> 00:00:03.000\nsprites.jpg#xywh=0,0,160,90" in vtt
+    assert "00:00:57.000 --> 00:01:00.000\nsprites.jpg#xywh=640,270,160,90" in vtt
+    assert vtt.count(" --> ") == 20
+
+    # Very short clips get fewer tiles
+    short = sprite_layout(2.0, 640, 480, frames=20, columns=5, tile_width=160)
+    assert (short.frames, short.columns, short.rows) == (4, 4, 1)
+
+
+def test_ffmpeg_commands(monkeypatch):
+    from app.services import video_preview_service as mod
+
+    monkeypatch.setattr(mod.settings, "VIDEO_PREVIEW_SECONDS", 3.0)
+    preview = mod.build_animated_preview_command(Path("in.mp4"), Path("preview.webp"), 40.0)
+    assert preview[preview.index("-ss") + 1] == "4.000"  # skip the first 10 %
+    assert preview[preview.index("-t") + 1] == "3.000"
+    assert preview[preview.index("-c:v") + 1] == "libwebp"
+    assert preview[preview.index("-loop") + 1] == "0"
+    assert "-an" in preview
+
+    layout = mod.sprite_layout(60.0, 1280, 720, frames=20, columns=5, tile_width=160)
+    sprite = mod.build_sprite_command(Path("in.mp4"), Path("sprites.jpg"), layout)
+    assert sprite[sprite.index("-vf") + 1] == "fps=1/3.000000,scale=160:90,tile=5x4"
+    assert sprite[sprite.index("-frames:v") + 1] == "1"
+
+
+@pytest.mark.asyncio
+async def test_publish_to_yandex_disk_points_cues_at_proxy(tmp_path):
+    from app.core.yandex_disk_provider import YandexDiskStorageProvider
+    from app.services.video_preview_service import publish_scrub_assets, sprite_layout
+
+    out = tmp_path / "preview"
+    out.mkdir()
+    (out / "preview.webp").write_bytes(b"webp")
+    (out / "sprites.jpg").write_bytes(b"jpg")
+    (out / "sprites.vtt").write_text("WEBVTT\n")
+    uploaded: list[tuple[str, str]] = []
+
+    class _FakeYD(YandexDiskStorageProvider):
+        def __init__(self):
+            super().__init__(oauth_token="token", base_prefix="Vertex")
+
+        async def save_file(self, source_path, destination_path):
+            uploaded.append((destination_path, Path(source_path).read_text(errors="ignore")))
+            return f"yadisk://{destination_path}"
+
+    layout = sprite_layout(10.0, 640, 360, frames=4, columns=2, tile_width=160)
+    result = await publish_scrub_assets(out, "blobs/ab/abc/preview", _FakeYD(), 7, layout, 10.0)
+
+    assert result["animated_preview_url"] == "yadisk://blobs/ab/abc/preview/preview.webp"
+    assert result["sprite_vtt_url"] == "yadisk://blobs/ab/abc/preview/sprites.vtt"
+    assert result["sprite"]["frames"] == 4
+    assert uploaded[-1][0] == "blobs/ab/abc/preview/sprites.vtt"
+    assert "/api/storage/yd-file?path=blobs/ab/abc/preview/sprites.jpg&company_id=7#xywh=0,0,160,90" in uploaded[-1][1]
+
+
+@pytest.mark.asyncio
+async def test_publish_for_s3_company_bakes_local_urls_into_cues(tmp_path, monkeypatch):
+    from app.core import storage_providers
+    from app.core.s3_provider import S3StorageProvider
+    from app.services import video_preview_service as mod
+
+    monkeypatch.setattr(mod.settings, "STORAGE_BASE_PATH", str(tmp_path / "storage"))
+    monkeypatch.setattr(mod.settings, "LOCAL_STORAGE_PATH", str(tmp_path / "storage"))
+    storage_providers.reset_storage_provider()
+    out = tmp_path / "preview"
+    out.mkdir()
+    (out / "preview.webp").write_bytes(b"webp")
+    (out / "sprites.jpg").write_bytes(b"jpg")
+    provider = S3StorageProvider("http://minio:9000", "media", "key", "secret", base_prefix="acme", company_id=3)
+    layout = mod.sprite_layout(10.0, 640, 360, frames=4, columns=2, tile_width=160)
+
+    try:
+        result = await mod.publish_scrub_assets(out, "blobs/ab/abc/preview", provider, 3, layout, 10.0)
+    finally:
+        storage_providers.reset_storage_provider()
+
+    assert result["animated_preview_url"] == "/storage/blobs/ab/abc/preview/preview.webp"
+    assert result["sprite_url"] == "/storage/blobs/ab/abc/preview/sprites.jpg"
+    assert result["sprite_vtt_url"] == "/storage/blobs/ab/abc/preview/sprites.vtt"
+    vtt = (tmp_path / "storage" / "blobs" / "ab" / "abc" / "preview" / "sprites.vtt").read_text()
+    assert "/storage/blobs/ab/abc/preview/sprites.jpg#xywh=0,0,160,90" in vtt
+    assert "s3://" not in vtt
+
+@pytest.mark.asyncio
+async def test_generate_scrub_assets_is_best_effort(tmp_path, monkeypatch):
+    from app.services import video_preview_service as mod
+
+    async def _no_ffprobe(path):
+        raise FileNotFoundError("ffprobe")
+
+    monkeypatch.setattr(mod, "probe_video", _no_ffprobe)
+    assert await mod.generate_scrub_assets(tmp_path / "in.mp4", "previews/video_1", None, 1) is None
+
+    monkeypatch.setattr(mod.settings, "VIDEO_SCRUB_PREVIEW_ENABLED", False)
+    assert await mod.generate_scrub_assets(tmp_path / "in.mp4", "previews/video_1", None, 1) is None
+
+    video = type("V", (), {})()
+    mod.apply_scrub_preview(video, {"animated_preview_url": "a", "sprite_url": "b", "sprite_vtt_url": "c"})
+    assert (video.animated_preview_url, video.sprite_url, video.sprite_vtt_url) == ("a", "b", "c")
@@ -14,8 +14,9 @@ def test_video_helper_functions_handle_yadisk_and_subscription_presets():
     two_years = videos.parse_subscription_preset("2y")
     iso_value = videos.parse_subscription_preset("2030-01-02T03:04:05Z")
 
-    assert videos._is_yadisk_path("yadisk://company/video.mp4") is True
-    assert videos._is_yadisk_path("/storage/video.mp4") is False
+    assert videos._is_remote_path("yadisk://company/video.mp4") is True
+    assert videos._is_remote_path("s3://company/video.mp4") is True
+    assert videos._is_remote_path("/storage/video.mp4") is False
     now_utc = datetime.now(timezone.utc).replace(tzinfo=None)
     assert 360 <= (one_year - now_utc).days <= 366
     assert 725 <= (two_years - now_utc).days <= 731
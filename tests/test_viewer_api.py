@@ -223,6 +223,8 @@ async def test_build_manifest_returns_payload_and_updates_rotation(monkeypatch):
         photo_url="/storage/photos/marker.jpg",
         photo_path=None,
         marker_status="ready",
+        marker_url="/storage/blobs/ab/abc/marker.jpg",
+        marker_metadata={"derivative": {"size_bytes": 1234, "sha256": "f00d"}},
         order_number="ORD-11",
     )
     video = SimpleNamespace(
@@ -230,6 +232,9 @@ async def test_build_manifest_returns_payload_and_updates_rotation(monkeypatch):
         filename="clip.mp4",
         video_url="/storage/videos/clip.mp4",
         preview_url="/storage/videos/clip-preview.jpg",
+        hls_url="/storage/blobs/ab/abc/hls/master.m3u8",
+        hls_status="ready",
+        poster_url="/storage/blobs/ab/abc/hls/poster.jpg",
         duration=15,
         width=1080,
         height=1920,
@@ -273,6 +278,11 @@ async def test_build_manifest_returns_payload_and_updates_rotation(monkeypatch):
     assert '"order_number":"ORD-11"' in payload
     assert '"selection_source":"rotation"' in payload
     assert '"video_url":"https://example.test/storage/videos/clip.mp4"' in payload
+    assert '"marker_image_url":"https://example.test/storage/blobs/ab/abc/marker.jpg"' in payload
+    assert '"marker_image_size_bytes":1234' in payload
+    assert '"photo_url":"https://example.test/storage/photos/marker.jpg"' in payload
+    assert '"hls_url":"https://example.test/storage/blobs/ab/abc/hls/master.m3u8"' in payload
+    assert '"poster_url":"https://example.test/storage/blobs/ab/abc/hls/poster.jpg"' in payload
     assert seen == {"rotation_updates": 1, "recorded": 1, "cached": 1}
 
 
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+
+from app.services import yandex_disk_file_cache_service as mod
+from app.services.yandex_disk_file_cache_service import YandexDiskFileCache, YandexFileNotFound
+from app.utils.range_response import file_response
+
+
+class _FakeProvider:
+    def __init__(self, files):
+        self.files = files  # path -> bytes
+        self.info_calls = 0
+
+    async def get_file_info(self, path):
+        self.info_calls += 1
+        data = self.files.get(path)
+        if data is None:
+            return None
+        return {"type": "file", "size": len(data), "md5": hashlib.md5(data).hexdigest(), "modified": "m"}
+
+    async def get_download_url(self, path):
+        return f"https://downloader.disk.yandex.ru/{path}"
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    state = {"provider": None, "count": 0}
+
+    async def handler(request):
+        state["count"] += 1
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=state["provider"].files[request.url.path.lstrip("/")])
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(mod, "get_http_client", lambda: client)
+    return state
+
+
+@pytest.mark.asyncio
+async def test_fill_is_single_flight_and_revalidated_by_md5(tmp_path, downloads, monkeypatch):
+    provider = _FakeProvider({"blobs/a/video.mp4": b"v" * 100})
+    downloads["provider"] = provider
+    cache = YandexDiskFileCache(tmp_path)
+
+    results = await asyncio.gather(*(cache.get(provider, 7, "blobs/a/video.mp4") for _ in range(5)))
+    assert downloads["count"] == 1
+    local, entry = results[0]
+    assert local.read_bytes() == b"v" * 100 and entry.size == 100
+
+    await cache.get(provider, 7, "blobs/a/video.mp4")  # fresh: no Disk request at all
+    assert (provider.info_calls, downloads["count"]) == (1, 1)
+
+    monkeypatch.setattr(mod.settings, "YD_FILE_CACHE_REVALIDATE_SECONDS", 0)
+    await cache.get(provider, 7, "blobs/a/video.mp4")
+    assert (provider.info_calls, downloads["count"]) == (2, 1)  # unchanged md5
+
+    provider.files["blobs/a/video.mp4"] = b"w" * 50
+    local, entry = await cache.get(provider, 7, "/blobs/a/video.mp4")
+    assert downloads["count"] == 2 and local.read_bytes() == b"w" * 50
+    assert cache.stats()["bytes"] == 50
+
+    del provider.files["blobs/a/video.mp4"]
+    with pytest.raises(YandexFileNotFound):
+        await cache.get(provider, 7, "blobs/a/video.mp4")
+    assert cache.stats()["entries"] == 0 and not local.exists()
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_by_bytes_and_survives_restart(tmp_path, downloads, monkeypatch):
+    monkeypatch.setattr(mod.settings, "YD_FILE_CACHE_MAX_BYTES", 250)
+    monkeypatch.setattr(mod.settings, "YD_FILE_CACHE_MAX_OBJECT_BYTES", 150)
+    monkeypatch.setattr(mod, "EVICT_GRACE_SECONDS", 0)
+    provider = _FakeProvider({name: name[0].encode() * 100 for name in ("a.jpg", "b.jpg", "c.jpg")})
+    provider.files["huge.mp4"] = b"h" * 200
+    downloads["provider"] = provider
+    cache = YandexDiskFileCache(tmp_path)
+    evicted_before = mod.YD_FILE_CACHE_EVICTED_BYTES._value.get()
+
+    await cache.get(provider, 1, "a.jpg")
+    await cache.get(provider, 1, "b.jpg")
+    await cache.get(provider, 1, "a.jpg")  # a is now most recent
+    await cache.get(provider, 1, "c.jpg")
+    assert mod.YD_FILE_CACHE_EVICTED_BYTES._value.get() - evicted_before == 100
+    assert not cache.file_path(mod.cache_key(1, "b.jpg")).exists()
+    assert await cache.get(provider, 1, "huge.mp4") is None  # proxied, not cached
+
+    restarted = YandexDiskFileCache(tmp_path)
+    local, entry = await restarted.get(provider, 1, "c.jpg")
+    assert entry.path == "c.jpg" and local.read_bytes() == b"c" * 100
+    assert restarted.stats()["entries"] == 2 and downloads["count"] == 3
+
+    restarted.invalidate(1, "c.jpg")
+    assert not local.exists()
+
+
+@pytest.mark.asyncio
+async def test_workers_share_copies_budget_and_recover_from_each_others_evictions(tmp_path, downloads, monkeypatch):
+    monkeypatch.setattr(mod.settings, "YD_FILE_CACHE_MAX_BYTES", 250)
+    provider = _FakeProvider({name: name[0].encode() * 100 for name in ("a.jpg", "b.jpg", "c.jpg")})
+    downloads["provider"] = provider
+    first, second = YandexDiskFileCache(tmp_path), YandexDiskFileCache(tmp_path)
+
+    await first.get(provider, 1, "a.jpg")
+    local, _entry = await second.get(provider, 1, "a.jpg")  # adopted from the sidecar
+    assert downloads["count"] == 1 and local.read_bytes() == b"a" * 100
+
+    # Recently used copies are spared; older ones count against one shared budget
+    await second.get(provider, 1, "b.jpg")
+    await first.get(provider, 1, "c.jpg")
+    assert first.stats()["bytes"] == 300
+    monkeypatch.setattr(mod, "EVICT_GRACE_SECONDS", 0)
+    await first._evict()
+    assert first.stats()["bytes"] == 200 and not local.exists()
+
+    # The second worker still indexes "a": the missing copy is downloaded again
+    local, _entry = await second.get(provider, 1, "a.jpg")
+    assert local.read_bytes() == b"a" * 100 and downloads["count"] == 4
+
+
+@pytest.mark.asyncio
+async def test_file_response_serves_ranges_and_conditional_requests(tmp_path):
+    target = tmp_path / "clip.mp4"
+    target.write_bytes(bytes(range(100)))
+    app = FastAPI()
+
+    @app.get("/f")
+    async def _serve(request: Request):
+        return file_response(request, str(target), "video/mp4", etag="abc")
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        full = await client.get("/f")
+        assert full.status_code == 200 and full.content == bytes(range(100))
+        assert full.headers["etag"] == '"abc"' and full.headers["accept-ranges"] == "bytes"
+
+        part = await client.get("/f", headers={"Range": "bytes=10-19"})
+        assert part.status_code == 206 and part.content == bytes(range(10, 20))
+        assert part.headers["content-range"] == "bytes 10-19/100"
+
+        tail = await client.get("/f", headers={"Range": "bytes=-5"})
+        assert tail.content == bytes(range(95, 100))
+        assert (await client.get("/f", headers={"Range": "bytes=90-"})).headers["content-length"] == "10"
+        assert (await client.get("/f", headers={"Range": "bytes=200-"})).status_code == 416
+        assert (await client.get("/f", headers={"If-None-Match": '"abc"'})).status_code == 304
@@ -0,0 +1,114 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services import yandex_disk_metadata_service as mod
+from app.services.yandex_disk_metadata_service import YandexDiskMetadataService
+
+
+class _FakeDisk:
+    """Disk API stand-in: ``{path: (modified, [items])}`` with request accounting."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request):
+        params = dict(request.url.params)
+        self.requests.append(params)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            if params["path"] not in self.tree:
+                return httpx.Response(404, json={"error": "DiskNotFoundError"})
+            modified, items = self.tree[params["path"]]
+            if params["fields"] == "modified":
+                return httpx.Response(200, json={"modified": modified})
+            offset, limit = int(params.get("offset", 0)), int(params["limit"])
+            return httpx.Response(
+                200,
+                json={"modified": modified, "_embedded": {"items": items[offset:offset + limit], "total": len(items)}},
+            )
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    def _install(tree):
+        fake = _FakeDisk(tree)
+        client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+        monkeypatch.setattr(mod, "get_http_client", lambda: client)
+        return fake
+
+    return _install
+
+
+def _dir(name):
+    return {"name": name, "type": "dir"}
+
+
+def _file(name, size):
+    return {"name": name, "type": "file", "size": size}
+
+
+@pytest.mark.asyncio
+async def test_listing_is_cached_then_revalidated_by_modified(disk, monkeypatch):
+    fake = disk({"app:/acme": ("m1", [_dir("001"), _file("a.jpg", 5)])})
+    service = YandexDiskMetadataService()
+
+    listing = await service.list_directory("t", "app:/acme/")
+    assert [f["name"] for f in listing.folders] == ["001"]
+    assert [f["name"] for f in listing.files] == ["a.jpg"]
+    assert "_embedded.items.size" in fake.requests[0]["fields"]
+
+    await service.list_directory("t", "app:/acme")  # within TTL
+    assert len(fake.requests) == 1
+
+    monkeypatch.setattr(mod.settings, "YD_METADATA_CACHE_TTL_SECONDS", 0)
+    again = await service.list_directory("t", "app:/acme")
+    assert again is listing
+    assert fake.requests[-1]["fields"] == "modified"  # one cheap request, no re-list
+
+    fake.tree["app:/acme"] = ("m2", [_file("a.jpg", 5), _file("b.jpg", 7)])
+    changed = await service.list_directory("t", "app:/acme")
+    assert [f["name"] for f in changed.files] == ["a.jpg", "b.jpg"]
+    assert len(fake.requests) == 4
+
+
+@pytest.mark.asyncio
+async def test_listing_pages_and_shares_concurrent_requests(disk, monkeypatch):
+    monkeypatch.setattr(mod.settings, "YD_METADATA_PAGE_SIZE", 2)
+    fake = disk({"app:/big": ("m1", [_file(f"{i}.jpg", i) for i in range(5)])})
+    service = YandexDiskMetadataService()
+
+    results = await asyncio.gather(*(service.list_directory("t", "app:/big") for _ in range(4)))
+    assert all(result is results[0] for result in results)
+    assert len(results[0].files) == 5
+    assert [r["offset"] for r in fake.requests] == ["0", "2", "4"]
+
+
+@pytest.mark.asyncio
+async def test_walk_lists_subfolders_with_bounded_concurrency(disk):
+    tree = {"app:/acme": ("m", [_dir(f"{i:03d}") for i in range(10)] + [_file("root.bin", 1)])}
+    for i in range(10):
+        tree[f"app:/acme/{i:03d}"] = ("m", [_file("photo.jpg", 10), _dir("previews")])
+        tree[f"app:/acme/{i:03d}/previews"] = ("m", [_file("thumb.png", 2)])
+    del tree["app:/acme/004/previews"]  # removed between listings
+    fake = disk(tree)
+    service = YandexDiskMetadataService()
+
+    files = await service.walk_files("t", "app:/acme", concurrency=3)
+    assert fake.max_in_flight == 3
+    assert ("app:/acme/002/previews/thumb.png", _file("thumb.png", 2)) in files
+    assert await service.folder_size("t", "app:/acme") == {"total_bytes": 1 + 10 * 10 + 9 * 2, "file_count": 20}
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await service.walk_files("t", "app:/missing")
+
+    service.invalidate("t")
+    assert not service._listings
@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import yandex_disk_provider as mod
+from app.core.yandex_disk_provider import YandexDiskStorageProvider
+
+
+class _FakeDisk:
+    """Minimal Disk API: folders must exist before uploading into them."""
+
+    def __init__(self, folders=()):
+        self.folders = {"app:/Vertex", *folders}
+        self.requests: list[tuple[str, str]] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.params.get("path", "")
+        self.requests.append((request.method, request.url.path if not path else path))
+        if request.method == "PUT" and request.url.path == "/v1/disk/resources":
+            parent = path.rsplit("/", 1)[0]
+            if path in self.folders or parent not in self.folders:
+                return httpx.Response(409)
+            self.folders.add(path)
+            return httpx.Response(201)
+        if request.url.path == "/v1/disk/resources/upload":
+            if path.rsplit("/", 1)[0] not in self.folders:
+                return httpx.Response(409, json={"error": "DiskPathDoesntExistsError"})
+            return httpx.Response(200, json={"href": "https://uploader.example/put"})
+        if request.url.host == "uploader.example":
+            return httpx.Response(201)
+        return httpx.Response(404)
+
+    def mkdirs(self):
+        return [p for m, p in self.requests if m == "PUT" and p.startswith("app:")]
+
+
+@pytest.fixture
+def disk(monkeypatch):
+    fake = _FakeDisk()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(fake.handler))
+    monkeypatch.setattr(mod, "get_http_client", lambda: client)
+    mod.known_directories.clear()
+    yield fake
+    mod.known_directories.clear()
+
+
+@pytest.mark.asyncio
+async def test_uploads_create_folders_once_on_conflict(disk):
+    provider = YandexDiskStorageProvider(oauth_token="token", base_prefix="Vertex")
+
+    await provider.save_file_bytes(b"a", "acme/001/photo.jpg")
+    assert disk.mkdirs() == ["app:/Vertex", "app:/Vertex/acme", "app:/Vertex/acme/001"]
+
+    disk.requests.clear()
+    for name in ("video.mp4", "qr.png", "thumb.webp"):
+        await provider.save_file_bytes(b"x", f"acme/001/{name}")
+    assert disk.mkdirs() == []
+    assert [m for m, _ in disk.requests] == ["GET", "PUT"] * 3  # upload href + body, no mkdir
+
+
+@pytest.mark.asyncio
+async def test_concurrent_uploads_share_directory_creation(disk):
+    provider = YandexDiskStorageProvider(oauth_token="token", base_prefix="Vertex")
+    await asyncio.gather(*(provider.save_file_bytes(b"x", f"acme/002/{i}.bin") for i in range(5)))
+    assert disk.mkdirs() == ["app:/Vertex", "app:/Vertex/acme", "app:/Vertex/acme/002"]
+
+    # Later uploads into the same folder go straight to the upload endpoint
+    disk.requests.clear()
+    await provider.save_file_bytes(b"x", "acme/002/5.bin")
+    assert disk.mkdirs() == []
+
+
+@pytest.mark.asyncio
+async def test_stale_cache_entry_is_recreated(disk, monkeypatch):
+    provider = YandexDiskStorageProvider(oauth_token="token", base_prefix="Vertex")
+    await provider.save_file_bytes(b"a", "acme/003/a.bin")
+    disk.folders -= {"app:/Vertex/acme", "app:/Vertex/acme/003"}  # deleted in the Disk UI
+    disk.requests.clear()
+
+    await provider.save_file_bytes(b"b", "acme/003/b.bin")
+    assert disk.mkdirs() == ["app:/Vertex", "app:/Vertex/acme", "app:/Vertex/acme/003"]
+
+    monkeypatch.setattr(mod.settings, "YD_DIRECTORY_CACHE_TTL_SECONDS", -1)
+    mod.known_directories.add(("token", "app:/Vertex/x"))
+    assert ("token", "app:/Vertex/x") not in mod.known_directories  # expired